@@ -186,6 +186,24 @@ class APIClient {
     }
 
 
+    /**
+     * PATCH リクエストを送信する
+     * @param url リクエスト先の URL
+     * @param data 送信するデータ
+     * @param config AxiosRequestConfig
+     * @returns 成功なら ISuccessResponse 、失敗なら IErrorResponse を返す
+     */
+    static async patch<T = any, D = any>(url: string, data?: D, config?: AxiosRequestConfig<D>): Promise<ISuccessResponse<T> | IErrorResponse> {
+        const request: AxiosRequestConfig = {
+            url: url,
+            method: 'PATCH',
+            data: data,
+            ...config,
+        };
+        return await APIClient.request<T>(request);
+    }
+
+
     /**
      * DELETE リクエストを送信する
      * @param url リクエスト先の URL
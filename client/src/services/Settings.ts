@@ -104,6 +104,15 @@ export interface IClientSettings {
     tweet_capture_watermark_position: 'None' | 'TopLeft' | 'TopRight' | 'BottomLeft' | 'BottomRight';
 }
 
+/**
+ * 指定したリビジョンより後に更新されたクライアント設定を表すインターフェース
+ * サーバー側の app.schemas.ClientSettingsChanges で定義されているものと同じ
+ */
+export interface IClientSettingsChanges {
+    revision: number;
+    settings: Partial<IClientSettings>;
+}
+
 /**
  * サーバー設定を表すインターフェース
  * サーバー側の app.config.ServerSettings で定義されているものと同じ
@@ -193,22 +202,52 @@ class Settings {
 
 
     /**
-     * クライアント設定を更新する
-     * @param settings クライアント設定
-     * @return 成功した場合は true
+     * 指定したリビジョンより後にサーバー上で更新されたクライアント設定を取得する
+     * @param since 最後に同期したリビジョン (0 を指定するとすべての設定キーを取得する)
+     * @return 現在のリビジョンと更新された設定キーの値 (取得に失敗した場合は null)
      */
-    static async updateClientSettings(settings: IClientSettings): Promise<boolean> {
+    static async fetchClientSettingsChanges(since: number): Promise<IClientSettingsChanges | null> {
 
         // API リクエストを実行
-        const response = await APIClient.put<IClientSettings>('/settings/client', settings);
+        const response = await APIClient.get<IClientSettingsChanges>('/settings/client', {params: {since: since}});
 
-        // 設定同期は再生や画面操作を妨げない補助処理なので、通信失敗や更新競合は次回の同期へ委ねる
+        // エラー処理 (基本起こらないはず & 実行できなくても後続の処理に影響しないため何もしない)
+        if (response.type === 'error') {
+            return null;
+        }
+
+        return response.data;
+    }
+
+
+    /**
+     * クライアント設定のうち、変更された設定キーだけを更新する
+     * @param base_revision 最後に同期したリビジョン (null を指定すると他のクライアントからの更新に関わらず上書きする)
+     * @param settings 変更された設定キーの値
+     * @return 更新後のリビジョンと、base_revision より後に他のクライアントから更新された設定キーの値
+     *         (他のクライアントから同じ設定キーが更新されていた場合は 'Conflict' 、それ以外の理由で失敗した場合は null)
+     */
+    static async updateClientSettings(base_revision: number | null, settings: Partial<IClientSettings>): Promise<IClientSettingsChanges | 'Conflict' | null> {
+
+        // API リクエストを実行
+        const response = await APIClient.patch<IClientSettingsChanges>('/settings/client', {
+            base_revision: base_revision,
+            settings: settings,
+        });
+
+        // 他のクライアントから同じ設定キーが更新されていた場合 (409) は、呼び出し元でサーバー上の値を pull してから push し直す
+        if (response.type === 'error' && response.status === 409) {
+            console.warn('Client settings conflicted with another client. Pull and retry syncing.');
+            return 'Conflict';
+        }
+
+        // 設定同期は再生や画面操作を妨げない補助処理なので、通信失敗は次回の同期へ委ねる
         if (response.type === 'error') {
             console.warn('Failed to update client settings on server. Skip syncing.');
-            return false;
+            return null;
         }
 
-        return true;
+        return response.data;
     }
 
 
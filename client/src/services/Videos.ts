@@ -66,6 +66,18 @@ export interface IThumbnailTileInfo {
     column_count: number;
     row_count: number;
     interval_sec: number;
+    // サムネイル情報のバージョン 2 以降で生成されたタイル画像にのみ存在する
+    sheet?: IThumbnailTileSheetInfo;
+}
+
+/** サムネイルタイルを一定の列数・行数ごとに分割したタイルシートの情報を表すインターフェース */
+export interface IThumbnailTileSheetInfo {
+    image_width: number;
+    image_height: number;
+    column_count: number;
+    row_count: number;
+    tiles_per_sheet: number;
+    sheet_count: number;
 }
 
 /** 録画ファイル情報を表すインターフェースのデフォルト値 */
@@ -75,6 +75,10 @@ class PlayerController {
     // 保持しておかないと disconnect() で ResizeObserver を止められない
     private player_container_resize_observer: ResizeObserver | null = null;
 
+    // setupSeekbarThumbnailSheetHandler() で利用する MutationObserver
+    // 保持しておかないと disconnect() で MutationObserver を止められない
+    private seekbar_thumbnail_sheet_observer: MutationObserver | null = null;
+
     // setControlDisplayTimer() で利用するタイマー ID
     // 保持しておかないと clearTimeout() でタイマーを止められない
     private player_control_ui_hide_timer_id: number = 0;
@@ -439,6 +443,16 @@ class PlayerController {
 
                     // ビデオストリーミング API のベース URL
                     const streaming_api_base_url = `${Utils.api_base_url}/streams/video/${player_store.recorded_program.id}`;
+                    // H.264 の録画では、映像を再エンコードせずにストリームコピーする「元の画質」も選べるようにする
+                    // 元の画質は -hevc / -10bit / -24fps の指定を受け付けないため、常に original をそのまま API に渡す
+                    if (player_store.recorded_program.recorded_video.video_codec === 'H.264') {
+                        const session_id = crypto.randomUUID().split('-')[0];
+                        qualities.push({
+                            name: '元の画質',
+                            type: 'hls',
+                            url: `${streaming_api_base_url}/original/playlist?session_id=${session_id}`,
+                        });
+                    }
                     // 画質リストを作成
                     for (const quality_name of VIDEO_STREAMING_QUALITIES) {
                         // 画質ごとに異なるセッション ID を生成 (セッション ID は UUID の - で区切って一番左側のみを使う)
@@ -463,7 +477,15 @@ class PlayerController {
                     return {
                         quality: qualities,
                         defaultQuality: default_quality,
-                        thumbnails: tile_info !== null ? {
+                        // タイルシートが生成されている場合は、最初のタイルシートだけを渡してシーク位置に応じて遅延読み込みする
+                        // 残りのタイルシートの読み込みは setupSeekbarThumbnailSheetHandler() で行う
+                        thumbnails: (tile_info !== null && tile_info.sheet !== undefined) ? {
+                            url: `${Utils.api_base_url}/videos/${player_store.recorded_program.id}/thumbnail/tiled/0`,
+                            interval: tile_info.interval_sec,
+                            width: tile_info.tile_width,
+                            height: tile_info.tile_height,
+                            columnCount: tile_info.sheet.column_count,
+                        } : tile_info !== null ? {
                             url: `${Utils.api_base_url}/videos/${player_store.recorded_program.id}/thumbnail/tiled`,
                             interval: tile_info.interval_sec,
                             width: tile_info.tile_width,
@@ -844,6 +866,9 @@ class PlayerController {
         // L字画面のクロップ設定が変更されたときのイベントハンドラーを登録する
         this.setupLShapedScreenCropHandler();
 
+        // シークバーのサムネイルプレビューで、シーク位置に対応するタイルシートを遅延読み込みする
+        this.setupSeekbarThumbnailSheetHandler();
+
         // KonomiTV 本体の UI を含むプレイヤー全体のコンテナ要素がリサイズされたときのイベントハンドラーを登録する
         this.setupPlayerContainerResizeHandler();
 
@@ -1949,6 +1974,60 @@ class PlayerController {
     }
 
 
+    /**
+     * シークバーのサムネイルプレビューで、シーク位置に対応するタイルシートを遅延読み込みして表示する
+     * 長尺の番組では1枚のタイル画像が数十 MB になるため、タイルシートが生成されている録画番組では必要なシートだけを読み込む
+     */
+    private setupSeekbarThumbnailSheetHandler(): void {
+        assert(this.player !== null);
+        const player_store = usePlayerStore();
+
+        // ビデオ視聴 (オフライン再生を除く) でタイルシートが生成されている録画番組のみが対象
+        if (this.playback_mode !== 'Video' || player_store.is_offline_playback === true) return;
+        const tile_info = player_store.recorded_program.recorded_video.thumbnail_info?.tile ?? null;
+        if (tile_info === null || tile_info.sheet === undefined) return;
+        const sheet_info = tile_info.sheet;
+        const recorded_program_id = player_store.recorded_program.id;
+
+        // DPlayer はサムネイル画像を1枚の URL でしか受け取れないため、最初のタイルシートを渡した上で、
+        // シーク位置が別のタイルシートの範囲に入ったらプレビュー要素の背景画像をそのタイルシートに差し替える
+        // DPlayer は全体の列数を sheet_info.column_count として背景位置を算出するため、縦方向の背景位置はタイルシートの高さを超えうるが、
+        // すべてのタイルシートは同じ列数・行数で生成されているので、背景画像を繰り返せばタイルシート内の正しい行に折り返される
+        const bar_preview_element = this.player.template.barPreview;
+        bar_preview_element.style.backgroundRepeat = 'repeat';
+        const getSheetURL = (sheet_index: number) => `${Utils.api_base_url}/videos/${recorded_program_id}/thumbnail/tiled/${sheet_index}`;
+
+        // 読み込みを開始したタイルシートのインデックス
+        // 隣接するタイルシートを先読みしておき、シーク位置がシートの境界を越えた時に背景画像が空になる時間を短くする
+        const requested_sheet_indexes = new Set<number>([0]);
+        const preloadSheet = (sheet_index: number) => {
+            if (sheet_index < 0 || sheet_index >= sheet_info.sheet_count || requested_sheet_indexes.has(sheet_index)) return;
+            requested_sheet_indexes.add(sheet_index);
+            const image = new Image();
+            image.src = getSheetURL(sheet_index);
+        };
+
+        // DPlayer がプレビュー要素の背景位置を更新するたびに、背景位置の縦方向の値から表示中のタイルが属するタイルシートを求める
+        // シーク位置から独自に計算すると DPlayer 側の計算と端数の扱いがずれる可能性があるため、DPlayer が設定した背景位置をそのまま使う
+        let current_sheet_index = 0;
+        this.seekbar_thumbnail_sheet_observer = new MutationObserver(() => {
+            const background_position = bar_preview_element.style.backgroundPosition.trim().split(/\s+/);
+            const background_position_y = background_position.length >= 2 ? parseFloat(background_position[1]) : 0;
+            if (Number.isFinite(background_position_y) === false) return;
+            const row_index = Math.round(Math.abs(background_position_y) / tile_info.tile_height);
+            const sheet_index = Math.min(Math.floor(row_index / sheet_info.row_count), sheet_info.sheet_count - 1);
+            if (sheet_index !== current_sheet_index) {
+                current_sheet_index = sheet_index;
+                requested_sheet_indexes.add(sheet_index);
+                bar_preview_element.style.backgroundImage = `url('${getSheetURL(sheet_index)}')`;
+            }
+            preloadSheet(sheet_index + 1);
+            preloadSheet(sheet_index - 1);
+        });
+        this.seekbar_thumbnail_sheet_observer.observe(bar_preview_element, {attributes: true, attributeFilter: ['style']});
+    }
+
+
     /**
      * KonomiTV 本体の UI を含むプレイヤー全体のコンテナ要素がリサイズされたときのイベントハンドラーを登録する
      */
@@ -2230,6 +2309,12 @@ class PlayerController {
             this.player_container_resize_observer = null;
         }
 
+        // シークバーのサムネイルプレビューの監視を停止
+        if (this.seekbar_thumbnail_sheet_observer !== null) {
+            this.seekbar_thumbnail_sheet_observer.disconnect();
+            this.seekbar_thumbnail_sheet_observer = null;
+        }
+
         // L字画面のクロップ設定で使うウォッチャーを破棄
         if (this.lshaped_screen_crop_watchers.length > 0) {
             this.lshaped_screen_crop_watchers.forEach((unwatcher) => unwatcher());
@@ -555,6 +555,44 @@ export function hashClientSettings(settings: IClientSettings): string {
     });
 }
 
+/**
+ * サーバーとの設定データの差分同期の状態
+ * revision はこのクライアントが最後に同期したサーバー上の設定データのリビジョン、
+ * hashes は最後に同期した時点の設定キーごとの値のハッシュで、サーバーへ送る設定キー (前回の同期以降に変更されたもの) の判定に使う
+ */
+export interface IClientSettingsSyncState {
+    revision: number;
+    hashes: {[key: string]: string};
+}
+
+/**
+ * LocalStorage の KonomiTV-Settings-SyncState キーから設定データの差分同期の状態を取得する
+ * @returns 設定データの差分同期の状態 (まだ一度も同期していない場合はリビジョン 0 の状態)
+ */
+export function getClientSettingsSyncState(): IClientSettingsSyncState {
+    const sync_state = localStorage.getItem('KonomiTV-Settings-SyncState');
+    if (sync_state !== null) {
+        return JSON.parse(sync_state);
+    }
+    return {revision: 0, hashes: {}};
+}
+
+/**
+ * LocalStorage の KonomiTV-Settings-SyncState キーに設定データの差分同期の状態を保存する
+ * @param sync_state 設定データの差分同期の状態
+ */
+export function setClientSettingsSyncState(sync_state: IClientSettingsSyncState): void {
+    localStorage.setItem('KonomiTV-Settings-SyncState', JSON.stringify(sync_state));
+}
+
+/**
+ * 設定データの差分同期の状態を破棄する
+ * リビジョンはユーザーアカウントごとに異なるため、ログアウト時に呼び出し、次回の同期ですべての設定キーを取得し直すようにする
+ */
+export function resetClientSettingsSyncState(): void {
+    localStorage.removeItem('KonomiTV-Settings-SyncState');
+}
+
 /**
  * 最終同期時刻を更新中かどうかを表すフラグ
  * main.ts 側で最終同期時刻の更新が検知され syncClientSettingsToServer() が呼び出されると無限ループが発生するため、
@@ -571,6 +609,45 @@ export let is_last_synced_at_updating: boolean = false;
  */
 export let is_syncing_client_settings_from_server: boolean = false;
 
+/**
+ * このクライアントの設定データをサーバーに同期中かどうか
+ * 差分同期の状態を読み書きする push と pull が並行して実行されないようにするためのフラグ
+ * push 中に設定データがさらに変更された場合は is_client_settings_push_pending を立て、push の完了後に改めて push する
+ * このフラグを Store に含めると Store の更新イベントが発生して意味がないので、やむを得ず Store の外に定義している
+ */
+let is_syncing_client_settings_to_server: boolean = false;
+let is_client_settings_push_pending: boolean = false;
+
+
+/**
+ * サーバー上で更新された設定キーの値をクライアントの設定データに反映し、同期済みの値として差分同期の状態に記録する
+ * @param settings クライアントの設定データ
+ * @param sync_state 設定データの差分同期の状態
+ * @param changed_settings サーバー上で更新された設定キーの値
+ * @param apply 設定データに反映する場合は true (false の場合は差分同期の状態への記録のみ行う)
+ */
+function applyClientSettingsChanges(
+    settings: ILocalClientSettings,
+    sync_state: IClientSettingsSyncState,
+    changed_settings: Partial<IClientSettings>,
+    apply: boolean,
+): void {
+    for (const [settings_key, settings_value] of Object.entries(changed_settings)) {
+        // 現在の ILocalClientSettingsDefault に存在しない設定キーや、同期対象外の設定キーは無視する
+        if (SYNCABLE_SETTINGS_KEYS.includes(settings_key as keyof IClientSettings) === false) {
+            continue;
+        }
+        if (settings_key !== 'last_synced_at') {
+            sync_state.hashes[settings_key] = hash(settings_value);
+        }
+        // 両者の値に変更がある場合のみ上書きする
+        // さもなければ、実際にはサーバー側で値が変更されていない場合でも定義されているストアに紐づく全てのコンポーネントの再描画が発生してしまう (?)
+        if (apply === true && isEqual(settings[settings_key], settings_value) === false) {
+            settings[settings_key] = settings_value;
+        }
+    }
+}
+
 
 /**
  * 設定データを共有するストア
@@ -662,7 +739,8 @@ const useSettingsStore = defineStore('settings', {
 
         /**
          * ログイン時かつ同期が有効な場合、サーバーに保存されている設定データをこのクライアントに同期する
-         * @param force ログイン中なら同期が有効かに関わらず実行する (デフォルト: false)
+         * 前回同期したリビジョンより後にサーバー上で更新された設定キーだけを取得して反映する
+         * @param force ログイン中なら同期が有効かに関わらず、すべての設定キーを取得して反映する (デフォルト: false)
          */
         async syncClientSettingsFromServer(force: boolean = false): Promise<void> {
 
@@ -672,49 +750,62 @@ const useSettingsStore = defineStore('settings', {
             }
 
             // 遅い回線では前回の取得完了後に次の周期が再試行する
-            if (is_syncing_client_settings_from_server === true) {
+            // サーバーへの同期中も差分同期の状態が書き換わるため、次の周期に再試行する
+            if (is_syncing_client_settings_from_server === true || is_syncing_client_settings_to_server === true) {
                 return;
             }
 
             // ここから先、設定データの pull 中に syncClientSettingsToServer() が実行されないようロックする
             is_syncing_client_settings_from_server = true;
+            let is_client_newer = false;
             try {
 
-                // サーバーから設定データをダウンロード
-                const settings_server = await Settings.fetchClientSettings();
-                if (settings_server === null) {
+                // 前回同期したリビジョンより後にサーバー上で更新された設定データをダウンロード
+                // force が true の場合は、前回の同期状態を破棄してすべての設定キーをダウンロードする
+                const sync_state: IClientSettingsSyncState = force === true ? {revision: 0, hashes: {}} : getClientSettingsSyncState();
+                const changes = await Settings.fetchClientSettingsChanges(sync_state.revision);
+                if (changes === null) {
                     console.warn('Failed to fetch client settings from server. Skip syncing.');
                     return;  // 取得できなくても後続の処理には影響しないので、サイレントに失敗する
                 }
 
-                // サーバーから取得した設定データに含まれる最終同期時刻が、このクライアントが保持している最終同期時刻よりも古い場合、
-                // このまま同期を続行するとサーバーに保存されている古い設定データに巻き戻されてしまうため、同期を中断する
-                if (settings_server.last_synced_at < this.settings.last_synced_at) {
-                    console.warn('Server has older settings than this client. Skipping sync.');
+                // 前回の同期以降、サーバー上の設定データは更新されていない
+                if (changes.revision === sync_state.revision && Object.keys(changes.settings).length === 0) {
                     return;
-                } else if (settings_server.last_synced_at > this.settings.last_synced_at) {
-                    console.log('Last Synced At Changed (From Server):', settings_server.last_synced_at);
                 }
 
-                // クライアントの設定データをサーバーからの設定データで上書き
-                // 両者の値に変更がある場合のみ上書きする
-                // さもなければ、実際にはサーバー側で値が変更されていない場合でも定義されているストアに紐づく全てのコンポーネントの再描画が発生してしまう (?)
-                for (const [settings_server_key, settings_server_value] of Object.entries(settings_server)) {
-                    if (isEqual(this.settings[settings_server_key], settings_server_value) === false) {
-                        this.settings[settings_server_key] = settings_server_value;
-                    }
+                // まだ一度も差分同期していない状態で、サーバーから取得した設定データに含まれる最終同期時刻が、
+                // このクライアントが保持している最終同期時刻よりも古い場合、このまま反映するとサーバーに保存されている古い設定データに巻き戻されてしまう
+                // この場合はサーバーの設定データを反映せずに同期状態だけを記録し、直後の push でこのクライアントの設定データをサーバーに送る
+                if (sync_state.revision === 0 && force === false &&
+                    changes.settings.last_synced_at !== undefined && changes.settings.last_synced_at < this.settings.last_synced_at) {
+                    console.warn('Server has older settings than this client. Uploading client settings instead.');
+                    is_client_newer = true;
+                } else if (changes.revision !== sync_state.revision) {
+                    console.log('Client Settings Revision Changed (From Server):', changes.revision);
                 }
 
+                // クライアントの設定データを、サーバー上で更新された設定キーの値で上書きする
+                applyClientSettingsChanges(this.settings, sync_state, changes.settings, is_client_newer === false);
+                sync_state.revision = changes.revision;
+                setClientSettingsSyncState(sync_state);
+
             // 成功・失敗に関わらずロックを解除する
             } finally {
                 await Utils.sleep(0.01);  // ここで若干待つことで、フラグが正しく機能するようにする
                 is_syncing_client_settings_from_server = false;
             }
+
+            // このクライアントの設定データの方が新しい場合は、サーバーに同期する
+            if (is_client_newer === true) {
+                await this.syncClientSettingsToServer();
+            }
         },
 
         /**
          * ログイン時かつ同期が有効な場合、このクライアントの設定をサーバーに同期する
-         * @param force ログイン中なら同期が有効かに関わらず実行する (デフォルト: false)
+         * 前回の同期以降に値が変更された設定キーだけをサーバーに送る
+         * @param force ログイン中なら同期が有効かに関わらず、すべての設定キーでサーバー上の設定データを上書きする (デフォルト: false)
          */
         async syncClientSettingsToServer(force: boolean = false): Promise<void> {
 
@@ -728,29 +819,94 @@ const useSettingsStore = defineStore('settings', {
                 return;
             }
 
-            // 同期対象の設定キーのみで設定データをまとめ直す
-            const sync_settings = getSyncableClientSettings(this.settings);
+            // 前回の push がまだ完了していない場合は、完了後に改めて push する
+            if (is_syncing_client_settings_to_server === true && force === false) {
+                is_client_settings_push_pending = true;
+                return;
+            }
+
+            is_syncing_client_settings_to_server = true;
+            let conflicted_revision: number | null = null;
+            try {
 
-            // 新しい最終同期時刻
-            const new_last_synced_at = Utils.time();
+                // 同期対象の設定キーのみで設定データをまとめ直す
+                const sync_settings = getSyncableClientSettings(this.settings);
+                const sync_state = getClientSettingsSyncState();
+
+                // 前回の同期以降に値が変更された設定キーだけを取り出す (force が true の場合はすべての設定キー)
+                // 最終同期時刻は同期のたびに必ず変わるため、変更の判定からは除外する
+                const changed_settings: Partial<IClientSettings> = {};
+                const changed_hashes: {[key: string]: string} = {};
+                for (const sync_settings_key of SYNCABLE_SETTINGS_KEYS) {
+                    if (sync_settings_key === 'last_synced_at') {
+                        continue;
+                    }
+                    const value_hash = hash(sync_settings[sync_settings_key]);
+                    if (force === true || sync_state.hashes[sync_settings_key] !== value_hash) {
+                        changed_settings[sync_settings_key as string] = sync_settings[sync_settings_key];
+                        changed_hashes[sync_settings_key] = value_hash;
+                    }
+                }
+                if (Object.keys(changed_settings).length === 0) {
+                    return;
+                }
 
-            // 同期対象の設定キーのみでまとめ直した設定データ内の最終同期時刻を、新しい最終同期時刻に更新
-            // この時 this.settings.last_synced_at は更新しないのがポイント (実際に同期が成功したときのみ更新する必要がある)
-            sync_settings.last_synced_at = new_last_synced_at;
+                // 新しい最終同期時刻
+                // この時 this.settings.last_synced_at は更新しないのがポイント (実際に同期が成功したときのみ更新する必要がある)
+                // このとき同一の最終同期時刻をサーバー側にも保管することで、差分同期に対応していない古いクライアントが
+                // サーバーから新しい設定データを同期する際に、古い設定データへの巻き戻しが発生するのを防ぐ
+                const new_last_synced_at = Utils.time();
+                changed_settings.last_synced_at = new_last_synced_at;
+
+                // サーバーに変更された設定キーだけをアップロード
+                // force が true の場合は、他のクライアントからの更新に関わらずサーバー上の設定データを上書きする
+                const changes = await Settings.updateClientSettings(force === true ? null : sync_state.revision, changed_settings);
+                if (changes === null) {
+                    return;
+                }
+                if (changes === 'Conflict') {
+                    conflicted_revision = sync_state.revision;
+                    return;
+                }
 
-            // サーバーに設定データをアップロード
-            // このとき同一の最終同期時刻をサーバー側にも保管することで、サーバーから新しい設定データを同期する際に
-            // 古い設定データへの巻き戻しが発生するのを防ぐ
-            const success = await Settings.updateClientSettings(sync_settings);
+                // アップロードした設定キーの値を同期済みとして記録し、他のクライアントから更新された設定キーの値を反映する
+                // 反映中に syncClientSettingsToServer() が再度実行されないよう、pull 中と同様にロックする
+                Object.assign(sync_state.hashes, changed_hashes);
+                is_syncing_client_settings_from_server = true;
+                try {
+                    applyClientSettingsChanges(this.settings, sync_state, changes.settings, true);
+                } finally {
+                    await Utils.sleep(0.01);  // ここで若干待つことで、フラグが正しく機能するようにする
+                    is_syncing_client_settings_from_server = false;
+                }
+                sync_state.revision = changes.revision;
+                setClientSettingsSyncState(sync_state);
 
-            // 設定データの同期に成功した場合のみ、最終同期時刻を実際のクライアント設定 (this.settings) に反映
-            // 当然ここで反映した最終同期時刻は LocalStorage にも記録される
-            if (success === true) {
+                // 設定データの同期に成功した場合のみ、最終同期時刻を実際のクライアント設定 (this.settings) に反映
+                // 当然ここで反映した最終同期時刻は LocalStorage にも記録される
                 is_last_synced_at_updating = true;
                 this.settings.last_synced_at = new_last_synced_at;
                 await Utils.sleep(0.01);  // ここで若干待つことで、フラグが正しく機能するようにする
                 is_last_synced_at_updating = false;
                 console.log('Last Synced At Changed (To Server):', this.settings.last_synced_at);
+
+            // 成功・失敗に関わらずロックを解除し、push 中に変更された設定データがあれば改めて push する
+            } finally {
+                is_syncing_client_settings_to_server = false;
+
+                // 他のクライアントから同じ設定キーが更新されていた (競合した) 場合は、サーバー上の値を pull して反映した上で、
+                // まだサーバーに送れていない残りの設定キー (同期済みのハッシュと値が異なるもの) を改めて push する
+                // pull でリビジョンが進まなかった (取得に失敗した) 場合は、競合と pull を繰り返さないよう次回の同期に委ねる
+                if (conflicted_revision !== null) {
+                    await this.syncClientSettingsFromServer();
+                    if (getClientSettingsSyncState().revision !== conflicted_revision) {
+                        is_client_settings_push_pending = true;
+                    }
+                }
+                if (is_client_settings_push_pending === true) {
+                    is_client_settings_push_pending = false;
+                    await this.syncClientSettingsToServer();
+                }
             }
         }
     }
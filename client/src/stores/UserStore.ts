@@ -3,7 +3,7 @@ import { defineStore } from 'pinia';
 
 import Message from '@/message';
 import Users, { IUser, IUserUpdateRequest } from '@/services/Users';
-import useSettingsStore from '@/stores/SettingsStore';
+import useSettingsStore, { resetClientSettingsSyncState } from '@/stores/SettingsStore';
 import Utils from '@/utils';
 
 
@@ -103,6 +103,9 @@ const useUserStore = defineStore('user', {
             const settings_store = useSettingsStore();
             settings_store.settings.sync_settings = false;
 
+            // 設定データの差分同期の状態を破棄する (リビジョンはユーザーアカウントごとに異なるため)
+            resetClientSettingsSyncState();
+
             // ブラウザからアクセストークンを削除
             // これをもってログアウトしたことになる（それ以降の Axios のリクエストにはアクセストークンが含まれなくなる）
             Utils.deleteAccessToken();
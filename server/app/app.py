@@ -19,6 +19,7 @@ from app.constants import (
     QUALITY,
     VERSION,
 )
+from app.metadata.AnalysisWorkerPool import AnalysisWorkerPool
 from app.metadata.RecordedScanTask import RecordedScanTask
 from app.models.Channel import Channel
 from app.models.Program import Program
@@ -45,6 +46,7 @@ from app.routers import (
 from app.streams.LiveStream import LiveStream
 from app.utils.edcb.EDCBTuner import EDCBTuner
 from app.utils.FastAPITaskUtil import repeat_every
+from app.utils.MirakurunProgramEventStream import MirakurunProgramEventStream
 
 
 # もし Config() の実行時に AssertionError が発生した場合は、LoadConfig() を実行してサーバー設定データをロードする
@@ -229,6 +231,12 @@ async def Startup():
     # ニコニコ実況関連のステータスを更新
     await Channel.updateJikkyoStatus()
 
+    # Mirakurun のイベントストリームの購読を開始 (Mirakurun バックエンドのみ)
+    ## 番組情報の更新中に届いたイベントも取りこぼさないよう、番組情報の更新より前に開始する
+    ## 届いたイベントは番組情報の更新が終わるまで待ってから DB に反映される
+    if CONFIG.general.backend == 'Mirakurun':
+        await MirakurunProgramEventStream.start()
+
     # 番組情報を更新
     await Program.update()
 
@@ -246,6 +254,7 @@ async def Startup():
 # サーバー設定で指定された時間 (デフォルト: 15分) ごとに1回、チャンネル情報と番組情報を更新する
 # チャンネル情報は頻繁に変わるわけではないけど、手動で再起動しなくても自動で変更が適用されてほしい
 # 番組情報の更新処理はかなり重くストリーム配信などの他の処理に影響してしまうため、マルチプロセスで実行する
+# Mirakurun のイベントストリームから番組情報を随時反映できている間は、番組情報の全件更新は取りこぼしを補うために間隔を空けて行う
 @app.on_event('startup')
 @repeat_every(
     seconds = CONFIG.general.program_update_interval * 60,
@@ -255,7 +264,8 @@ async def Startup():
 async def UpdateChannelAndProgram():
     await Channel.update()
     await Channel.updateJikkyoStatus()
-    await Program.update(multiprocess=True)
+    if MirakurunProgramEventStream.isFullUpdateRequired() is True:
+        await Program.update(multiprocess=True)
 
 # 30秒に1回、ニコニコ実況関連のステータスを更新する
 @app.on_event('startup')
@@ -278,6 +288,9 @@ async def Shutdown():
     for live_stream in LiveStream.getAllLiveStreams():
         live_stream.setStatus('Offline', 'ライブストリームは Offline です。', True)
 
+    # Mirakurun のイベントストリームの購読を停止する
+    await MirakurunProgramEventStream.stop()
+
     # 全てのチューナーインスタンスを終了する (EDCB バックエンドのみ)
     if CONFIG.general.backend == 'EDCB':
         await EDCBTuner.closeAll()
@@ -288,6 +301,9 @@ async def Shutdown():
         await recorded_scan_task.stop()
         recorded_scan_task = None
 
+    # 録画ファイル解析用の常駐ワーカープロセスを終了
+    await AnalysisWorkerPool().stop()
+
     # 非同期タスクの終了処理が完全に終わるよう、もう少しだけ待つ
     # この待機を省略すると LiveEncodingTask などの終了前に Tortoise ORM の DB 接続が閉じられ、エラートレースバックが出力される
     await asyncio.sleep(0.5)
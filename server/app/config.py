@@ -16,6 +16,7 @@ from pydantic import (
     BaseModel,
     DirectoryPath,
     FilePath,
+    NonNegativeInt,
     PositiveFloat,
     PositiveInt,
     UrlConstraints,
@@ -345,11 +346,13 @@ class _ServerSettingsServer(BaseModel):
 class _ServerSettingsTV(BaseModel):
     preferred_terrestrial_region: TerrestrialRegion | None = None
     max_alive_time: PositiveInt = 10
+    zapping_pool_size: NonNegativeInt = 0
     debug_mode_ts_path: FilePath | None = None
 
 class _ServerSettingsVideo(BaseModel):
     recorded_folders: list[DirectoryPath] = []
     exclude_scan_paths: list[str] = []
+    speculative_prefetch: bool = False
 
 class _ServerSettingsCapture(BaseModel):
     upload_folders: list[DirectoryPath] = []
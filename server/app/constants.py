@@ -33,6 +33,8 @@ DATA_DIR = BASE_DIR / 'data'
 ACCOUNT_ICON_DIR = DATA_DIR / 'account-icons'
 ## サムネイル画像があるディレクトリ
 THUMBNAILS_DIR = DATA_DIR / 'thumbnails'
+## Twitter の動画プロキシで取得した動画・画像のキャッシュディレクトリ
+TWITTER_MEDIA_CACHE_DIR = DATA_DIR / 'twitter-media-cache'
 ## Twitter 関連のデバッグ用スクリーンショットの保存先ディレクトリ
 TWITTER_DEBUG_SCREENSHOTS_DIR = DATA_DIR / 'twitter-debug-screenshots'
 ## デバッグ用スクリーンショットの保持期限 (日数)
@@ -84,11 +86,18 @@ LIBRARY_PATH = {
 }
 
 # データベース (Tortoise ORM) の設定
+## SQLite は WAL モードで開き、書き込みはすべて default コネクションで行う
+## 番組情報の更新や録画フォルダのスキャンの書き込みトランザクション中でも API の読み取りがブロックされないよう、
+## 生 SQL による読み取り用に、読み取り専用 (query_only) のコネクションを別途 DATABASE_READ_CONNECTION_COUNT 個用意する
+## busy_timeout は、別プロセスで実行される番組情報の更新などと書き込みが重なった際に、即座にエラーにせず待機させるためのもの
 __model_list = [name for _, name, _ in pkgutil.iter_modules(path=['app/models'])]
+__database_url = f'sqlite://{DATA_DIR / "database.sqlite"!s}?journal_mode=WAL&synchronous=NORMAL&busy_timeout=10000'
+DATABASE_READ_CONNECTION_COUNT = 4
 DATABASE_CONFIG = {
     'timezone': 'Asia/Tokyo',
     'connections': {
-        'default': f'sqlite://{DATA_DIR / "database.sqlite"!s}',
+        'default': __database_url,
+        **{f'read_{index}': f'{__database_url}&query_only=ON' for index in range(DATABASE_READ_CONNECTION_COUNT)},
     },
     'apps': {
         'models': {
@@ -146,44 +155,65 @@ LOGGING_CONFIG: dict[str, Any] = {
         },
     },
     'handlers': {
+        # 各ハンドラーは QueuedLogHandler で包み、実際の書き込みはバックグラウンドのスレッドで行う
+        ## ログファイルのあるドライブが詰まった際に、イベントループ上の処理 (ライブストリームの配信など) が止まらないようにするため
+        ## フォーマットは QueuedLogHandler 側で行うため、formatter は QueuedLogHandler に、書き込み先の設定は target に指定する
         # サーバーログは標準エラー出力と server/logs/KonomiTV-Server.log の両方に出力する
         'default': {
             'formatter': 'default',
-            'class': 'logging.StreamHandler',
-            'stream': 'ext://sys.stderr',
+            '()': 'app.utils.QueuedLogHandler.QueuedLogHandler',
+            'target': {
+                'class': 'logging.StreamHandler',
+                'stream': 'ext://sys.stderr',
+            },
         },
         'default_file': {
             'formatter': 'default_file',
-            'class': 'app.utils.LogRotation.DailyRotatingFileHandler',
-            'filename': KONOMITV_SERVER_LOG_PATH,
-            'encoding': 'utf-8',
-            'retention_days': SERVER_LOG_ARCHIVE_RETENTION_DAYS,
+            '()': 'app.utils.QueuedLogHandler.QueuedLogHandler',
+            'target': {
+                'class': 'app.utils.LogRotation.DailyRotatingFileHandler',
+                'filename': KONOMITV_SERVER_LOG_PATH,
+                'encoding': 'utf-8',
+                'retention_days': SERVER_LOG_ARCHIVE_RETENTION_DAYS,
+            },
         },
         # サーバーログ (デバッグ) は標準エラー出力と server/logs/KonomiTV-Server.log の両方に出力する
         'debug': {
             'formatter': 'debug',
-            'class': 'logging.StreamHandler',
-            'stream': 'ext://sys.stderr',
+            '()': 'app.utils.QueuedLogHandler.QueuedLogHandler',
+            'target': {
+                'class': 'logging.StreamHandler',
+                'stream': 'ext://sys.stderr',
+            },
         },
         'debug_file': {
             'formatter': 'debug_file',
-            'class': 'app.utils.LogRotation.DailyRotatingFileHandler',
-            'filename': KONOMITV_SERVER_LOG_PATH,
-            'encoding': 'utf-8',
-            'retention_days': SERVER_LOG_ARCHIVE_RETENTION_DAYS,
+            '()': 'app.utils.QueuedLogHandler.QueuedLogHandler',
+            'target': {
+                'class': 'app.utils.LogRotation.DailyRotatingFileHandler',
+                'filename': KONOMITV_SERVER_LOG_PATH,
+                'encoding': 'utf-8',
+                'retention_days': SERVER_LOG_ARCHIVE_RETENTION_DAYS,
+            },
         },
         # アクセスログは標準出力と server/logs/KonomiTV-Access.log の両方に出力する
         'access': {
             'formatter': 'access',
-            'class': 'logging.StreamHandler',
-            'stream': 'ext://sys.stdout',
+            '()': 'app.utils.QueuedLogHandler.QueuedLogHandler',
+            'target': {
+                'class': 'logging.StreamHandler',
+                'stream': 'ext://sys.stdout',
+            },
         },
         'access_file': {
             'formatter': 'access_file',
-            'class': 'logging.FileHandler',
-            'filename': KONOMITV_ACCESS_LOG_PATH,
-            'mode': 'a',
-            'encoding': 'utf-8',
+            '()': 'app.utils.QueuedLogHandler.QueuedLogHandler',
+            'target': {
+                'class': 'logging.FileHandler',
+                'filename': KONOMITV_ACCESS_LOG_PATH,
+                'mode': 'a',
+                'encoding': 'utf-8',
+            },
         },
     },
     'loggers': {
@@ -372,6 +402,17 @@ QUALITY: dict[QUALITY_TYPES, Quality] = {
     ),
 }
 
+# 録画視聴でのみ指定できる品質の種類 (型定義)
+## original: 映像を再エンコードせず、元の録画の映像をそのままストリームコピーして HLS セグメントに再多重化する
+## ブラウザでそのまま再生できる H.264 の録画でのみ使える (音声はステレオ AAC への変換のみ行う)
+VIDEO_QUALITY_TYPES = Literal[
+    QUALITY_TYPES,
+    'original',
+]
+
+# original 品質で映像をストリームコピーできる録画の映像コーデック
+ORIGINAL_QUALITY_VIDEO_CODECS: list[Literal['MPEG-2', 'H.264', 'H.265']] = ['H.264']
+
 # ニコニコ OAuth の Client ID
 NICONICO_OAUTH_CLIENT_ID = '4JTJdyBZLwMJwaI7'
 
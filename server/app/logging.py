@@ -3,6 +3,7 @@ import ctypes
 import logging
 import logging.config
 import sys
+from collections.abc import Callable
 from typing import Any
 
 from app.config import Config
@@ -24,18 +25,43 @@ logging.config.dictConfig(LOGGING_CONFIG)
 # ロガーを取得
 logger = logging.getLogger('uvicorn')
 
+# デバッグログの出力に使うロガー
+## 'uvicorn' ロガーの子ロガーで、ログは 'uvicorn' ロガーのハンドラーからそのまま出力される
+## 'uvicorn' ロガー自体のログレベルを切り替えると Uvicorn 内部のデバッグログまで出力されてしまうため、デバッグログ専用に分けている
+debug_logger = logging.getLogger('uvicorn.konomitv')
 
-def debug(message: Any, *args: Any, exc_info: BaseException | bool | None = None) -> None:
+# デバッグログを出力するかどうか (サーバー設定のロード後、最初に isDebugEnabled() が呼ばれた時点で確定する)
+## サーバー設定は1プロセス内で一度しかロードされないため、ログ出力のたびに Config() を参照する必要はない
+_is_debug_enabled: bool | None = None
+
+
+def isDebugEnabled() -> bool:
+    """
+    デバッグログを出力するかどうかを返す
+    デバッグログのためだけに重い処理が必要な場合は、この関数で事前に確認してから処理を行う
+
+    Returns:
+        bool: デバッグログを出力する場合は True
+    """
+    global _is_debug_enabled
+    if _is_debug_enabled is None:
+        _is_debug_enabled = Config().general.debug is True
+        debug_logger.setLevel(logging.DEBUG if _is_debug_enabled is True else logging.INFO)
+    return _is_debug_enabled
+
+
+def debug(message: Any | Callable[[], Any], *args: Any, exc_info: BaseException | bool | None = None) -> None:
     """
     デバッグログを出力する (スクリプトパス・行番号を出力しない)
+    呼び出し頻度の高い箇所では、ログメッセージを返す関数 (lambda: f'...') を渡すと、デバッグログが無効な場合にメッセージの組み立て自体を省略できる
 
     Args:
-        message (Any): ログメッセージ
+        message (Any | Callable[[], Any]): ログメッセージ、またはログメッセージを返す関数
     """
-    if Config().general.debug is True:
-        logger.setLevel(logging.DEBUG)
-        logger.debug(message, *args, exc_info=exc_info, stacklevel=2)
-        logger.setLevel(logging.INFO)
+    if isDebugEnabled() is True:
+        if callable(message):
+            message = message()
+        debug_logger.debug(message, *args, exc_info=exc_info, stacklevel=2)
 
 
 def info(message: Any, *args: Any, exc_info: BaseException | bool | None = None) -> None:
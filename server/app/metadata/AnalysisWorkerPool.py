@@ -0,0 +1,655 @@
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import multiprocessing
+import multiprocessing.connection
+import multiprocessing.process
+import signal
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any, ClassVar, Literal
+
+import anyio
+import psutil
+
+from app import logging, schemas
+from app.utils.DriveIOLimiter import DriveIOLimiter
+
+
+# ワーカープロセス内で、メインプロセスとの通信に使う接続
+## ワーカープロセス外 (typer の CLI など) から実行された場合は None のままとなり、ReportAnalysisProgress() は何もしない
+worker_connection: multiprocessing.connection.Connection | None = None
+
+
+class AnalysisJobCancelledError(Exception):
+    """
+    AnalysisWorkerPool に投入したジョブが、録画ファイルの削除などによりキャンセルされたことを表す例外
+    """
+
+
+def ReportAnalysisProgress(progress: float) -> None:
+    """
+    AnalysisWorkerPool のワーカープロセス内で実行中のジョブの進捗をメインプロセスに通知する
+    ワーカープロセス外から呼ばれた場合は何もしない
+
+    Args:
+        progress (float): ジョブの進捗 (0.0 ~ 1.0)
+    """
+
+    if worker_connection is None:
+        return
+    try:
+        worker_connection.send(('Progress', min(max(progress, 0.0), 1.0)))
+    except Exception:
+        # 進捗通知はあくまで補助的な情報なので、送信に失敗しても処理は継続する
+        pass
+
+
+def RunAnalysisWorker(connection: multiprocessing.connection.Connection) -> None:
+    """
+    AnalysisWorkerPool のワーカープロセスのエントリーポイント
+    メインプロセスから (関数, 引数) のタプルを受け取って順に実行し、結果を返送し続ける
+    None を受け取るか、メインプロセスとの接続が切れた時点で終了する
+
+    Args:
+        connection (multiprocessing.connection.Connection): メインプロセスとの接続
+    """
+
+    global worker_connection
+
+    # Ctrl+C による SIGINT はメインプロセス側で処理し、ワーカープロセスは stop() 経由で終了させる
+    ## fork で起動した場合はメインプロセスのシグナルハンドラを引き継いでしまうため、明示的に無視する
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # もし Config() の実行時に AssertionError が発生した場合は、LoadConfig() を実行してサーバー設定データをロードする
+    ## 自動リロードモード時などにグローバル変数が引き継がれないことがあるため
+    from app.config import Config, LoadConfig
+    try:
+        Config()
+    except AssertionError:
+        LoadConfig(bypass_validation=True)
+
+    # PyAV / OpenCV / NumPy を含む解析モジュールを事前にインポートしておく
+    ## ワーカープロセスは使い回されるため、インポートコストはプロセス起動時の1回だけで済む
+    ## ここでのインポートはあくまで事前準備なので、失敗してもワーカープロセス自体は終了させない
+    try:
+        import app.metadata.MetadataAnalyzer
+        import app.metadata.ThumbnailGenerator  # noqa: F401
+    except Exception as ex:
+        logging.warning('[AnalysisWorkerPool] Failed to preload analysis modules in worker process:', exc_info=ex)
+
+    worker_connection = connection
+    while True:
+        try:
+            message = connection.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+
+        func, args = message
+        try:
+            response: tuple[str, Any] = ('Result', func(*args))
+        except Exception as ex:
+            response = ('Error', ex)
+
+        try:
+            connection.send(response)
+        except (EOFError, OSError):
+            break
+        except Exception as ex:
+            # 戻り値や例外が pickle できない場合は、内容を文字列化した RuntimeError として返す
+            connection.send(('Error', RuntimeError(f'{type(ex).__name__}: {ex}')))
+
+    worker_connection = None
+    connection.close()
+
+
+@dataclass(slots=True, eq=False)
+class AnalysisJob:
+    """
+    AnalysisWorkerPool で実行されるジョブの情報
+    """
+
+    id: int
+    name: str
+    file_path: str
+    drive_id: str
+    priority: Literal['High', 'Low']
+    func: Callable[..., Any]
+    args: tuple[Any, ...]
+    future: asyncio.Future[Any]
+    status: Literal['Queued', 'Running'] = 'Queued'
+    progress: float | None = None
+    queued_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    is_cancel_requested: bool = False
+
+
+@dataclass(slots=True, eq=False)
+class AnalysisWorker:
+    """
+    AnalysisWorkerPool が管理するワーカープロセスの情報
+    """
+
+    process: multiprocessing.process.BaseProcess
+    connection: multiprocessing.connection.Connection
+    completed_job_count: int = 0
+    is_suspended: bool = False
+
+
+class AnalysisWorkerPool:
+    """
+    録画ファイルのメタデータ解析やサムネイル生成などの CPU-bound な処理を実行する、常駐ワーカープロセスのプール
+    ジョブごとに ProcessPoolExecutor を作り直すと、その都度 Python インタープリタの起動と PyAV / OpenCV / NumPy のインポートが発生するため、
+    ワーカープロセスを使い回してそのコストを初回の1回だけに抑える
+    - ジョブは優先度付きキューで管理し、録画完了直後のファイルを一括スキャン時のバックログより優先して処理する
+    - 実行中のジョブは、録画ファイルの削除時などにワーカープロセスごと強制終了してキャンセルできる
+    - 録画視聴などのフォアグラウンドの読み込みが行われている HDD 上のジョブは、ワーカープロセスを一時停止・再開して間欠実行に絞る
+    """
+
+    # シングルトンインスタンス
+    __instance: ClassVar[AnalysisWorkerPool | None] = None
+
+    # 優先度ごとの並び順 (小さいほど優先される)
+    PRIORITY_ORDER: ClassVar[dict[Literal['High', 'Low'], int]] = {
+        'High': 0,  # 録画完了直後のファイルや、ユーザー操作に起因するジョブ
+        'Low': 1,  # 一括スキャン時のバックログ
+    }
+
+    # 1つのワーカープロセスで実行するジョブの最大数
+    ## ネイティブライブラリ側のメモリリークが蓄積し続けないよう、この数に達したワーカープロセスは作り直す
+    MAX_JOBS_PER_WORKER: ClassVar[int] = 100
+
+    # ワーカープロセスの終了を待機する時間 (秒)
+    WORKER_SHUTDOWN_TIMEOUT: ClassVar[float] = 3.0
+
+    # フォアグラウンドの読み込みと HDD が競合しているジョブを間欠実行する周期 (秒)
+    THROTTLE_PERIOD: ClassVar[float] = 1.0
+
+    # 間欠実行時に、1周期のうちワーカープロセスを動かしてよい時間の割合
+    ## ワーカープロセスの読み込み帯域を直接制限する手段はないため、実行時間の割合を帯域の割り当ての代わりとする
+    ## HDD ではシーク自体が律速となるため、帯域の割合より実行時間の割合で絞る方がフォアグラウンドの読み込みへの影響を抑えやすい
+    THROTTLED_IO_BUDGET_RATIO: ClassVar[float] = 0.2
+
+
+    def __new__(cls) -> AnalysisWorkerPool:
+        """
+        シングルトンインスタンスを作成または取得する
+
+        Returns:
+            AnalysisWorkerPool: シングルトンインスタンス
+        """
+
+        if cls.__instance is None:
+            cls.__instance = super().__new__(cls)
+        return cls.__instance
+
+
+    def __init__(self) -> None:
+        """
+        常駐ワーカープロセスのプールを初期化する
+        ワーカープロセス自体は最初のジョブが投入された時点で起動される
+        """
+
+        # 初期化済みの場合は何もしない
+        if hasattr(self, '_initialized') and self._initialized:
+            return
+
+        # ワーカープロセス数は従来の ProcessLimiter と同じく CPU 論理コア数の 50% とする
+        cpu_count = psutil.cpu_count(logical=True)
+        if cpu_count is None:
+            cpu_count = 4  # 取得できない場合は4コアと仮定
+        self.max_workers = max(1, cpu_count // 2)
+
+        # 優先度付きのジョブキュー (優先度, 投入順, ジョブ)
+        self._queue: list[tuple[int, int, AnalysisJob]] = []
+        self._queue_event = asyncio.Event()
+        self._job_id_counter = itertools.count(1)
+
+        # 投入済み (キュー待ち・実行中) のジョブ
+        self._jobs: dict[int, AnalysisJob] = {}
+
+        # ワーカープロセスと、各ワーカープロセスで実行中のジョブ
+        self._workers: list[AnalysisWorker | None] = [None] * self.max_workers
+        self._running_jobs: list[AnalysisJob | None] = [None] * self.max_workers
+
+        # ワーカープロセスごとのディスパッチャータスク
+        self._dispatcher_tasks: list[asyncio.Task[None]] = []
+
+        # フォアグラウンドの読み込みと競合するジョブを間欠実行させるタスク
+        self._throttler_task: asyncio.Task[None] | None = None
+
+        # 初期化済みフラグをセット
+        self._initialized = True
+
+
+    def start(self) -> None:
+        """
+        ジョブのディスパッチを開始する
+        既に開始済みの場合は何もしない (runJob() からも自動的に呼ばれる)
+        """
+
+        if len(self._dispatcher_tasks) > 0:
+            return
+        self._dispatcher_tasks = [
+            asyncio.create_task(self.__runDispatcher(worker_index))
+            for worker_index in range(self.max_workers)
+        ]
+        self._throttler_task = asyncio.create_task(self.__runThrottler())
+
+
+    async def stop(self) -> None:
+        """
+        キュー待ち・実行中のすべてのジョブをキャンセルし、ワーカープロセスを終了する
+        このメソッドはサーバー終了時に app.py から自動的に呼ばれる
+        """
+
+        # ディスパッチャータスクと間欠実行タスクを停止
+        tasks = [*self._dispatcher_tasks, *([self._throttler_task] if self._throttler_task is not None else [])]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._dispatcher_tasks = []
+        self._throttler_task = None
+
+        # 残っているジョブをすべてキャンセル扱いにする
+        for job in list(self._jobs.values()):
+            if not job.future.done():
+                job.future.set_exception(AnalysisJobCancelledError(f'{job.file_path}: Analysis worker pool has been stopped.'))
+        self._jobs.clear()
+        self._queue.clear()
+
+        # ワーカープロセスを終了
+        for worker_index in range(self.max_workers):
+            await self.__terminateWorker(worker_index, graceful=True)
+
+
+    async def runJob(
+        self,
+        func: Callable[..., Any],
+        *args: Any,
+        file_path: str,
+        name: str,
+        priority: Literal['High', 'Low'] = 'Low',
+    ) -> Any:
+        """
+        ジョブをキューに投入し、ワーカープロセス上で実行された結果を返す
+        func と args は pickle 可能である必要がある (ProcessPoolExecutor に渡す場合と同様)
+        呼び出し元のタスクがキャンセルされた場合、実行中のジョブもワーカープロセスごと強制終了される
+
+        Args:
+            func (Callable[..., Any]): ワーカープロセス上で実行する関数
+            *args (Any): 関数に渡す引数
+            file_path (str): ジョブの対象ファイルのパス (cancelJobs() でのキャンセル単位)
+            name (str): ジョブの種類を表す名前 (ログ・進捗表示用)
+            priority (Literal['High', 'Low']): ジョブの優先度 (デフォルト: Low)
+
+        Returns:
+            Any: 関数の戻り値
+
+        Raises:
+            AnalysisJobCancelledError: cancelJobs() や stop() によりジョブがキャンセルされた場合
+        """
+
+        self.start()
+
+        # ジョブを作成してキューに投入
+        job = AnalysisJob(
+            id = next(self._job_id_counter),
+            name = name,
+            file_path = file_path,
+            drive_id = DriveIOLimiter.getDriveID(anyio.Path(file_path)),
+            priority = priority,
+            func = func,
+            args = args,
+            future = asyncio.get_running_loop().create_future(),
+        )
+        self._jobs[job.id] = job
+        heapq.heappush(self._queue, (self.PRIORITY_ORDER[priority], job.id, job))
+        self._queue_event.set()
+
+        try:
+            # ディスパッチャータスクがジョブの結果をセットするまで待つ
+            ## Future をそのまま await すると呼び出し元のキャンセル時に Future もキャンセルされるため、shield() で保護しておく
+            return await asyncio.shield(job.future)
+        except asyncio.CancelledError:
+            # 呼び出し元がキャンセルされた場合は、ジョブ自体もキャンセルする
+            ## 先に Future をキャンセルしておくことで、誰も受け取らない例外が Future にセットされないようにする
+            job.future.cancel()
+            await self.__cancelJob(job)
+            raise
+        finally:
+            self._jobs.pop(job.id, None)
+
+
+    async def cancelJobs(self, file_path: str) -> int:
+        """
+        指定されたファイルを対象とする、キュー待ち・実行中のすべてのジョブをキャンセルする
+        キャンセルされたジョブの呼び出し元には AnalysisJobCancelledError が送出される
+
+        Args:
+            file_path (str): 対象ファイルのパス
+
+        Returns:
+            int: キャンセルしたジョブの数
+        """
+
+        cancelled_count = 0
+        for job in list(self._jobs.values()):
+            if job.file_path == file_path and not job.future.done():
+                await self.__cancelJob(job)
+                cancelled_count += 1
+        if cancelled_count > 0:
+            logging.info(f'{file_path}: Cancelled {cancelled_count} analysis job(s).')
+        return cancelled_count
+
+
+    def getJobs(self) -> schemas.AnalysisJobs:
+        """
+        キュー待ち・実行中のジョブの一覧と進捗を取得する
+
+        Returns:
+            schemas.AnalysisJobs: ジョブの一覧
+        """
+
+        jobs = sorted(
+            (job for job in self._jobs.values() if not job.future.done()),
+            key = lambda job: (job.status != 'Running', self.PRIORITY_ORDER[job.priority], job.id),
+        )
+        return schemas.AnalysisJobs(
+            max_workers = self.max_workers,
+            running_count = sum(1 for job in jobs if job.status == 'Running'),
+            queued_count = sum(1 for job in jobs if job.status == 'Queued'),
+            jobs = [
+                schemas.AnalysisJob(
+                    id = job.id,
+                    name = job.name,
+                    file_path = job.file_path,
+                    priority = job.priority,
+                    status = job.status,
+                    progress = job.progress,
+                    queued_at = job.queued_at,
+                    started_at = job.started_at,
+                    drive_id = job.drive_id,
+                    is_throttled = job.status == 'Running' and DriveIOLimiter.isForegroundActive(job.drive_id),
+                )
+                for job in jobs
+            ],
+        )
+
+
+    def getDriveIOStatuses(self) -> schemas.DriveIOStatuses:
+        """
+        HDD ごとのフォアグラウンドの読み込み数と、バックグラウンド解析ジョブの実行・キュー待ちの数を取得する
+
+        Returns:
+            schemas.DriveIOStatuses: HDD ごとの I/O の状況
+        """
+
+        foreground_reader_counts = DriveIOLimiter.getForegroundReaderCounts()
+        drive_ids = set(foreground_reader_counts.keys())
+        jobs = [job for job in self._jobs.values() if not job.future.done()]
+        drive_ids.update(job.drive_id for job in jobs)
+
+        drives: list[schemas.DriveIOStatus] = []
+        for drive_id in sorted(drive_ids):
+            running_count = sum(1 for job in jobs if job.drive_id == drive_id and job.status == 'Running')
+            foreground_reader_count = foreground_reader_counts.get(drive_id, 0)
+            drives.append(schemas.DriveIOStatus(
+                drive_id = drive_id,
+                foreground_reader_count = foreground_reader_count,
+                background_running_count = running_count,
+                background_queued_count = sum(1 for job in jobs if job.drive_id == drive_id and job.status == 'Queued'),
+                is_throttled = foreground_reader_count > 0 and running_count > 0,
+            ))
+        return schemas.DriveIOStatuses(
+            throttle_period = self.THROTTLE_PERIOD,
+            throttled_io_budget_ratio = self.THROTTLED_IO_BUDGET_RATIO,
+            drives = drives,
+        )
+
+
+    async def __cancelJob(self, job: AnalysisJob) -> None:
+        """
+        ジョブをキャンセルする
+        キュー待ちのジョブはディスパッチ対象から外し、実行中のジョブはワーカープロセスごと強制終了する
+
+        Args:
+            job (AnalysisJob): キャンセルするジョブ
+        """
+
+        job.is_cancel_requested = True
+        if job.status == 'Queued':
+            # キュー上のエントリはディスパッチ時に読み飛ばされる
+            if not job.future.done():
+                job.future.set_exception(AnalysisJobCancelledError(f'{job.file_path}: {job.name} job has been cancelled.'))
+            return
+
+        # 実行中のジョブは途中で安全に止める手段がないため、ワーカープロセスごと強制終了する
+        ## 結果の受信を待っているディスパッチャータスク側で接続断を検知し、ジョブにキャンセル例外をセットする
+        for worker_index, running_job in enumerate(self._running_jobs):
+            if running_job is job:
+                await self.__terminateWorker(worker_index, graceful=False)
+                break
+
+
+    async def __runDispatcher(self, worker_index: int) -> None:
+        """
+        キューからジョブを優先度順に取り出し、担当するワーカープロセスで実行し続ける
+
+        Args:
+            worker_index (int): 担当するワーカープロセスのインデックス
+        """
+
+        while True:
+            # キューが空の間は新しいジョブが投入されるまで待つ
+            while len(self._queue) == 0:
+                self._queue_event.clear()
+                await self._queue_event.wait()
+
+            _, _, job = heapq.heappop(self._queue)
+            # 既にキャンセルされたジョブは読み飛ばす
+            if job.future.done():
+                continue
+
+            try:
+                await self.__executeJob(worker_index, job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                if not job.future.done():
+                    job.future.set_exception(ex)
+            finally:
+                self._running_jobs[worker_index] = None
+
+
+    async def __runThrottler(self) -> None:
+        """
+        フォアグラウンドの読み込みが行われている HDD 上のジョブを実行中のワーカープロセスを、一時停止・再開して間欠実行させ続ける
+        THROTTLE_PERIOD 秒の周期のうち、THROTTLED_IO_BUDGET_RATIO の割合の時間だけワーカープロセスを動かす
+        """
+
+        run_duration = self.THROTTLE_PERIOD * self.THROTTLED_IO_BUDGET_RATIO
+        suspend_duration = self.THROTTLE_PERIOD - run_duration
+
+        try:
+            while True:
+                # 稼働フェーズ: 一時停止中のワーカープロセスをすべて再開する
+                for worker_index in range(self.max_workers):
+                    self.__setWorkerSuspended(worker_index, False)
+                await asyncio.sleep(run_duration)
+
+                # 停止フェーズ: フォアグラウンドの読み込みと HDD が競合しているジョブのワーカープロセスだけを一時停止する
+                ## 競合がなければ停止フェーズを設けず、すぐに次の周期に移る
+                is_suspended_any = False
+                for worker_index, running_job in enumerate(self._running_jobs):
+                    if running_job is not None and DriveIOLimiter.isForegroundActive(running_job.drive_id):
+                        is_suspended_any = self.__setWorkerSuspended(worker_index, True) or is_suspended_any
+                if is_suspended_any is True:
+                    await asyncio.sleep(suspend_duration)
+        finally:
+            # 停止時に一時停止したままのワーカープロセスを残さない
+            for worker_index in range(self.max_workers):
+                self.__setWorkerSuspended(worker_index, False)
+
+
+    def __setWorkerSuspended(self, worker_index: int, is_suspended: bool) -> bool:
+        """
+        ワーカープロセスを一時停止または再開する
+
+        Args:
+            worker_index (int): 対象のワーカープロセスのインデックス
+            is_suspended (bool): 一時停止する場合は True 、再開する場合は False
+
+        Returns:
+            bool: ワーカープロセスの状態を変更したかどうか
+        """
+
+        worker = self._workers[worker_index]
+        if worker is None or worker.is_suspended is is_suspended or worker.process.pid is None:
+            return False
+        try:
+            if is_suspended is True:
+                psutil.Process(worker.process.pid).suspend()
+            else:
+                psutil.Process(worker.process.pid).resume()
+        except psutil.Error:
+            # 既にワーカープロセスが終了している場合は、終了の検知をディスパッチャータスクに任せる
+            return False
+        worker.is_suspended = is_suspended
+        return True
+
+
+    async def __executeJob(self, worker_index: int, job: AnalysisJob) -> None:
+        """
+        ジョブを指定されたワーカープロセスで実行し、結果を Future にセットする
+
+        Args:
+            worker_index (int): ジョブを実行するワーカープロセスのインデックス
+            job (AnalysisJob): 実行するジョブ
+        """
+
+        # ワーカープロセスが未起動または終了している場合は起動する
+        worker = self._workers[worker_index]
+        if worker is None or worker.process.is_alive() is False:
+            await self.__terminateWorker(worker_index, graceful=False)
+            worker = self.__spawnWorker(worker_index)
+
+        job.status = 'Running'
+        job.started_at = time.time()
+        self._running_jobs[worker_index] = job
+
+        loop = asyncio.get_running_loop()
+
+        def ReceiveResult() -> tuple[str, Any]:
+            """ ワーカープロセスから結果が返ってくるまで受信し続ける (進捗通知はジョブ情報に反映する) """
+            while True:
+                message_type, value = worker.connection.recv()
+                if message_type == 'Progress':
+                    loop.call_soon_threadsafe(setattr, job, 'progress', value)
+                    continue
+                return message_type, value
+
+        try:
+            worker.connection.send((job.func, job.args))
+            # recv() は同期 API なので、イベントループを塞がないよう別スレッドで待つ
+            ## ワーカープロセスが強制終了された場合は、接続断により EOFError / OSError が発生する
+            message_type, value = await asyncio.to_thread(ReceiveResult)
+        except (EOFError, OSError) as ex:
+            await self.__terminateWorker(worker_index, graceful=False)
+            if job.future.done():
+                return
+            if job.is_cancel_requested is True:
+                job.future.set_exception(AnalysisJobCancelledError(f'{job.file_path}: {job.name} job has been cancelled.'))
+            else:
+                logging.error(f'{job.file_path}: Analysis worker process exited unexpectedly while running {job.name} job.')
+                job.future.set_exception(RuntimeError(f'Analysis worker process exited unexpectedly. ({type(ex).__name__})'))
+            return
+
+        if not job.future.done():
+            if message_type == 'Result':
+                job.future.set_result(value)
+            else:
+                job.future.set_exception(value)
+
+        # 一定数のジョブを実行したワーカープロセスは作り直す
+        worker.completed_job_count += 1
+        if worker.completed_job_count >= self.MAX_JOBS_PER_WORKER:
+            await self.__terminateWorker(worker_index, graceful=True)
+
+
+    def __spawnWorker(self, worker_index: int) -> AnalysisWorker:
+        """
+        ワーカープロセスを起動する
+
+        Args:
+            worker_index (int): 起動するワーカープロセスのインデックス
+
+        Returns:
+            AnalysisWorker: 起動したワーカープロセスの情報
+        """
+
+        # ProcessPoolExecutor と同じく、プラットフォームのデフォルトの起動方式を使う
+        context = multiprocessing.get_context()
+        parent_connection, child_connection = context.Pipe(duplex=True)
+        process = context.Process(
+            target = RunAnalysisWorker,
+            args = (child_connection,),
+            name = f'AnalysisWorker-{worker_index}',
+            daemon = True,
+        )
+        process.start()
+        # 子プロセス側の接続をメインプロセスで閉じておかないと、子プロセスの終了時に接続断を検知できない
+        child_connection.close()
+
+        worker = AnalysisWorker(process=process, connection=parent_connection)
+        self._workers[worker_index] = worker
+        logging.debug(f'[AnalysisWorkerPool] Worker process {worker_index} started. (PID: {process.pid})')
+        return worker
+
+
+    async def __terminateWorker(self, worker_index: int, graceful: bool) -> None:
+        """
+        ワーカープロセスを終了する
+
+        Args:
+            worker_index (int): 終了するワーカープロセスのインデックス
+            graceful (bool): 終了要求を送って自発的な終了を待つかどうか (False の場合は即座に強制終了する)
+        """
+
+        worker = self._workers[worker_index]
+        if worker is None:
+            return
+        # 一時停止中のワーカープロセスは終了要求やシグナルを処理できないため、先に再開しておく
+        self.__setWorkerSuspended(worker_index, False)
+        self._workers[worker_index] = None
+
+        def Terminate() -> None:
+            """ ワーカープロセスを終了し、回収する (join() を含むため別スレッドで実行する) """
+            if graceful is True:
+                try:
+                    worker.connection.send(None)
+                except (EOFError, OSError):
+                    pass
+                worker.process.join(timeout=self.WORKER_SHUTDOWN_TIMEOUT)
+            # 応答しない場合は terminate() → kill() の順に強制終了する
+            ## PyAV / OpenCV / FFmpeg 周辺のネイティブ処理が応答しないケースでは SIGTERM 相当だけでは終わらないことがある
+            if worker.process.is_alive() is True:
+                worker.process.terminate()
+                worker.process.join(timeout=1.0)
+            if worker.process.is_alive() is True:
+                worker.process.kill()
+                worker.process.join(timeout=1.0)
+
+        await asyncio.to_thread(Terminate)
+        worker.connection.close()
+        logging.debug(f'[AnalysisWorkerPool] Worker process {worker_index} stopped. (PID: {worker.process.pid})')
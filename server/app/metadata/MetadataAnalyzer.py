@@ -15,9 +15,17 @@ from app import logging, schemas
 from app.config import Config, LoadConfig
 from app.constants import JST, LIBRARY_PATH
 from app.metadata.TSInfoAnalyzer import TSInfoAnalyzer
+from app.metadata.TSStreamAnalyzer import (
+    AUDIO_STREAM_TYPES,
+    VIDEO_STREAM_TYPES,
+    TSElementaryStreamInfo,
+    TSStreamAnalysisResult,
+    TSStreamAnalyzer,
+)
 from app.utils import ClosestMultiple
 from app.utils.TSInformation import TSInformation
 from app.utils.TSKeyFrameSeeker import TSKeyFrameSeeker, TSStreamInfo
+from app.utils.TSPacketReader import TSPacketReader
 
 
 class FFprobeFormat(BaseModel):
@@ -276,13 +284,30 @@ class MetadataAnalyzer:
         secondary_audio_channel: Literal['Monaural', 'Stereo', '5.1ch'] | None = None
         secondary_audio_sampling_rate: int | None = None
 
-        # FFprobe から録画ファイルのメディア情報を取得
-        ## 取得に失敗した場合は KonomiTV で再生可能なファイルではないと判断し、None を返す
-        result = self.__analyzeFFprobe()
-        if result is None:
-            return None
-        full_probe, sample_probe, end_ts_offset = result
-        logging.debug(f'{self.recorded_file_path}: FFprobe analysis completed.')
+        # MPEG-TS 形式の場合は、まず録画ファイルの先頭・25% 位置・末尾を1度ずつ読むだけの単一パス解析を試みる
+        ## FFprobe の全体解析・部分解析・ストリーム構成の変化検出・ファイルハッシュの算出でそれぞれファイルを読み直す必要がなくなる
+        ## 解析結果は FFprobe の解析結果と同じ形に変換し、以降の処理を共通化する
+        ts_analysis_result: TSStreamAnalysisResult | None = None
+        if TSStreamAnalyzer.isSupportedFile(self.recorded_file_path):
+            try:
+                ts_analysis_result = TSStreamAnalyzer(self.recorded_file_path).analyze()
+                if ts_analysis_result is not None:
+                    full_probe, sample_probe = self.__convertTSStreamAnalysisResult(ts_analysis_result)
+            except Exception as ex:
+                logging.warning(f'{self.recorded_file_path}: Failed to analyze MPEG-TS streams:', exc_info=ex)
+                ts_analysis_result = None
+
+        if ts_analysis_result is not None:
+            end_ts_offset = ts_analysis_result.end_ts_offset
+            logging.debug(f'{self.recorded_file_path}: MPEG-TS stream analysis completed.')
+        else:
+            # 単一パス解析に対応していない or 失敗した場合は、FFprobe から録画ファイルのメディア情報を取得
+            ## 取得に失敗した場合は KonomiTV で再生可能なファイルではないと判断し、None を返す
+            result = self.__analyzeFFprobe()
+            if result is None:
+                return None
+            full_probe, sample_probe, end_ts_offset = result
+            logging.debug(f'{self.recorded_file_path}: FFprobe analysis completed.')
 
         # MPEG-TS の TS パケットサイズが 188 以外であれば弾く（BDAV 等は非対応）
         if full_probe.format.format_name == 'mpegts':
@@ -482,14 +507,21 @@ class MetadataAnalyzer:
                     logging.warning(f'{self.recorded_file_path}: sync_byte is missing. ignored.')
                     return None
 
-            has_video_stream_changes = self.__detectTSVideoStreamChanges(end_ts_offset)
+            if ts_analysis_result is not None:
+                has_video_stream_changes = ts_analysis_result.has_video_stream_changes
+            else:
+                has_video_stream_changes = self.__detectTSVideoStreamChanges(end_ts_offset)
 
         # ファイルハッシュを計算
-        try:
-            file_hash = self.__calculateFileHash(end_ts_offset)
-        except ValueError:
-            logging.warning(f'{self.recorded_file_path}: File size is too small. ignored.')
-            return None
+        ## 単一パス解析で算出済みであればそれを使う
+        if ts_analysis_result is not None and ts_analysis_result.file_hash is not None:
+            file_hash = ts_analysis_result.file_hash
+        else:
+            try:
+                file_hash = self.__calculateFileHash(end_ts_offset)
+            except ValueError:
+                logging.warning(f'{self.recorded_file_path}: File size is too small. ignored.')
+                return None
 
         # 録画ファイル情報を表すモデルを作成
         now = datetime.now(tz=JST)
@@ -706,29 +738,22 @@ class MetadataAnalyzer:
                 # --- 先頭ブロックからの PCR 抽出 ---
                 # 基本的にはファイル先頭の最初の TS パケットから PCR を取得する
                 f.seek(0)
-                head_data = f.read(search_block_size)
-                # 先頭ブロックが TS 同期バイト (0x47) で始まっていない場合、1バイトずつ探索して
+                head_data = f.read(ts.PACKET_SIZE)
+                # 先頭ブロックが TS 同期バイト (0x47) で始まっていない場合、
                 # 最初の同期バイトの位置を特定する
+                head_offset = 0
                 if head_data and head_data[0] != ts.SYNC_BYTE[0]:
                     logging.info('Head data is not aligned; searching for sync byte...')
-                    corrected_offset = None
-                    for idx in range(len(head_data)):
-                        if head_data[idx] == ts.SYNC_BYTE[0]:
-                            corrected_offset = idx
-                            break
-                    if corrected_offset is not None:
-                        head_data = head_data[corrected_offset:]
-                    else:
+                    f.seek(0)
+                    head_offset = f.read(search_block_size).find(ts.SYNC_BYTE)
+                    if head_offset == -1:
                         logging.error('Failed to find sync byte in head data.')
                         return None
 
+                # 先頭ブロック内の TS パケットを、同期バイトが一致しないものは読み飛ばしながら順に調べる
                 first_timestamp: float | None = None
-                for i in range(0, len(head_data), ts.PACKET_SIZE):
-                    packet = head_data[i : i + ts.PACKET_SIZE]
-                    if len(packet) < ts.PACKET_SIZE:
-                        break
-                    if packet[0] != ts.SYNC_BYTE[0]:
-                        continue
+                head_reader = TSPacketReader(f, start_offset=head_offset, max_scan_bytes=search_block_size - head_offset)
+                for _, packet in head_reader.iterPackets(stop_on_sync_loss=False):
                     pcr_val = ts.pcr(packet)
                     if pcr_val is not None:
                         # PCR 値を ts.HZ (90000Hz) で割り、秒単位に変換する
@@ -742,24 +767,7 @@ class MetadataAnalyzer:
                 # --- 末尾のゼロ埋め領域の境界をバイナリサーチで検出 ---
                 # TS ファイルは録画後にゼロ埋め領域が存在する場合があるため、
                 # 正常なデータが存在する最後のオフセット (valid_data_end) を求める
-                block_check_size = 4096  # ゼロ埋め判定用の小ブロックサイズ (4KB)
-                low = 0
-                high = file_size
-                zero_boundary = file_size  # もしゼロブロックが見つからなければ有効データはファイル全体とする
-
-                while low <= high:
-                    mid = (low + high) // 2
-                    f.seek(mid)
-                    candidate = f.read(block_check_size)
-                    if candidate and all(byte == 0 for byte in candidate):
-                        # candidate が全て 0x00 ならば、ゼロ埋め領域の一部と見なし、境界を mid に更新
-                        zero_boundary = mid
-                        high = mid - 1
-                    else:
-                        low = mid + 1
-
-                # valid_data_end はゼロ埋めが始まる境界、つまり有効データの終了位置
-                valid_data_end = zero_boundary if zero_boundary < file_size else file_size
+                valid_data_end = TSStreamAnalyzer.findZeroFillBoundary(f, file_size)
 
                 # --- 末尾領域から最後の有効な PCR の取得 ---
                 # 有効データ領域の終端から search_block_size 分の範囲を読み込み、TS パケット単位で同期を取る
@@ -768,24 +776,21 @@ class MetadataAnalyzer:
                     start_offset = 0
                 # TS パケット境界に合わせるため、start_offset を ts.PACKET_SIZE の倍数に補正
                 start_offset = (start_offset // ts.PACKET_SIZE) * ts.PACKET_SIZE
-                f.seek(start_offset)
-                tail_chunk = f.read(valid_data_end - start_offset)
 
                 # --- TS パケット同期の調整 ---
-                # 読み込んだ tail_chunk の先頭が TS 同期バイト (0x47) でない場合、同期位置を調整する
-                offset_in_chunk = 0
-                if tail_chunk and tail_chunk[0] != ts.SYNC_BYTE[0]:
-                    for idx in range(len(tail_chunk)):
-                        if tail_chunk[idx] == ts.SYNC_BYTE[0]:
-                            offset_in_chunk = idx
-                            break
-
-                # --- tail_chunk 内の TS パケットから有効な PCR 値を収集 ---
+                # 末尾領域の先頭が TS 同期バイト (0x47) でない場合、同期位置を調整する
+                f.seek(start_offset)
+                tail_head_data = f.read(ts.PACKET_SIZE)
+                if tail_head_data and tail_head_data[0] != ts.SYNC_BYTE[0]:
+                    f.seek(start_offset)
+                    offset_in_chunk = f.read(valid_data_end - start_offset).find(ts.SYNC_BYTE)
+                    if offset_in_chunk != -1:
+                        start_offset += offset_in_chunk
+
+                # --- 末尾領域内の TS パケットから有効な PCR 値を収集 ---
                 valid_pcrs: list[float] = []
-                for j in range(offset_in_chunk, len(tail_chunk) - ts.PACKET_SIZE + 1, ts.PACKET_SIZE):
-                    packet = tail_chunk[j : j + ts.PACKET_SIZE]
-                    if packet[0] != ts.SYNC_BYTE[0]:
-                        continue
+                tail_reader = TSPacketReader(f, start_offset=start_offset, end_offset=valid_data_end)
+                for _, packet in tail_reader.iterPackets(stop_on_sync_loss=False):
                     pcr_val = ts.pcr(packet)
                     if pcr_val is not None:
                         valid_pcrs.append(pcr_val / ts.HZ)
@@ -895,6 +900,84 @@ class MetadataAnalyzer:
         return False
 
 
+    def __convertTSStreamAnalysisResult(self, result: TSStreamAnalysisResult) -> tuple[FFprobeResult, FFprobeSampleResult]:
+        """
+        TSStreamAnalyzer による単一パス解析の結果を、FFprobe の全体解析・部分解析の結果と同じ形に変換する
+        各ストリームは FFprobe の JSON と同じ形の dict から検証するため、非対応のコーデックやチャンネル数のストリームは
+        FFprobe の場合と同様に FFprobeOtherStream として扱われる
+
+        Args:
+            result (TSStreamAnalysisResult): 単一パス解析の結果
+
+        Returns:
+            tuple[FFprobeResult, FFprobeSampleResult]: 全体解析と部分解析の結果
+        """
+
+        def BuildStreams(stream_infos: list[TSElementaryStreamInfo], is_full_probe: bool) -> list[dict[str, Any]]:
+            streams: list[dict[str, Any]] = []
+            for index, stream_info in enumerate(stream_infos):
+                stream: dict[str, Any] = {'index': index, 'ts_packetsize': str(ts.PACKET_SIZE)}
+                sample_stream_info = result.sample_streams[index]
+                if sample_stream_info.video_parameters is not None and sample_stream_info.video_parameters.frame_rate is not None:
+                    # 解像度・フレームレートなどは 25% 位置のサンプルの値を使う
+                    video_parameters = sample_stream_info.video_parameters
+                    frame_rate = f'{video_parameters.frame_rate.numerator}/{video_parameters.frame_rate.denominator}'
+                    stream.update({
+                        'codec_type': 'video',
+                        'codec_name': video_parameters.codec_name,
+                        'profile': video_parameters.profile,
+                        'width': video_parameters.width,
+                        'height': video_parameters.height,
+                        'avg_frame_rate': frame_rate,
+                        'r_frame_rate': frame_rate,
+                        'field_order': 'progressive' if video_parameters.is_progressive is True else 'tt',
+                    })
+                    # 全体解析に相当する結果では、再生時間を含め、スキャン形式はファイル先頭の値を使う
+                    if is_full_probe is True:
+                        stream['duration'] = result.video_duration
+                        if stream_info.video_parameters is None:
+                            stream['field_order'] = None
+                        else:
+                            stream['field_order'] = 'progressive' if stream_info.video_parameters.is_progressive is True else 'tt'
+                elif sample_stream_info.audio_parameters is not None:
+                    audio_parameters = sample_stream_info.audio_parameters
+                    stream.update({
+                        'codec_type': 'audio',
+                        'codec_name': AUDIO_STREAM_TYPES[stream_info.stream_type],
+                        'profile': audio_parameters.profile,
+                        'channels': audio_parameters.channels,
+                        'sample_rate': str(audio_parameters.sample_rate),
+                    })
+                elif stream_info.stream_type in VIDEO_STREAM_TYPES:
+                    stream.update({'codec_type': 'video', 'codec_name': VIDEO_STREAM_TYPES[stream_info.stream_type]})
+                elif stream_info.stream_type in AUDIO_STREAM_TYPES:
+                    stream.update({'codec_type': 'audio', 'codec_name': AUDIO_STREAM_TYPES[stream_info.stream_type]})
+                streams.append(stream)
+            return streams
+
+        full_probe = FFprobeResult(**{
+            'format': {
+                'format_name': 'mpegts',
+                'duration': str(result.duration),
+            },
+            'streams': BuildStreams(result.head_streams, is_full_probe=True),
+            'programs': [
+                {
+                    'program_id': program.program_number,
+                    'program_num': program.program_number,
+                    'nb_streams': program.nb_streams,
+                    'pmt_pid': program.pmt_pid,
+                    'pcr_pid': program.pcr_pid,
+                }
+                for program in result.programs
+            ],
+        })
+        sample_probe = FFprobeSampleResult(**{
+            'streams': BuildStreams(result.sample_streams, is_full_probe=False),
+        })
+        return (full_probe, sample_probe)
+
+
     def __analyzeFFprobe(self) -> tuple[FFprobeResult, FFprobeSampleResult, int | None] | None:
         """
         録画ファイルのメディア情報を FFprobe を使って解析する
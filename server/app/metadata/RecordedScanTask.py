@@ -2,7 +2,6 @@
 from __future__ import annotations
 
 import asyncio
-import concurrent.futures
 import pathlib
 from dataclasses import dataclass
 from datetime import datetime
@@ -17,6 +16,10 @@ from watchfiles import Change, awatch
 from app import logging, schemas
 from app.config import Config
 from app.constants import JST, THUMBNAILS_DIR
+from app.metadata.AnalysisWorkerPool import (
+    AnalysisJobCancelledError,
+    AnalysisWorkerPool,
+)
 from app.metadata.CMSectionsDetector import CMSectionsDetector
 from app.metadata.MetadataAnalyzer import MetadataAnalyzer
 from app.metadata.ThumbnailGenerator import ThumbnailGenerator
@@ -24,7 +27,6 @@ from app.models.Channel import Channel
 from app.models.RecordedProgram import RecordedProgram
 from app.models.RecordedVideo import RecordedVideo
 from app.streams.VideoSegmentPlanner import VideoSegmentPlanner
-from app.utils import ShutdownProcessPoolExecutor
 from app.utils.DriveIOLimiter import DriveIOLimiter
 from app.utils.ProcessLimiter import ProcessLimiter
 from app.utils.TSInformation import TSInformation
@@ -413,10 +415,12 @@ class RecordedScanTask:
                         continue
 
                     # ファイル名からハッシュを抽出
-                    ## ファイル名は "{hash}.webp" または "{hash}_tile.webp" の形式
+                    ## ファイル名は "{hash}.webp" または "{hash}_tile.webp" または "{hash}_tile_{sheet_index}.webp" の形式
                     file_name = thumbnail_path.stem
                     if file_name.endswith('_tile'):
                         file_hash = file_name[:-5]  # "_tile" を除去
+                    elif '_tile_' in file_name:
+                        file_hash = file_name.rsplit('_tile_', 1)[0]  # "_tile_{sheet_index}" を除去
                     else:
                         file_hash = file_name
 
@@ -623,20 +627,26 @@ class RecordedScanTask:
                         # 録画開始前にファイルアロケーションを行う録画予約ソフトでは、録画中も表面上ファイルサイズが変化しない問題への対処
                         pass
 
-                # ProcessPoolExecutor を使い、別プロセス上でメタデータを解析
+                # 録画フォルダの一括スキャンから呼ばれた場合はバックログとして扱い、録画完了直後のファイルなどの解析を優先させる
+                ## ファイル変更イベントなどから呼ばれた場合は existing_db_recorded_videos が None になる
+                priority: Literal['High', 'Low'] = 'Low' if existing_db_recorded_videos is not None else 'High'
+
+                # AnalysisWorkerPool の常駐ワーカープロセス上でメタデータを解析
                 ## メタデータ解析処理は実装上同期 I/O で実装されており、また CPU-bound な処理のため、別プロセスで実行している
-                ## コンテキストマネージャーはキャンセル時にも子プロセス終了を同期的に待つため、イベントループ上では使わない
-                ## 正常完了時は明示的に待ってクリーンアップし、リクエスト切断時だけ待機なしで解放処理へ進める
-                loop = asyncio.get_running_loop()
+                ## ワーカープロセスは使い回されるため、録画ファイルごとのプロセス起動・モジュールインポートのコストはかからない
                 analyzer = MetadataAnalyzer(pathlib.Path(str(file_path)))  # anyio.Path -> pathlib.Path に変換
-                executor = concurrent.futures.ProcessPoolExecutor(max_workers=1)
-                should_wait_executor = True
                 try:
-                    recorded_program = await loop.run_in_executor(executor, analyzer.analyze)
-                except asyncio.CancelledError:
-                    should_wait_executor = False
-                    await ShutdownProcessPoolExecutor(executor, is_cancelled=True)
-                    raise
+                    recorded_program = await AnalysisWorkerPool().runJob(
+                        analyzer.analyze,
+                        file_path = file_path_str,
+                        name = 'MetadataAnalysis',
+                        priority = priority,
+                    )
+                except AnalysisJobCancelledError:
+                    # 解析中に録画ファイルが削除された場合など
+                    logging.info(f'{file_path}: Metadata analysis has been cancelled.')
+                    self._recording_files.pop(file_path, None)  # もし録画中扱いであればここで削除
+                    return
                 except Exception as ex:
                     logging.error(f'{file_path}: Error analyzing metadata:', exc_info=ex)
                     # メタデータ解析中に例外が発生した場合も、この時点ですでに DB にエントリが存在している場合は、UI から判別できるようステータスを更新する
@@ -645,9 +655,6 @@ class RecordedScanTask:
                         existing_recorded_video_summary.status = 'AnalysisFailed'
                     self._recording_files.pop(file_path, None)  # もし録画中扱いであればここで削除
                     return
-                finally:
-                    if should_wait_executor is True:
-                        await ShutdownProcessPoolExecutor(executor, is_cancelled=False)
                 if recorded_program is None:
                     logging.error(f'{file_path}: Failed to analyze metadata.')
                     # メタデータ解析に失敗したがこの時点ですでに DB にエントリが存在している場合は、UI から判別できるようステータスを更新する
@@ -712,7 +719,7 @@ class RecordedScanTask:
                 ## DB 保存に失敗した状態で開始すると、RecordedVideo が存在しないままサムネイル生成だけが進んでしまうため、この処理は永続化後に実行する必要がある
                 if recorded_program.recorded_video.status == 'Recorded':
                     if file_path not in self._background_tasks:
-                        task = asyncio.create_task(self.__runBackgroundAnalysis(recorded_program))
+                        task = asyncio.create_task(self.__runBackgroundAnalysis(recorded_program, priority))
                         self._background_tasks[file_path] = task
 
                 # wait_background_analysis が True の場合のみ、バックグラウンド解析タスクが完了するまで待つ
@@ -983,7 +990,7 @@ class RecordedScanTask:
             await db_recorded_video.save()
 
 
-    async def __runBackgroundAnalysis(self, recorded_program: schemas.RecordedProgram) -> None:
+    async def __runBackgroundAnalysis(self, recorded_program: schemas.RecordedProgram, priority: Literal['High', 'Low'] = 'Low') -> None:
         """
         録画完了後のバックグラウンド解析タスク
         - サムネイル生成
@@ -992,23 +999,28 @@ class RecordedScanTask:
 
         Args:
             recorded_program (schemas.RecordedProgram): 解析対象の録画番組情報
+            priority (Literal['High', 'Low']): 解析の優先度 (録画完了直後のファイルは High、一括スキャン時のバックログは Low)
         """
 
         # 録画ファイルのパスを anyio.Path に変換
         file_path = anyio.Path(recorded_program.recorded_video.file_path)
 
+        async def RunAnalysis() -> None:
+            await asyncio.gather(
+                # 録画ファイルの CM 区間を検出し DB に保存
+                CMSectionsDetector(file_path, recorded_program.recorded_video.duration).detectAndSave(),
+                # シークバー用サムネイルとリスト表示用の代表サムネイルの両方を生成
+                ThumbnailGenerator.fromRecordedProgram(recorded_program).generateAndSave(priority=priority),
+            )
+
         try:
-            logging.info(f'{file_path}: Starting background analysis task...')
+            logging.info(f'{file_path}: Starting background analysis task... (priority: {priority})')
             # ProcessLimiter で稼働中のバックグラウンドタスクの同時実行数を CPU コア数の 50% に制限
-            async with ProcessLimiter.getSemaphore('RecordedScanTask'):
+            ## 録画完了直後のファイル (High) は、一括スキャン時のバックログ (Low) が待ち行列に大量に積まれていても、その先頭に割り込んで獲得する
+            async with ProcessLimiter.getSemaphore('RecordedScanTask').hold(priority):
                 # DriveIOLimiter で同一 HDD に対してのバックグラウンドタスクの同時実行数を原則1セッションに制限
-                async with DriveIOLimiter.getSemaphore(file_path):
-                    await asyncio.gather(
-                        # 録画ファイルの CM 区間を検出し DB に保存
-                        CMSectionsDetector(file_path, recorded_program.recorded_video.duration).detectAndSave(),
-                        # シークバー用サムネイルとリスト表示用の代表サムネイルの両方を生成
-                        ThumbnailGenerator.fromRecordedProgram(recorded_program).generateAndSave(),
-                    )
+                async with DriveIOLimiter.getSemaphore(file_path).hold(priority):
+                    await RunAnalysis()
             logging.info(f'{file_path}: Background analysis task completed.')
 
         except Exception as ex:
@@ -1315,6 +1327,13 @@ class RecordedScanTask:
             original_file_path (anyio.Path | None): 監視で検知した元のファイルパス
         """
 
+        # 削除されたファイルを対象とする、キュー待ち・実行中の解析ジョブをキャンセル
+        ## 一括スキャンのバックログに積まれたままのジョブや、実行中のメタデータ解析・サムネイル生成が無駄に走り続けないようにする
+        ## メタデータ解析中は processRecordedFile() がファイルごとのロックを保持しているため、ロックの取得前にキャンセルする
+        await AnalysisWorkerPool().cancelJobs(str(file_path))
+        if original_file_path is not None and str(original_file_path) != str(file_path):
+            await AnalysisWorkerPool().cancelJobs(str(original_file_path))
+
         # ファイルパスに対応するロックを取得または作成
         async with self._file_locks_dict_lock:
             if file_path not in self._file_locks:
@@ -1,5 +1,7 @@
 
 import asyncio
+import itertools
+import struct
 from collections.abc import Callable
 from datetime import datetime, timedelta
 from io import BufferedReader, BytesIO
@@ -8,6 +10,7 @@ from typing import Any, Literal, cast
 
 import ariblib
 import ariblib.event
+import numpy as np
 from ariblib.descriptors import (
     AudioComponentDescriptor,
     ServiceDescriptor,
@@ -30,6 +33,14 @@ from app.utils import ClosestMultiple, NormalizeToJSTDatetime
 from app.utils.TSInformation import TSInformation
 
 
+# PSI/SI 書庫 (psisiarc の .psc) の各ブロックの先頭に置かれるマジックナンバー
+PSI_ARCHIVE_MAGIC = b'Pssc\x0d\x0a\x9a\x0a'
+
+# PSI/SI 書庫のブロックヘッダーのうち、マジックナンバーと予約領域の後に続くフィールド
+## 時刻リスト長・辞書長・辞書ウィンドウ長 (uint16) と、辞書データサイズ・辞書バッファサイズ・コードリスト長 (uint32)
+PSI_ARCHIVE_HEADER_STRUCT = struct.Struct('<HHHIII')
+
+
 class TSInfoAnalyzer:
     """
     録画 TS ファイルや録画データ関連ファイルに含まれる番組情報を解析するクラス
@@ -85,8 +96,8 @@ class TSInfoAnalyzer:
                     last_time_sec = 0.0
                     last_tot_time_sec: float | None = None
 
-                    def callback(time_sec: float, pid: int, section: bytes):
-                        nonlocal last_time_sec, last_tot_time_sec
+                    def callback(time_sec: float, pid: int, section: memoryview):
+                        nonlocal packets, last_time_sec, last_tot_time_sec
                         last_time_sec = time_sec
                         if pid in (0x12, 0x26, 0x27):
                             # EIT は 20% の位置から 60 秒間だけ
@@ -102,21 +113,22 @@ class TSInfoAnalyzer:
                             if time_sec > 60:
                                 return True
 
+                        # TS パケットに変換
+                        ## セクションは 183 バイト (先頭パケットは pointer_field の分だけ短い) / 184 バイトごとにまとめてコピーする
                         i = 0
                         while i < len(section):
-                            # TS パケットに変換
-                            packets.append(0x47)
-                            packets.append((0x40 if i == 0 else 0) | pid >> 8)
-                            packets.append(pid & 0xff)
                             counters[pid] = (counters[pid] + 1) & 0x0f if pid in counters else 0
-                            packets.append(0x10 | counters[pid])
                             if i == 0:
-                                packets.append(0)
-                            while len(packets) % 188 != 0 and i < len(section):
-                                packets.append(section[i])
-                                i += 1
-                            while len(packets) % 188 != 0:
-                                packets.append(0xff)
+                                packets += bytes((0x47, 0x40 | pid >> 8, pid & 0xff, 0x10 | counters[pid], 0))
+                                payload_size = 183
+                            else:
+                                packets += bytes((0x47, pid >> 8, pid & 0xff, 0x10 | counters[pid]))
+                                payload_size = 184
+                            section_chunk = section[i:i + payload_size]
+                            packets += section_chunk
+                            if len(section_chunk) < payload_size:
+                                packets += b'\xff' * (payload_size - len(section_chunk))
+                            i += payload_size
                         return True
 
                     # PAT, NIT, SDT, TOT, EIT を取り出す
@@ -913,102 +925,106 @@ class TSInfoAnalyzer:
 
 
     @staticmethod
-    def readPSIData(reader: BufferedReader, target_pids: list[int], callback: Callable[[float, int, bytes], bool]) -> bool:
+    def readPSIData(reader: BufferedReader, target_pids: list[int], callback: Callable[[float, int, memoryview], bool]) -> bool:
         """
         書庫から PSI/SI セクションを取り出す
+        書庫はブロック単位でまとめて読み込み、ヘッダー・辞書・時刻リストは struct で、コードリストと辞書の引き継ぎは NumPy でまとめてデコードする
+        セクションデータは読み込んだブロックのバッファを参照する memoryview としてコピーせずに渡される
 
         Args:
             reader (BufferedReader): 書庫データ
             target_pids (list[int]): 取り出すセクションの PID のリスト
-            callback (Callable[[float, int, bytes], bool]): セクションを1つ取り出すごとに呼び出される関数
+            callback (Callable[[float, int, memoryview], bool]): セクションを1つ取り出すごとに呼び出される関数
 
         Returns:
             bool: フォーマットエラーか callback から False が返ったとき False を返す
         """
 
-        def GetUint16(buf: bytes, pos: int):
-            return buf[pos] | buf[pos + 1] << 8
-
-        def GetUint32(buf: bytes, pos: int):
-            return GetUint16(buf, pos) | GetUint16(buf, pos + 2) << 16
+        # PID から取り出す対象かどうかを引くための表
+        is_target_pid_table = np.zeros(0x2000, dtype=np.bool_)
+        is_target_pid_table[[target_pid % 0x2000 for target_pid in target_pids]] = True
 
-        last_pids: list[int] = []
-        last_dict: list[int | bytes | None] = []
+        # 前回辞書の PID (参照済みのエントリは -1) と、セクションデータ (対象 PID 以外は None)
+        last_pids = np.empty(0, dtype=np.int64)
+        last_dict: list[memoryview | None] = []
         init_time = -1
 
         while True:
-            buf = reader.read(32)
-            if len(buf) != 32 or buf[0:8] != b'Pssc\x0d\x0a\x9a\x0a':
+            header = reader.read(32)
+            if len(header) != 32 or header[0:8] != PSI_ARCHIVE_MAGIC:
                 # 完了
                 break
 
-            time_list_len = GetUint16(buf, 10)
-            dictionary_len = GetUint16(buf, 12)
-            dictionary_window_len = GetUint16(buf, 14)
-            dictionary_data_size = GetUint32(buf, 16)
-            dictionary_buff_size = GetUint32(buf, 20)
-            code_list_len = GetUint32(buf, 24)
+            (time_list_len, dictionary_len, dictionary_window_len,
+             dictionary_data_size, dictionary_buff_size, code_list_len) = PSI_ARCHIVE_HEADER_STRUCT.unpack_from(header, 10)
             if (dictionary_window_len < dictionary_len or
                 dictionary_buff_size < dictionary_data_size or
                 dictionary_window_len > 65536 - 4096):
                 return False
 
-            time_buf = reader.read(time_list_len * 4 + dictionary_len * 2)
-            if len(time_buf) != time_list_len * 4 + dictionary_len * 2:
+            # ヘッダー以降のブロック全体 (時刻リスト・辞書・辞書データ・コードリスト・トレイラー) を一度に読み込む
+            dictionary_pos = time_list_len * 4
+            dictionary_data_pos = dictionary_pos + dictionary_len * 2
+            code_list_pos = dictionary_data_pos + dictionary_data_size + dictionary_data_size % 2
+            trailer_size = 4 - (dictionary_len * 2 + (dictionary_data_size + 1) // 2 * 2 + code_list_len * 2) % 4
+            block_size = code_list_pos + code_list_len * 2 + trailer_size
+            block = memoryview(reader.read(block_size))
+            if len(block) != block_size:
                 return False
 
-            pos = time_list_len * 4
-            remain = dictionary_data_size
+            # ***** 辞書の更新 *****
+
+            # 辞書のエントリは、4096 以上なら前回辞書 ID の参照、それ未満ならセクションサイズ - 1 を表す
+            ## 辞書データの先頭には新規エントリの PID が並び、その後に新規エントリのセクションデータが順に並ぶ
+            dictionary_codes = struct.unpack_from(f'<{dictionary_len}H', block, dictionary_pos)
+            new_entry_count = int(np.count_nonzero(np.frombuffer(block, dtype='<u2', count=dictionary_len, offset=dictionary_pos) < 4096))
+            if new_entry_count * 2 > dictionary_data_size:
+                return False
+            new_pids = [new_pid % 0x2000 for new_pid in struct.unpack_from(f'<{new_entry_count}H', block, dictionary_data_pos)]
+
             pids: list[int] = []
-            dict: list[int | bytes | None] = []
-            for _ in range(dictionary_len):
-                code_or_size = GetUint16(time_buf, pos) - 4096
-                if code_or_size >= 0:
+            dictionary: list[memoryview | None] = []
+            referenced_codes: list[int] = []
+            section_pos = dictionary_data_pos + new_entry_count * 2
+            dictionary_data_end = dictionary_data_pos + dictionary_data_size
+            for code in dictionary_codes:
+                if code >= 4096:
                     # 前回辞書 ID の参照
-                    if code_or_size >= len(last_pids) or last_pids[code_or_size] < 0:
+                    code -= 4096
+                    if code >= len(last_dict) or last_pids[code] < 0:
                         return False
-                    pids.append(last_pids[code_or_size])
-                    dict.append(last_dict[code_or_size])
-                    last_pids[code_or_size] = -1
+                    pids.append(int(last_pids[code]))
+                    dictionary.append(last_dict[code])
+                    last_pids[code] = -1
+                    referenced_codes.append(code)
                 else:
-                    # セクションサイズ
-                    remain -= 2
-                    buf = reader.read(2)
-                    if len(buf) != 2 or remain < 0:
-                        return False
-                    pids.append(GetUint16(buf, 0) % 0x2000)
-                    # このあとセクションデータに置き換える
-                    dict.append(code_or_size)
-                pos += 2
-
-            for i in range(dictionary_len):
-                if type(dict[i]) is int:
-                    # 新規なのでセクションデータを読む
-                    size = cast(int, dict[i]) + 4097
-                    remain -= size
-                    buf = reader.read(size)
-                    if len(buf) != size or remain < 0:
+                    # 新規なのでセクションデータを参照する (対象 PID 以外のセクションデータは無視)
+                    new_pid = new_pids[len(pids) - len(referenced_codes)]
+                    section_end = section_pos + code + 1
+                    if section_end > dictionary_data_end:
                         return False
-                    # 対象 PID 以外のセクションデータは無視
-                    dict[i] = buf if pids[i] in target_pids else None
+                    pids.append(new_pid)
+                    dictionary.append(block[section_pos:section_end] if is_target_pid_table[new_pid] else None)
+                    section_pos = section_end
 
-            for i in range(dictionary_window_len - dictionary_len):
-                if i >= len(last_pids):
-                    return False
-                # 前回辞書のうち未参照のものを引き継ぐ
-                if last_pids[i] >= 0:
-                    pids.append(last_pids[i])
-                    dict.append(last_dict[i])
-            last_pids = pids
-            last_dict = dict
-            # 残りは読み飛ばす
-            remain += dictionary_data_size % 2
-            if remain > 0 and len(reader.read(remain)) != remain:
+            # 前回辞書のうち、ウィンドウ内で未参照のものを引き継ぐ
+            carry_over_len = dictionary_window_len - dictionary_len
+            if carry_over_len > len(last_dict):
                 return False
-
+            carry_over_mask = last_pids[:carry_over_len] >= 0
+            last_dict = dictionary + list(itertools.compress(last_dict[:carry_over_len], carry_over_mask.tolist()))
+            last_pids = np.concatenate((np.array(pids, dtype=np.int64), last_pids[:carry_over_len][carry_over_mask]))
+
+            # ***** 時刻リストのデコード *****
+
+            # 時刻リストの各要素は、0xffffffff なら時刻のリセット、0x80000000 以上なら絶対時刻、
+            # それ未満なら下位 16bit が直前からの時刻の増分、上位 16bit がその時刻に出現したセクションの数 - 1 を表す
+            ## 時刻ごとに、コードリスト上で対応するコードの終了位置と時刻 (秒) を求めておく
+            group_code_ends: list[int] = []
+            group_time_secs: list[float] = []
+            code_count = 0
             curr_time = -1
-            for time_list_pos in range(0, time_list_len * 4, 4):
-                abs_time = GetUint32(time_buf, time_list_pos)
+            for abs_time in struct.unpack_from(f'<{time_list_len}I', block, 0):
                 if abs_time == 0xffffffff:
                     curr_time = -1
                 elif abs_time >= 0x80000000:
@@ -1017,22 +1033,30 @@ class TSInfoAnalyzer:
                         init_time = curr_time
                 else:
                     if curr_time >= 0:
-                        curr_time += GetUint16(time_buf, time_list_pos)
-                    n = GetUint16(time_buf, time_list_pos + 2) + 1
-                    buf = reader.read(n * 2)
-                    if len(buf) != n * 2:
-                        return False
-                    time_sec = (curr_time + 0x40000000 - init_time) % 0x40000000 / 11250
-                    for i in range(n):
-                        code = GetUint16(buf, i * 2) - 4096
-                        if code < 0 or code >= len(pids):
-                            return False
-                        if dict[code] is not None and not callback(time_sec, pids[code], cast(bytes, dict[code])):
-                            return False
+                        curr_time += abs_time & 0xffff
+                    code_count += (abs_time >> 16) + 1
+                    group_code_ends.append(code_count)
+                    group_time_secs.append((curr_time + 0x40000000 - init_time) % 0x40000000 / 11250)
+            if code_count > code_list_len:
+                return False
 
-            trailer_size = 4 - (dictionary_len * 2 + (dictionary_data_size + 1) // 2 * 2 + code_list_len * 2) % 4
-            buf = reader.read(trailer_size)
-            if len(buf) != trailer_size:
+            # ***** コードリストのデコード *****
+
+            # コードリスト全体を NumPy でデコードし、対象 PID のセクションを参照するコードだけを取り出す
+            codes = np.frombuffer(block, dtype='<u2', count=code_count, offset=code_list_pos).astype(np.int64) - 4096
+            if code_count == 0:
+                continue
+            if int(codes.min()) < 0 or int(codes.max()) >= len(last_dict):
                 return False
+            target_code_indexes = np.flatnonzero(is_target_pid_table[last_pids[codes]])
+            if len(target_code_indexes) == 0:
+                continue
+            target_codes = codes[target_code_indexes]
+            target_groups = np.searchsorted(group_code_ends, target_code_indexes, side='right')
+
+            # 出現順に callback を呼び出す
+            for code, section_pid, group in zip(target_codes.tolist(), last_pids[target_codes].tolist(), target_groups.tolist()):
+                if not callback(group_time_secs[group], section_pid, cast(memoryview, last_dict[code])):
+                    return False
 
         return True
@@ -0,0 +1,1144 @@
+
+from __future__ import annotations
+
+import hashlib
+import itertools
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from fractions import Fraction
+from pathlib import Path
+from typing import BinaryIO, ClassVar, Literal
+
+import numpy as np
+from biim.mpeg2ts import ts
+from biim.mpeg2ts.parser import PESParser, SectionParser
+from biim.mpeg2ts.pat import PATSection
+from biim.mpeg2ts.pes import PES
+from biim.mpeg2ts.pmt import PMTSection
+
+from app import logging
+from app.utils import ClosestMultiple
+
+
+# PMT の stream_type と、FFprobe の codec_name 相当の名前の対応表
+VIDEO_STREAM_TYPES: dict[int, Literal['mpeg2video', 'h264', 'hevc']] = {
+    0x02: 'mpeg2video',
+    0x1B: 'h264',
+    0x24: 'hevc',
+}
+AUDIO_STREAM_TYPES: dict[int, str] = {
+    0x0F: 'aac',
+    0x11: 'aac_latm',
+}
+
+# MPEG-2 Video の frame_rate_code と フレームレートの対応表
+MPEG2_FRAME_RATES: dict[int, Fraction] = {
+    1: Fraction(24000, 1001),
+    2: Fraction(24, 1),
+    3: Fraction(25, 1),
+    4: Fraction(30000, 1001),
+    5: Fraction(30, 1),
+    6: Fraction(50, 1),
+    7: Fraction(60000, 1001),
+    8: Fraction(60, 1),
+}
+
+# ADTS の sampling_frequency_index と サンプルレートの対応表
+ADTS_SAMPLE_RATES: tuple[int, ...] = (96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350)
+ADTS_PROFILES: tuple[str, ...] = ('Main', 'LC', 'SSR', 'LTP')
+
+# PES のタイムスタンプから算出したフレームレートを丸める先の、一般的なフレームレートの一覧
+STANDARD_FRAME_RATES: tuple[Fraction, ...] = (
+    Fraction(24000, 1001), Fraction(24, 1), Fraction(25, 1), Fraction(30000, 1001), Fraction(30, 1),
+    Fraction(50, 1), Fraction(60000, 1001), Fraction(60, 1), Fraction(120000, 1001), Fraction(120, 1),
+)
+
+
+@dataclass(slots=True)
+class TSVideoParameters:
+    """
+    映像ストリームのシーケンスヘッダ / SPS から読み取ったパラメータ
+
+    Args:
+        codec_name (Literal['mpeg2video', 'h264', 'hevc']): FFprobe の codec_name 相当のコーデック名
+        profile (str | None): FFprobe の profile 相当のプロファイル名
+        width (int): 映像幅 (クロップ後)
+        height (int): 映像高さ (クロップ後)
+        frame_rate (Fraction | None): ヘッダに記録されたフレームレート (記録されていない場合は None)
+        is_progressive (bool): プログレッシブ映像かどうか
+    """
+
+    codec_name: Literal['mpeg2video', 'h264', 'hevc']
+    profile: str | None
+    width: int
+    height: int
+    frame_rate: Fraction | None
+    is_progressive: bool
+
+
+@dataclass(slots=True)
+class TSAudioParameters:
+    """
+    音声ストリームの ADTS ヘッダから読み取ったパラメータ
+
+    Args:
+        profile (str): FFprobe の profile 相当のプロファイル名
+        channels (int): チャンネル数
+        sample_rate (int): サンプルレート
+    """
+
+    profile: str
+    channels: int
+    sample_rate: int
+
+
+@dataclass(slots=True)
+class TSElementaryStreamInfo:
+    """
+    TS ファイル内のエレメンタリーストリームの情報
+
+    Args:
+        pid (int): エレメンタリーストリームの PID
+        stream_type (int): PMT に記載された stream_type
+        video_parameters (TSVideoParameters | None): 映像ストリームのパラメータ (映像以外・取得できなかった場合は None)
+        audio_parameters (TSAudioParameters | None): 音声ストリームのパラメータ (音声以外・取得できなかった場合は None)
+    """
+
+    pid: int
+    stream_type: int
+    video_parameters: TSVideoParameters | None = None
+    audio_parameters: TSAudioParameters | None = None
+
+
+@dataclass(slots=True)
+class TSProgramInfo:
+    """
+    TS ファイル内のプログラム (サービス) の情報
+
+    Args:
+        program_number (int): program_number (service_id)
+        pmt_pid (int): PMT の PID
+        pcr_pid (int | None): PCR の PID (PMT が見つからなかった場合は None)
+        nb_streams (int): PMT に記載されたストリームのうち、実際にパケットが流れていたストリームの数
+    """
+
+    program_number: int
+    pmt_pid: int
+    pcr_pid: int | None
+    nb_streams: int
+
+
+@dataclass(slots=True)
+class TSStreamAnalysisResult:
+    """
+    TSStreamAnalyzer による解析結果
+
+    Args:
+        programs (list[TSProgramInfo]): PAT に記載されたプログラムの一覧
+        head_streams (list[TSElementaryStreamInfo]): ファイル先頭で解析した、メインプログラムのストリームの一覧
+        sample_streams (list[TSElementaryStreamInfo]): 有効データ領域の 25% 位置で解析した、メインプログラムのストリームの一覧
+        duration (float): 先頭と末尾の PCR から算出した再生時間 (秒)
+        video_duration (float | None): 先頭と末尾の映像 PTS から算出した再生時間 (秒)
+        end_ts_offset (int | None): 有効な TS データの終了位置 (後半にゼロ埋め領域が存在する場合のみ)
+        has_video_stream_changes (bool): 映像 PID または映像コーデックが途中で変化しているか
+        file_hash (str | None): 録画ファイルのハッシュ (有効データ領域が小さすぎる場合は None)
+    """
+
+    programs: list[TSProgramInfo]
+    head_streams: list[TSElementaryStreamInfo]
+    sample_streams: list[TSElementaryStreamInfo]
+    duration: float
+    video_duration: float | None
+    end_ts_offset: int | None
+    has_video_stream_changes: bool
+    file_hash: str | None
+
+
+class _BitReader:
+    """
+    ビット単位でバイト列を読み進めるためのリーダー
+    """
+
+    def __init__(self, data: bytes) -> None:
+        self._value = int.from_bytes(data, 'big')
+        self._length = len(data) * 8
+        self._position = 0
+
+
+    def read(self, bits: int) -> int:
+        if self._position + bits > self._length:
+            raise EOFError('Not enough bits to read.')
+        self._position += bits
+        return (self._value >> (self._length - self._position)) & ((1 << bits) - 1)
+
+
+    def skip(self, bits: int) -> None:
+        if self._position + bits > self._length:
+            raise EOFError('Not enough bits to skip.')
+        self._position += bits
+
+
+    def readUE(self) -> int:
+        # Exp-Golomb 符号 (ue(v))
+        leading_zero_bits = 0
+        while self.read(1) == 0:
+            leading_zero_bits += 1
+            if leading_zero_bits > 31:
+                raise ValueError('Invalid Exp-Golomb code.')
+        return (1 << leading_zero_bits) - 1 + self.read(leading_zero_bits)
+
+
+    def readSE(self) -> int:
+        # 符号付き Exp-Golomb 符号 (se(v))
+        value = self.readUE()
+        return (value + 1) // 2 if value % 2 == 1 else -(value // 2)
+
+
+@dataclass(slots=True)
+class _TSWindowScan:
+    """
+    ファイル内の1つの読み込み範囲 (ウインドウ) から収集した情報
+    """
+
+    # パラメータを解析する対象の PID (映像・音声)
+    parameter_target_pids: set[int] = field(default_factory=set)
+    # PAT から取得した program_number と PMT の PID の対応 (PAT に記載された順)
+    pmt_pids: dict[int, int] = field(default_factory=dict)
+    # PMT から取得した program_number ごとの PCR の PID と、ストリームの一覧
+    pmts: dict[int, tuple[int, list[tuple[int, int]]]] = field(default_factory=dict)
+    # ウインドウ内で実際にパケットが流れていた PID
+    seen_pids: set[int] = field(default_factory=set)
+    # PCR の PID ごとの、最初と最後の PCR (90kHz)
+    first_pcrs: dict[int, int] = field(default_factory=dict)
+    last_pcrs: dict[int, int] = field(default_factory=dict)
+    # 映像 PID ごとの、ウインドウ内の PES の PTS (出現順)
+    video_ptss: dict[int, list[int]] = field(default_factory=dict)
+    # 映像・音声 PID ごとに解析したパラメータ
+    video_parameters: dict[int, TSVideoParameters] = field(default_factory=dict)
+    audio_parameters: dict[int, TSAudioParameters] = field(default_factory=dict)
+    # パラメータ解析用の PES パーサー
+    pes_parsers: dict[int, PESParser[PES]] = field(default_factory=dict)
+    # セクションパーサー
+    pat_parser: SectionParser[PATSection] = field(default_factory=lambda: SectionParser(PATSection))
+    pmt_parsers: dict[int, SectionParser[PMTSection]] = field(default_factory=dict)
+    # ウインドウ内にゼロ以外のデータが含まれていたか
+    has_non_zero_data: bool = False
+    # 実際に読み込んだバイト数
+    scanned_bytes: int = 0
+
+
+class TSStreamAnalyzer:
+    """
+    録画 TS ファイルのコンテナ・映像・音声のメタデータを、ファイルの必要な範囲を1度ずつ読むだけで解析するクラス
+    先頭・有効データ領域の 25% 位置・末尾の各範囲を昇順に読み込み、その過程で PAT/PMT・PCR・PTS・シーケンスヘッダ / SPS・ADTS ヘッダ・
+    映像ストリーム構成の変化・ファイルハッシュ用のチャンクをまとめて収集する
+    FFprobe を起動せずに MetadataAnalyzer が必要とする情報を揃えられるため、録画ファイルの一括スキャン時の I/O と CPU 負荷を大きく削減できる
+    """
+
+    # ファイル先頭・末尾で PAT/PMT・PCR・PTS を探す範囲の上限
+    ## 映像ストリーム構成の変化検出でも同じ範囲を使い、小さめの録画でも PMT を拾える範囲を確保する
+    MAX_WINDOW_SCAN_BYTES: ClassVar[int] = 8 * 1024 * 1024
+    # ファイル先頭で映像 PTS の最小値を求める際に集める PES の数 (B フレームの並べ替えを考慮)
+    HEAD_VIDEO_PTS_COUNT: ClassVar[int] = 32
+    # 部分解析のサンプル範囲の上限 (30 秒程度、ビットレートを 18Mbps と仮定)
+    ## 従来の FFprobe による部分解析と同じ範囲とし、ゼロ埋め判定の結果 (= ファイルハッシュの対象範囲) が変わらないようにする
+    SAMPLE_WINDOW_BYTES: ClassVar[int] = ClosestMultiple(18 * 1024 * 1024 * 30 // 8, ts.PACKET_SIZE)
+    # 部分解析で、副音声の PES が見つからなくても解析を打ち切る読み込み量
+    SAMPLE_MIN_SCAN_BYTES: ClassVar[int] = 8 * 1024 * 1024
+    # PTS からフレームレートを推定する際に集める PES の数
+    FRAME_RATE_PTS_COUNT: ClassVar[int] = 64
+    # 映像 PES の先頭から、シーケンスヘッダ / SPS を探す範囲
+    PARAMETER_SEARCH_BYTES: ClassVar[int] = 64 * 1024
+    # ファイルの読み込み単位
+    READ_CHUNK_SIZE: ClassVar[int] = ts.PACKET_SIZE * 5577  # 約 1MB
+    # ファイルハッシュの算出に使うチャンクのサイズと数
+    HASH_CHUNK_SIZE: ClassVar[int] = 1024 * 1024
+    HASH_CHUNK_COUNT: ClassVar[int] = 3
+    # ゼロ埋め領域の判定に使うブロックサイズ
+    ZERO_CHECK_BLOCK_SIZE: ClassVar[int] = 4096
+
+
+    def __init__(self, recorded_file_path: Path) -> None:
+        """
+        録画 TS ファイルのメタデータを単一パスで解析するクラスを初期化する
+
+        Args:
+            recorded_file_path (Path): 録画ファイルのパス
+        """
+
+        self.recorded_file_path = recorded_file_path
+
+
+    @staticmethod
+    def isSupportedFile(recorded_file_path: Path) -> bool:
+        """
+        ファイル先頭から 188 バイト間隔で sync_byte が並んでいる (= このクラスで解析できる) TS ファイルかを判定する
+        192 バイトパケットの TS や MPEG-4 など、それ以外のファイルは FFprobe で解析する
+
+        Args:
+            recorded_file_path (Path): 録画ファイルのパス
+
+        Returns:
+            bool: このクラスで解析できる TS ファイルかどうか
+        """
+
+        with recorded_file_path.open('rb') as file:
+            head = file.read(ts.PACKET_SIZE * 5)
+        if len(head) < ts.PACKET_SIZE * 5:
+            return False
+        return all(head[index * ts.PACKET_SIZE] == ts.SYNC_BYTE[0] for index in range(5))
+
+
+    @staticmethod
+    def findZeroFillBoundary(file: BinaryIO, file_size: int, block_size: int = 4096) -> int:
+        """
+        録画時にゼロ埋めされたファイル末尾の領域の開始位置をバイナリサーチで検出する
+
+        Args:
+            file (BinaryIO): 録画ファイルのファイルオブジェクト
+            file_size (int): ファイルサイズ
+            block_size (int): ゼロ埋め判定用の小ブロックサイズ (デフォルト: 4KB)
+
+        Returns:
+            int: ゼロ埋め領域の開始位置 (= 有効データの終了位置) 、ゼロ埋め領域が見つからなければファイルサイズ
+        """
+
+        low = 0
+        high = file_size
+        zero_boundary = file_size  # もしゼロブロックが見つからなければ有効データはファイル全体とする
+        while low <= high:
+            mid = (low + high) // 2
+            file.seek(mid)
+            candidate = file.read(block_size)
+            if candidate and candidate.count(0) == len(candidate):
+                # candidate が全て 0x00 ならば、ゼロ埋め領域の一部と見なし、境界を mid に更新
+                zero_boundary = mid
+                high = mid - 1
+            else:
+                low = mid + 1
+        return zero_boundary if zero_boundary < file_size else file_size
+
+
+    def analyze(self) -> TSStreamAnalysisResult | None:
+        """
+        録画 TS ファイルのメタデータを解析する
+
+        Returns:
+            TSStreamAnalysisResult | None: 解析結果 (必要な情報が揃わなかった場合は None)
+        """
+
+        file_size = self.recorded_file_path.stat().st_size
+        with self.recorded_file_path.open('rb') as file:
+
+            # 1. ファイル先頭: PAT/PMT・最初の PCR・最初の映像 PTS・先頭の映像パラメータ
+            head_scan = _TSWindowScan()
+            self.__scanWindow(file, head_scan, 0, min(file_size, self.MAX_WINDOW_SCAN_BYTES), self.__isHeadScanCompleted)
+            main_program_number = self.__selectMainProgram(head_scan)
+            if main_program_number is None:
+                logging.warning(f'{self.recorded_file_path}: PAT/PMT was not found in the head of the file.')
+                return None
+            main_pcr_pid, main_streams = head_scan.pmts[main_program_number]
+            video_streams = [(stream_type, pid) for stream_type, pid in main_streams if stream_type in VIDEO_STREAM_TYPES]
+            if len(video_streams) == 0:
+                logging.warning(f'{self.recorded_file_path}: Video stream was not found in PMT.')
+                return None
+            video_pid = video_streams[0][1]
+            if main_pcr_pid not in head_scan.first_pcrs:
+                logging.warning(f'{self.recorded_file_path}: Failed to extract first PCR timestamp.')
+                return None
+
+            # 2. ファイル末尾がゼロ埋めされている場合は、有効データの終了位置を求めておく
+            ## 録画時にファイルサイズだけ先に確保されたスパースファイルなどが該当する
+            data_end_offset = file_size
+            file.seek(max(file_size - self.ZERO_CHECK_BLOCK_SIZE, 0))
+            tail_block = file.read(self.ZERO_CHECK_BLOCK_SIZE)
+            if tail_block and tail_block.count(0) == len(tail_block):
+                data_end_offset = self.findZeroFillBoundary(file, file_size, self.ZERO_CHECK_BLOCK_SIZE)
+
+            # 3. 25% 位置のサンプル: 映像・音声のパラメータ
+            ## 従来の FFprobe による部分解析と同じく、まずファイルサイズ基準の 25% 位置を読み、
+            ## そこが全てゼロ埋めされていた場合に限り、有効データ領域基準の 25% 位置から読み直す
+            end_ts_offset: int | None = None
+            audio_pids = [pid for stream_type, pid in main_streams if stream_type == 0x0F]
+            if len(audio_pids) == 0:
+                logging.warning(f'{self.recorded_file_path}: AAC (ADTS) audio stream was not found in PMT.')
+                return None
+            parameter_target_pids = {video_pid, *audio_pids}
+            def IsSampleScanCompleted(scan: _TSWindowScan) -> bool:
+                return self.__isSampleScanCompleted(scan, video_pid, audio_pids[0])
+            sample_keep_bytes = self.HASH_CHUNK_SIZE + self.READ_CHUNK_SIZE
+            sample_offset = ClosestMultiple(int(file_size * 0.25), ts.PACKET_SIZE)
+            sample_scan = _TSWindowScan(parameter_target_pids=set(parameter_target_pids))
+            sample_data = self.__scanWindow(
+                file, sample_scan, sample_offset, min(sample_offset + self.SAMPLE_WINDOW_BYTES, file_size),
+                IsSampleScanCompleted, keep_bytes=sample_keep_bytes,
+            )
+            if sample_scan.scanned_bytes > 0 and sample_scan.has_non_zero_data is False:
+                end_ts_offset = data_end_offset if data_end_offset < file_size else \
+                    self.findZeroFillBoundary(file, file_size, self.ZERO_CHECK_BLOCK_SIZE)
+                data_end_offset = end_ts_offset
+                sample_offset = ClosestMultiple(int(end_ts_offset * 0.25), ts.PACKET_SIZE)
+                sample_scan = _TSWindowScan(parameter_target_pids=set(parameter_target_pids))
+                sample_data = self.__scanWindow(
+                    file, sample_scan, sample_offset, min(sample_offset + self.SAMPLE_WINDOW_BYTES, end_ts_offset),
+                    IsSampleScanCompleted, keep_bytes=sample_keep_bytes,
+                )
+
+            # 4. ファイルハッシュ: 有効データ領域の 1/4・2/4・3/4 位置から 1MB ずつ
+            ## 1/4 位置のチャンクはサンプルとほぼ同じ位置のため、読み込み済みのデータがあればそれを使う
+            file_hash = self.__calculateFileHash(file, end_ts_offset if end_ts_offset is not None else file_size, sample_offset, sample_data)
+
+            # 5. ファイル末尾: 最後の PCR・最後の映像 PTS
+            tail_offset = max(data_end_offset - self.MAX_WINDOW_SCAN_BYTES, 0) // ts.PACKET_SIZE * ts.PACKET_SIZE
+            tail_scan = _TSWindowScan()
+            self.__scanWindow(file, tail_scan, tail_offset, data_end_offset, None)
+
+        # 映像・音声のパラメータ
+        head_streams = self.__buildStreamInfos(main_streams, head_scan)
+        sample_streams = self.__buildStreamInfos(main_streams, sample_scan)
+        sample_video_parameters = sample_scan.video_parameters.get(video_pid)
+        if sample_video_parameters is None:
+            logging.warning(f'{self.recorded_file_path}: Video sequence header / SPS was not found in the sample.')
+            return None
+        if audio_pids[0] not in sample_scan.audio_parameters:
+            logging.warning(f'{self.recorded_file_path}: ADTS header was not found in the sample.')
+            return None
+
+        # シーケンスヘッダ / SPS にフレームレートが記録されていない場合は、PTS の間隔から推定する
+        if sample_video_parameters.frame_rate is None:
+            sample_video_parameters.frame_rate = self.__estimateFrameRate(sample_scan.video_ptss.get(video_pid, []))
+            if sample_video_parameters.frame_rate is None:
+                logging.warning(f'{self.recorded_file_path}: Failed to estimate video frame rate.')
+                return None
+
+        # 再生時間
+        ## PCR は先頭と末尾の差から、映像は先頭の PTS の最小値と末尾の PTS の最大値の差に 1 フレーム分を足して算出する
+        if main_pcr_pid not in tail_scan.last_pcrs:
+            logging.warning(f'{self.recorded_file_path}: Failed to extract last PCR in tail region.')
+            return None
+        duration = self.__calculateTimestampDistance(head_scan.first_pcrs[main_pcr_pid], tail_scan.last_pcrs[main_pcr_pid]) / ts.HZ
+        video_duration: float | None = None
+        head_video_ptss = head_scan.video_ptss.get(video_pid, [])
+        tail_video_ptss = tail_scan.video_ptss.get(video_pid, [])
+        if len(head_video_ptss) > 0 and len(tail_video_ptss) > 0:
+            first_pts = min(head_video_ptss)
+            last_pts = max(self.__unwrapTimestamps(tail_video_ptss))
+            video_duration = self.__calculateTimestampDistance(first_pts, last_pts % ts.PCR_CYCLE) / ts.HZ
+            video_duration += float(1 / sample_video_parameters.frame_rate)
+
+        # 映像ストリーム構成の変化
+        has_video_stream_changes = self.__detectVideoStreamChanges(main_program_number, [head_scan, sample_scan, tail_scan])
+
+        # プログラムの一覧
+        programs: list[TSProgramInfo] = []
+        for program_number, pmt_pid in head_scan.pmt_pids.items():
+            pmt = head_scan.pmts.get(program_number)
+            programs.append(TSProgramInfo(
+                program_number = program_number,
+                pmt_pid = pmt_pid,
+                pcr_pid = pmt[0] if pmt is not None else None,
+                nb_streams = sum(1 for _, pid in pmt[1] if pid in head_scan.seen_pids) if pmt is not None else 0,
+            ))
+
+        return TSStreamAnalysisResult(
+            programs = programs,
+            head_streams = head_streams,
+            sample_streams = sample_streams,
+            duration = duration,
+            video_duration = video_duration,
+            end_ts_offset = end_ts_offset,
+            has_video_stream_changes = has_video_stream_changes,
+            file_hash = file_hash,
+        )
+
+
+    def __scanWindow(
+        self,
+        file: BinaryIO,
+        scan: _TSWindowScan,
+        start_offset: int,
+        end_offset: int,
+        is_completed: Callable[[_TSWindowScan], bool] | None,
+        keep_bytes: int = 0,
+    ) -> bytes:
+        """
+        ファイルの指定範囲を先頭から読み込み、TS パケットから情報を収集する
+
+        Args:
+            file (BinaryIO): 録画ファイルのファイルオブジェクト
+            scan (_TSWindowScan): 収集した情報の格納先
+            start_offset (int): 読み込みを開始する位置
+            end_offset (int): 読み込みを終了する位置
+            is_completed (Callable[[_TSWindowScan], bool] | None): 必要な情報が揃ったかを判定する関数 (None の場合は範囲の末尾まで読む)
+            keep_bytes (int): 読み込んだデータのうち、先頭から保持して返すバイト数
+
+        Returns:
+            bytes: 読み込んだデータの先頭 keep_bytes バイト
+        """
+
+        kept_data = bytearray()
+        remainder = b''
+        offset = start_offset
+        file.seek(start_offset)
+        while offset < end_offset:
+            chunk = file.read(min(self.READ_CHUNK_SIZE, end_offset - offset))
+            if not chunk:
+                break
+            offset += len(chunk)
+            scan.scanned_bytes += len(chunk)
+            if len(kept_data) < keep_bytes:
+                kept_data += chunk[:keep_bytes - len(kept_data)]
+            if scan.has_non_zero_data is False and chunk.count(0) != len(chunk):
+                scan.has_non_zero_data = True
+            remainder = self.__scanPackets(scan, remainder + chunk)
+            if is_completed is not None and is_completed(scan) is True:
+                break
+
+        return bytes(kept_data)
+
+
+    def __scanPackets(self, scan: _TSWindowScan, data: bytes) -> bytes:
+        """
+        読み込んだデータに含まれる TS パケットから情報を収集する
+        PID の振り分けは NumPy でまとめて行い、解析が必要なパケットだけを Python で処理する
+
+        Args:
+            scan (_TSWindowScan): 収集した情報の格納先
+            data (bytes): 読み込んだデータ
+
+        Returns:
+            bytes: 末尾の TS パケットに満たない残りのデータ (次のチャンクの先頭に連結する)
+        """
+
+        # 同期が取れている位置を探す
+        ## 途中で同期が崩れている場合は、sync_byte が 188 バイト間隔で2つ並んでいる位置から再開する
+        start = 0
+        while start + ts.PACKET_SIZE < len(data):
+            if data[start] == ts.SYNC_BYTE[0] and data[start + ts.PACKET_SIZE] == ts.SYNC_BYTE[0]:
+                break
+            start = data.find(ts.SYNC_BYTE, start + 1)
+            if start == -1:
+                return b''
+        packet_count = (len(data) - start) // ts.PACKET_SIZE
+        if packet_count == 0:
+            return data[start:]
+
+        packets = np.frombuffer(data, dtype=np.uint8, count=packet_count * ts.PACKET_SIZE, offset=start).reshape(packet_count, ts.PACKET_SIZE)
+        is_synced = packets[:, 0] == ts.SYNC_BYTE[0]
+        pids = ((packets[:, 1].astype(np.uint16) & 0x1F) << 8) | packets[:, 2]
+        scan.seen_pids.update(int(pid) for pid in np.unique(pids[is_synced]))
+
+        index = 0
+        while index < packet_count:
+            # 解析が必要な PID の一覧 (PAT/PMT を見つけるたびに増えるため、その都度作り直す)
+            target_pid_table = np.zeros(0x2000, dtype=np.bool_)
+            target_pid_table[0x00] = True
+            for pmt_pid in scan.pmt_pids.values():
+                target_pid_table[pmt_pid] = True
+            for pcr_pid, streams in scan.pmts.values():
+                target_pid_table[pcr_pid & 0x1FFF] = True
+                for stream_type, pid in streams:
+                    if stream_type in VIDEO_STREAM_TYPES:
+                        target_pid_table[pid] = True
+            for pid in scan.parameter_target_pids:
+                target_pid_table[pid] = True
+
+            is_table_changed = False
+            for packet_index in np.flatnonzero(is_synced[index:] & target_pid_table[pids[index:]]) + index:
+                packet_offset = start + int(packet_index) * ts.PACKET_SIZE
+                packet = data[packet_offset:packet_offset + ts.PACKET_SIZE]
+                if self.__processPacket(scan, packet, int(pids[packet_index])) is True:
+                    index = int(packet_index) + 1
+                    is_table_changed = True
+                    break
+            if is_table_changed is False:
+                break
+
+        return data[start + packet_count * ts.PACKET_SIZE:]
+
+
+    def __processPacket(self, scan: _TSWindowScan, packet: bytes, pid: int) -> bool:
+        """
+        1つの TS パケットから情報を収集する
+
+        Args:
+            scan (_TSWindowScan): 収集した情報の格納先
+            packet (bytes): TS パケット
+            pid (int): TS パケットの PID
+
+        Returns:
+            bool: PAT/PMT の更新により、解析が必要な PID が変化したかどうか
+        """
+
+        is_table_changed = False
+
+        # PAT
+        if pid == 0x00:
+            scan.pat_parser.push(packet)
+            for pat in scan.pat_parser:
+                if pat.CRC32() != 0:
+                    continue
+                for program_number, program_map_pid in pat:
+                    if program_number != 0 and program_number not in scan.pmt_pids:
+                        scan.pmt_pids[program_number] = program_map_pid
+                        is_table_changed = True
+            return is_table_changed
+
+        # PMT
+        ## 複数のプログラムが同じ PID の PMT を共有していることは録画 TS ではまずないため、PAT 上で最初にその PID を持つプログラムに割り当てる
+        program_number = next((number for number, pmt_pid in scan.pmt_pids.items() if pmt_pid == pid), None)
+        if program_number is not None:
+            pmt_parser = scan.pmt_parsers.setdefault(pid, SectionParser(PMTSection))
+            pmt_parser.push(packet)
+            for pmt in pmt_parser:
+                if pmt.CRC32() != 0:
+                    continue
+                # 範囲の末尾側で起きた映像ストリーム構成の変化も捉えられるよう、範囲内で最後に見つかった PMT の内容で更新する
+                latest_pmt = (pmt.PCR_PID, [(stream_type, elementary_pid) for stream_type, elementary_pid, _ in pmt])
+                if scan.pmts.get(program_number) != latest_pmt:
+                    scan.pmts[program_number] = latest_pmt
+                    is_table_changed = True
+            return is_table_changed
+
+        # PCR
+        if ts.has_pcr(packet) is True:
+            pcr = ts.pcr(packet)
+            if pcr is not None:
+                scan.first_pcrs.setdefault(pid, pcr)
+                scan.last_pcrs[pid] = pcr
+
+        # 映像 PES の PTS
+        if (packet[1] & 0x40) != 0 and any(
+            pid == elementary_pid and stream_type in VIDEO_STREAM_TYPES
+            for _, streams in scan.pmts.values() for stream_type, elementary_pid in streams
+        ):
+            pts = self.__readPESTimestamp(packet)
+            if pts is not None:
+                scan.video_ptss.setdefault(pid, []).append(pts)
+
+        # 映像・音声のパラメータ
+        if pid in scan.parameter_target_pids and pid not in scan.video_parameters and pid not in scan.audio_parameters:
+            stream_type = next(
+                (stream_type for _, streams in scan.pmts.values() for stream_type, elementary_pid in streams if elementary_pid == pid),
+                None,
+            )
+            if stream_type is not None:
+                pes_parser = scan.pes_parsers.setdefault(pid, PESParser(PES))
+                pes_parser.push(packet)
+                for pes in pes_parser:
+                    es_data = bytes(pes.PES_packet_data())
+                    if stream_type in VIDEO_STREAM_TYPES:
+                        video_parameters = self.__parseVideoParameters(VIDEO_STREAM_TYPES[stream_type], es_data)
+                        if video_parameters is not None:
+                            scan.video_parameters[pid] = video_parameters
+                            break
+                    else:
+                        audio_parameters = self.__parseADTSHeader(es_data)
+                        if audio_parameters is not None:
+                            scan.audio_parameters[pid] = audio_parameters
+                            break
+
+        return is_table_changed
+
+
+    def __isHeadScanCompleted(self, scan: _TSWindowScan) -> bool:
+        """
+        ファイル先頭の解析に必要な情報が揃ったかを判定する
+        """
+
+        program_number = self.__selectMainProgram(scan)
+        if program_number is None:
+            return False
+        pcr_pid, streams = scan.pmts[program_number]
+        video_pids = [pid for stream_type, pid in streams if stream_type in VIDEO_STREAM_TYPES]
+        if len(video_pids) == 0:
+            return False
+        # 先頭の映像パラメータはスキャン形式の判定に使うため、映像 PID が確定したら解析対象に加える
+        scan.parameter_target_pids.add(video_pids[0])
+        return (
+            pcr_pid in scan.first_pcrs and
+            video_pids[0] in scan.video_parameters and
+            len(scan.video_ptss.get(video_pids[0], [])) >= self.HEAD_VIDEO_PTS_COUNT
+        )
+
+
+    def __isSampleScanCompleted(self, scan: _TSWindowScan, video_pid: int, primary_audio_pid: int) -> bool:
+        """
+        25% 位置のサンプルの解析に必要な情報が揃ったかを判定する
+        """
+
+        video_parameters = scan.video_parameters.get(video_pid)
+        if video_parameters is None or primary_audio_pid not in scan.audio_parameters:
+            return False
+        # フレームレートがヘッダから取得できない場合は、PTS の間隔から推定するための PES が集まるまで読む
+        if video_parameters.frame_rate is None and len(scan.video_ptss.get(video_pid, [])) < self.FRAME_RATE_PTS_COUNT:
+            return False
+        # 副音声など、放送されていない音声 PID の PES はいくら読んでも見つからないため、一定量読んだら打ち切る
+        if any(pid not in scan.video_parameters and pid not in scan.audio_parameters for pid in scan.parameter_target_pids):
+            return scan.scanned_bytes >= self.SAMPLE_MIN_SCAN_BYTES
+        return True
+
+
+    @staticmethod
+    def __selectMainProgram(scan: _TSWindowScan) -> int | None:
+        """
+        解析対象とするメインプログラムを選ぶ
+        PAT に記載された順に、PMT が見つかっていて PCR が有効で、実際にストリームのパケットが流れているプログラムを選ぶ
+
+        Args:
+            scan (_TSWindowScan): 収集した情報
+
+        Returns:
+            int | None: メインプログラムの program_number (見つからなかった場合は None)
+        """
+
+        fallback_program_number: int | None = None
+        for program_number in scan.pmt_pids:
+            pmt = scan.pmts.get(program_number)
+            if pmt is None:
+                continue
+            pcr_pid, streams = pmt
+            if not any(stream_type in VIDEO_STREAM_TYPES for stream_type, _ in streams):
+                continue
+            if 0 < pcr_pid < 0x1FFF and any(pid in scan.seen_pids for _, pid in streams):
+                return program_number
+            if fallback_program_number is None:
+                fallback_program_number = program_number
+        return fallback_program_number
+
+
+    def __buildStreamInfos(self, streams: list[tuple[int, int]], scan: _TSWindowScan) -> list[TSElementaryStreamInfo]:
+        """
+        PMT に記載された順に、各ストリームの情報を作成する
+
+        Args:
+            streams (list[tuple[int, int]]): メインプログラムの PMT に記載された stream_type と PID の一覧
+            scan (_TSWindowScan): 収集した情報
+
+        Returns:
+            list[TSElementaryStreamInfo]: ストリームの情報の一覧
+        """
+
+        return [
+            TSElementaryStreamInfo(
+                pid = pid,
+                stream_type = stream_type,
+                video_parameters = scan.video_parameters.get(pid),
+                audio_parameters = scan.audio_parameters.get(pid),
+            )
+            for stream_type, pid in streams
+        ]
+
+
+    def __detectVideoStreamChanges(self, main_program_number: int, scans: list[_TSWindowScan]) -> bool:
+        """
+        先頭・25% 位置・末尾の各範囲で見つかった PMT を比較し、映像ストリーム構成が変化しているかを検出する
+
+        Args:
+            main_program_number (int): メインプログラムの program_number
+            scans (list[_TSWindowScan]): 各範囲から収集した情報
+
+        Returns:
+            bool: 映像 PID または映像コーデックが途中で変化している場合は True
+        """
+
+        video_streams: list[tuple[int, int]] = []
+        for scan in scans:
+            # 範囲内でメインプログラムの PMT が見つからなかった場合は、PAT に記載された順に最初に見つかった映像ストリームを使う
+            ## どちらも見つからない範囲は判定材料から外し、取れた範囲だけで保守的に判断する
+            program_numbers = [main_program_number] + [number for number in scan.pmt_pids if number != main_program_number]
+            for program_number in program_numbers:
+                pmt = scan.pmts.get(program_number)
+                if pmt is None:
+                    continue
+                video_stream = next(((pid, stream_type) for stream_type, pid in pmt[1] if stream_type in VIDEO_STREAM_TYPES), None)
+                if video_stream is not None:
+                    video_streams.append(video_stream)
+                    break
+
+        if len(video_streams) < 2:
+            return False
+        base_video_pid, base_stream_type = video_streams[0]
+        for video_pid, stream_type in video_streams[1:]:
+            if video_pid != base_video_pid or stream_type != base_stream_type:
+                logging.info(
+                    f'{self.recorded_file_path}: Video stream changes were detected. '
+                    f'[base_video_pid: {base_video_pid:#x}, base_codec: {VIDEO_STREAM_TYPES[base_stream_type]}, '
+                    f'video_pid: {video_pid:#x}, codec: {VIDEO_STREAM_TYPES[stream_type]}]'
+                )
+                return True
+        return False
+
+
+    def __calculateFileHash(self, file: BinaryIO, effective_size: int, sample_offset: int, sample_data: bytes) -> str | None:
+        """
+        録画ファイルのハッシュを計算する
+        MetadataAnalyzer の従来の算出方法と同じく、有効データ領域の 1/4・2/4・3/4 位置から 1MB ずつ読み込んで MD5 を計算する
+
+        Args:
+            file (BinaryIO): 録画ファイルのファイルオブジェクト
+            effective_size (int): 有効データ領域のサイズ
+            sample_offset (int): 25% 位置のサンプルを読み込んだ位置
+            sample_data (bytes): 25% 位置のサンプルとして読み込んだデータ
+
+        Returns:
+            str | None: 録画ファイルのハッシュ (有効データ領域が小さく十分な数のチャンクが取得できない場合は None)
+        """
+
+        if effective_size < self.HASH_CHUNK_SIZE * self.HASH_CHUNK_COUNT:
+            return None
+
+        # 録画ファイルのハッシュを取りたいだけなのでセキュリティの考慮は不要
+        hash_obj = hashlib.md5(usedforsecurity=False)
+        for chunk_index in range(self.HASH_CHUNK_COUNT):
+            offset = (effective_size // (self.HASH_CHUNK_COUNT + 1)) * (chunk_index + 1)
+            read_size = min(self.HASH_CHUNK_SIZE, effective_size - offset)
+            if read_size <= 0:
+                break
+            # 読み込み済みのサンプルに含まれている範囲であれば、ファイルを読み直さずにそのまま使う
+            if sample_offset <= offset and offset + read_size <= sample_offset + len(sample_data):
+                chunk = sample_data[offset - sample_offset:offset - sample_offset + read_size]
+            else:
+                file.seek(offset)
+                chunk = file.read(read_size)
+            if not chunk:
+                break
+            hash_obj.update(chunk)
+
+        return hash_obj.hexdigest()
+
+
+    @staticmethod
+    def __readPESTimestamp(packet: bytes) -> int | None:
+        """
+        PES の先頭を含む TS パケットから PTS を読み取る
+
+        Args:
+            packet (bytes): payload_unit_start_indicator が立っている TS パケット
+
+        Returns:
+            int | None: PTS (90kHz) (PTS が含まれていない場合は None)
+        """
+
+        payload_offset = 4
+        if (packet[3] & 0x20) != 0:
+            payload_offset += 1 + packet[4]
+        header = packet[payload_offset:payload_offset + 14]
+        if len(header) < 14 or header[0:3] != b'\x00\x00\x01' or (header[7] & 0x80) == 0:
+            return None
+        return (
+            ((header[9] >> 1) & 0x07) << 30 |
+            header[10] << 22 |
+            (header[11] >> 1) << 15 |
+            header[12] << 7 |
+            header[13] >> 1
+        )
+
+
+    @staticmethod
+    def __unwrapTimestamps(timestamps: list[int]) -> list[int]:
+        """
+        33bit のタイムスタンプの列を、ラップアラウンドを考慮した単調な値の列に展開する
+        """
+
+        unwrapped: list[int] = []
+        for timestamp in timestamps:
+            if len(unwrapped) > 0:
+                wrap_count = round((unwrapped[-1] - timestamp) / ts.PCR_CYCLE)
+                timestamp += wrap_count * ts.PCR_CYCLE
+            unwrapped.append(timestamp)
+        return unwrapped
+
+
+    @staticmethod
+    def __calculateTimestampDistance(first_timestamp: int, last_timestamp: int) -> int:
+        """
+        先頭と末尾の 33bit のタイムスタンプの差を求める
+        末尾のタイムスタンプが先頭より小さい場合は、ラップアラウンドが発生しているとみなす
+        """
+
+        if last_timestamp < first_timestamp:
+            last_timestamp += ts.PCR_CYCLE
+        return last_timestamp - first_timestamp
+
+
+    def __estimateFrameRate(self, timestamps: list[int]) -> Fraction | None:
+        """
+        映像 PES の PTS の間隔からフレームレートを推定する
+        シーケンスヘッダ / SPS にフレームレートが記録されていない場合のフォールバックとして利用する
+
+        Args:
+            timestamps (list[int]): 映像 PES の PTS の列
+
+        Returns:
+            Fraction | None: 推定したフレームレート (推定できなかった場合は None)
+        """
+
+        # B フレームの並べ替えを考慮し、表示順に並べ替えてから間隔を求める
+        sorted_timestamps = sorted(set(self.__unwrapTimestamps(timestamps)))
+        intervals = [b - a for a, b in itertools.pairwise(sorted_timestamps) if b > a]
+        if len(intervals) == 0:
+            return None
+        # 59.94fps の 1501/1502 のように交互に揺れる間隔を均すため、最頻値 ±1 の範囲の平均を使う
+        most_common_interval = Counter(intervals).most_common(1)[0][0]
+        near_intervals = [interval for interval in intervals if abs(interval - most_common_interval) <= 1]
+        frame_rate = ts.HZ * len(near_intervals) / sum(near_intervals)
+        # 一般的なフレームレートのうち、誤差 1% 以内で最も近いものに丸める
+        closest_frame_rate = min(STANDARD_FRAME_RATES, key=lambda candidate: abs(float(candidate) - frame_rate))
+        if abs(float(closest_frame_rate) - frame_rate) > frame_rate * 0.01:
+            return Fraction(frame_rate).limit_denominator(1001)
+        return closest_frame_rate
+
+
+    @staticmethod
+    def __splitNALUnits(es_data: bytes) -> list[bytes]:
+        """
+        エレメンタリーストリームを start code (0x000001) で区切られた単位に分割する
+        """
+
+        units: list[bytes] = []
+        position = es_data.find(b'\x00\x00\x01')
+        while position != -1:
+            next_position = es_data.find(b'\x00\x00\x01', position + 3)
+            # 次の start code が 4 バイト start code の場合、末尾に先頭のゼロが残るが、各ヘッダの読み取りには影響しない
+            ## MPEG-2 Video の sequence_extension などは末尾がゼロになり得るため、ゼロを取り除いてはならない
+            units.append(es_data[position + 3:next_position if next_position != -1 else len(es_data)])
+            position = next_position
+        return units
+
+
+    def __parseVideoParameters(self, codec_name: Literal['mpeg2video', 'h264', 'hevc'], es_data: bytes) -> TSVideoParameters | None:
+        """
+        映像 PES のデータからシーケンスヘッダ / SPS を探し、映像パラメータを読み取る
+
+        Args:
+            codec_name (Literal['mpeg2video', 'h264', 'hevc']): コーデック名
+            es_data (bytes): 映像 PES のデータ
+
+        Returns:
+            TSVideoParameters | None: 映像パラメータ (シーケンスヘッダ / SPS が含まれていない場合は None)
+        """
+
+        try:
+            # シーケンスヘッダ / SPS はアクセスユニットの先頭にあるため、PES の先頭部分だけを探す
+            units = self.__splitNALUnits(es_data[:self.PARAMETER_SEARCH_BYTES])
+            if codec_name == 'mpeg2video':
+                return self.__parseMPEG2SequenceHeader(units)
+            for unit in units:
+                if codec_name == 'h264' and len(unit) > 1 and (unit[0] & 0x1F) == 7:
+                    return self.__parseH264SPS(unit[1:].replace(b'\x00\x00\x03', b'\x00\x00'))
+                if codec_name == 'hevc' and len(unit) > 2 and ((unit[0] >> 1) & 0x3F) == 33:
+                    return self.__parseH265SPS(unit[2:].replace(b'\x00\x00\x03', b'\x00\x00'))
+        except (EOFError, ValueError, KeyError) as ex:
+            logging.debug(f'{self.recorded_file_path}: Failed to parse video parameters: {ex}')
+        return None
+
+
+    @staticmethod
+    def __parseMPEG2SequenceHeader(units: list[bytes]) -> TSVideoParameters | None:
+        """
+        MPEG-2 Video の sequence_header と sequence_extension から映像パラメータを読み取る
+        """
+
+        sequence_header = next((unit for unit in units if len(unit) >= 8 and unit[0] == 0xB3), None)
+        sequence_extension = next((unit for unit in units if len(unit) >= 7 and unit[0] == 0xB5 and (unit[1] >> 4) == 1), None)
+        if sequence_header is None or sequence_extension is None:
+            return None
+
+        width = (sequence_header[1] << 4) | (sequence_header[2] >> 4)
+        height = ((sequence_header[2] & 0x0F) << 8) | sequence_header[3]
+        frame_rate_code = sequence_header[4] & 0x0F
+
+        reader = _BitReader(sequence_extension[1:7])
+        reader.skip(4)  # extension_start_code_identifier
+        profile_and_level_indication = reader.read(8)
+        is_progressive = reader.read(1) == 1  # progressive_sequence
+        reader.skip(2)  # chroma_format
+        width |= reader.read(2) << 12  # horizontal_size_extension
+        height |= reader.read(2) << 12  # vertical_size_extension
+        reader.skip(12 + 1 + 8 + 1)  # bit_rate_extension, marker_bit, vbv_buffer_size_extension, low_delay
+        frame_rate_extension_n = reader.read(2)
+        frame_rate_extension_d = reader.read(5)
+
+        if (profile_and_level_indication & 0x80) != 0:
+            profile = '4:2:2' if (profile_and_level_indication & 0x0F) in (0x02, 0x05) else None
+        else:
+            profile = {1: 'High', 2: 'Spatially Scalable', 3: 'SNR Scalable', 4: 'Main', 5: 'Simple'}.get((profile_and_level_indication >> 4) & 0x07)
+        frame_rate = MPEG2_FRAME_RATES.get(frame_rate_code)
+        if frame_rate is not None:
+            frame_rate *= Fraction(frame_rate_extension_n + 1, frame_rate_extension_d + 1)
+
+        return TSVideoParameters(
+            codec_name = 'mpeg2video',
+            profile = profile,
+            width = width,
+            height = height,
+            frame_rate = frame_rate,
+            is_progressive = is_progressive,
+        )
+
+
+    @staticmethod
+    def __parseH264SPS(rbsp: bytes) -> TSVideoParameters:
+        """
+        H.264 の SPS (Sequence Parameter Set) から映像パラメータを読み取る
+        """
+
+        reader = _BitReader(rbsp)
+        profile_idc = reader.read(8)
+        constraint_flags = reader.read(8)
+        reader.skip(8)  # level_idc
+        reader.readUE()  # seq_parameter_set_id
+        chroma_format_idc = 1
+        if profile_idc in (100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135):
+            chroma_format_idc = reader.readUE()
+            if chroma_format_idc == 3:
+                reader.skip(1)  # separate_colour_plane_flag
+            reader.readUE()  # bit_depth_luma_minus8
+            reader.readUE()  # bit_depth_chroma_minus8
+            reader.skip(1)  # qpprime_y_zero_transform_bypass_flag
+            if reader.read(1) == 1:  # seq_scaling_matrix_present_flag
+                for index in range(8 if chroma_format_idc != 3 else 12):
+                    if reader.read(1) == 1:  # seq_scaling_list_present_flag
+                        last_scale = next_scale = 8
+                        for _ in range(16 if index < 6 else 64):
+                            if next_scale != 0:
+                                next_scale = (last_scale + reader.readSE() + 256) % 256
+                            last_scale = next_scale if next_scale != 0 else last_scale
+        reader.readUE()  # log2_max_frame_num_minus4
+        pic_order_cnt_type = reader.readUE()
+        if pic_order_cnt_type == 0:
+            reader.readUE()  # log2_max_pic_order_cnt_lsb_minus4
+        elif pic_order_cnt_type == 1:
+            reader.skip(1)  # delta_pic_order_always_zero_flag
+            reader.readSE()  # offset_for_non_ref_pic
+            reader.readSE()  # offset_for_top_to_bottom_field
+            for _ in range(reader.readUE()):  # num_ref_frames_in_pic_order_cnt_cycle
+                reader.readSE()  # offset_for_ref_frame
+        reader.readUE()  # max_num_ref_frames
+        reader.skip(1)  # gaps_in_frame_num_value_allowed_flag
+        pic_width_in_mbs = reader.readUE() + 1
+        pic_height_in_map_units = reader.readUE() + 1
+        frame_mbs_only_flag = reader.read(1)
+        if frame_mbs_only_flag == 0:
+            reader.skip(1)  # mb_adaptive_frame_field_flag
+        reader.skip(1)  # direct_8x8_inference_flag
+        width = pic_width_in_mbs * 16
+        height = (2 - frame_mbs_only_flag) * pic_height_in_map_units * 16
+        if reader.read(1) == 1:  # frame_cropping_flag
+            crop_unit_x = 2 if chroma_format_idc in (1, 2) else 1
+            crop_unit_y = (2 if chroma_format_idc == 1 else 1) * (2 - frame_mbs_only_flag)
+            width -= (reader.readUE() + reader.readUE()) * crop_unit_x
+            height -= (reader.readUE() + reader.readUE()) * crop_unit_y
+
+        # VUI からフレームレートを取得する
+        frame_rate: Fraction | None = None
+        if reader.read(1) == 1:  # vui_parameters_present_flag
+            if reader.read(1) == 1:  # aspect_ratio_info_present_flag
+                if reader.read(8) == 255:  # aspect_ratio_idc == Extended_SAR
+                    reader.skip(32)  # sar_width, sar_height
+            if reader.read(1) == 1:  # overscan_info_present_flag
+                reader.skip(1)  # overscan_appropriate_flag
+            if reader.read(1) == 1:  # video_signal_type_present_flag
+                reader.skip(3 + 1)  # video_format, video_full_range_flag
+                if reader.read(1) == 1:  # colour_description_present_flag
+                    reader.skip(24)  # colour_primaries, transfer_characteristics, matrix_coefficients
+            if reader.read(1) == 1:  # chroma_loc_info_present_flag
+                reader.readUE()  # chroma_sample_loc_type_top_field
+                reader.readUE()  # chroma_sample_loc_type_bottom_field
+            if reader.read(1) == 1:  # timing_info_present_flag
+                num_units_in_tick = reader.read(32)
+                time_scale = reader.read(32)
+                # H.264 の time_scale はフィールド単位のため、フレームレートはその半分になる
+                if num_units_in_tick > 0 and time_scale > 0:
+                    frame_rate = Fraction(time_scale, num_units_in_tick * 2)
+
+        profile: str | None = {
+            66: 'Baseline', 77: 'Main', 88: 'Extended', 100: 'High', 110: 'High 10',
+            122: 'High 4:2:2', 244: 'High 4:4:4 Predictive', 44: 'CAVLC 4:4:4',
+        }.get(profile_idc)
+        if profile_idc == 66 and (constraint_flags & 0x40) != 0:
+            profile = 'Constrained Baseline'
+        elif profile_idc == 110 and (constraint_flags & 0x10) != 0:
+            profile = 'High 10 Intra'
+
+        return TSVideoParameters(
+            codec_name = 'h264',
+            profile = profile,
+            width = width,
+            height = height,
+            frame_rate = frame_rate,
+            is_progressive = frame_mbs_only_flag == 1,
+        )
+
+
+    @staticmethod
+    def __parseH265SPS(rbsp: bytes) -> TSVideoParameters:
+        """
+        H.265 の SPS (Sequence Parameter Set) から映像パラメータを読み取る
+        フレームレートは VUI の奥深くにあり読み取りが煩雑なため、PTS の間隔から推定する
+        """
+
+        reader = _BitReader(rbsp)
+        reader.skip(4)  # sps_video_parameter_set_id
+        max_sub_layers_minus1 = reader.read(3)
+        reader.skip(1)  # sps_temporal_id_nesting_flag
+        # profile_tier_level()
+        reader.skip(2 + 1)  # general_profile_space, general_tier_flag
+        general_profile_idc = reader.read(5)
+        reader.skip(32)  # general_profile_compatibility_flag
+        general_progressive_source_flag = reader.read(1)
+        general_interlaced_source_flag = reader.read(1)
+        reader.skip(2 + 44 + 8)  # general_non_packed_constraint_flag, general_frame_only_constraint_flag, reserved, general_level_idc
+        sub_layer_flags = [(reader.read(1), reader.read(1)) for _ in range(max_sub_layers_minus1)]
+        if max_sub_layers_minus1 > 0:
+            reader.skip(2 * (8 - max_sub_layers_minus1))  # reserved_zero_2bits
+        for sub_layer_profile_present_flag, sub_layer_level_present_flag in sub_layer_flags:
+            if sub_layer_profile_present_flag == 1:
+                reader.skip(88)
+            if sub_layer_level_present_flag == 1:
+                reader.skip(8)
+        reader.readUE()  # sps_seq_parameter_set_id
+        chroma_format_idc = reader.readUE()
+        separate_colour_plane_flag = reader.read(1) if chroma_format_idc == 3 else 0
+        width = reader.readUE()  # pic_width_in_luma_samples
+        height = reader.readUE()  # pic_height_in_luma_samples
+        if reader.read(1) == 1:  # conformance_window_flag
+            sub_width_c = 2 if chroma_format_idc in (1, 2) and separate_colour_plane_flag == 0 else 1
+            sub_height_c = 2 if chroma_format_idc == 1 and separate_colour_plane_flag == 0 else 1
+            width -= (reader.readUE() + reader.readUE()) * sub_width_c
+            height -= (reader.readUE() + reader.readUE()) * sub_height_c
+
+        return TSVideoParameters(
+            codec_name = 'hevc',
+            profile = {1: 'Main', 2: 'Main 10', 3: 'Main Still Picture', 4: 'Rext'}.get(general_profile_idc),
+            width = width,
+            height = height,
+            frame_rate = None,
+            is_progressive = general_progressive_source_flag == 1 and general_interlaced_source_flag == 0,
+        )
+
+
+    @staticmethod
+    def __parseADTSHeader(es_data: bytes) -> TSAudioParameters | None:
+        """
+        音声 PES のデータから ADTS ヘッダを探し、音声パラメータを読み取る
+        """
+
+        position = es_data.find(b'\xFF')
+        while position != -1 and position + 4 <= len(es_data):
+            if (es_data[position + 1] & 0xF6) == 0xF0:  # syncword の残り4ビットと layer (常に 0)
+                profile = (es_data[position + 2] >> 6) & 0x03
+                sampling_frequency_index = (es_data[position + 2] >> 2) & 0x0F
+                channel_configuration = ((es_data[position + 2] & 0x01) << 2) | (es_data[position + 3] >> 6)
+                if sampling_frequency_index < len(ADTS_SAMPLE_RATES):
+                    return TSAudioParameters(
+                        profile = ADTS_PROFILES[profile],
+                        # channel_configuration が 0 の場合は PCE でチャンネル構成が指定されている
+                        ## 日本のデジタル放送ではデュアルモノ (2ch) の場合に限られるため、2ch として扱う
+                        channels = {0: 2, 7: 8}.get(channel_configuration, channel_configuration),
+                        sample_rate = ADTS_SAMPLE_RATES[sampling_frequency_index],
+                    )
+            position = es_data.find(b'\xFF', position + 1)
+        return None
@@ -2,7 +2,6 @@
 from __future__ import annotations
 
 import asyncio
-import concurrent.futures
 import math
 import pathlib
 import random
@@ -16,13 +15,18 @@ import cv2
 import numpy as np
 import typer
 from numpy.typing import NDArray
+from PIL import Image
 from tortoise import Tortoise
 
 from app import logging, schemas
 from app.config import Config, LoadConfig
 from app.constants import DATABASE_CONFIG, LIBRARY_PATH, STATIC_DIR, THUMBNAILS_DIR
+from app.metadata.AnalysisWorkerPool import (
+    AnalysisJobCancelledError,
+    AnalysisWorkerPool,
+    ReportAnalysisProgress,
+)
 from app.models.RecordedVideo import RecordedVideo
-from app.utils import ShutdownProcessPoolExecutor
 
 
 class ThumbnailGenerator:
@@ -39,19 +43,21 @@ class ThumbnailGenerator:
     TILE_SCALE: ClassVar[tuple[int, int]] = (320, 180)  # タイル化時の1フレーム解像度 (width, height)
     LEGACY_TILE_SCALE: ClassVar[tuple[int, int]] = (480, 270)  # 旧タイルの1フレーム解像度 (width, height)
     LEGACY_TILE_COLS: ClassVar[int] = 34  # 旧タイルの列数
+    TILE_SHEET_COLS: ClassVar[int] = 10  # シークバーで遅延読み込みするタイルシート1枚あたりの列数
+    TILE_SHEET_ROWS: ClassVar[int] = 10  # シークバーで遅延読み込みするタイルシート1枚あたりの行数
 
     # WebP 出力の設定
     WEBP_QUALITY_REPRESENTATIVE: ClassVar[int] = 80  # 代表サムネイルの WebP 品質 (0-100)
     WEBP_QUALITY_TILE: ClassVar[int] = 71  # シークバーサムネイルタイルの WebP 品質 (0-100)
     WEBP_COMPRESSION: ClassVar[int] = 6  # WebP 圧縮レベル (0-6)
     WEBP_MAX_SIZE: ClassVar[int] = 16383  # WebP の最大サイズ制限 (px)
-    FFMPEG_TIMEOUT: ClassVar[int] = 300  # FFmpeg サブプロセスのタイムアウト時間 (秒)
     TSREADEX_FRAME_EXTRACTION_TIMEOUT: ClassVar[int] = 600  # tsreadex 経由のフレーム抽出タイムアウト時間 (秒)
     FRAME_EXTRACTION_MAX_DEMUX_PACKETS: ClassVar[int] = 20000  # 1候補位置でフレーム探索する最大パケット数
     FRAME_EXTRACTION_MAX_CONSECUTIVE_FAILURES: ClassVar[int] = 10  # 連続失敗時に残り候補を黒画像で埋める閾値
 
     # サムネイル情報のバージョン
-    THUMBNAIL_INFO_VERSION: ClassVar[int] = 1
+    ## バージョン 2 以降では、1枚のタイル画像に加えてタイルシートも生成している
+    THUMBNAIL_INFO_VERSION: ClassVar[int] = 2
 
     # サムネイルタイル移行時のバックアップ設定 (デバッグ用)
     MIGRATION_BACKUP_ENABLED: ClassVar[bool] = False
@@ -190,7 +196,13 @@ class ThumbnailGenerator:
             self.tile_image_height,
         ) = self.__calculateTileLayout()
 
+        # タイルシートの枚数を計算
+        ## 1枚のタイル画像は長尺の番組だと数十 MB になり、シークバーのサムネイルを表示できるようになるまで時間がかかるため、
+        ## TILE_SHEET_COLS x TILE_SHEET_ROWS ごとに分割したタイルシートも生成し、クライアントがシーク位置に応じて必要なシートだけを読み込めるようにする
+        self.tile_sheet_count = math.ceil(self.total_tiles / (self.TILE_SHEET_COLS * self.TILE_SHEET_ROWS))
+
         # ファイルハッシュをベースにしたファイル名を生成
+        self.file_hash = file_hash
         self.seekbar_thumbnails_tile_path = anyio.Path(str(THUMBNAILS_DIR / f"{file_hash}_tile.webp"))
         self.representative_thumbnail_path = anyio.Path(str(THUMBNAILS_DIR / f"{file_hash}.webp"))
 
@@ -334,15 +346,18 @@ class ThumbnailGenerator:
         )
 
 
-    async def generateAndSave(self) -> None:
+    async def generateAndSave(self, priority: Literal['High', 'Low'] = 'High') -> None:
         """
         プレイヤーのシークバー用サムネイルタイル画像を生成し、
         さらに候補区間内のフレームから最も良い1枚を選び、代表サムネイルとして出力する
 
         処理フロー:
-        1. サブプロセス内で PyAV でフレーム抽出 + スコアリング
-        2. サブプロセス内で代表サムネイルを保存
-        3. サブプロセス内でタイル画像を生成・保存
+        1. ワーカープロセス内で PyAV でフレーム抽出 + スコアリング
+        2. ワーカープロセス内で代表サムネイルを保存
+        3. ワーカープロセス内でタイル画像を生成・保存
+
+        Args:
+            priority (Literal['High', 'Low']): AnalysisWorkerPool でのジョブの優先度 (デフォルト: High)
         """
 
         start_time = time.time()
@@ -357,27 +372,22 @@ class ThumbnailGenerator:
             # 1. 候補オフセットを計算
             candidate_offsets = self.__calculateCandidateOffsets()
 
-            # 2. フレーム抽出 + タイル画像生成・保存 + 代表サムネイル保存をサブプロセス内で完結させる
+            # 2. フレーム抽出 + タイル画像生成・保存 + 代表サムネイル保存をワーカープロセス内で完結させる
             ## 親プロセスへのフレーム配列転送を避け、メモリ使用量とコピーコストを抑制する
-            ## リクエスト切断時に ProcessPoolExecutor.__exit__() が同期的に子プロセス終了を待つとイベントループが止まるため、
-            ## コンテキストマネージャーは使わず、キャンセル時だけ待機なしで終了処理に入る
-            loop = asyncio.get_running_loop()
-            executor = concurrent.futures.ProcessPoolExecutor(max_workers=1)
-            should_wait_executor = True
+            ## 常駐ワーカープロセスで実行するため、録画ファイルごとのプロセス起動・モジュールインポートのコストはかからない
+            ## 呼び出し元のタスクがキャンセルされた場合は、AnalysisWorkerPool 側でワーカープロセスごと強制終了される
             try:
-                success = await loop.run_in_executor(
-                    executor,
+                success = await AnalysisWorkerPool().runJob(
                     self._generateAndSaveThumbnails,
                     candidate_offsets,
                     self.tile_rows,
+                    file_path = str(self.file_path),
+                    name = 'ThumbnailGeneration',
+                    priority = priority,
                 )
-            except asyncio.CancelledError:
-                should_wait_executor = False
-                await ShutdownProcessPoolExecutor(executor, is_cancelled=True)
-                raise
-            finally:
-                if should_wait_executor is True:
-                    await ShutdownProcessPoolExecutor(executor, is_cancelled=False)
+            except AnalysisJobCancelledError:
+                logging.info(f'{self.file_path}: Thumbnail generation has been cancelled.')
+                return
 
             if not success:
                 logging.error(f'{self.file_path}: Failed to generate thumbnails in subprocess.')
@@ -529,9 +539,9 @@ class ThumbnailGenerator:
         tile_rows: int,
     ) -> bool:
         """
-        サブプロセス内でフレーム抽出・スコアリング・タイル生成・代表サムネイル保存まで行う
-        PyAV (FFmpeg) によるデコードや OpenCV での画像処理が CPU-bound のため、ProcessPoolExecutor 上で実行する
-        ProcessPoolExecutor で実行されるエントリーポイントなので、あえて prefix のアンダースコアは1つとしている
+        ワーカープロセス内でフレーム抽出・スコアリング・タイル生成・代表サムネイル保存まで行う
+        PyAV (FFmpeg) によるデコードや OpenCV での画像処理が CPU-bound のため、AnalysisWorkerPool のワーカープロセス上で実行する
+        別プロセスで実行されるエントリーポイントなので、あえて prefix のアンダースコアは1つとしている
         (別プロセスで実行されるため、__ を付けるとマングリングにより正常に実行できない)
 
         Args:
@@ -543,7 +553,7 @@ class ThumbnailGenerator:
         """
 
         # もし Config() の実行時に AssertionError が発生した場合は、LoadConfig() を実行してサーバー設定データをロードする
-        ## ProcessPoolExecutor で実行した場合、自動リロードモード時にグローバル変数が引き継がれないことがあるため
+        ## 別プロセスで実行した場合、自動リロードモード時にグローバル変数が引き継がれないことがあるため
         try:
             Config()
         except AssertionError:
@@ -701,6 +711,10 @@ class ThumbnailGenerator:
                         bgr_frames.append(img_bgr)
                         consecutive_failed_frames = 0
 
+                        # 進捗をメインプロセスに通知 (10フレームごと)
+                        if (i + 1) % 10 == 0:
+                            ReportAnalysisProgress((i + 1) / len(candidate_offsets))
+
                         # 進捗ログ（50フレームごと）
                         if (i + 1) % 50 == 0:
                             logging.debug(f'{self.file_path}: Extracted {i + 1}/{len(candidate_offsets)} frames')
@@ -869,6 +883,9 @@ class ThumbnailGenerator:
                     else:
                         bgr_frames.append(bgr_frame.copy())
                     next_candidate_index += 1
+                    # 進捗をメインプロセスに通知 (10フレームごと)
+                    if next_candidate_index % 10 == 0:
+                        ReportAnalysisProgress(next_candidate_index / expected_frame_count)
 
                 previous_frame_bgr = bgr_frame
                 previous_frame_relative_time = relative_time
@@ -1020,13 +1037,12 @@ class ThumbnailGenerator:
                 thumbnails_dir.mkdir(parents=True, exist_ok=True)
 
             # WebP ファイルを書き込む
-            if not cv2.imwrite(str(self.representative_thumbnail_path), img_bgr, [
-                cv2.IMWRITE_WEBP_QUALITY, self.WEBP_QUALITY_REPRESENTATIVE,
-            ]):
-                logging.error(f'{self.file_path}: Failed to write representative thumbnail.')
-                return False
-
-            return True
+            return self.encodeImageToWebP(
+                img_bgr,
+                pathlib.Path(str(self.representative_thumbnail_path)),
+                self.WEBP_QUALITY_REPRESENTATIVE,
+                str(self.file_path),
+            )
 
         except Exception as ex:
             logging.error(f'{self.file_path}: Error in representative thumbnail saving:', exc_info=ex)
@@ -1065,31 +1081,91 @@ class ThumbnailGenerator:
             else:
                 resized_frames = bgr_frames
 
-            # OpenCV を用いてタイル化処理を行う
-            rows = []
-            num_cols = self.tile_cols
-            for r in range(tile_rows):
-                row_images = list(resized_frames[r * num_cols: (r + 1) * num_cols])
-                # 最終行が列数に満たない場合、黒画像で埋める
-                if len(row_images) < num_cols:
-                    black_image = np.zeros((tile_height, tile_width, 3), dtype=np.uint8)
-                    while len(row_images) < num_cols:
-                        row_images.append(black_image)
-                row_concat = cv2.hconcat(row_images)
-                rows.append(row_concat)
-            tile_image = cast(NDArray[np.uint8], cv2.vconcat(rows))
-
-            # タイル画像を WebP としてエンコードし、ファイルに保存する
-            if not self.__encodeTileImageToWebP(tile_image, pathlib.Path(str(self.seekbar_thumbnails_tile_path)), str(self.file_path)):
-                return False
-
-            return True
+            # タイル画像とタイルシートを WebP としてエンコードし、ファイルに保存する
+            return self.__saveTileImages(resized_frames, tile_rows, pathlib.Path(str(self.seekbar_thumbnails_tile_path)))
 
         except Exception as ex:
             logging.error(f'{self.file_path}: Error in tile image generation and saving:', exc_info=ex)
             return False
 
 
+    def __composeTileImage(
+        self,
+        frames: list[NDArray[np.uint8]],
+        column_count: int,
+        row_count: int,
+    ) -> NDArray[np.uint8]:
+        """
+        TILE_SCALE のフレームを指定された列数・行数で並べ、1枚のタイル画像を生成する
+        列数・行数に満たない部分は黒画像で埋める
+
+        Args:
+            frames (list[NDArray[np.uint8]]): BGR フレームのリスト (TILE_SCALE)
+            column_count (int): タイルの列数
+            row_count (int): タイルの行数
+
+        Returns:
+            NDArray[np.uint8]: タイル画像 (BGR)
+        """
+
+        tile_width, tile_height = self.TILE_SCALE
+        black_image = np.zeros((tile_height, tile_width, 3), dtype=np.uint8)
+
+        # OpenCV を用いてタイル化処理を行う
+        rows = []
+        for r in range(row_count):
+            row_images = list(frames[r * column_count: (r + 1) * column_count])
+            # 最終行が列数に満たない場合、黒画像で埋める
+            while len(row_images) < column_count:
+                row_images.append(black_image)
+            rows.append(cv2.hconcat(row_images))
+        return cast(NDArray[np.uint8], cv2.vconcat(rows))
+
+
+    def __saveTileImages(
+        self,
+        frames: list[NDArray[np.uint8]],
+        tile_rows: int,
+        tile_output_path: pathlib.Path,
+    ) -> bool:
+        """
+        TILE_SCALE のフレームから1枚のタイル画像とタイルシートを生成し、WebP として保存する
+        1枚のタイル画像は、タイルシートに対応していないクライアントやオフライン保存のために引き続き生成している
+        タイルシートは最後のシートも含めて常に TILE_SHEET_COLS x TILE_SHEET_ROWS の大きさで生成する
+        (クライアントは背景画像の繰り返しを利用してシート内の位置を求めるため、すべてのシートの大きさを揃える必要がある)
+
+        Args:
+            frames (list[NDArray[np.uint8]]): BGR フレームのリスト (TILE_SCALE)
+            tile_rows (int): 1枚のタイル画像の行数
+            tile_output_path (pathlib.Path): 1枚のタイル画像の出力先のパス
+
+        Returns:
+            bool: 成功時は True、失敗時は False
+        """
+
+        # 1枚のタイル画像を生成・保存
+        tile_image = self.__composeTileImage(frames, self.tile_cols, tile_rows)
+        if not self.encodeImageToWebP(tile_image, tile_output_path, self.WEBP_QUALITY_TILE, str(self.file_path)):
+            return False
+
+        # タイルシートを生成・保存
+        tiles_per_sheet = self.TILE_SHEET_COLS * self.TILE_SHEET_ROWS
+        for sheet_index in range(self.tile_sheet_count):
+            sheet_frames = frames[sheet_index * tiles_per_sheet: (sheet_index + 1) * tiles_per_sheet]
+            sheet_image = self.__composeTileImage(sheet_frames, self.TILE_SHEET_COLS, self.TILE_SHEET_ROWS)
+            sheet_path = THUMBNAILS_DIR / f'{self.file_hash}_tile_{sheet_index}.webp'
+            if not self.encodeImageToWebP(sheet_image, sheet_path, self.WEBP_QUALITY_TILE, f'{self.file_path} (sheet {sheet_index})'):
+                return False
+
+        # 再生成によってシート数が減った場合に、前回生成された余分なタイルシートを削除する
+        for sheet_path in THUMBNAILS_DIR.glob(f'{self.file_hash}_tile_*.webp'):
+            sheet_index_str = sheet_path.stem.rsplit('_', 1)[1]
+            if sheet_index_str.isdigit() and int(sheet_index_str) >= self.tile_sheet_count:
+                sheet_path.unlink(missing_ok=True)
+
+        return True
+
+
     def downscaleWithAntiMoire(
         self,
         bgr: NDArray[np.uint8],
@@ -1205,67 +1281,39 @@ class ThumbnailGenerator:
         return cast(NDArray[np.uint8], cv2.cvtColor(out, cv2.COLOR_YCrCb2BGR))
 
 
-    def __encodeTileImageToWebP(
-        self,
-        tile_image: NDArray[np.uint8],
+    @classmethod
+    def encodeImageToWebP(
+        cls,
+        img_bgr: NDArray[np.uint8],
         output_path: pathlib.Path,
+        quality: int,
         log_prefix: str,
     ) -> bool:
         """
-        タイル画像を WebP としてエンコードし、ファイルに保存する
+        画像を WebP としてエンコードし、ファイルに保存する
+        以前はタイル画像を PNG にエンコードしてから FFmpeg のサブプロセスに渡して WebP に変換していたが、
+        巨大なタイル画像では PNG の可逆圧縮とプロセス起動のコストが無視できないため、Pillow (libwebp) で BGR 配列から直接エンコードする
+        (ワーカープロセス内で実行されるため、エンコード中にイベントループがブロックされることはない)
+        エンコード方式の比較のため、misc/ThumbnailWebPEncodeBenchmark.py からも呼び出される
 
         Args:
-            tile_image (NDArray[np.uint8]): タイル画像 (BGR)
+            img_bgr (NDArray[np.uint8]): 画像データ (BGR)
             output_path (pathlib.Path): 出力先のパス
+            quality (int): WebP 品質 (0-100)
             log_prefix (str): ログに表示するファイルパスまたは識別子
 
         Returns:
             bool: 成功時は True、失敗時は False
         """
 
-        # タイル画像を PNG としてメモリ上にエンコード
-        _, tile_png_data = cv2.imencode('.png', tile_image)
-        if tile_png_data is None:
-            logging.error(f'{log_prefix}: Failed to encode tile image as PNG.')
-            return False
-
-        # FFmpeg でタイル画像を WebP に圧縮保存
-        # 出力形式を -f webp で明示的に指定することで、.tmp などの拡張子でも正しく出力できる
-        preset = 'drawing' if self.face_detection_mode == 'Anime' else 'picture'
-        process = subprocess.Popen(
-            [
-                LIBRARY_PATH['FFmpeg'],
-                '-y',
-                '-nostdin',
-                '-f', 'image2pipe',
-                '-codec:v', 'png',
-                '-i', 'pipe:0',
-                '-codec:v', 'webp',
-                '-quality', str(ThumbnailGenerator.WEBP_QUALITY_TILE),
-                '-compression_level', str(ThumbnailGenerator.WEBP_COMPRESSION),
-                '-preset', preset,
-                '-threads', 'auto',
-                '-f', 'webp',
-                str(output_path),
-            ],
-            stdin = subprocess.PIPE,
-            stdout = subprocess.PIPE,
-            stderr = subprocess.PIPE,
-        )
-
-        # FFmpeg プロセスの実行とタイムアウト処理
         try:
-            _, stderr_data = process.communicate(input=tile_png_data.tobytes(), timeout=ThumbnailGenerator.FFMPEG_TIMEOUT)
-        except subprocess.TimeoutExpired:
-            # タイムアウトが発生した場合、プロセスを強制終了してパイプをフラッシュ
-            process.kill()
-            process.communicate()
-            logging.error(f'{log_prefix}: FFmpeg tile image compression timed out after {ThumbnailGenerator.FFMPEG_TIMEOUT} seconds.')
-            return False
-
-        if process.returncode != 0:
-            error_message = stderr_data.decode('utf-8', errors='ignore')
-            logging.error(f'{log_prefix}: FFmpeg tile image compression failed with error: {error_message}')
+            # Pillow は RGB の並びを前提とするため、BGR から変換してから PIL.Image に変換する
+            image = Image.fromarray(cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB))
+            # 出力形式を明示的に指定することで、.tmp などの拡張子でも正しく出力できる
+            ## method は libwebp の圧縮レベル (FFmpeg の -compression_level と同じ) に対応する
+            image.save(output_path, format='WEBP', quality=quality, method=cls.WEBP_COMPRESSION)
+        except Exception as ex:
+            logging.error(f'{log_prefix}: Failed to encode image as WebP:', exc_info=ex)
             return False
 
         return True
@@ -1304,6 +1352,14 @@ class ThumbnailGenerator:
                 column_count = self.tile_cols,
                 row_count = self.tile_rows,
                 interval_sec = self.tile_interval_sec,
+                sheet = schemas.ThumbnailTileSheetInfo(
+                    image_width = tile_width * self.TILE_SHEET_COLS,
+                    image_height = tile_height * self.TILE_SHEET_ROWS,
+                    column_count = self.TILE_SHEET_COLS,
+                    row_count = self.TILE_SHEET_ROWS,
+                    tiles_per_sheet = self.TILE_SHEET_COLS * self.TILE_SHEET_ROWS,
+                    sheet_count = self.tile_sheet_count,
+                ),
             ),
         )
         await db_recorded_video.save()
@@ -1314,7 +1370,7 @@ class ThumbnailGenerator:
         既存のサムネイルタイル画像を新仕様に合わせて再タイル化し、サムネイル情報を DB に保存する
 
         旧仕様 (480x270, 34列) で生成されたタイル画像を読み込み、新仕様 (192x108, 85列) にリサイズ・再タイル化する
-        処理は ProcessPoolExecutor で別プロセスで実行され、完了後に旧タイルをバックアップしてから新タイルに置換する
+        処理は AnalysisWorkerPool のワーカープロセスで実行され、完了後に旧タイルをバックアップしてから新タイルに置換する
         このメソッドは RecordedScanTask から呼び出される
 
         Returns:
@@ -1326,30 +1382,25 @@ class ThumbnailGenerator:
         output_tile_path = self.seekbar_thumbnails_tile_path
         temp_tile_path = anyio.Path(f'{output_tile_path}.tmp')
 
-        # ProcessPoolExecutor を使用して別プロセスで画像変換を実行
+        # AnalysisWorkerPool のワーカープロセスで画像変換を実行
         ## 画像処理は CPU-bound な処理のため、別プロセスで実行している
         ## anyio.Path は同期関数では実行できないため、pathlib.Path に変換して渡す
-        ## キャンセル時に同期的な終了待機へ入るとイベントループ全体が止まるため、Executor は明示的に閉じる
-        loop = asyncio.get_running_loop()
-        executor = concurrent.futures.ProcessPoolExecutor(max_workers=1)
-        should_wait_executor = True
+        ## 既存サムネイルの移行は急ぎではないため、録画完了直後のファイルの解析より低い優先度で実行する
         try:
-            success = await loop.run_in_executor(
-                executor,
+            success = await AnalysisWorkerPool().runJob(
                 self._convertLegacyTileImage,
                 pathlib.Path(str(output_tile_path)),
                 pathlib.Path(str(temp_tile_path)),
+                file_path = str(self.file_path),
+                name = 'LegacyTileMigration',
+                priority = 'Low',
             )
-        except asyncio.CancelledError:
-            should_wait_executor = False
-            await ShutdownProcessPoolExecutor(executor, is_cancelled=True)
-            raise
+        except AnalysisJobCancelledError:
+            logging.info(f'{self.file_path}: Legacy tile migration has been cancelled.')
+            return False
         except Exception as ex:
             logging.error(f'{self.file_path}: Error converting legacy tile:', exc_info=ex)
             return False
-        finally:
-            if should_wait_executor is True:
-                await ShutdownProcessPoolExecutor(executor, is_cancelled=False)
 
         # 変換失敗時はエラーログを出力して終了
         if not success:
@@ -1411,7 +1462,7 @@ class ThumbnailGenerator:
         """
         既存のタイル画像を読み込み、新しい解像度に合わせて再タイル化する
         旧仕様 (480x270, 34列) で生成されたタイル画像を、新仕様 (192x108, 85列) に変換する
-        ProcessPoolExecutor で実行されるエントリーポイントなので、あえて prefix のアンダースコアは1つとしている
+        AnalysisWorkerPool のワーカープロセスで実行されるエントリーポイントなので、あえて prefix のアンダースコアは1つとしている
         (別プロセスで実行されるため、__ を付けるとマングリングにより正常に実行できない)
 
         Args:
@@ -1472,27 +1523,10 @@ class ThumbnailGenerator:
             resized_frame = self.downscaleWithAntiMoire(cast(NDArray[np.uint8], frame), new_width, new_height)
             resized_frames.append(resized_frame)
 
-        # 新しい列数でタイル化
-        ## リサイズしたフレームを新しい列数で並べ直し、1枚のタイル画像を生成する
-        rows = []
-        tile_cols = self.tile_cols
-        tile_rows = self.tile_rows
-        for r in range(tile_rows):
-            # この行に含まれるフレームを取得
-            row_images = list(resized_frames[r * tile_cols: (r + 1) * tile_cols])
-            # 最終行が列数に満たない場合は黒画像で埋める
-            if len(row_images) < tile_cols:
-                black_image = np.zeros((new_height, new_width, 3), dtype=np.uint8)
-                while len(row_images) < tile_cols:
-                    row_images.append(black_image)
-            # 横方向に連結
-            row_concat = cv2.hconcat(row_images)
-            rows.append(row_concat)
-        # 全ての行を縦方向に連結してタイル画像を完成
-        tile_image = cast(NDArray[np.uint8], cv2.vconcat(rows))
-
-        # WebP にエンコードして保存
-        return self.__encodeTileImageToWebP(tile_image, output_tile_path, str(self.file_path))
+        # 新しい列数でタイル化し、WebP にエンコードして保存
+        ## リサイズしたフレームを新しい列数で並べ直した1枚のタイル画像と、タイルシートを生成する
+        ## タイルシートは旧タイルを置き換える前に直接出力先に保存されるが、旧仕様にはタイルシートが存在しないため問題ない
+        return self.__saveTileImages(resized_frames, self.tile_rows, output_tile_path)
 
 
     def __inCandidateIntervals(self, sec: float) -> bool:
@@ -2094,7 +2128,14 @@ if __name__ == "__main__":
             generator.face_detection_mode = face_detection_mode
 
         # サムネイルを生成
-        asyncio.run(generator.generateAndSave())
+        async def run() -> None:
+            try:
+                await generator.generateAndSave()
+            finally:
+                # 常駐ワーカープロセスを終了する
+                await AnalysisWorkerPool().stop()
+
+        asyncio.run(run())
 
     @app.command()
     def migrate(
@@ -2164,6 +2205,8 @@ if __name__ == "__main__":
                 return await generator.migrateFromLegacyTile()
 
             finally:
+                # 常駐ワーカープロセスを終了する
+                await AnalysisWorkerPool().stop()
                 # データベース接続を閉じる（必須）
                 await Tortoise.close_connections()
 
@@ -0,0 +1,30 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "user_client_settings" (
+            "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+            "user_id" INT NOT NULL REFERENCES "users" ("id") ON DELETE CASCADE,
+            "key" TEXT NOT NULL,
+            "value" TEXT NOT NULL,
+            "revision" INT NOT NULL,
+            "updated_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT "uid_user_client_user_id_key" UNIQUE ("user_id", "key")
+        );
+        INSERT INTO "user_client_settings" ("user_id", "key", "value", "revision")
+            SELECT "users"."id", "settings"."key",
+                CASE "settings"."type" WHEN 'true' THEN 'true' WHEN 'false' THEN 'false' ELSE json_quote("settings"."value") END, 1
+            FROM "users", json_each("users"."client_settings") AS "settings";
+        ALTER TABLE "users" DROP COLUMN "client_settings";
+    """
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "users" ADD COLUMN "client_settings" JSON NOT NULL DEFAULT '{}';
+        UPDATE "users" SET "client_settings" = COALESCE((
+            SELECT json_group_object("key", json("value")) FROM "user_client_settings" WHERE "user_client_settings"."user_id" = "users"."id"
+        ), '{}');
+        DROP TABLE IF EXISTS "user_client_settings";
+    """
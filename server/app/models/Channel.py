@@ -21,6 +21,7 @@ from app.utils.edcb import ChSet5Item
 from app.utils.edcb.CtrlCmdUtil import CtrlCmdUtil
 from app.utils.edcb.EDCBUtil import EDCBUtil
 from app.utils.JikkyoClient import JikkyoClient
+from app.utils.TimeTableSnapshotCache import TimeTableSnapshotCache
 from app.utils.TSInformation import TSInformation
 
 
@@ -116,6 +117,9 @@ class Channel(TortoiseModel):
         except Exception as ex:
             logging.error('Failed to update channels:', exc_info=ex)
 
+        # 番組表のスナップショットを破棄し、バックグラウンドで再生成させる
+        TimeTableSnapshotCache.invalidate()
+
         logging.info(f'Channels update complete. ({round(time.time() - timestamp, 3)} sec)')
 
 
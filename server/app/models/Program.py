@@ -6,10 +6,9 @@ from __future__ import annotations
 import asyncio
 import concurrent.futures
 import gc
-import json
 import time
 from datetime import datetime, timedelta
-from typing import Any, cast
+from typing import Any, ClassVar, Literal, cast
 
 import ariblib.constants
 import httpx
@@ -25,6 +24,8 @@ from app.schemas import Genre
 from app.utils import GetMirakurunAPIEndpointURL, ShutdownProcessPoolExecutor
 from app.utils.edcb.CtrlCmdUtil import CtrlCmdUtil
 from app.utils.edcb.EDCBUtil import EDCBUtil
+from app.utils.ProgramFieldDecodeCache import ProgramFieldDecodeCache
+from app.utils.TimeTableSnapshotCache import TimeTableSnapshotCache
 from app.utils.TSInformation import TSInformation
 
 
@@ -43,12 +44,13 @@ class Program(TortoiseModel):
     event_id = fields.IntField()
     title = fields.TextField()
     description = fields.TextField()
-    detail = cast(TortoiseField[dict[str, str]], fields.JSONField(default={}, encoder=lambda x: json.dumps(x, ensure_ascii=False)))  # type: ignore
+    # detail / genres は番組表などで頻繁に読み込まれるため、デコード結果をキャッシュする encoder / decoder を使う
+    detail = cast(TortoiseField[dict[str, str]], fields.JSONField(default={}, encoder=ProgramFieldDecodeCache.encodeDetail, decoder=ProgramFieldDecodeCache.decodeDetail))  # type: ignore
     start_time = fields.DatetimeField(index=True)
     end_time = fields.DatetimeField(index=True)
     duration = fields.FloatField()
     is_free = fields.BooleanField()
-    genres = cast(TortoiseField[list[Genre]], fields.JSONField(default=[], encoder=lambda x: json.dumps(x, ensure_ascii=False)))  # type: ignore
+    genres = cast(TortoiseField[list[Genre]], fields.JSONField(default=[], encoder=ProgramFieldDecodeCache.encodeGenres, decoder=ProgramFieldDecodeCache.decodeGenres))  # type: ignore
     video_type = cast(TortoiseField[str | None], fields.TextField(null=True))
     video_codec = cast(TortoiseField[str | None], fields.TextField(null=True))
     video_resolution = cast(TortoiseField[str | None], fields.TextField(null=True))
@@ -59,6 +61,14 @@ class Program(TortoiseModel):
     secondary_audio_language = cast(TortoiseField[str | None], fields.TextField(null=True))
     secondary_audio_sampling_rate = cast(TortoiseField[str | None], fields.TextField(null=True))
 
+    # 番組情報の全件更新と、Mirakurun のイベントストリームからの差分反映が同時に DB に書き込まないようにするためのロック
+    ## 全件更新の途中で差分を反映すると、全件更新が取得した (差分より古い) 番組情報で上書きされてしまう
+    _update_lock: ClassVar[asyncio.Lock] = asyncio.Lock()
+
+    # 最後に番組情報の全件更新が成功した時刻 (time.monotonic() の値)
+    ## 取得に失敗した場合は更新しないため、イベントストリームで取りこぼした番組情報を補う全件更新が次の周期で再度行われる
+    last_updated_at: ClassVar[float | None] = None
+
 
     @classmethod
     async def update(cls, multiprocess: bool = False) -> None:
@@ -72,6 +82,44 @@ class Program(TortoiseModel):
         timestamp = time.time()
         logging.info('Programs updating...')
 
+        # データベースが他のプロセスにロックされていた場合は、ロックを解放してから5秒待ってリトライする
+        async with cls._update_lock:
+            result = await cls.__update(multiprocess)
+        if result == 'Retry':
+            await asyncio.sleep(5)
+            await cls.update(multiprocess=multiprocess)
+            return
+
+        # 番組情報の取得に失敗した場合は、DB はロールバックされていて何も変わっていないため、最終更新時刻も進めない
+        if result == 'Failure':
+            logging.warning(f'Programs update failed. ({round(time.time() - timestamp, 3)} sec)')
+            return
+
+        cls.last_updated_at = time.monotonic()
+
+        # 削除・変更された番組の detail / genres のデコード結果をキャッシュから取り除く
+        ProgramFieldDecodeCache.prune()
+
+        # 番組表のスナップショットを破棄し、バックグラウンドで再生成させる
+        TimeTableSnapshotCache.invalidate()
+
+        logging.info(f'Programs update complete. ({round(time.time() - timestamp, 3)} sec)')
+
+
+    @classmethod
+    async def __update(cls, multiprocess: bool) -> Literal['Success', 'Failure', 'Retry']:
+        """
+        番組情報を更新する (update() から _update_lock を取得した状態で呼ばれる)
+
+        Args:
+            multiprocess (bool): マルチプロセスで実行するかどうか
+
+        Returns:
+            Literal['Success', 'Failure', 'Retry']: 更新に成功したか、失敗したか、データベースが他のプロセスにロックされていたためにリトライが必要か
+        """
+
+        is_succeeded = False
+
         # 番組情報をマルチプロセスで更新する
         if multiprocess is True:
 
@@ -86,11 +134,11 @@ class Program(TortoiseModel):
             try:
                 # Mirakurun バックエンド
                 if Config().general.backend == 'Mirakurun':
-                    await loop.run_in_executor(executor, cls.updateFromMirakurunForMultiProcess)
+                    is_succeeded = await loop.run_in_executor(executor, cls.updateFromMirakurunForMultiProcess)
 
                 # EDCB バックエンド
                 elif Config().general.backend == 'EDCB':
-                    await loop.run_in_executor(executor, cls.updateFromEDCBForMultiProcess)
+                    is_succeeded = await loop.run_in_executor(executor, cls.updateFromEDCBForMultiProcess)
 
             # タスクキャンセル時は子プロセスの終了を待たず、イベントループを即座に呼び出し元へ返す
             ## Python 3.11 の ProcessPoolExecutor は実行中の処理を即時終了できないため、子プロセス自体は完了まで残る可能性がある
@@ -100,15 +148,13 @@ class Program(TortoiseModel):
                 raise
 
             # データベースが他のプロセスにロックされていた場合
-            # 5秒待ってからリトライ
+            # 呼び出し元で5秒待ってからリトライさせる
             except exceptions.OperationalError:
                 # 子プロセス側の処理は例外として戻ってきているため、リトライ前にこの試行の Executor を閉じる
-                ## 閉じる前に再帰呼び出しへ進むと、リトライ中も前回試行のプロセス管理リソースが残る
+                ## 閉じる前にリトライへ進むと、リトライ中も前回試行のプロセス管理リソースが残る
                 should_wait_executor = False
                 await ShutdownProcessPoolExecutor(executor, is_cancelled=False)
-                await asyncio.sleep(5)
-                await cls.update(multiprocess=multiprocess)
-                return
+                return 'Retry'
 
             finally:
                 if should_wait_executor is True:
@@ -119,78 +165,28 @@ class Program(TortoiseModel):
             try:
                 # Mirakurun バックエンド
                 if Config().general.backend == 'Mirakurun':
-                    await cls.updateFromMirakurun()
+                    is_succeeded = await cls.updateFromMirakurun()
 
                 # EDCB バックエンド
                 elif Config().general.backend == 'EDCB':
-                    await cls.updateFromEDCB()
+                    is_succeeded = await cls.updateFromEDCB()
             except Exception as ex:
                 logging.error('Failed to update programs:', exc_info=ex)
 
-        logging.info(f'Programs update complete. ({round(time.time() - timestamp, 3)} sec)')
+        return 'Success' if is_succeeded is True else 'Failure'
 
 
     @classmethod
-    async def updateFromMirakurun(cls, is_running_multiprocess: bool = False) -> None:
+    async def updateFromMirakurun(cls, is_running_multiprocess: bool = False) -> bool:
         """
         Mirakurun バックエンドから番組情報を取得し、更新する
 
         Args:
             is_running_multiprocess (bool, optional): マルチプロセスで実行されているかどうか
-        """
-
-        def IsMainProgram(program: dict[str, Any]) -> bool:
-            """
-            relatedItems からメインの番組情報か判定する
-            EIT[p/f] 対応により増えた番組情報から必要なものだけを取得する
-            ref: https://github.com/l3tnun/EPGStation/blob/master/src/model/epgUpdater/EPGUpdateManageModel.ts#L103-L136
-
-            Args:
-                program (dict[str, Any]): 番組情報の辞書
-            Returns:
-                bool: メインの番組情報かどうか
-            """
-
-            if 'relatedItems' not in program:
-                return True
-
-            for item in program['relatedItems']:
-
-                # Mirakurun 3.8 以下では type が存在しない & relatedItems が機能していないので true を返す
-                if 'type' not in item:
-                    return True
 
-                # 移動したイベントか？
-                if item['type'] == 'movement':
-                    return True
-
-                # type が shared でメインサービスか？
-                if item['type'] == 'shared':
-                    # サービス ID とイベント ID が一致すればメインサービスだし、そうでないならメインサービスとイベントを共有している
-                    if item['serviceId'] == program['serviceId'] and item['eventId'] == program['eventId']:
-                        return True
-                    else:
-                        return False
-
-                # イベントリレーされてきた番組か？
-                if item['type'] == 'relay':
-                    return True
-
-            return False
-
-        def MillisecondToDatetime(millisecond: int) -> datetime:
-            """
-            ミリ秒から Datetime を取得する
-
-            Args:
-                millisecond (int): ミリ秒
-
-            Returns:
-                datetime: Datetime（タイムゾーン付き）
-            """
-
-            # タイムゾーンを UTC+9（日本時間）に指定する
-            return datetime.fromtimestamp(millisecond / 1000, tz=JST)
+        Returns:
+            bool: 番組情報の更新に成功したかどうか (失敗した場合、DB への変更はロールバックされている)
+        """
 
         # マルチプロセス時は既存のコネクションが使えないため、Tortoise ORM を初期化し直す
         # ref: https://tortoise-orm.readthedocs.io/en/latest/setup.html
@@ -204,6 +200,7 @@ class Program(TortoiseModel):
             # Tortoise ORM を再初期化
             await Tortoise.init(config=DATABASE_CONFIG)
 
+        is_succeeded = False
         try:
 
             # このトランザクションはパフォーマンス向上と、取得失敗時のロールバックのためのもの
@@ -236,206 +233,23 @@ class Program(TortoiseModel):
                 # 番組情報ごとに
                 for program_info in programs:
 
-                    # この番組が放送されるチャンネルの情報を取得
-                    channel = channels.get(f'NID{program_info["networkId"]}-SID{program_info["serviceId"]:03d}', None)
-
-                    # 登録されていないチャンネルの番組を弾く（ワンセグやデータ放送など）
-                    if channel is None:
-                        continue
-
-                    # メインの番組情報でないなら弾く
-                    if IsMainProgram(program_info) is False:
-                        continue
-
-                    # 番組タイトルがない（＝サブチャンネルでメインチャンネルの内容をそのまま放送している）を弾く
-                    if 'name' not in program_info:
-                        continue
-
-                    # 重複する番組情報が登録されているかの判定に使うため、ここで先に番組情報を取得する
-
-                    # 番組タイトル・番組概要
-                    title: str = ''  # デフォルト値
-                    description: str = ''  # デフォルト値
-                    if 'name' in program_info:
-                        title = TSInformation.formatString(program_info['name']).strip()
-                    if 'description' in program_info:
-                        description = TSInformation.formatString(program_info['description']).strip()
-
-                    # 番組詳細
-                    detail: dict[str, str] = {}  # デフォルト値
-                    if 'extended' in program_info:
-
-                        # 番組詳細の見出しと本文の辞書ごとに
-                        for head, text in program_info['extended'].items():
-
-                            # 見出しと本文
-                            head_hankaku = TSInformation.formatString(head).replace('◇', '').strip()  # ◇ を取り除く
-                            if head_hankaku == '':  # 見出しが空の場合、固定で「番組内容」としておく
-                                head_hankaku = '番組内容'
-                            text_hankaku = TSInformation.formatString(text).strip()
-                            detail[head_hankaku] = text_hankaku
-
-                            # 番組概要が空の場合、番組詳細の最初の本文を概要として使う
-                            # 空でまったく情報がないよりかは良いはず
-                            if description.strip() == '':
-                                description = text_hankaku
-
-                    # 番組開始時刻・番組終了時刻
-                    start_time = MillisecondToDatetime(program_info['startAt'])
-                    end_time = MillisecondToDatetime(program_info['startAt'] + program_info['duration'])
-
-                    # 番組終了時刻が現在時刻より12時間以上前な番組を弾く
-                    if datetime.now(JST) - end_time > timedelta(hours=12):
-                        continue
-
-                    # ***** ここからは 追加・更新・更新不要 のいずれか *****
-
-                    # DB は読み取りよりも書き込みの方が負荷と時間がかかるため、不要な書き込みは極力避ける
-
                     # 番組 ID
-                    program_id = f'NID{program_info["networkId"]}-SID{program_info["serviceId"]:03d}-EID{program_info["eventId"]}'
+                    program_id = cls.getMirakurunProgramID(program_info)
 
-                    # 重複する番組 ID の番組情報があれば取得する
+                    # 重複する番組 ID の番組情報があれば取得し、保存する Program に変換する
                     duplicate_program = duplicate_programs.get(program_id)
+                    is_target, program = cls.__convertFromMirakurun(program_info, channels, duplicate_program)
 
-                    # 重複する番組情報があり、かつタイトル・番組概要・番組詳細・番組開始時刻・番組終了時刻が全て同じ
-                    if (duplicate_program is not None and
-                        duplicate_program.title == title and
-                        duplicate_program.description == description and
-                        len(duplicate_program.detail) == len(detail) and
-                        duplicate_program.start_time == start_time and
-                        duplicate_program.end_time == end_time):
-
-                        # 更新不要なのでスキップ
-                        del duplicate_programs[program_id]
+                    # 保存対象でない番組なら弾く (重複する番組情報は最後にまとめて削除される)
+                    if is_target is False:
                         continue
 
-                    # 重複する番組情報が存在しない（追加）
-                    if duplicate_program is None:
-                        program = Program()
-
-                    # 重複する番組情報が存在する（更新）
-                    else:
-                        del duplicate_programs[program_id]  # 参照を削除
-                        program = duplicate_program
-
-                    # 取得してきた値を設定
-                    program.id = program_id
-                    program.channel_id = channel.id
-                    program.network_id = int(channel.network_id)
-                    program.service_id = int(channel.service_id)
-                    program.event_id = int(program_info['eventId'])
-                    program.title = title
-                    program.description = description
-                    program.detail = detail
-                    program.start_time = start_time
-                    program.is_free = bool(program_info['isFree'])
-
-                    # 番組終了時刻・番組時間
-                    # 終了時間未定 (Mirakurun から duration == 1 で示される) の場合、まだ番組情報を取得していないならとりあえず5分とする
-                    # すでに番組情報を取得している（番組情報更新）なら以前取得した値をそのまま使う
-                    ## Mirakurun の /api/programs API のレスポンスには EIT[schedule] 由来の情報と EIT[p/f] 由来の情報が混ざっている
-                    ## さらに EIT[p/f] には番組が延長されたなどの理由で稀に番組時間が「終了時間未定」になることがある
-                    ## 基本的には EIT[p/f] 由来の「終了時間未定」が降ってくる前に EIT[schedule] 由来の番組時間を取得しているはず
-                    ## 「終了時間未定」だと番組表の整合性が壊れるので、実態と一致しないとしても EIT[schedule] 由来の番組時間を優先したい
-                    if program_info['duration'] == 1:
-                        if program.duration is None:  # 番組情報をまだ取得していない
-                            program.end_time = start_time + timedelta(minutes=5)
-                        else:  # すでに番組情報を取得しているので以前取得した値をそのまま使う
-                            pass
-                    else:
-                        program.end_time = end_time
-                    program.duration = (program.end_time - program.start_time).total_seconds()
-
-                    # ジャンル
-                    ## 数字だけでは開発中の視認性が低いのでテキストに変換する
-                    program.genres = []  # デフォルト値
-                    if 'genres' in program_info:
-                        for genre in program_info['genres']:  # ジャンルごとに
-
-                            # 大まかなジャンルを取得
-                            genre_tuple = ariblib.constants.CONTENT_TYPE.get(genre['lv1'])
-                            if genre_tuple is not None:
-
-                                # major … 大分類
-                                # middle … 中分類
-                                genre_dict: Genre = {
-                                    'major': genre_tuple[0].replace('／', '・'),
-                                    'middle': genre_tuple[1].get(genre['lv2'], '未定義').replace('／', '・'),
-                                }
-
-                                # BS/地上デジタル放送用番組付属情報がジャンルに含まれている場合、user_nibble から値を取得して書き換える
-                                # たとえば「中止の可能性あり」や「延長の可能性あり」といった情報が取れる
-                                if genre_dict['major'] == '拡張':
-                                    if genre_dict['middle'] == 'BS/地上デジタル放送用番組付属情報':
-                                        user_nibble = (genre['un1'] * 0x10) + genre['un2']
-                                        genre_dict['middle'] = ariblib.constants.USER_TYPE.get(user_nibble, '未定義')
-                                    # 「拡張」はあるがBS/地上デジタル放送用番組付属情報でない場合はなんの値なのかわからないのでパス
-                                    else:
-                                        continue
-
-                                # ジャンルを追加
-                                program.genres.append(genre_dict)
-
-                    # 映像情報
-                    program.video_type = None
-                    program.video_codec = None
-                    program.video_resolution = None
-                    if 'video' in program_info:
-                        if program_info['video']['streamContent'] is not None:
-                            program.video_type = ariblib.constants.COMPONENT_TYPE \
-                                [program_info['video']['streamContent']].get(program_info['video']['componentType'], 'Unknown')
-                        else:
-                            program.video_type = 'Unknown'
-                        program.video_codec = program_info['video']['type']
-                        program.video_resolution = program_info['video']['resolution']
-
-                    # 音声情報
-                    program.primary_audio_type = ''
-                    program.primary_audio_language = ''
-                    program.primary_audio_sampling_rate = ''
-                    program.secondary_audio_type = None
-                    program.secondary_audio_language = None
-                    program.secondary_audio_sampling_rate = None
-                    ## Mirakurun 3.9 以降向け
-                    ## ref: https://github.com/Chinachu/Mirakurun/blob/master/api.d.ts#L88-L105
-                    if 'audios' in program_info:
-
-                        ## 主音声
-                        program.primary_audio_type = ariblib.constants.COMPONENT_TYPE[0x02].get(program_info['audios'][0]['componentType'], 'Unknown')
-                        program.primary_audio_language = TSInformation.getISO639LanguageCodeName(program_info['audios'][0]['langs'][0])
-                        program.primary_audio_sampling_rate = str(int(program_info['audios'][0]['samplingRate'] / 1000)) + 'kHz'  # kHz に変換
-                        ## デュアルモノのみ
-                        if program.primary_audio_type == '1/0+1/0モード(デュアルモノ)':
-                            if len(program_info['audios'][0]['langs']) == 2:  # 他言語の定義が存在すれば
-                                program.primary_audio_language += '+' + TSInformation.getISO639LanguageCodeName(program_info['audios'][0]['langs'][1])
-                            else:
-                                program.primary_audio_language = program.primary_audio_language + '+副音声'  # 副音声で固定
-
-                        ## 副音声（存在する場合）
-                        if len(program_info['audios']) == 2:
-                            program.secondary_audio_type = ariblib.constants.COMPONENT_TYPE[0x02].get(program_info['audios'][1]['componentType'], 'Unknown')
-                            program.secondary_audio_language = TSInformation.getISO639LanguageCodeName(program_info['audios'][1]['langs'][0])
-                            program.secondary_audio_sampling_rate = str(int(program_info['audios'][1]['samplingRate'] / 1000)) + 'kHz'  # kHz に変換
-                            ## デュアルモノのみ
-                            if program.secondary_audio_type == '1/0+1/0モード(デュアルモノ)':
-                                if len(program_info['audios'][1]['langs']) == 2:  # 他言語の定義が存在すれば
-                                    program.secondary_audio_language += '+' + TSInformation.getISO639LanguageCodeName(program_info['audios'][1]['langs'][1])
-                                else:
-                                    program.secondary_audio_language = program.secondary_audio_language + '+副音声'  # 副音声で固定
+                    # 重複する番組情報の参照を削除
+                    duplicate_programs.pop(program_id, None)
 
-                    ## Mirakurun 3.8 以下向け（フォールバック）
-                    else:
-
-                        ## 主音声
-                        ## 副音声の情報は常に存在しないため省略
-                        program.primary_audio_type = ariblib.constants.COMPONENT_TYPE[0x02].get(program_info['audio']['componentType'], 'Unknown')
-                        program.primary_audio_sampling_rate = str(int(program_info['audio']['samplingRate'] / 1000)) + 'kHz'  # kHz に変換
-                        ## Mirakurun 3.8 以下では言語コードが取得できないため、日本語で固定する
-                        program.primary_audio_language = '日本語'
-                        ## デュアルモノのみ
-                        if program.primary_audio_type == '1/0+1/0モード(デュアルモノ)':
-                            program.primary_audio_language = '日本語+英語'  # 日本語+英語で固定
+                    # 更新不要ならスキップ
+                    if program is None:
+                        continue
 
                     # 番組情報をデータベースに保存する
                     if duplicate_program is None:
@@ -467,6 +281,7 @@ class Program(TortoiseModel):
                         except exceptions.OperationalError:
                             pass
 
+            is_succeeded = True
 
         # マルチプロセス実行時は、明示的に例外を拾わないとなぜかメインプロセスも含め全体がフリーズしてしまう
         except Exception as ex:
@@ -478,14 +293,386 @@ class Program(TortoiseModel):
             if is_running_multiprocess:
                 await Tortoise.close_connections()
 
+        return is_succeeded
+
+
+    @classmethod
+    async def applyMirakurunProgramEvents(cls, events: list[dict[str, Any]]) -> bool:
+        """
+        Mirakurun のイベントストリーム (/api/events/stream) から受け取った番組情報の追加・更新・削除イベントを DB に反映する
+        updateFromMirakurun() と異なり全件の番組情報は取得せず、イベントで通知された番組の番組情報だけを読み書きする
+
+        Args:
+            events (list[dict[str, Any]]): resource が program のイベントのリスト (受け取った順)
+
+        Returns:
+            bool: DB 上の番組情報が変化したかどうか
+        """
+
+        # 番組 ID ごとに、最後に受け取ったイベントだけを反映する
+        ## create / update イベントには番組情報全体が、remove イベントには Mirakurun の番組 ID だけが含まれる
+        latest_events: dict[str, dict[str, Any]] = {}
+        for event in events:
+            data = event.get('data')
+            if not isinstance(data, dict):
+                continue
+            if event.get('type') == 'remove' and 'id' in data:
+                # Mirakurun の番組 ID は、ネットワーク ID・5桁のサービス ID・5桁のイベント ID を連結した数値になっている
+                program_id = cls.getMirakurunProgramID({
+                    'networkId': data['id'] // 10000000000,
+                    'serviceId': data['id'] // 100000 % 100000,
+                    'eventId': data['id'] % 100000,
+                })
+            elif event.get('type') in ('create', 'update') and 'networkId' in data:
+                program_id = cls.getMirakurunProgramID(data)
+            else:
+                continue
+            latest_events.pop(program_id, None)
+            latest_events[program_id] = event
+        if len(latest_events) == 0:
+            return False
+
+        is_changed = False
+        async with cls._update_lock, transactions.in_transaction():
+
+            # チャンネル情報を取得
+            # NID32736-SID1024 形式の ID をキーにした辞書にまとめる
+            channels = {temp.id:temp for temp in await Channel.filter(is_watchable=True)}
+
+            # イベントで通知された番組の既存の番組情報を取得する
+            ## EPG の取得直後などは一度に数千件のイベントが届くため、SQLite の変数の上限を超えないよう分けて取得する
+            program_ids = list(latest_events.keys())
+            existing_programs: dict[str, Program] = {}
+            for index in range(0, len(program_ids), 500):
+                for temp in await Program.filter(id__in=program_ids[index:index + 500]):
+                    existing_programs[temp.id] = temp
+
+            for program_id, event in latest_events.items():
+                existing_program = existing_programs.get(program_id)
+
+                # 削除イベント、または保存対象でなくなった番組なら、既存の番組情報を削除する
+                is_target, program = (False, None) if event['type'] == 'remove' else \
+                    cls.__convertFromMirakurun(event['data'], channels, existing_program)
+                if is_target is False:
+                    if existing_program is not None:
+                        logging.debug(f'Delete Program: {program_id}')
+                        await existing_program.delete()
+                        is_changed = True
+                    continue
+
+                # 更新不要ならスキップ
+                if program is None:
+                    continue
+
+                # 番組情報をデータベースに保存する
+                if existing_program is None:
+                    logging.debug(f'Add Program: {program.id}')
+                else:
+                    logging.debug(f'Update Program: {program.id}')
+                await program.save()
+                is_changed = True
+
+        return is_changed
+
+
+    @classmethod
+    def getMirakurunProgramID(cls, program_info: dict[str, Any]) -> str:
+        """
+        Mirakurun の番組情報から、NID32736-SID1024-EID1 形式の番組 ID を取得する
+
+        Args:
+            program_info (dict[str, Any]): Mirakurun の番組情報
+
+        Returns:
+            str: 番組 ID
+        """
+
+        return f'NID{program_info["networkId"]}-SID{program_info["serviceId"]:03d}-EID{program_info["eventId"]}'
+
 
     @classmethod
-    async def updateFromEDCB(cls, is_running_multiprocess: bool = False) -> None:
+    def __convertFromMirakurun(
+        cls,
+        program_info: dict[str, Any],
+        channels: dict[str, Channel],
+        existing_program: Program | None,
+    ) -> tuple[bool, Program | None]:
+        """
+        Mirakurun の番組情報を、保存する Program に変換する
+        番組情報の全件取得 (updateFromMirakurun()) とイベントストリームからの差分反映 (applyMirakurunProgramEvents()) で共通して使われる
+
+        Args:
+            program_info (dict[str, Any]): Mirakurun の番組情報
+            channels (dict[str, Channel]): 視聴可能なチャンネル情報 (チャンネル ID をキーにした辞書)
+            existing_program (Program | None): DB に保存されている同じ番組 ID の番組情報 (存在しない場合は None)
+
+        Returns:
+            tuple[bool, Program | None]: 保存対象の番組かどうかと、保存する Program (保存対象でないか、既存の番組情報から変化がない場合は None)
+                保存対象でない番組 (登録されていないチャンネルの番組や放送終了から時間が経った番組など) の既存の番組情報は、呼び出し元で削除する
+        """
+
+        def IsMainProgram(program: dict[str, Any]) -> bool:
+            """
+            relatedItems からメインの番組情報か判定する
+            EIT[p/f] 対応により増えた番組情報から必要なものだけを取得する
+            ref: https://github.com/l3tnun/EPGStation/blob/master/src/model/epgUpdater/EPGUpdateManageModel.ts#L103-L136
+
+            Args:
+                program (dict[str, Any]): 番組情報の辞書
+            Returns:
+                bool: メインの番組情報かどうか
+            """
+
+            if 'relatedItems' not in program:
+                return True
+
+            for item in program['relatedItems']:
+
+                # Mirakurun 3.8 以下では type が存在しない & relatedItems が機能していないので true を返す
+                if 'type' not in item:
+                    return True
+
+                # 移動したイベントか？
+                if item['type'] == 'movement':
+                    return True
+
+                # type が shared でメインサービスか？
+                if item['type'] == 'shared':
+                    # サービス ID とイベント ID が一致すればメインサービスだし、そうでないならメインサービスとイベントを共有している
+                    if item['serviceId'] == program['serviceId'] and item['eventId'] == program['eventId']:
+                        return True
+                    else:
+                        return False
+
+                # イベントリレーされてきた番組か？
+                if item['type'] == 'relay':
+                    return True
+
+            return False
+
+        def MillisecondToDatetime(millisecond: int) -> datetime:
+            """
+            ミリ秒から Datetime を取得する
+
+            Args:
+                millisecond (int): ミリ秒
+
+            Returns:
+                datetime: Datetime（タイムゾーン付き）
+            """
+
+            # タイムゾーンを UTC+9（日本時間）に指定する
+            return datetime.fromtimestamp(millisecond / 1000, tz=JST)
+
+        # この番組が放送されるチャンネルの情報を取得
+        channel = channels.get(f'NID{program_info["networkId"]}-SID{program_info["serviceId"]:03d}', None)
+
+        # 登録されていないチャンネルの番組を弾く（ワンセグやデータ放送など）
+        if channel is None:
+            return False, None
+
+        # メインの番組情報でないなら弾く
+        if IsMainProgram(program_info) is False:
+            return False, None
+
+        # 番組タイトルがない（＝サブチャンネルでメインチャンネルの内容をそのまま放送している）を弾く
+        if 'name' not in program_info:
+            return False, None
+
+        # 重複する番組情報が登録されているかの判定に使うため、ここで先に番組情報を取得する
+
+        # 番組タイトル・番組概要
+        title: str = ''  # デフォルト値
+        description: str = ''  # デフォルト値
+        if 'name' in program_info:
+            title = TSInformation.formatString(program_info['name']).strip()
+        if 'description' in program_info:
+            description = TSInformation.formatString(program_info['description']).strip()
+
+        # 番組詳細
+        detail: dict[str, str] = {}  # デフォルト値
+        if 'extended' in program_info:
+
+            # 番組詳細の見出しと本文の辞書ごとに
+            for head, text in program_info['extended'].items():
+
+                # 見出しと本文
+                head_hankaku = TSInformation.formatString(head).replace('◇', '').strip()  # ◇ を取り除く
+                if head_hankaku == '':  # 見出しが空の場合、固定で「番組内容」としておく
+                    head_hankaku = '番組内容'
+                text_hankaku = TSInformation.formatString(text).strip()
+                detail[head_hankaku] = text_hankaku
+
+                # 番組概要が空の場合、番組詳細の最初の本文を概要として使う
+                # 空でまったく情報がないよりかは良いはず
+                if description.strip() == '':
+                    description = text_hankaku
+
+        # 番組開始時刻・番組終了時刻
+        start_time = MillisecondToDatetime(program_info['startAt'])
+        end_time = MillisecondToDatetime(program_info['startAt'] + program_info['duration'])
+
+        # 番組終了時刻が現在時刻より12時間以上前な番組を弾く
+        if datetime.now(JST) - end_time > timedelta(hours=12):
+            return False, None
+
+        # ***** ここからは 追加・更新・更新不要 のいずれか *****
+
+        # DB は読み取りよりも書き込みの方が負荷と時間がかかるため、不要な書き込みは極力避ける
+
+        # 番組 ID
+        program_id = cls.getMirakurunProgramID(program_info)
+
+        # 既存の番組情報があり、かつタイトル・番組概要・番組詳細・番組開始時刻・番組終了時刻が全て同じ
+        if (existing_program is not None and
+            existing_program.title == title and
+            existing_program.description == description and
+            len(existing_program.detail) == len(detail) and
+            existing_program.start_time == start_time and
+            existing_program.end_time == end_time):
+
+            # 更新不要なのでスキップ
+            return True, None
+
+        # 既存の番組情報が存在しない（追加）
+        if existing_program is None:
+            program = Program()
+
+        # 既存の番組情報が存在する（更新）
+        else:
+            program = existing_program
+
+        # 取得してきた値を設定
+        program.id = program_id
+        program.channel_id = channel.id
+        program.network_id = int(channel.network_id)
+        program.service_id = int(channel.service_id)
+        program.event_id = int(program_info['eventId'])
+        program.title = title
+        program.description = description
+        program.detail = detail
+        program.start_time = start_time
+        program.is_free = bool(program_info['isFree'])
+
+        # 番組終了時刻・番組時間
+        # 終了時間未定 (Mirakurun から duration == 1 で示される) の場合、まだ番組情報を取得していないならとりあえず5分とする
+        # すでに番組情報を取得している（番組情報更新）なら以前取得した値をそのまま使う
+        ## Mirakurun の /api/programs API のレスポンスには EIT[schedule] 由来の情報と EIT[p/f] 由来の情報が混ざっている
+        ## さらに EIT[p/f] には番組が延長されたなどの理由で稀に番組時間が「終了時間未定」になることがある
+        ## 基本的には EIT[p/f] 由来の「終了時間未定」が降ってくる前に EIT[schedule] 由来の番組時間を取得しているはず
+        ## 「終了時間未定」だと番組表の整合性が壊れるので、実態と一致しないとしても EIT[schedule] 由来の番組時間を優先したい
+        if program_info['duration'] == 1:
+            if program.duration is None:  # 番組情報をまだ取得していない
+                program.end_time = start_time + timedelta(minutes=5)
+            else:  # すでに番組情報を取得しているので以前取得した値をそのまま使う
+                pass
+        else:
+            program.end_time = end_time
+        program.duration = (program.end_time - program.start_time).total_seconds()
+
+        # ジャンル
+        ## 数字だけでは開発中の視認性が低いのでテキストに変換する
+        program.genres = []  # デフォルト値
+        if 'genres' in program_info:
+            for genre in program_info['genres']:  # ジャンルごとに
+
+                # 大まかなジャンルを取得
+                genre_tuple = ariblib.constants.CONTENT_TYPE.get(genre['lv1'])
+                if genre_tuple is not None:
+
+                    # major … 大分類
+                    # middle … 中分類
+                    genre_dict: Genre = {
+                        'major': genre_tuple[0].replace('／', '・'),
+                        'middle': genre_tuple[1].get(genre['lv2'], '未定義').replace('／', '・'),
+                    }
+
+                    # BS/地上デジタル放送用番組付属情報がジャンルに含まれている場合、user_nibble から値を取得して書き換える
+                    # たとえば「中止の可能性あり」や「延長の可能性あり」といった情報が取れる
+                    if genre_dict['major'] == '拡張':
+                        if genre_dict['middle'] == 'BS/地上デジタル放送用番組付属情報':
+                            user_nibble = (genre['un1'] * 0x10) + genre['un2']
+                            genre_dict['middle'] = ariblib.constants.USER_TYPE.get(user_nibble, '未定義')
+                        # 「拡張」はあるがBS/地上デジタル放送用番組付属情報でない場合はなんの値なのかわからないのでパス
+                        else:
+                            continue
+
+                    # ジャンルを追加
+                    program.genres.append(genre_dict)
+
+        # 映像情報
+        program.video_type = None
+        program.video_codec = None
+        program.video_resolution = None
+        if 'video' in program_info:
+            if program_info['video']['streamContent'] is not None:
+                program.video_type = ariblib.constants.COMPONENT_TYPE \
+                    [program_info['video']['streamContent']].get(program_info['video']['componentType'], 'Unknown')
+            else:
+                program.video_type = 'Unknown'
+            program.video_codec = program_info['video']['type']
+            program.video_resolution = program_info['video']['resolution']
+
+        # 音声情報
+        program.primary_audio_type = ''
+        program.primary_audio_language = ''
+        program.primary_audio_sampling_rate = ''
+        program.secondary_audio_type = None
+        program.secondary_audio_language = None
+        program.secondary_audio_sampling_rate = None
+        ## Mirakurun 3.9 以降向け
+        ## ref: https://github.com/Chinachu/Mirakurun/blob/master/api.d.ts#L88-L105
+        if 'audios' in program_info:
+
+            ## 主音声
+            program.primary_audio_type = ariblib.constants.COMPONENT_TYPE[0x02].get(program_info['audios'][0]['componentType'], 'Unknown')
+            program.primary_audio_language = TSInformation.getISO639LanguageCodeName(program_info['audios'][0]['langs'][0])
+            program.primary_audio_sampling_rate = str(int(program_info['audios'][0]['samplingRate'] / 1000)) + 'kHz'  # kHz に変換
+            ## デュアルモノのみ
+            if program.primary_audio_type == '1/0+1/0モード(デュアルモノ)':
+                if len(program_info['audios'][0]['langs']) == 2:  # 他言語の定義が存在すれば
+                    program.primary_audio_language += '+' + TSInformation.getISO639LanguageCodeName(program_info['audios'][0]['langs'][1])
+                else:
+                    program.primary_audio_language = program.primary_audio_language + '+副音声'  # 副音声で固定
+
+            ## 副音声（存在する場合）
+            if len(program_info['audios']) == 2:
+                program.secondary_audio_type = ariblib.constants.COMPONENT_TYPE[0x02].get(program_info['audios'][1]['componentType'], 'Unknown')
+                program.secondary_audio_language = TSInformation.getISO639LanguageCodeName(program_info['audios'][1]['langs'][0])
+                program.secondary_audio_sampling_rate = str(int(program_info['audios'][1]['samplingRate'] / 1000)) + 'kHz'  # kHz に変換
+                ## デュアルモノのみ
+                if program.secondary_audio_type == '1/0+1/0モード(デュアルモノ)':
+                    if len(program_info['audios'][1]['langs']) == 2:  # 他言語の定義が存在すれば
+                        program.secondary_audio_language += '+' + TSInformation.getISO639LanguageCodeName(program_info['audios'][1]['langs'][1])
+                    else:
+                        program.secondary_audio_language = program.secondary_audio_language + '+副音声'  # 副音声で固定
+
+        ## Mirakurun 3.8 以下向け（フォールバック）
+        else:
+
+            ## 主音声
+            ## 副音声の情報は常に存在しないため省略
+            program.primary_audio_type = ariblib.constants.COMPONENT_TYPE[0x02].get(program_info['audio']['componentType'], 'Unknown')
+            program.primary_audio_sampling_rate = str(int(program_info['audio']['samplingRate'] / 1000)) + 'kHz'  # kHz に変換
+            ## Mirakurun 3.8 以下では言語コードが取得できないため、日本語で固定する
+            program.primary_audio_language = '日本語'
+            ## デュアルモノのみ
+            if program.primary_audio_type == '1/0+1/0モード(デュアルモノ)':
+                program.primary_audio_language = '日本語+英語'  # 日本語+英語で固定
+
+        return True, program
+
+
+    @classmethod
+    async def updateFromEDCB(cls, is_running_multiprocess: bool = False) -> bool:
         """
         EDCB バックエンドから番組情報を取得し、更新する
 
         Args:
             is_running_multiprocess (bool, optional): マルチプロセスで実行されているかどうか
+
+        Returns:
+            bool: 番組情報の更新に成功したかどうか (失敗した場合、DB への変更はロールバックされている)
         """
 
         # マルチプロセス時は既存のコネクションが使えないため、Tortoise ORM を初期化し直す
@@ -500,6 +687,7 @@ class Program(TortoiseModel):
             # Tortoise ORM を再初期化
             await Tortoise.init(config=DATABASE_CONFIG)
 
+        is_succeeded = False
         try:
 
             # このトランザクションはパフォーマンス向上と、取得失敗時のロールバックのためのもの
@@ -753,6 +941,8 @@ class Program(TortoiseModel):
                         except exceptions.OperationalError:
                             pass
 
+            is_succeeded = True
+
         # マルチプロセス実行時は、明示的に例外を拾わないとなぜかメインプロセスも含め全体がフリーズしてしまう
         except Exception as ex:
             logging.error('Failed to update programs from EDCB:', exc_info=ex)
@@ -766,11 +956,16 @@ class Program(TortoiseModel):
         # 強制的にガベージコレクションを実行する
         gc.collect()
 
+        return is_succeeded
+
 
     @classmethod
-    def updateFromMirakurunForMultiProcess(cls) -> None:
+    def updateFromMirakurunForMultiProcess(cls) -> bool:
         """
         Program.updateFromMirakurun() の同期版 (ProcessPoolExecutor でのマルチプロセス実行用)
+
+        Returns:
+            bool: 番組情報の更新に成功したかどうか
         """
 
         # もし Config() の実行時に AssertionError が発生した場合は、LoadConfig() を実行してサーバー設定データをロードする
@@ -783,13 +978,16 @@ class Program(TortoiseModel):
             LoadConfig(bypass_validation=True)
 
         # asyncio.run() で非同期メソッドの実行が終わるまで待つ
-        asyncio.run(cls.updateFromMirakurun(is_running_multiprocess=True))
+        return asyncio.run(cls.updateFromMirakurun(is_running_multiprocess=True))
 
 
     @classmethod
-    def updateFromEDCBForMultiProcess(cls) -> None:
+    def updateFromEDCBForMultiProcess(cls) -> bool:
         """
         Program.updateFromEDCB() の同期版 (ProcessPoolExecutor でのマルチプロセス実行用)
+
+        Returns:
+            bool: 番組情報の更新に成功したかどうか
         """
 
         # もし Config() の実行時に AssertionError が発生した場合は、LoadConfig() を実行してサーバー設定データをロードする
@@ -802,7 +1000,7 @@ class Program(TortoiseModel):
             LoadConfig(bypass_validation=True)
 
         # asyncio.run() で非同期メソッドの実行が終わるまで待つ
-        asyncio.run(cls.updateFromEDCB(is_running_multiprocess=True))
+        return asyncio.run(cls.updateFromEDCB(is_running_multiprocess=True))
 
 
     def isOffTheAirProgram(self) -> bool:
@@ -3,8 +3,7 @@
 # ref: https://stackoverflow.com/a/33533514/17124142
 from __future__ import annotations
 
-import json
-from typing import TYPE_CHECKING, Any, cast
+from typing import TYPE_CHECKING, cast
 
 import httpx
 from tortoise import fields
@@ -19,6 +18,7 @@ if TYPE_CHECKING:
     from app.models.AccountLink import AccountLink
     from app.models.BlueskyAccount import BlueskyAccount
     from app.models.TwitterAccount import TwitterAccount
+    from app.models.UserClientSetting import UserClientSetting
 
 
 class User(TortoiseModel):
@@ -31,7 +31,6 @@ class User(TortoiseModel):
     name = fields.TextField()
     password = fields.TextField()
     is_admin = fields.BooleanField()
-    client_settings = cast(TortoiseField[dict[str, Any]], fields.JSONField(default={}, encoder=lambda x: json.dumps(x, ensure_ascii=False)))  # type: ignore
     niconico_user_id = cast(TortoiseField[int | None], fields.IntField(null=True))
     niconico_user_name = cast(TortoiseField[str | None], fields.TextField(null=True))
     niconico_user_premium = cast(TortoiseField[bool | None], fields.BooleanField(null=True))
@@ -40,6 +39,7 @@ class User(TortoiseModel):
     twitter_accounts: fields.ReverseRelation[TwitterAccount]
     bluesky_accounts: fields.ReverseRelation[BlueskyAccount]
     account_links: fields.ReverseRelation[AccountLink]
+    client_settings: fields.ReverseRelation[UserClientSetting]
     created_at = fields.DatetimeField(auto_now_add=True)
     updated_at = fields.DatetimeField(auto_now=True)
 
@@ -0,0 +1,171 @@
+
+# Type Hints を指定できるように
+# ref: https://stackoverflow.com/a/33533514/17124142
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING, Any
+
+from tortoise import fields, transactions
+from tortoise.models import Model as TortoiseModel
+
+from app.config import ClientSettings
+
+
+if TYPE_CHECKING:
+    from app.models.User import User
+
+
+class UserClientSettingConflictError(Exception):
+    """
+    更新しようとしたクライアント設定のキーが、クライアントが把握しているリビジョンより後に他のクライアントから更新されていた場合に送出される例外
+    """
+
+    def __init__(self, keys: list[str]) -> None:
+        super().__init__(f'Client settings have been updated by another client. [{", ".join(keys)}]')
+        self.keys = keys
+
+
+class UserClientSetting(TortoiseModel):
+    """
+    ユーザーアカウントごとのクライアント設定を、設定キー1つにつき1レコードで保持するモデル
+    以前は User.client_settings に設定全体を1つの JSON として保存していたが、視聴履歴やマイリストなど肥大化しやすい設定キーがあるため、
+    設定キーごとにレコードを分け、変更された設定キーのレコードだけを書き換えるようにしている
+    各レコードには最後に更新された時点のリビジョン (ユーザーごとに単調増加する) を持たせ、差分同期に使う
+    """
+
+    # データベース上のテーブル名
+    class Meta(TortoiseModel.Meta):
+        table: str = 'user_client_settings'
+        unique_together = (('user', 'key'),)
+
+    id = fields.IntField(pk=True)
+    # ユーザー削除時はクライアント設定も同時に削除すべきなので cascade を指定
+    user: fields.ForeignKeyRelation[User] = \
+        fields.ForeignKeyField('models.User', related_name='client_settings', on_delete=fields.CASCADE)
+    user_id: int
+    key = fields.TextField()
+    # 設定値を JSON にシリアライズした文字列
+    ## JSONField は文字列の値を代入すると JSON 文字列として解釈しようとするため、文字列の設定値をそのまま扱えるよう TextField に自前でシリアライズして保存する
+    value = fields.TextField()
+    revision = fields.IntField()
+    updated_at = fields.DatetimeField(auto_now=True)
+
+
+    @property
+    def decoded_value(self) -> Any:
+        """ デシリアライズした設定値 """
+        return json.loads(self.value)
+
+
+    @classmethod
+    async def getClientSettings(cls, user: User) -> ClientSettings:
+        """
+        ユーザーアカウントのクライアント設定全体を取得する
+        保存されていない設定キーにはデフォルト値が入る
+
+        Args:
+            user (User): ユーザーアカウント
+
+        Returns:
+            ClientSettings: クライアント設定
+        """
+
+        records = await cls.filter(user_id=user.id)
+        return ClientSettings.model_validate({record.key: record.decoded_value for record in records})
+
+
+    @classmethod
+    async def getClientSettingsChanges(cls, user: User, since_revision: int) -> tuple[int, dict[str, Any]]:
+        """
+        指定されたリビジョンより後に更新されたクライアント設定のキーと値を取得する
+        since_revision が 0 以下か、現在のリビジョンより新しい (別のユーザーアカウントのリビジョンを渡されたなど) 場合は、
+        デフォルト値を含むすべての設定キーを返す
+
+        Args:
+            user (User): ユーザーアカウント
+            since_revision (int): クライアントが最後に同期したリビジョン
+
+        Returns:
+            tuple[int, dict[str, Any]]: 現在のリビジョンと、更新された設定キーと値の辞書
+        """
+
+        records = await cls.filter(user_id=user.id)
+        revision = max((record.revision for record in records), default=0)
+        if since_revision <= 0 or since_revision > revision:
+            client_settings = ClientSettings.model_validate({record.key: record.decoded_value for record in records})
+            return revision, client_settings.model_dump()
+
+        # 現在の ClientSettings に存在しない (廃止された) 設定キーは返さない
+        return revision, {
+            record.key: record.decoded_value for record in records
+            if record.revision > since_revision and record.key in ClientSettings.model_fields
+        }
+
+
+    @classmethod
+    async def updateClientSettings(
+        cls,
+        user: User,
+        settings: dict[str, Any],
+        base_revision: int | None,
+    ) -> tuple[int, dict[str, Any]]:
+        """
+        クライアント設定のうち、渡された設定キーの値だけを更新する
+        値が変わっていない設定キーのレコードは書き換えず、リビジョンも進めない
+
+        Args:
+            user (User): ユーザーアカウント
+            settings (dict[str, Any]): 更新する設定キーと値の辞書 (バリデーション済みであること)
+            base_revision (int | None): クライアントが最後に同期したリビジョン (None の場合は競合を確認せずに上書きする)
+
+        Returns:
+            tuple[int, dict[str, Any]]: 更新後のリビジョンと、base_revision より後に他のクライアントから更新された設定キーと値の辞書
+                (このクライアントがまだ取得していない変更を、追加のリクエストなしで反映できるようにするためのもの)
+
+        Raises:
+            UserClientSettingConflictError: 更新しようとした設定キーが base_revision より後に他のクライアントから異なる値に更新されていた場合
+        """
+
+        # 現在のリビジョンの読み取りから書き込みまでの間に、同じユーザーの別のリクエストで同じリビジョンが使われないようトランザクション内で行う
+        async with transactions.in_transaction():
+            records = {record.key: record for record in await cls.filter(user_id=user.id)}
+            revision = max((record.revision for record in records.values()), default=0)
+
+            # 値が変わる設定キーだけを取り出す
+            changed_settings = {
+                key: value for key, value in settings.items()
+                if key not in records or records[key].decoded_value != value
+            }
+
+            # 値が変わる設定キーのうち、base_revision より後に他のクライアントから更新されたものがあれば競合として扱う
+            ## 最終同期時刻はすべてのクライアントが push のたびに必ず送ってくるため、競合の判定から除外する
+            ## さもなければ、他のクライアントが一度 push しただけで、異なる設定キーしか更新していなくても常に競合になってしまう
+            if base_revision is not None:
+                conflicted_keys = [
+                    key for key in changed_settings
+                    if key != 'last_synced_at' and key in records and records[key].revision > base_revision
+                ]
+                if len(conflicted_keys) > 0:
+                    raise UserClientSettingConflictError(conflicted_keys)
+
+            # 値が変わる設定キーのレコードだけを書き換える
+            if len(changed_settings) > 0:
+                revision += 1
+                for key, value in changed_settings.items():
+                    encoded_value = json.dumps(value, ensure_ascii=False)
+                    record = records.get(key)
+                    if record is None:
+                        records[key] = await cls.create(user_id=user.id, key=key, value=encoded_value, revision=revision)
+                    else:
+                        record.value = encoded_value
+                        record.revision = revision
+                        await record.save(update_fields=['value', 'revision', 'updated_at'])
+
+        # 他のクライアントから更新された設定キーを返す
+        if base_revision is None:
+            return revision, {}
+        return revision, {
+            key: record.decoded_value for key, record in records.items()
+            if base_revision < record.revision and key not in settings and key in ClientSettings.model_fields
+        }
@@ -1,6 +1,5 @@
 
 import errno
-import shutil
 from pathlib import Path
 from typing import Annotated, cast
 
@@ -9,6 +8,7 @@ from fastapi import APIRouter, File, HTTPException, UploadFile, status
 
 from app import logging
 from app.config import Config
+from app.utils.CaptureUploader import CaptureUploader
 
 
 # ルーター
@@ -23,18 +23,19 @@ router = APIRouter(
     summary = 'キャプチャ画像アップロード API',
     status_code = status.HTTP_204_NO_CONTENT,
 )
-def CaptureUploadAPI(
+async def CaptureUploadAPI(
     image: Annotated[UploadFile, File(description='アップロードするキャプチャ画像 (JPEG or PNG)。')],
 ):
     """
     クライアント側でキャプチャした画像をサーバーにアップロードする。<br>
-    アップロードされた画像は、サーバー設定で指定されたフォルダに保存される。<br>
-    同期ファイル I/O を伴うため敢えて同期関数として実装している。
+    アップロードされた画像は、サーバー設定で指定されたフォルダに保存される。
     """
 
     # 画像が JPEG または PNG かをチェック
     ## 万が一悪意ある攻撃者から危険なファイルを送り込まれないように
-    mimetype: str = puremagic.magic_stream(image.file)[0].mime_type
+    ## 判定にはファイルの先頭部分があれば十分なため、ファイル全体は読み込まない
+    header = await image.read(8192)
+    mimetype: str = puremagic.magic_string(header)[0].mime_type if len(header) > 0 else ''
     if mimetype != 'image/jpeg' and mimetype != 'image/png':
         logging.error('[CapturesRouter][CaptureUploadAPI] Invalid image file was uploaded.')
         raise HTTPException(
@@ -43,79 +44,60 @@ def CaptureUploadAPI(
         )
 
     # シークを元に戻す（重要）
-    ## puremagic を使った時点でファイルはシークされているため、戻さないと 0 バイトになる
-    image.file.seek(0)
+    ## 先頭部分を読み込んだ時点でファイルはシークされているため、戻さないと先頭が欠けたファイルが保存される
+    await image.seek(0)
 
     # 先頭から順に保存容量が空いている保存先フォルダを探す
-    upload_folders: list[Path] = [Path(folder) for folder in Config().capture.upload_folders]
-    for index, upload_folder in enumerate(upload_folders):
+    upload_folder = await CaptureUploader.selectUploadFolder([Path(folder) for folder in Config().capture.upload_folders])
 
-        # 万が一保存先フォルダが存在しない場合は次の保存先フォルダを探す
-        if not upload_folder.exists():
-            continue
+    # 保存先フォルダが見つからなかった場合はエラー
+    if upload_folder is None:
+        logging.error('[CapturesRouter][CaptureUploadAPI] No available folder to save the file.')
+        raise HTTPException(
+            status_code = status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail = 'No available folder to save the file',
+        )
 
-        # 保存先フォルダの空き容量が 10MB 未満なら、最後のフォルダでなければ次の保存先フォルダを探す
-        upload_folder_disk_usage = shutil.disk_usage(upload_folder)
-        if upload_folder_disk_usage.free < 10 * 1024 * 1024 and index < len(upload_folders) - 1:
-            continue
+    # ディレクトリトラバーサル対策のためのチェック
+    ## ref: https://stackoverflow.com/a/45190125/17124142
+    filename = Path(cast(str, image.filename))
+    try:
+        upload_folder.joinpath(filename).resolve().relative_to(upload_folder.resolve())
+    except ValueError:
+        logging.error('[CapturesRouter][CaptureUploadAPI] Invalid filename was specified.')
+        raise HTTPException(
+            status_code = status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail = 'Specified filename is invalid',
+        )
 
-        # ディレクトリトラバーサル対策のためのチェック
-        ## ref: https://stackoverflow.com/a/45190125/17124142
-        filename = Path(cast(str, image.filename))
-        try:
-            upload_folder.joinpath(filename).resolve().relative_to(upload_folder.resolve())
-        except ValueError:
-            logging.error('[CapturesRouter][CaptureUploadAPI] Invalid filename was specified.')
+    # キャプチャを保存
+    ## 既にファイルが存在していた場合は上書きせず、連番を付けたファイル名で保存される
+    try:
+        await CaptureUploader.save(upload_folder, filename, image.file)
+    except PermissionError:
+        logging.error('[CapturesRouter][CaptureUploadAPI] Permission denied to save the file.')
+        raise HTTPException(
+            status_code = status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail = 'Permission denied to save the file',
+        )
+    except OSError as ex:
+        is_disk_full_error = False
+        if hasattr(ex, 'winerror'):
+            is_disk_full_error = ex.winerror == 112  # type: ignore
+        if hasattr(ex, 'errno'):
+            is_disk_full_error = ex.errno == errno.ENOSPC
+        if is_disk_full_error is True:
+            logging.error('[CapturesRouter][CaptureUploadAPI] No space left on the device.')
             raise HTTPException(
                 status_code = status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail = 'Specified filename is invalid',
+                detail = 'No space left on the device',
             )
-
-        # 保存するファイルパス
-        filepath = upload_folder / filename
-
-        # 既にファイルが存在していた場合は上書きしないようにリネーム
-        ## ref: https://note.nkmk.me/python-pathlib-name-suffix-parent/
-        count = 1
-        while filepath.exists():
-            filepath = upload_folder / f'{filename.stem}-{count}{filename.suffix}'
-            count += 1
-
-        # キャプチャを保存
-        try:
-            with open(filepath, mode='wb') as buffer:
-                shutil.copyfileobj(image.file, buffer)
-        except PermissionError:
-            logging.error('[CapturesRouter][CaptureUploadAPI] Permission denied to save the file.')
+        else:
+            logging.error('[CapturesRouter][CaptureUploadAPI] Unexpected OSError:', exc_info=ex)
             raise HTTPException(
                 status_code = status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail = 'Permission denied to save the file',
+                detail = 'Unexpected error occurred while saving the file',
             )
-        except OSError as ex:
-            is_disk_full_error = False
-            if hasattr(ex, 'winerror'):
-                is_disk_full_error = ex.winerror == 112  # type: ignore
-            if hasattr(ex, 'errno'):
-                is_disk_full_error = ex.errno == errno.ENOSPC
-            if is_disk_full_error is True:
-                logging.error('[CapturesRouter][CaptureUploadAPI] No space left on the device.')
-                raise HTTPException(
-                    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY,
-                    detail = 'No space left on the device',
-                )
-            else:
-                logging.error('[CapturesRouter][CaptureUploadAPI] Unexpected OSError:', exc_info=ex)
-                raise HTTPException(
-                    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY,
-                    detail = 'Unexpected error occurred while saving the file',
-                )
-
-        # キャプチャのアップロードに成功したら 204 No Content を返す
-        return
 
-    # 保存先フォルダが見つからなかった場合はエラー
-    logging.error('[CapturesRouter][CaptureUploadAPI] No available folder to save the file.')
-    raise HTTPException(
-        status_code = status.HTTP_422_UNPROCESSABLE_ENTITY,
-        detail = 'No available folder to save the file',
-    )
+    # キャプチャのアップロードに成功したら 204 No Content を返す
+    return
@@ -1,7 +1,6 @@
 
 import asyncio
 import hashlib
-import json
 from datetime import datetime, timedelta
 from typing import Annotated, Any
 
@@ -10,7 +9,6 @@ import httpx
 from fastapi import APIRouter, Depends, HTTPException, Path, Request, status
 from fastapi.responses import FileResponse, Response
 from fastapi.security.utils import get_authorization_scheme_param
-from tortoise import connections
 
 from app import logging, schemas
 from app.config import Config
@@ -18,10 +16,15 @@ from app.constants import HTTPX_CLIENT, JST, LOGO_DIR, VERSION
 from app.models.Channel import Channel
 from app.routers.UsersRouter import GetCurrentUser
 from app.streams.LiveStream import LiveStream
-from app.utils import GetMirakurunAPIEndpointURL, ParseDatetimeStringToJST
+from app.utils import (
+    GetDatabaseReadConnection,
+    GetMirakurunAPIEndpointURL,
+    ParseDatetimeStringToJST,
+)
 from app.utils.edcb.CtrlCmdUtil import CtrlCmdUtil
 from app.utils.edcb.EDCBUtil import EDCBUtil
 from app.utils.JikkyoClient import JikkyoClient
+from app.utils.ProgramFieldDecodeCache import ProgramFieldDecodeCache
 from app.utils.TSInformation import TSInformation
 
 
@@ -78,7 +81,7 @@ async def ChannelsAPI():
     # データベースの生のコネクションを取得
     # 地デジ・BS・CS を合わせると 18000 件近くになる番組情報を SQLite かつ ORM で絞り込んで素早く取得するのは無理があるらしい
     # そこで、この部分だけは ORM の機能を使わず、直接クエリを叩いて取得する
-    connection = connections.get('default')
+    connection = GetDatabaseReadConnection()
 
     # 現在と次の番組情報を取得する
     ## 一度に取得した方がパフォーマンスが向上するため敢えてそうしている
@@ -219,19 +222,19 @@ async def ChannelsAPI():
             ## DB 由来の日時文字列は utils 側で JST aware datetime に正規化してから ISO8601 文字列にする
             ## 真偽値も SQLite では 0/1 で管理されているため、bool 型に変換する
             if channel_dict['program_present'] is not None:
-                channel_dict['program_present']['detail'] = json.loads(channel_dict['program_present']['detail'])
+                channel_dict['program_present']['detail'] = ProgramFieldDecodeCache.decodeDetail(channel_dict['program_present']['detail'])
                 channel_dict['program_present']['start_time'] = ParseDatetimeStringToJST(channel_dict['program_present']['start_time']).isoformat()
                 channel_dict['program_present']['end_time'] = ParseDatetimeStringToJST(channel_dict['program_present']['end_time']).isoformat()
                 channel_dict['program_present']['is_free'] = bool(channel_dict['program_present']['is_free'])
-                channel_dict['program_present']['genres'] = json.loads(channel_dict['program_present']['genres'])
+                channel_dict['program_present']['genres'] = ProgramFieldDecodeCache.decodeGenres(channel_dict['program_present']['genres'])
                 channel_dict['program_present'].pop('is_present')
                 channel_dict['program_present'].pop('program_order')
             if channel_dict['program_following'] is not None:
-                channel_dict['program_following']['detail'] = json.loads(channel_dict['program_following']['detail'])
+                channel_dict['program_following']['detail'] = ProgramFieldDecodeCache.decodeDetail(channel_dict['program_following']['detail'])
                 channel_dict['program_following']['start_time'] = ParseDatetimeStringToJST(channel_dict['program_following']['start_time']).isoformat()
                 channel_dict['program_following']['end_time'] = ParseDatetimeStringToJST(channel_dict['program_following']['end_time']).isoformat()
                 channel_dict['program_following']['is_free'] = bool(channel_dict['program_following']['is_free'])
-                channel_dict['program_following']['genres'] = json.loads(channel_dict['program_following']['genres'])
+                channel_dict['program_following']['genres'] = ProgramFieldDecodeCache.decodeGenres(channel_dict['program_following']['genres'])
                 channel_dict['program_following'].pop('is_present')
                 channel_dict['program_following'].pop('program_order')
 
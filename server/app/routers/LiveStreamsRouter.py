@@ -12,6 +12,7 @@ from starlette.types import Receive
 from app import logging, schemas
 from app.models.Channel import Channel
 from app.streams.LiveStream import LiveStream, LiveStreamStatus
+from app.streams.LiveZappingPool import LiveZappingPool
 from app.streams.StreamEncodingOptions import (
     SplitQualityAndEncodingOptions,
     StreamQualityWithOptions,
@@ -299,6 +300,9 @@ async def LiveMPEGTSStreamAPI(
     live_stream = LiveStream(display_channel_id, stream_quality.quality, stream_quality.encoding_options)
     live_stream_client = await live_stream.connect('mpegts')
 
+    # 次にチャンネルを切り替えられそうなチャンネルのライブストリームを、バックグラウンドで事前に起動しておく
+    LiveZappingPool.update(live_stream)
+
     # ライブストリームを出力するジェネレーター
     async def generator():
         while True:
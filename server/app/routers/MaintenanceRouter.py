@@ -25,6 +25,7 @@ from app.constants import (
     RESTART_REQUIRED_LOCK_PATH,
     THUMBNAILS_DIR,
 )
+from app.metadata.AnalysisWorkerPool import AnalysisWorkerPool
 from app.metadata.CMSectionsDetector import CMSectionsDetector
 from app.metadata.RecordedScanTask import RecordedScanTask
 from app.metadata.ThumbnailGenerator import ThumbnailGenerator
@@ -161,6 +162,41 @@ def LogStreamAPI(
     return EventSourceResponse(generator())
 
 
+@router.get(
+    '/analysis-jobs',
+    summary = '録画ファイル解析ジョブ一覧取得 API',
+    response_description = 'キュー待ち・実行中の録画ファイル解析ジョブの一覧と進捗。',
+    response_model = schemas.AnalysisJobs,
+)
+async def AnalysisJobsAPI(
+    current_user: Annotated[User, Depends(GetCurrentAdminUser)],
+):
+    """
+    メタデータ解析・サムネイル生成など、常駐ワーカープロセスでキュー待ち・実行中の録画ファイル解析ジョブの一覧と進捗を取得する。<br>
+    JWT エンコードされたアクセストークンがリクエストの Authorization: Bearer に設定されていて、かつ管理者アカウントでないとアクセスできない。
+    """
+
+    return AnalysisWorkerPool().getJobs()
+
+
+@router.get(
+    '/drive-io',
+    summary = 'ドライブ I/O 状況取得 API',
+    response_description = 'HDD ごとのフォアグラウンドの読み込み数と、バックグラウンド解析ジョブの実行・キュー待ちの数。',
+    response_model = schemas.DriveIOStatuses,
+)
+async def DriveIOStatusesAPI(
+    current_user: Annotated[User, Depends(GetCurrentAdminUser)],
+):
+    """
+    HDD ごとに、録画視聴などのフォアグラウンドの読み込み数と、バックグラウンド解析ジョブの実行・キュー待ちの数を取得する。<br>
+    フォアグラウンドの読み込みが行われている HDD 上のバックグラウンド解析ジョブは、is_throttled が True になり間欠実行に絞られる。<br>
+    JWT エンコードされたアクセストークンがリクエストの Authorization: Bearer に設定されていて、かつ管理者アカウントでないとアクセスできない。
+    """
+
+    return AnalysisWorkerPool().getDriveIOStatuses()
+
+
 @router.post(
     '/update-database',
     summary = 'データベース更新 API',
@@ -282,7 +318,7 @@ async def BackgroundAnalysisAPI():
                     if db_recorded_program is not None:
                         # RecordedProgram モデルを schemas.RecordedProgram に変換
                         recorded_program = schemas.RecordedProgram.model_validate(db_recorded_program, from_attributes=True)
-                        tasks.append(ThumbnailGenerator.fromRecordedProgram(recorded_program).generateAndSave())
+                        tasks.append(ThumbnailGenerator.fromRecordedProgram(recorded_program).generateAndSave(priority='Low'))
 
                 # タスクが存在する場合、同時実行
                 if tasks:
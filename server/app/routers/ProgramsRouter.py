@@ -1,24 +1,36 @@
 
-import json
+import asyncio
+import gzip
+import hashlib
 import re
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Annotated, Any, Literal, cast
 
 import ariblib.constants
-from fastapi import APIRouter, Body, Depends, Query
+from fastapi import APIRouter, Body, Depends, Query, Request
+from fastapi.responses import Response
 from pydantic import TypeAdapter
-from tortoise import connections
 
 from app import logging, schemas
 from app.config import Config
 from app.constants import JST
 from app.models.Channel import Channel
 from app.routers.ReservationConditionsRouter import EncodeEDCBSearchKeyInfo
-from app.routers.ReservationsRouter import GetCtrlCmdUtil
-from app.utils import NormalizeToJSTDatetime, ParseDatetimeStringToJST
+from app.routers.ReservationsRouter import GetCtrlCmdUtil, GetRecordingInProgressStates
+from app.utils import (
+    GetDatabaseReadConnection,
+    NormalizeToJSTDatetime,
+    ParseDatetimeStringToJST,
+)
 from app.utils.edcb import EventInfo, ReserveDataRequired, SearchKeyInfo
 from app.utils.edcb.CtrlCmdUtil import CtrlCmdUtil
 from app.utils.edcb.EDCBUtil import EDCBUtil
+from app.utils.ProgramFieldDecodeCache import ProgramFieldDecodeCache
+from app.utils.TimeTableSnapshotCache import (
+    TimeTableSnapshotCache,
+    TimeTableSnapshotKey,
+)
 from app.utils.TSInformation import TSInformation
 
 
@@ -31,6 +43,34 @@ router = APIRouter(
 TimeTableSubchannelGroupKey = tuple[Literal['TS', 'BSService'], int, int]
 
 
+@dataclass(slots=True, frozen=True)
+class TimeTableReservation:
+    """
+    番組表に表示する録画予約の情報 (EDCB バックエンド時のみ)
+
+    Args:
+        reservation_id (int): 録画予約 ID
+        network_id (int): 予約番組のネットワーク ID
+        transport_stream_id (int): 予約番組のトランスポートストリーム ID
+        service_id (int): 予約番組のサービス ID
+        event_id (int): 予約番組のイベント ID
+        start_time (datetime): 予約の開始時刻
+        end_time (datetime): 予約の終了時刻
+        status (Literal['Reserved', 'Recording', 'Disabled']): 予約状態
+        recording_availability (Literal['Full', 'Partial', 'Unavailable']): 録画可能状態
+    """
+
+    reservation_id: int
+    network_id: int
+    transport_stream_id: int
+    service_id: int
+    event_id: int
+    start_time: datetime
+    end_time: datetime
+    status: Literal['Reserved', 'Recording', 'Disabled']
+    recording_availability: Literal['Full', 'Partial', 'Unavailable']
+
+
 def GetTimeTableChannelSortKey(channel_row: dict[str, Any]) -> tuple[int, int, int, int, str]:
     """
     番組表で利用するチャンネル並び替えキーを取得する
@@ -357,36 +397,105 @@ async def ProgramSearchAPI(
     return schemas.Programs(total=len(programs), programs=programs)
 
 
-@router.get(
-    '/timetable',
-    summary = '番組表 API',
-    response_description = '番組表データ。チャンネルごとの番組リストと日付範囲を含む。',
-    response_model = schemas.TimeTable,
-)
-async def TimeTableAPI(
-    start_time: Annotated[datetime | None, Query(description='取得開始日時 (ISO8601 形式)。省略時は現在時刻。')] = None,
-    end_time: Annotated[datetime | None, Query(description='取得終了日時 (ISO8601 形式)。省略時は DB に存在する最終日時。')] = None,
-    channel_type: Annotated[Literal['GR', 'BS', 'CS', 'CATV', 'SKY', 'BS4K'] | None, Query(description='チャンネル種別。省略時は全種別。')] = None,
-    pinned_channel_ids: Annotated[str | None, Query(description='チャンネル ID のカンマ区切りリスト (ピン留めチャンネル用)。指定時は channel_type より優先される。')] = None,
-):
+async def FetchTimeTableReservations() -> list[TimeTableReservation]:
     """
-    番組表データを取得する。<br>
-    チャンネルごとの番組リストと、番組データの有効日付範囲を含む。<br>
-    EDCB バックエンド時は各番組の予約情報も含む。
+    番組表に表示する録画予約の一覧を取得する (EDCB バックエンド時のみ)
+
+    Returns:
+        list[TimeTableReservation]: 録画予約の一覧 (EDCB バックエンド以外の場合や、取得に失敗した場合は空のリスト)
     """
 
-    # 現在時刻
-    now = datetime.now(JST)
+    if Config().general.backend != 'EDCB':
+        return []
+
+    reservations: list[TimeTableReservation] = []
+    try:
+        edcb = CtrlCmdUtil()
+        reserve_data_list: list[ReserveDataRequired] | None = await edcb.sendEnumReserve()
+        if reserve_data_list is None:
+            return []
+
+        # 現在時刻付近の予約が録画中かどうかをまとめて判定する (N+1 問題の回避)
+        ## 明らかに録画中でない予約に対しては EDCB にクエリを発行せず、残りも並列に問い合わせる
+        ## 判定結果は録画予約 API と共有して数秒間キャッシュされる
+        is_recording_in_progress_by_reserve_id = await GetRecordingInProgressStates(reserve_data_list, edcb)
+
+        for reserve_data in reserve_data_list:
+            reserve_start_time = NormalizeToJSTDatetime(reserve_data['start_time'])
+            reserve_end_time = reserve_start_time + timedelta(seconds=reserve_data['duration_second'])
+
+            # 予約状態を判定
+            status: Literal['Reserved', 'Recording', 'Disabled']
+            rec_mode = reserve_data.get('rec_setting', {}).get('rec_mode', 1)
+            if rec_mode >= 5:  # 5以上は無効
+                status = 'Disabled'
+            elif is_recording_in_progress_by_reserve_id[reserve_data['reserve_id']] is True:
+                status = 'Recording'
+            else:
+                status = 'Reserved'
+
+            # 録画可能状態
+            recording_availability: Literal['Full', 'Partial', 'Unavailable'] = 'Full'
+            if reserve_data['overlap_mode'] == 1:
+                recording_availability = 'Partial'
+            elif reserve_data['overlap_mode'] == 2:
+                recording_availability = 'Unavailable'
+
+            reservations.append(TimeTableReservation(
+                reservation_id = reserve_data['reserve_id'],
+                network_id = reserve_data['onid'],
+                transport_stream_id = reserve_data['tsid'],
+                service_id = reserve_data['sid'],
+                event_id = reserve_data['eid'],
+                start_time = reserve_start_time,
+                end_time = reserve_end_time,
+                status = status,
+                recording_availability = recording_availability,
+            ))
+    except Exception as ex:
+        # 予約情報の取得に失敗しても番組表自体は返す
+        logging.warning('[ProgramsRouter][TimeTableAPI] Failed to get reservations:', exc_info=ex)
+        return []
+
+    return reservations
+
+
+def GetTimeTableRevision(reservations: list[TimeTableReservation]) -> str:
+    """
+    番組表データのリビジョンを取得する
+    番組情報・チャンネル情報のデータバージョンと、録画予約の一覧のハッシュから生成する
+
+    Args:
+        reservations (list[TimeTableReservation]): 録画予約の一覧
+
+    Returns:
+        str: 番組表データのリビジョン
+    """
+
+    reservations_digest = hashlib.sha256(repr(reservations).encode('utf-8')).hexdigest()[:16]
+    return f'{TimeTableSnapshotCache.getDataVersion()}-{reservations_digest}'
+
+
+async def BuildTimeTable(key: TimeTableSnapshotKey, reservations: list[TimeTableReservation], now: datetime) -> schemas.TimeTable:
+    """
+    データベースから番組表データを構築する
+
+    Args:
+        key (TimeTableSnapshotKey): 番組表 API のリクエストパラメーター
+        reservations (list[TimeTableReservation]): 録画予約の一覧
+        now (datetime): 現在時刻
 
-    # 開始時刻のデフォルト値: 現在時刻
-    if start_time is None:
-        start_time = now
+    Returns:
+        schemas.TimeTable: 番組表データ
+    """
 
-    # タイムゾーンが指定されていない場合は JST として扱う
-    start_time = NormalizeToJSTDatetime(start_time)
+    start_time = key.start_time
+    end_time = key.end_time
+    channel_type = key.channel_type
+    target_channel_ids = list(key.pinned_channel_ids) if key.pinned_channel_ids is not None else None
 
     # データベースの生のコネクションを取得
-    connection = connections.get('default')
+    connection = GetDatabaseReadConnection()
 
     # 番組データの日付範囲を取得 (日付セレクター用)
     date_range_result = await connection.execute_query_dict(
@@ -410,14 +519,6 @@ async def TimeTableAPI(
     if end_time is None:
         end_time = latest
 
-    # タイムゾーンが指定されていない場合は JST として扱う
-    end_time = NormalizeToJSTDatetime(end_time)
-
-    # チャンネル ID リストをパース
-    target_channel_ids: list[str] | None = None
-    if pinned_channel_ids is not None and pinned_channel_ids.strip() != '':
-        target_channel_ids = [cid.strip() for cid in pinned_channel_ids.split(',') if cid.strip()]
-
     # チャンネル情報を raw SQL で取得 (Tortoise ORM のオーバーヘッドを回避)
     if target_channel_ids is not None:
         # 指定されたチャンネル ID のチャンネルのみ取得
@@ -571,81 +672,43 @@ async def TimeTableAPI(
 
     programs_result = await connection.execute_query_dict(programs_query, programs_params)
 
-    # EDCB バックエンドの場合は予約情報を取得
+    # 録画予約を番組 ID とチャンネル ID ごとに整理する
     reservations_by_program_id: dict[str, dict[str, Any]] = {}
     reservations_by_channel_time: dict[str, list[dict[str, Any]]] = {}
-    if Config().general.backend == 'EDCB':
-        try:
-            edcb = CtrlCmdUtil()
-            reserve_data_list: list[ReserveDataRequired] | None = await edcb.sendEnumReserve()
-            if reserve_data_list is not None:
-                # (ONID, TSID, SID) からチャンネル ID への逆引き辞書
-                ## 予約の EID が DB 上の番組情報と不一致でも、同一チャンネルかつ同一時間帯なら予約情報を表示できるようにする
-                channel_id_by_service_triplet: dict[tuple[int, int, int], str] = {}
-                for channel_row in channels_result:
-                    if channel_row['transport_stream_id'] is None:
-                        continue
-                    channel_id_by_service_triplet[(
-                        channel_row['network_id'],
-                        channel_row['transport_stream_id'],
-                        channel_row['service_id'],
-                    )] = channel_row['id']
-
-                # 録画中判定を行う時間範囲 (現在時刻の2時間前〜2時間後)
-                # 番組延長や繰り上げを考慮して余裕を持たせる
-                recording_check_start = now - timedelta(hours=2)
-                recording_check_end = now + timedelta(hours=2)
-
-                for reserve_data in reserve_data_list:
-                    reserve_start_time = NormalizeToJSTDatetime(reserve_data['start_time'])
-                    reserve_end_time = reserve_start_time + timedelta(seconds=reserve_data['duration_second'])
-
-                    # 番組 ID を構築
-                    program_id = f'NID{reserve_data["onid"]}-SID{reserve_data["sid"]:03d}-EID{reserve_data["eid"]}'
-
-                    # 予約状態を判定
-                    status: Literal['Reserved', 'Recording', 'Disabled']
-                    rec_mode = reserve_data.get('rec_setting', {}).get('rec_mode', 1)
-                    if rec_mode >= 5:  # 5以上は無効
-                        status = 'Disabled'
-                    else:
-                        # 現在時刻付近の番組のみ録画中かどうかを判定 (N+1 問題の回避)
-                        # 明らかに録画中でない番組に対して EDCB にクエリを発行しても無駄なので、
-                        # 録画中判定の時間範囲内 (現在時刻の前後2時間) にある番組のみチェックする
-                        if reserve_start_time <= recording_check_end and reserve_end_time >= recording_check_start:
-                            is_recording = type(await edcb.sendGetRecFilePath(reserve_data['reserve_id'])) is str
-                            status = 'Recording' if is_recording else 'Reserved'
-                        else:
-                            status = 'Reserved'
-
-                    # 録画可能状態
-                    recording_availability: Literal['Full', 'Partial', 'Unavailable'] = 'Full'
-                    if reserve_data['overlap_mode'] == 1:
-                        recording_availability = 'Partial'
-                    elif reserve_data['overlap_mode'] == 2:
-                        recording_availability = 'Unavailable'
-
-                    reservations_by_program_id[program_id] = {
-                        'id': reserve_data['reserve_id'],
-                        'status': status,
-                        'recording_availability': recording_availability,
-                    }
-                    channel_id = channel_id_by_service_triplet.get((
-                        reserve_data['onid'],
-                        reserve_data['tsid'],
-                        reserve_data['sid'],
-                    ))
-                    if channel_id is not None:
-                        if channel_id not in reservations_by_channel_time:
-                            reservations_by_channel_time[channel_id] = []
-                        reservations_by_channel_time[channel_id].append({
-                            'start_time': reserve_start_time,
-                            'end_time': reserve_end_time,
-                            'reservation': reservations_by_program_id[program_id],
-                        })
-        except Exception as ex:
-            # 予約情報の取得に失敗しても番組表自体は返す
-            logging.warning('[ProgramsRouter][TimeTableAPI] Failed to get reservations:', exc_info=ex)
+    if len(reservations) > 0:
+        # (ONID, TSID, SID) からチャンネル ID への逆引き辞書
+        ## 予約の EID が DB 上の番組情報と不一致でも、同一チャンネルかつ同一時間帯なら予約情報を表示できるようにする
+        channel_id_by_service_triplet: dict[tuple[int, int, int], str] = {}
+        for channel_row in channels_result:
+            if channel_row['transport_stream_id'] is None:
+                continue
+            channel_id_by_service_triplet[(
+                channel_row['network_id'],
+                channel_row['transport_stream_id'],
+                channel_row['service_id'],
+            )] = channel_row['id']
+
+        for reservation in reservations:
+            # 番組 ID を構築
+            program_id = f'NID{reservation.network_id}-SID{reservation.service_id:03d}-EID{reservation.event_id}'
+            reservations_by_program_id[program_id] = {
+                'id': reservation.reservation_id,
+                'status': reservation.status,
+                'recording_availability': reservation.recording_availability,
+            }
+            channel_id = channel_id_by_service_triplet.get((
+                reservation.network_id,
+                reservation.transport_stream_id,
+                reservation.service_id,
+            ))
+            if channel_id is not None:
+                if channel_id not in reservations_by_channel_time:
+                    reservations_by_channel_time[channel_id] = []
+                reservations_by_channel_time[channel_id].append({
+                    'start_time': reservation.start_time,
+                    'end_time': reservation.end_time,
+                    'reservation': reservations_by_program_id[program_id],
+                })
 
     # チャンネルごとに番組をグループ化
     programs_by_channel: dict[str, list[dict[str, Any]]] = {c['id']: [] for c in channels_result}
@@ -653,8 +716,9 @@ async def TimeTableAPI(
         channel_id = program_row['channel_id']
         if channel_id in programs_by_channel:
             # JSON フィールドをデコード
-            program_row['detail'] = json.loads(program_row['detail']) if program_row['detail'] else {}
-            program_row['genres'] = json.loads(program_row['genres']) if program_row['genres'] else []
+            ## 同じ JSON 文字列のデコード結果はキャッシュされているため、番組情報の更新後に初めて取得した番組以外は json.loads() されない
+            program_row['detail'] = ProgramFieldDecodeCache.decodeDetail(program_row['detail'])
+            program_row['genres'] = ProgramFieldDecodeCache.decodeGenres(program_row['genres'])
 
             # SQLite から取得した番組開始・終了時刻を JST aware datetime に正規化する
             ## DB には基本的に UTC+9 を保存しているが、将来のデータ混在に備えてタイムゾーンなしでも JST を補う
@@ -747,3 +811,104 @@ async def TimeTableAPI(
         channels=validated_channels,
         date_range=schemas.TimeTableDateRange(earliest=earliest, latest=latest),
     )
+
+
+async def RegenerateTimeTableSnapshots(keys: list[TimeTableSnapshotKey]) -> None:
+    """
+    番組情報・チャンネル情報の更新後に、保持している番組表スナップショットを再生成する
+    TimeTableSnapshotCache.invalidate() からバックグラウンドで呼ばれる
+
+    Args:
+        keys (list[TimeTableSnapshotKey]): 再生成するスナップショットキーのリスト
+    """
+
+    now = datetime.now(JST)
+    reservations = await FetchTimeTableReservations()
+    revision = GetTimeTableRevision(reservations)
+    for key in keys:
+        # 再生成の途中でリクエストを受けて生成済みの場合はスキップする
+        if TimeTableSnapshotCache.get(key, revision) is not None:
+            continue
+        timetable = await BuildTimeTable(key, reservations, now)
+        await TimeTableSnapshotCache.put(key, revision, timetable.model_dump_json().encode('utf-8'))
+
+TimeTableSnapshotCache.setRegenerator(RegenerateTimeTableSnapshots)
+
+
+@router.get(
+    '/timetable',
+    summary = '番組表 API',
+    response_description = '番組表データ。チャンネルごとの番組リストと日付範囲を含む。',
+    response_model = schemas.TimeTable,
+)
+async def TimeTableAPI(
+    request: Request,
+    start_time: Annotated[datetime | None, Query(description='取得開始日時 (ISO8601 形式)。省略時は現在時刻。')] = None,
+    end_time: Annotated[datetime | None, Query(description='取得終了日時 (ISO8601 形式)。省略時は DB に存在する最終日時。')] = None,
+    channel_type: Annotated[Literal['GR', 'BS', 'CS', 'CATV', 'SKY', 'BS4K'] | None, Query(description='チャンネル種別。省略時は全種別。')] = None,
+    pinned_channel_ids: Annotated[str | None, Query(description='チャンネル ID のカンマ区切りリスト (ピン留めチャンネル用)。指定時は channel_type より優先される。')] = None,
+):
+    """
+    番組表データを取得する。<br>
+    チャンネルごとの番組リストと、番組データの有効日付範囲を含む。<br>
+    EDCB バックエンド時は各番組の予約情報も含む。<br>
+    レスポンスには強い ETag が付与され、番組情報・チャンネル情報・予約情報が変化していなければ 304 を返す。
+    """
+
+    # 現在時刻
+    now = datetime.now(JST)
+
+    # チャンネル ID リストをパース
+    target_channel_ids: list[str] | None = None
+    if pinned_channel_ids is not None and pinned_channel_ids.strip() != '':
+        target_channel_ids = [cid.strip() for cid in pinned_channel_ids.split(',') if cid.strip()]
+
+    # スナップショットキーを構築
+    ## 開始時刻のデフォルト値は現在時刻、タイムゾーンが指定されていない場合は JST として扱う
+    ## pinned_channel_ids 指定時は channel_type は使われないため、キーからも外す
+    key = TimeTableSnapshotKey(
+        channel_type = channel_type if target_channel_ids is None else None,
+        pinned_channel_ids = tuple(target_channel_ids) if target_channel_ids is not None else None,
+        start_time = NormalizeToJSTDatetime(start_time if start_time is not None else now),
+        end_time = NormalizeToJSTDatetime(end_time) if end_time is not None else None,
+    )
+
+    # 番組表データのリビジョンが一致するスナップショットがあればそれを使い、なければ構築する
+    ## 開始時刻が省略された場合はリクエストごとにキーが変わるため、スナップショットは保存しない
+    reservations = await FetchTimeTableReservations()
+    revision = GetTimeTableRevision(reservations)
+    snapshot = TimeTableSnapshotCache.get(key, revision) if start_time is not None else None
+    if snapshot is None:
+        timetable = await BuildTimeTable(key, reservations, now)
+        snapshot = await TimeTableSnapshotCache.put(
+            key if start_time is not None else None,
+            revision,
+            timetable.model_dump_json().encode('utf-8'),
+        )
+
+    # gzip に対応しているクライアントには圧縮済みのレスポンスをそのまま返す
+    is_gzip_accepted = 'gzip' in request.headers.get('Accept-Encoding', '')
+    etag = snapshot.etag_gzip if is_gzip_accepted is True else snapshot.etag
+    headers = {
+        # ブラウザにはキャッシュさせるが、使う前に毎回 ETag で再検証させる
+        'Cache-Control': 'no-cache',
+        'ETag': etag,
+        'Vary': 'Accept-Encoding',
+    }
+
+    # リクエストに If-None-Match ヘッダが存在し、ETag が一致する場合は 304 を返す
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None and etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]:
+        return Response(status_code=304, headers=headers)
+
+    if is_gzip_accepted is True:
+        return Response(
+            content = snapshot.body_gzip,
+            media_type = 'application/json',
+            headers = {**headers, 'Content-Encoding': 'gzip'},
+        )
+    return Response(
+        content = await asyncio.to_thread(gzip.decompress, snapshot.body_gzip),
+        media_type = 'application/json',
+        headers = headers,
+    )
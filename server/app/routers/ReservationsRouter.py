@@ -40,6 +40,17 @@ _bitrate_ini_cache: dict[str, int] | None = None
 _bitrate_ini_cache_timestamp: float | None = None
 _bitrate_ini_cache_lock: asyncio.Lock | None = None
 
+# 録画中判定結果のキャッシュ (TTL: 5秒)
+## 番組表 API と録画予約 API は視聴中に定期的に呼ばれるため、短時間に同じ予約へ何度も問い合わせないようにする
+## 予約 ID -> (判定時刻, 録画中かどうか)
+RECORDING_IN_PROGRESS_CACHE_TTL = 5
+_recording_in_progress_cache: dict[int, tuple[float, bool]] = {}
+## 予約 ID -> 問い合わせ中の判定結果 (同時に来た同じ予約の判定を1回の問い合わせにまとめる)
+_recording_in_progress_inflight: dict[int, asyncio.Future[bool]] = {}
+## EDCB への同時問い合わせ数の上限
+RECORDING_IN_PROGRESS_MAX_CONCURRENCY = 4
+_recording_in_progress_semaphore: asyncio.Semaphore | None = None
+
 
 async def DecodeEDCBReserveData(
     reserve_data: ReserveDataRequired,
@@ -942,6 +953,75 @@ def ShouldCheckRecordingInProgress(reserve_data: ReserveDataRequired) -> bool:
     return reserve_start_time <= recording_check_end and reserve_end_time >= recording_check_start
 
 
+async def GetRecordingInProgressStates(reserve_data_list: list[ReserveDataRequired], edcb: CtrlCmdUtil) -> dict[int, bool]:
+    """
+    指定された予約がそれぞれ現在録画中かどうかをまとめて判定する。
+    判定結果は数秒間キャッシュされ、番組表 API・録画予約 API の間で共有される。
+
+    Args:
+        reserve_data_list (list[ReserveDataRequired]): 判定対象の予約情報のリスト
+        edcb (CtrlCmdUtil): EDCB API クライアント
+
+    Returns:
+        dict[int, bool]: 予約 ID をキー、録画中かどうかを値とした辞書
+    """
+
+    global _recording_in_progress_semaphore
+
+    if _recording_in_progress_semaphore is None:
+        _recording_in_progress_semaphore = asyncio.Semaphore(RECORDING_IN_PROGRESS_MAX_CONCURRENCY)
+    semaphore = _recording_in_progress_semaphore
+
+    async def ProbeRecordingInProgress(reserve_id: int) -> bool:
+        try:
+            async with semaphore:
+                # CtrlCmdUtil.sendGetRecFilePath() で「録画中かつ視聴予約でない予約の録画ファイルパス」が返ってくる場合は True、それ以外は False
+                ## 歴史的経緯でこう取得することになっているらしい
+                is_recording_in_progress = isinstance(await edcb.sendGetRecFilePath(reserve_id), str)
+            _recording_in_progress_cache[reserve_id] = (time.monotonic(), is_recording_in_progress)
+            return is_recording_in_progress
+        finally:
+            _recording_in_progress_inflight.pop(reserve_id, None)
+
+    # 期限切れのキャッシュを削除する (削除済みの予約のキャッシュが残り続けないようにする)
+    current_time = time.monotonic()
+    for reserve_id, (checked_at, _) in list(_recording_in_progress_cache.items()):
+        if current_time - checked_at >= RECORDING_IN_PROGRESS_CACHE_TTL:
+            del _recording_in_progress_cache[reserve_id]
+
+    results: dict[int, bool] = {}
+    probes: dict[int, asyncio.Future[bool]] = {}
+    for reserve_data in reserve_data_list:
+        reserve_id = reserve_data['reserve_id']
+
+        # 録画中判定が不要な予約では追加問い合わせを行わない
+        if ShouldCheckRecordingInProgress(reserve_data) is False:
+            results[reserve_id] = False
+            continue
+
+        # キャッシュが有効ならそれを使う
+        cached = _recording_in_progress_cache.get(reserve_id)
+        if cached is not None:
+            results[reserve_id] = cached[1]
+            continue
+
+        # 他のリクエストが既に問い合わせ中なら、その結果を待つ
+        probe = _recording_in_progress_inflight.get(reserve_id)
+        if probe is None:
+            probe = asyncio.ensure_future(ProbeRecordingInProgress(reserve_id))
+            _recording_in_progress_inflight[reserve_id] = probe
+        probes[reserve_id] = probe
+
+    # 並列に問い合わせる (同時問い合わせ数はセマフォで制限される)
+    ## 問い合わせは他のリクエストと共有しているため、このリクエストがキャンセルされても問い合わせ自体はキャンセルしない
+    if len(probes) > 0:
+        probe_results = await asyncio.gather(*(asyncio.shield(probe) for probe in probes.values()))
+        for reserve_id, is_recording_in_progress in zip(probes.keys(), probe_results):
+            results[reserve_id] = is_recording_in_progress
+
+    return results
+
+
 async def GetIsRecordingInProgress(reserve_data: ReserveDataRequired, edcb: CtrlCmdUtil) -> bool:
     """
     指定された予約が現在録画中かどうかを判定する。
@@ -954,13 +1034,8 @@ async def GetIsRecordingInProgress(reserve_data: ReserveDataRequired, edcb: Ctrl
         bool: 録画中の場合は True
     """
 
-    # 録画中判定が不要な予約では追加問い合わせを行わない
-    if ShouldCheckRecordingInProgress(reserve_data) is False:
-        return False
-
-    # CtrlCmdUtil.sendGetRecFilePath() で「録画中かつ視聴予約でない予約の録画ファイルパス」が返ってくる場合は True、それ以外は False
-    ## 歴史的経緯でこう取得することになっているらしい
-    return isinstance(await edcb.sendGetRecFilePath(reserve_data['reserve_id']), str)
+    results = await GetRecordingInProgressStates([reserve_data], edcb)
+    return results[reserve_data['reserve_id']]
 
 
 @router.get(
@@ -985,14 +1060,7 @@ async def ReservationsAPI(
     # 録画中判定が必要な予約のみ EDCB へ問い合わせる
     ## 必要最小限の予約に絞ることで、視聴中の定期更新時の EDCB 負荷を抑える
     ## データベーストランザクション外で実行し、かつ並列にリクエストすることで通信によるトランザクションの長時間ブロックを防ぐ
-    is_recording_in_progress_tasks = []
-    for reserve_data in reserve_data_list:
-        is_recording_in_progress_tasks.append(GetIsRecordingInProgress(reserve_data, edcb))
-
-    is_recording_in_progress_results = await asyncio.gather(*is_recording_in_progress_tasks)
-    is_recording_in_progress_by_reserve_id: dict[int, bool] = {}
-    for i, reserve_data in enumerate(reserve_data_list):
-        is_recording_in_progress_by_reserve_id[reserve_data['reserve_id']] = is_recording_in_progress_results[i]
+    is_recording_in_progress_by_reserve_id = await GetRecordingInProgressStates(reserve_data_list, edcb)
 
     # データベースアクセスを伴うので、トランザクション下に入れた上で並行して行う
     async with transactions.in_transaction():
@@ -1,11 +1,16 @@
 
 from typing import Annotated
 
-from fastapi import APIRouter, Body, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
+from pydantic import ValidationError
 
-from app import logging
+from app import logging, schemas
 from app.config import ClientSettings, Config, SaveConfig, ServerSettings
 from app.models.User import User
+from app.models.UserClientSetting import (
+    UserClientSetting,
+    UserClientSettingConflictError,
+)
 from app.routers.UsersRouter import GetCurrentAdminUser, GetCurrentUser
 
 
@@ -19,17 +24,75 @@ router = APIRouter(
 @router.get(
     '/client',
     summary = 'クライアント設定取得 API',
-    response_description = 'ログイン中のユーザーアカウントのクライアント設定。',
-    response_model = ClientSettings,
+    response_description = 'ログイン中のユーザーアカウントのクライアント設定。since を指定した場合は、そのリビジョンより後に更新された設定キーだけを返す。',
+    response_model = ClientSettings | schemas.ClientSettingsChanges,
 )
 async def ClientSettingsAPI(
     current_user: Annotated[User, Depends(GetCurrentUser)],
+    since: Annotated[int | None, Query(description='クライアントが最後に同期したリビジョン。0 の場合はすべての設定キーを返す。')] = None,
 ):
     """
     現在ログイン中のユーザーアカウントのクライアント設定を取得する。<br>
+    since を指定した場合は、そのリビジョンより後に更新された設定キーと値だけを、現在のリビジョンと共に返す。<br>
+    since が 0 か、現在のリビジョンより新しい場合は、すべての設定キーと値を返す。<br>
     JWT エンコードされたアクセストークンがリクエストの Authorization: Bearer に設定されていないとアクセスできない。
     """
-    return current_user.client_settings
+
+    # since を指定しない場合は、従来通りクライアント設定全体を返す
+    if since is None:
+        return await UserClientSetting.getClientSettings(current_user)
+
+    revision, settings = await UserClientSetting.getClientSettingsChanges(current_user, since)
+    return schemas.ClientSettingsChanges(revision=revision, settings=settings)
+
+
+@router.patch(
+    '/client',
+    summary = 'クライアント設定差分更新 API',
+    response_description = '更新後のリビジョンと、base_revision より後に他のクライアントから更新された設定キーと値。',
+    response_model = schemas.ClientSettingsChanges,
+)
+async def ClientSettingsPatchAPI(
+    patch_request: Annotated[schemas.ClientSettingsPatchRequest, Body(description='更新するクライアント設定の設定キーと値。')],
+    current_user: Annotated[User, Depends(GetCurrentUser)],
+):
+    """
+    現在ログイン中のユーザーアカウントのクライアント設定のうち、指定された設定キーの値だけを更新する。<br>
+    base_revision より後に他のクライアントから異なる値に更新された設定キーを更新しようとした場合は 409 を返す。<br>
+    JWT エンコードされたアクセストークンがリクエストの Authorization: Bearer に設定されていないとアクセスできない。
+    """
+
+    # 存在しない設定キーが含まれている場合、エラーを返す
+    unknown_keys = [key for key in patch_request.settings if key not in ClientSettings.model_fields]
+    if len(unknown_keys) > 0:
+        logging.error(f'[ClientSettingsPatchAPI] Unknown client settings keys specified. [{", ".join(unknown_keys)}]')
+        raise HTTPException(
+            status_code = status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail = 'Unknown client settings keys specified.',
+        )
+
+    # 指定された設定キーの値だけをバリデーションする
+    ## 指定されていない設定キーにはデフォルト値が入るが、それらは取り出さない
+    try:
+        client_settings = ClientSettings.model_validate(patch_request.settings)
+    except ValidationError as ex:
+        logging.error('[ClientSettingsPatchAPI] Invalid client settings specified:', exc_info=ex)
+        raise HTTPException(
+            status_code = status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail = 'Invalid client settings specified.',
+        )
+    settings = client_settings.model_dump(include=set(patch_request.settings.keys()))
+
+    try:
+        revision, changed_settings = await UserClientSetting.updateClientSettings(current_user, settings, patch_request.base_revision)
+    except UserClientSettingConflictError as ex:
+        logging.warning(f'[ClientSettingsPatchAPI] Client settings conflicted. [{", ".join(ex.keys)}]')
+        raise HTTPException(
+            status_code = status.HTTP_409_CONFLICT,
+            detail = 'The client settings have been updated by another client. Please fetch the latest client settings from the server.',
+        )
+
+    return schemas.ClientSettingsChanges(revision=revision, settings=changed_settings)
 
 
 @router.put(
@@ -42,12 +105,13 @@ async def ClientSettingsUpdateAPI(
     current_user: Annotated[User, Depends(GetCurrentUser)],
 ):
     """
-    現在ログイン中のユーザーアカウントのクライアント設定を更新する。<br>
+    現在ログイン中のユーザーアカウントのクライアント設定全体を更新する。<br>
+    差分更新 API (PATCH) に対応していない古いクライアント向けの API で、送られてきた設定のうち値が変わった設定キーだけが保存される。<br>
     JWT エンコードされたアクセストークンがリクエストの Authorization: Bearer に設定されていないとアクセスできない。
     """
 
     # 現在サーバーに保存されているクライアント設定の最終同期時刻よりも古いクライアント設定が送られてきた場合、エラーを返す
-    current_client_settings = ClientSettings.model_validate(current_user.client_settings)
+    current_client_settings = await UserClientSetting.getClientSettings(current_user)
     if client_settings.last_synced_at < current_client_settings.last_synced_at:
         logging.error(f'[ClientSettingsUpdateAPI] Client settings are outdated! [{client_settings.last_synced_at} < {current_client_settings.last_synced_at}]')
         raise HTTPException(
@@ -55,12 +119,8 @@ async def ClientSettingsUpdateAPI(
             detail = 'The client settings are outdated. Please update the client settings from the server.',
         )
 
-    # dict に変換してから入れる
-    ## Pydantic モデルのままだと JSON にシリアライズできないので怒られる
-    current_user.client_settings = dict(client_settings)
-
-    # レコードを保存する
-    await current_user.save()
+    # 値が変わった設定キーのレコードだけを保存する
+    await UserClientSetting.updateClientSettings(current_user, client_settings.model_dump(), base_revision=None)
 
 
 @router.get(
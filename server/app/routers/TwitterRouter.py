@@ -2,7 +2,6 @@
 from typing import Annotated, Literal
 from urllib.parse import urlparse
 
-import httpx
 from fastapi import (
     APIRouter,
     Body,
@@ -20,11 +19,11 @@ from fastapi.responses import StreamingResponse
 from starlette.background import BackgroundTask
 
 from app import logging, schemas
-from app.constants import API_REQUEST_HEADERS
 from app.models.TwitterAccount import TwitterAccount
 from app.models.User import User
 from app.routers.UsersRouter import GetCurrentUser
 from app.utils.TwitterGraphQLAPI import TwitterGraphQLAPI
+from app.utils.TwitterMediaCache import TwitterMediaCache
 from app.utils.TwitterScrapeBrowser import TwitterScrapeBrowser
 
 
@@ -540,6 +539,7 @@ async def TwitterVideoProxyAPI(
     Twitter 側の仕様変更により、許可されたオリジン以外からの動画 URL への直接アクセスが<br>
     403 Forbidden で拒否されるようになったため、サーバー側でリクエストを中継することでこの制限を回避する。<br>
     Range リクエストに対応しており、動画のシーク操作が可能。<br>
+    取得した動画はバイト範囲ごとにサーバー上にキャッシュされ、同じ動画のシークや再生では取得済みの範囲をキャッシュから返す。<br>
     セキュリティ上の理由から、`video.twimg.com` および `pbs.twimg.com` ドメインの HTTPS URL のみプロキシを許可する。
     """
 
@@ -563,63 +563,14 @@ async def TwitterVideoProxyAPI(
             detail = f'URL domain is not allowed. Only {", ".join(ALLOWED_VIDEO_PROXY_DOMAINS)} are allowed.',
         )
 
-    # リクエストヘッダの構築
-    ## Range ヘッダを転送することで、動画のシーク操作に対応する
-    proxy_headers: dict[str, str] = {
-        'User-Agent': API_REQUEST_HEADERS['User-Agent'],
-    }
-    allowed_request_headers = ['range', 'accept', 'accept-encoding', 'if-range', 'if-none-match', 'if-modified-since']
-    for key, value in request.headers.items():
-        if key.lower() in allowed_request_headers:
-            proxy_headers[key] = value
-
-    # httpx クライアントを作成し、ストリーミングモードでリクエストを送信
+    # キャッシュを使って動画を取得する
+    ## Range リクエストの範囲のうちキャッシュ済みの部分はローカルから返し、それ以外は上流から取得しながらキャッシュに書き込む
     ## メモリ効率のためにレスポンスボディを一括で読み込まず、チャンク単位でストリーミング転送する
-    client = httpx.AsyncClient(follow_redirects=True, timeout=30.0)
-    try:
-        upstream_request = client.build_request('GET', url, headers=proxy_headers)
-        upstream_response = await client.send(upstream_request, stream=True)
-    except Exception as ex:
-        await client.aclose()
-        logging.error('[TwitterRouter][TwitterVideoProxyAPI] Failed to request upstream:', exc_info=ex)
-        raise HTTPException(
-            status_code = status.HTTP_502_BAD_GATEWAY,
-            detail = f'Failed to request upstream: {ex}',
-        )
-
-    # 上流サーバーからエラーレスポンスが返された場合はクリーンアップしてエラーを返す
-    if upstream_response.status_code >= 400:
-        error_body = await upstream_response.aread()
-        await upstream_response.aclose()
-        await client.aclose()
-        error_text = error_body[:200].decode('utf-8', errors='replace')
-        logging.error(f'[TwitterRouter][TwitterVideoProxyAPI] Upstream returned HTTP {upstream_response.status_code}: {error_text}')
-        raise HTTPException(
-            status_code = upstream_response.status_code,
-            detail = f'Upstream returned HTTP {upstream_response.status_code}.',
-        )
-
-    # レスポンスヘッダの構築
-    ## 動画のストリーミング再生に必要なヘッダを転送する
-    allowed_response_headers = [
-        'content-type',
-        'content-length',
-        'content-range',
-        'accept-ranges',
-        'cache-control',
-        'etag',
-        'last-modified',
-    ]
-    response_headers = {key: value for key, value in upstream_response.headers.items() if key.lower() in allowed_response_headers}
-
-    # ストリーミングレスポンスの完了後にクリーンアップを行う BackgroundTask
-    async def cleanup() -> None:
-        await upstream_response.aclose()
-        await client.aclose()
+    media_response = await TwitterMediaCache.open(url, {key.lower(): value for key, value in request.headers.items()})
 
     return StreamingResponse(
-        upstream_response.aiter_bytes(chunk_size=65536),
-        status_code = upstream_response.status_code,
-        headers = response_headers,
-        background = BackgroundTask(cleanup),
+        media_response.body,
+        status_code = media_response.status_code,
+        headers = media_response.headers,
+        background = BackgroundTask(media_response.cleanup),
     )
@@ -1,9 +1,12 @@
 
 import asyncio
+import copy
 import pathlib
+import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Annotated, BinaryIO
+from typing import Annotated, Any, BinaryIO
 
 import anyio
 from fastapi import (
@@ -22,6 +25,7 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from PIL import Image
 from tortoise.exceptions import IntegrityError
+from tortoise.signals import post_delete, post_save
 
 from app import logging, schemas
 from app.constants import (
@@ -43,6 +47,45 @@ router = APIRouter(
     prefix = '/api/users',
 )
 
+# GetCurrentUser() で取得したユーザー情報のキャッシュの有効期間 (秒) と最大保持数
+## GetCurrentUser() は設定の同期などで頻繁に呼ばれる認証が必要な全 API から呼ばれるため、認証のたびに DB へ問い合わせないよう短時間だけ保持する
+CURRENT_USER_CACHE_TTL = 10  # 10 秒
+CURRENT_USER_CACHE_MAX_ENTRIES = 64
+
+# (ユーザー ID, JWT の発行時刻) をキーとした、取得時刻とユーザー情報の LRU キャッシュ
+## ユーザー情報が保存・削除された際は、Tortoise ORM のシグナル経由で InvalidateCurrentUserCache() が呼ばれて破棄される
+_current_user_cache: OrderedDict[tuple[int, int], tuple[float, User]] = OrderedDict()
+
+# ユーザー情報のキャッシュを破棄するたびに進む世代番号
+## DB への問い合わせ中にユーザー情報が更新された場合に、更新前のユーザー情報をキャッシュしてしまわないようにする
+_current_user_cache_generation = 0
+
+
+def InvalidateCurrentUserCache(user_id: int) -> None:
+    """
+    指定されたユーザーの、GetCurrentUser() で取得したユーザー情報のキャッシュを破棄する
+
+    Args:
+        user_id (int): ユーザー ID
+    """
+
+    global _current_user_cache_generation
+    _current_user_cache_generation += 1
+    for cache_key in [key for key in _current_user_cache if key[0] == user_id]:
+        _current_user_cache.pop(cache_key, None)
+
+
+@post_save(User)
+async def OnUserSaved(sender: type[User], instance: User, created: bool, using_db: Any, update_fields: list[str]) -> None:
+    """ ユーザー情報の保存時に、キャッシュされたユーザー情報を破棄する """
+    InvalidateCurrentUserCache(instance.id)
+
+
+@post_delete(User)
+async def OnUserDeleted(sender: type[User], instance: User, using_db: Any) -> None:
+    """ ユーザーの削除時に、キャッシュされたユーザー情報を破棄する """
+    InvalidateCurrentUserCache(instance.id)
+
 
 def GenerateAccessToken(user_id: int) -> str:
     """
@@ -121,9 +164,20 @@ async def GetCurrentUser(token: Annotated[str, Depends(OAuth2PasswordBearer(toke
     # JWT ペイロードの Subject をユーザー ID として取得
     user_id: int = int(jwt_payload['sub'])
 
+    # 有効期間内のユーザー情報がキャッシュされていれば、DB に問い合わせずにそれを返す
+    ## 呼び出し元でユーザー情報を書き換えてもキャッシュに影響しないよう、常に複製を返す
+    cache_key = (user_id, int(jwt_payload.get('iat', 0)))
+    cached = _current_user_cache.get(cache_key)
+    if cached is not None:
+        if time.monotonic() - cached[0] < CURRENT_USER_CACHE_TTL:
+            _current_user_cache.move_to_end(cache_key)
+            return copy.deepcopy(cached[1])
+        _current_user_cache.pop(cache_key, None)
+
     # JWT トークンに刻まれたユーザー ID に紐づくユーザー情報を取得
     ## 認証時の Depends として認証が必要な全 API から呼ばれるメソッドなので、ここでは関連アカウントの取得を行わない
     ## 関連アカウントの取得は、その情報を返す必要があるエンドポイントの実装 (UsersAPI, UserAPI など) 側で明示的に行うべき
+    cache_generation = _current_user_cache_generation
     current_user = await User.filter(id=user_id).get_or_none()
 
     # そのユーザー ID のユーザーが存在しない
@@ -135,6 +189,13 @@ async def GetCurrentUser(token: Annotated[str, Depends(OAuth2PasswordBearer(toke
             headers = {'WWW-Authenticate': 'Bearer'},
         )
 
+    # 取得したユーザー情報をキャッシュする (問い合わせ中にユーザー情報が更新された場合はキャッシュしない)
+    if cache_generation == _current_user_cache_generation:
+        _current_user_cache[cache_key] = (time.monotonic(), copy.deepcopy(current_user))
+        _current_user_cache.move_to_end(cache_key)
+        while len(_current_user_cache) > CURRENT_USER_CACHE_MAX_ENTRIES:
+            _current_user_cache.popitem(last=False)
+
     return current_user
 
 
@@ -252,7 +313,6 @@ async def UserCreateAPI(
         name = user_create_request.username,  # ユーザー名
         password = PASSWORD_CONTEXT.hash(user_create_request.password),  # ハッシュ化されたパスワード
         is_admin = False if await User.all().count() > 0 else True,  # 他のユーザーアカウントがまだ作成されていないなら、特別に管理者権限を付与
-        client_settings = {},  # クライアント側の設定（ひとまず空の辞書を設定）
     )
 
     # 外部テーブルのデータを取得してから返す
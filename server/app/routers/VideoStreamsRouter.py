@@ -11,11 +11,12 @@ from sse_starlette.sse import EventSourceResponse
 from starlette.background import BackgroundTask
 
 from app import logging
+from app.constants import ORIGINAL_QUALITY_VIDEO_CODECS
 from app.models.RecordedProgram import RecordedProgram
 from app.schemas import OfflineVideoStreamMetadata
 from app.streams.StreamEncodingOptions import (
-    SplitQualityAndEncodingOptions,
-    StreamQualityWithOptions,
+    SplitVideoQualityAndEncodingOptions,
+    VideoStreamQualityWithOptions,
 )
 from app.streams.VideoStream import VideoStream
 
@@ -47,12 +48,15 @@ async def ValidateVideoID(video_id: Annotated[int, Path(description='録画番
     return recorded_program
 
 
-async def ValidateQuality(quality: Annotated[str, Path(description='映像の品質。ex: 1080p')]) -> StreamQualityWithOptions:
+async def ValidateQuality(
+    quality: Annotated[str, Path(description='映像の品質。ex: 1080p (映像を再エンコードしない場合は original)')],
+    recorded_program: Annotated[RecordedProgram, Depends(ValidateVideoID)],
+) -> VideoStreamQualityWithOptions:
     """ 映像の品質のバリデーション """
 
     # 指定された品質が存在するか確認
     ## 品質の指定に -10bit や -24fps が付いていれば分解する
-    stream_quality = SplitQualityAndEncodingOptions(quality)
+    stream_quality = SplitVideoQualityAndEncodingOptions(quality)
     if stream_quality is None:
         logging.error(f'[VideoStreamsRouter][ValidateQuality] Specified quality was not found. [quality: {quality}]')
         raise HTTPException(
@@ -60,6 +64,18 @@ async def ValidateQuality(quality: Annotated[str, Path(description='映像の品
             detail = 'Specified quality was not found',
         )
 
+    # original 品質は映像をストリームコピーするため、ブラウザでそのまま再生できるコーデックの録画でのみ受け付ける
+    if (stream_quality.quality == 'original' and
+        recorded_program.recorded_video.video_codec not in ORIGINAL_QUALITY_VIDEO_CODECS):
+        logging.error(
+            f'[VideoStreamsRouter][ValidateQuality] Original quality is not available for this video. '
+            f'[video_id: {recorded_program.id}, video_codec: {recorded_program.recorded_video.video_codec}]'
+        )
+        raise HTTPException(
+            status_code = status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail = 'Original quality is not available for this video',
+        )
+
     return stream_quality
 
 
@@ -76,7 +92,7 @@ async def ValidateQuality(quality: Annotated[str, Path(description='映像の品
 )
 async def VideoHLSPlaylistAPI(
     recorded_program: Annotated[RecordedProgram, Depends(ValidateVideoID)],
-    stream_quality: Annotated[StreamQualityWithOptions, Depends(ValidateQuality)],
+    stream_quality: Annotated[VideoStreamQualityWithOptions, Depends(ValidateQuality)],
     session_id: Annotated[str, Query(description='セッション ID（クライアント側で適宜生成したランダム値を指定する）。')],
     cache_key: Annotated[str | None, Query(description='キャッシュ制御用のキー。')] = None,
 ):
@@ -118,7 +134,7 @@ async def VideoHLSPlaylistAPI(
 )
 async def VideoHLSSegmentAPI(
     recorded_program: Annotated[RecordedProgram, Depends(ValidateVideoID)],
-    stream_quality: Annotated[StreamQualityWithOptions, Depends(ValidateQuality)],
+    stream_quality: Annotated[VideoStreamQualityWithOptions, Depends(ValidateQuality)],
     session_id: Annotated[str, Query(description='セッション ID（クライアント側で適宜生成したランダム値を指定する）。')],
     sequence: Annotated[int, Query(description='HLS セグメントの 0 スタートのシーケンス番号。')],
     cache_key: Annotated[str | None, Query(description='キャッシュ制御用のキー。')],
@@ -168,7 +184,7 @@ async def VideoHLSSegmentAPI(
 )
 async def VideoHLSBufferAPI(
     recorded_program: Annotated[RecordedProgram, Depends(ValidateVideoID)],
-    stream_quality: Annotated[StreamQualityWithOptions, Depends(ValidateQuality)],
+    stream_quality: Annotated[VideoStreamQualityWithOptions, Depends(ValidateQuality)],
     session_id: Annotated[str, Query(description='セッション ID（クライアント側で適宜生成したランダム値を指定する）。')],
 ):
     """
@@ -234,7 +250,7 @@ async def VideoHLSBufferAPI(
 )
 async def VideoHLSKeepAliveAPI(
     recorded_program: Annotated[RecordedProgram, Depends(ValidateVideoID)],
-    stream_quality: Annotated[StreamQualityWithOptions, Depends(ValidateQuality)],
+    stream_quality: Annotated[VideoStreamQualityWithOptions, Depends(ValidateQuality)],
     session_id: Annotated[str, Query(description='セッション ID（クライアント側で適宜生成したランダム値を指定する）。')],
 ):
     """
@@ -266,7 +282,7 @@ async def VideoHLSKeepAliveAPI(
 )
 async def VideoOfflineStreamAPI(
     recorded_program: Annotated[RecordedProgram, Depends(ValidateVideoID)],
-    stream_quality: Annotated[StreamQualityWithOptions, Depends(ValidateQuality)],
+    stream_quality: Annotated[VideoStreamQualityWithOptions, Depends(ValidateQuality)],
     quality: Annotated[str, Path(description='映像の品質。ex: 720p-hevc-10bit-24fps')],
 ) -> StreamingResponse:
     """
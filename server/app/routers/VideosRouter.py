@@ -20,7 +20,6 @@ from fastapi import (
 )
 from fastapi.responses import FileResponse
 from starlette.datastructures import Headers
-from tortoise import connections
 
 from app import logging, schemas
 from app.constants import STATIC_DIR, THUMBNAILS_DIR
@@ -30,6 +29,7 @@ from app.metadata.TSInfoAnalyzer import TSInfoAnalyzer
 from app.models.RecordedProgram import RecordedProgram
 from app.models.User import User
 from app.routers.UsersRouter import GetCurrentAdminUser
+from app.utils import GetDatabaseReadConnection
 from app.utils.DriveIOLimiter import DriveIOLimiter
 from app.utils.JikkyoClient import JikkyoClient
 
@@ -170,18 +170,24 @@ async def GetThumbnailResponse(
     request: Request,
     recorded_program: RecordedProgram,
     return_tiled: bool = False,
+    tile_sheet_index: int | None = None,
 ) -> FileResponse | Response:
     """
     サムネイル画像のレスポンスを生成する共通処理
     ETags と Last-Modified を使ったキャッシュ制御を行う
+    ETag はファイルごとに生成されるため、タイルシートはシートごとに個別にキャッシュされる
 
     Args:
         request (Request): FastAPI のリクエストオブジェクト
         recorded_program (RecordedProgram): 録画番組情報
         is_tile (bool, optional): シークバー用タイル画像かどうか. Defaults to False.
+        tile_sheet_index (int | None, optional): シークバー用タイルシートのインデックス (return_tiled が True の時のみ有効). Defaults to None.
 
     Returns:
         Union[FileResponse, Response]: サムネイル画像のレスポンス
+
+    Raises:
+        HTTPException: 指定されたタイルシートが存在しない場合 (404)
     """
 
     def IsContentNotModified(response_headers: Headers, request_headers: Headers) -> bool:
@@ -260,12 +266,30 @@ async def GetThumbnailResponse(
             headers = headers,
         )
 
-    # 録画中のファイルは常にデフォルトのサムネイル画像を返す
+    def RaiseTileSheetNotFound() -> None:
+        """ 指定されたタイルシートが存在しない場合に 404 を返す """
+
+        # タイルシートとしてデフォルトのサムネイル画像を返すと、プレイヤーが 16:9 の1枚画像をタイルシートとして切り出してしまう
+        ## シート数を超えたインデックスや、タイルシートに分割される前に生成されたサムネイルの録画番組では、デフォルトのサムネイル画像は返さない
+        logging.warning(
+            f'[VideosRouter][GetThumbnailResponse] Specified tile sheet was not found. '
+            f'[video_id: {recorded_program.id}, sheet_index: {tile_sheet_index}]'
+        )
+        raise HTTPException(
+            status_code = status.HTTP_404_NOT_FOUND,
+            detail = 'Specified tile sheet was not found',
+        )
+
+    # 録画中のファイルは常にデフォルトのサムネイル画像を返す (タイルシートは存在しないため 404 を返す)
     if recorded_program.recorded_video.status == 'Recording':
+        if return_tiled is True and tile_sheet_index is not None:
+            RaiseTileSheetNotFound()
         return CreateDefaultThumbnailResponse()
 
     # サムネイル画像のパスを生成
     suffix = '_tile' if return_tiled else ''
+    if return_tiled is True and tile_sheet_index is not None:
+        suffix = f'_tile_{tile_sheet_index}'
     base_path = anyio.Path(str(THUMBNAILS_DIR)) / f'{recorded_program.recorded_video.file_hash}{suffix}'
 
     # WebP のみを試す
@@ -276,8 +300,10 @@ async def GetThumbnailResponse(
         thumbnail_path = path
         media_type = 'image/webp'
 
-    # サムネイル画像が存在しない場合はデフォルトのサムネイル画像を返す
+    # サムネイル画像が存在しない場合はデフォルトのサムネイル画像を返す (タイルシートの場合は 404 を返す)
     if thumbnail_path is None:
+        if return_tiled is True and tile_sheet_index is not None:
+            RaiseTileSheetNotFound()
         return CreateDefaultThumbnailResponse()
 
     # サムネイル画像のファイル情報を取得
@@ -464,7 +490,7 @@ async def VideosAPI(
 
     try:
         # データベースから直接クエリを実行
-        conn = connections.get('default')
+        conn = GetDatabaseReadConnection()
         rows = await conn.execute_query(query, params)
         total_result = await conn.execute_query(total_query, total_params)
         total = total_result[1][0]['count']
@@ -653,7 +679,7 @@ async def VideosSearchAPI(
 
     try:
         # データベースから直接クエリを実行
-        conn = connections.get('default')
+        conn = GetDatabaseReadConnection()
         rows = await conn.execute_query(query, params)
         total_result = await conn.execute_query(total_query, total_params)
         total = total_result[1][0]['count']
@@ -755,8 +781,8 @@ async def VideoJikkyoCommentsAPI(
                 psc_path = pathlib.Path(recorded_program.recorded_video.file_path).with_suffix('.psc')
                 try:
                     with open(psc_path, 'rb') as f:
-                        def callback(time_sec: float, pid: int, section: bytes) -> bool:
-                            tot = TimeOffsetSection(section)
+                        def callback(time_sec: float, pid: int, section: memoryview) -> bool:
+                            tot = TimeOffsetSection(bytes(section))
                             tot_jst_time = tot.JST_time
                             if tot_jst_time is None:
                                 return False
@@ -900,6 +926,32 @@ async def VideoThumbnailTileAPI(
     return await GetThumbnailResponse(request, recorded_program, return_tiled=True)
 
 
+@router.get(
+    '/{video_id}/thumbnail/tiled/{sheet_index}',
+    summary = '録画番組シークバー用サムネイルタイルシート取得 API',
+    response_description = '録画番組のシークバー用サムネイルタイルシート (WebP) 。',
+    response_class = FileResponse,
+    responses = {
+        200: {'content': {'image/webp': {}}},
+        304: {'description': 'Not Modified'},
+        404: {'description': 'Specified tile sheet was not found'},
+        422: {'description': 'Specified video_id was not found'},
+    },
+)
+async def VideoThumbnailTileSheetAPI(
+    request: Request,
+    recorded_program: Annotated[RecordedProgram, Depends(GetRecordedProgram)],
+    sheet_index: Annotated[int, Path(description='タイルシートのインデックス (0 始まり) 。', ge=0)],
+):
+    """
+    指定された録画番組のシークバー用サムネイルタイル画像を分割したタイルシートのうち、指定されたインデックスのシートを取得する。<br>
+    タイルシートの列数・行数・枚数は録画ファイル情報の thumbnail_info.tile.sheet に格納されている。<br>
+    指定されたインデックスのタイルシートが存在しない場合 (シート数を超えている、タイルシートが生成されていないなど) は 404 を返す。
+    """
+
+    return await GetThumbnailResponse(request, recorded_program, return_tiled=True, tile_sheet_index=sheet_index)
+
+
 @router.post(
     '/{video_id}/thumbnail/regenerate',
     summary = '録画番組サムネイル画像再生成 API',
@@ -1010,6 +1062,17 @@ async def VideoDeleteAPI(
                         )
                 elif ext == '.webp':  # JPEG はよほど長尺でない限り発生しないので WebP のみチェック
                     logging.warning(f'[VideoDeleteAPI] Tile thumbnail file does not exist: {tile_thumbnail_path}')
+
+            # タイルシート (サムネイル情報のバージョン 2 以降で生成されたもののみ存在する)
+            async for tile_sheet_path in thumbnails_dir.glob(f'{file_hash}_tile_*.webp'):
+                try:
+                    await tile_sheet_path.unlink()
+                except Exception as ex:
+                    logging.error(f'[VideoDeleteAPI] Failed to delete tile sheet file: {tile_sheet_path}', exc_info=ex)
+                    raise HTTPException(
+                        status_code = status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        detail = f'Failed to delete tile sheet file: {ex!s}',
+                    )
         elif has_duplicates:
             logging.info(f'[VideoDeleteAPI] Skip deleting thumbnail files because other records with the same file_hash exist: {file_hash}')
 
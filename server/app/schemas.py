@@ -4,7 +4,7 @@
 from __future__ import annotations
 
 from datetime import date, datetime
-from typing import Annotated, Literal
+from typing import Annotated, Any, Literal, NotRequired
 
 from pydantic import BaseModel, Field, RootModel, computed_field
 from tortoise.contrib.pydantic import PydanticModel
@@ -204,6 +204,17 @@ class ThumbnailTileInfo(TypedDict):
     column_count: int
     row_count: int
     interval_sec: float
+    # シークバーでの遅延読み込み用に、タイル画像を一定の列数・行数ごとに分割した「シート」の情報
+    ## サムネイル情報のバージョン 2 以降で生成されたタイル画像にのみ存在する
+    sheet: NotRequired[ThumbnailTileSheetInfo]
+
+class ThumbnailTileSheetInfo(TypedDict):
+    image_width: int
+    image_height: int
+    column_count: int
+    row_count: int
+    tiles_per_sheet: int
+    sheet_count: int
 
 # ***** 録画番組 *****
 
@@ -429,6 +440,15 @@ class BlueskyAuthRequest(BaseModel):
     handle: str
     app_password: str
 
+# ***** 設定 *****
+
+# クライアント設定のうち、変更された設定キーだけを更新する
+class ClientSettingsPatchRequest(BaseModel):
+    # クライアントが最後に同期したリビジョン (None の場合は競合を確認せずに上書きする)
+    base_revision: int | None = None
+    # 更新する設定キーと値
+    settings: dict[str, Any]
+
 # モデルに関連しない API レスポンスの構造を表す Pydantic モデル
 ## レスポンスボディの JSON 構造と一致する
 
@@ -768,6 +788,47 @@ class UserAccessToken(BaseModel):
     access_token: str
     token_type: str
 
+# ***** 設定 *****
+
+# 指定されたリビジョンより後に更新されたクライアント設定
+class ClientSettingsChanges(BaseModel):
+    # 現在のリビジョン
+    revision: int
+    # 更新された設定キーと値
+    settings: dict[str, Any]
+
+# ***** メンテナンス *****
+
+class AnalysisJob(BaseModel):
+    id: int
+    name: str
+    file_path: str
+    priority: Literal['High', 'Low']
+    status: Literal['Queued', 'Running']
+    progress: float | None
+    queued_at: float
+    started_at: float | None
+    drive_id: str
+    is_throttled: bool
+
+class AnalysisJobs(BaseModel):
+    max_workers: int
+    running_count: int
+    queued_count: int
+    jobs: list[AnalysisJob]
+
+class DriveIOStatus(BaseModel):
+    drive_id: str
+    foreground_reader_count: int
+    background_running_count: int
+    background_queued_count: int
+    is_throttled: bool
+
+class DriveIOStatuses(BaseModel):
+    throttle_period: float
+    throttled_io_budget_ratio: float
+    drives: list[DriveIOStatus]
+
 # ***** バージョン情報 *****
 
 class VersionInformation(BaseModel):
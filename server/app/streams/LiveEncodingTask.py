@@ -31,6 +31,7 @@ from app.constants import (
 from app.models.Channel import Channel
 from app.streams.LivePSIDataArchiver import LivePSIDataArchiver
 from app.utils import GetMirakurunAPIEndpointURL
+from app.utils.DriveIOLimiter import DriveIOLimiter
 from app.utils.edcb.EDCBTuner import EDCBTuner
 from app.utils.edcb.PipeStreamReader import PipeStreamReader
 
@@ -1140,7 +1141,7 @@ class LiveEncodingTask:
                         # ストリーム関連のログを表示
                         ## エンコーダーのログ出力が有効なら、ストリーム関連に限らずすべてのログを出力する
                         if 'Stream #0:' in line or CONFIG.general.debug_encoder is True:
-                            logging.debug(f'{self.live_stream.log_prefix} [{ENCODER_TYPE}] ' + line)
+                            logging.debug(lambda: f'{self.live_stream.log_prefix} [{ENCODER_TYPE}] {line}')
 
                         # エンコーダーのログ出力が有効なら、エンコーダーのログファイルに書き込む
                         if CONFIG.general.debug_encoder is True and encoder_log is not None:
@@ -1282,8 +1283,10 @@ class LiveEncodingTask:
                         self.live_stream.setStatus('Idling', 'ライブストリームは Idling です。')
 
                     # 現在 Idling でかつ最終更新から max_alive_time 秒以上経っていたらエンコーダーを終了し、Offline 状態に移行
+                    ## ただし、ザッピングに備えて事前に起動されたライブストリームは、起点のライブストリームが視聴されている間は維持する
                     if ((live_stream_status.status == 'Idling') and
-                        (time.time() - live_stream_status.updated_at > CONFIG.tv.max_alive_time)):
+                        (time.time() - live_stream_status.updated_at > CONFIG.tv.max_alive_time) and
+                        (self.live_stream.isZappingStandby() is False)):
                         self.live_stream.setStatus('Offline', 'ライブストリームは Offline です。')
 
                     # ***** 異常処理 (エンコードタスク再起動による回復が不可能) *****
@@ -1421,8 +1424,19 @@ class LiveEncodingTask:
                     await asyncio.sleep(0.1)
 
 
+            # デバッグモードでは tsreadex が TS ファイルを HDD から読み込み続けるため、フォアグラウンドの読み込みとして登録する
+            ## 登録中は同じ HDD 上のバックグラウンド解析が AnalysisWorkerPool 側で間欠実行に絞られる
+            ## チューナー起動フェーズの途中で return した場合に登録が残らないよう、メインループの実行中だけ登録する
+            foreground_drive_id: str | None = None
+            if CONFIG.tv.debug_mode_ts_path is not None:
+                foreground_drive_id = DriveIOLimiter.acquireForeground(anyio.Path(CONFIG.tv.debug_mode_ts_path))
+
             # エンコードタスクのメインループを実行する
-            await Controller()
+            try:
+                await Controller()
+            finally:
+                if foreground_drive_id is not None:
+                    DriveIOLimiter.releaseForeground(foreground_drive_id)
 
         except asyncio.CancelledError:
             # チャンネル切り替え時に LiveStream.connect() からこのタスクがキャンセルされる場合がある
@@ -179,6 +179,10 @@ class LiveStream:
             ## チューナー再利用の競合を避けるため、LiveStream ごとにロックを持つ
             instance._tuner_lock = asyncio.Lock()
 
+            # ザッピングに備えてこのライブストリームを事前に起動した、起点となる視聴中のライブストリーム
+            ## LiveZappingPool によって設定され、起点のライブストリームが Offline になるまでは Idling 状態でも維持される
+            instance.zapping_anchor = None
+
             # 生成したインスタンスを登録する
             cls.__instances[live_stream_id] = instance
 
@@ -218,6 +222,7 @@ class LiveStream:
         self.psi_data_archiver: LivePSIDataArchiver | None
         self.tuner: EDCBTuner | None
         self._tuner_lock: asyncio.Lock
+        self.zapping_anchor: LiveStream | None
 
 
     @property
@@ -513,6 +518,39 @@ class LiveStream:
         return client
 
 
+    async def standby(self) -> bool:
+        """
+        クライアントを接続せずに、ザッピングに備えてライブストリームを事前に起動する
+        connect() と異なり、他のライブストリームからチューナーを譲り受けることはしない (空きチューナーがなければ起動に失敗して Offline に戻る)
+        起動したライブストリームはクライアントが 0 のため、ONAir になった後すぐに Idling 状態に移行する
+
+        Returns:
+            bool: エンコードタスクを起動したかどうか (既に Offline 以外の状態だった場合は False を返す)
+        """
+
+        async with self._tuner_lock:
+            if self._status != 'Offline':
+                return False
+            self.setStatus('Standby', 'チャンネル切り替えに備えて、エンコードタスクを起動しています…')
+
+        # エンコードタスクを非同期で実行
+        instance = LiveEncodingTask(self)
+        self._live_encoding_task_ref = asyncio.create_task(instance.run())
+        self.__registerLiveEncodingTaskRef(self._live_encoding_task_ref)
+        return True
+
+
+    def isZappingStandby(self) -> bool:
+        """
+        ザッピングに備えて事前に起動されたライブストリームとして、Idling 状態でも維持すべきかどうかを返す
+
+        Returns:
+            bool: 起点となる視聴中のライブストリームが Offline でなければ True
+        """
+
+        return self.zapping_anchor is not None and self.zapping_anchor.getStatus().status != 'Offline'
+
+
     def disconnect(self, client: LiveStreamClient) -> None:
         """
         指定されたクライアントのライブストリームへの接続を切断する
@@ -0,0 +1,144 @@
+
+# Type Hints を指定できるように
+# ref: https://stackoverflow.com/a/33533514/17124142
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from typing import ClassVar
+
+from app import logging
+from app.config import Config
+from app.models.Channel import Channel
+from app.streams.LiveStream import LiveStream
+
+
+class LiveZappingPool:
+    """
+    チャンネル切り替え (ザッピング) に備えて、次に選局されそうなチャンネルのライブストリームを事前に起動しておくクラス
+    視聴中のチャンネルのリモコン番号順で前後にあるチャンネルと、最近視聴したチャンネルのライブストリームを、
+    視聴中と同じ画質でクライアントを接続しないまま起動しておくことで、チャンネル切り替え時に既に配信中のライブストリームへ接続できる
+    事前に起動したライブストリームは Idling 状態で待機するため、新たなライブストリームの起動時には通常の Idling のライブストリームと同様にチューナーを譲る
+    """
+
+    # 保持する視聴履歴の最大数
+    MAX_VIEWING_HISTORY: ClassVar[int] = 8
+
+    # 最近視聴したチャンネルの ID (古い順)
+    _viewing_history: ClassVar[OrderedDict[str, None]] = OrderedDict()
+
+    # 現在プールに入っている (事前に起動された) ライブストリーム
+    _pooled_live_streams: ClassVar[list[LiveStream]] = []
+
+    # 実行中のプール更新タスク
+    # ref: https://docs.astral.sh/ruff/rules/asyncio-dangling-task/
+    _update_task: ClassVar[asyncio.Task[None] | None] = None
+
+
+    @classmethod
+    def update(cls, live_stream: LiveStream) -> None:
+        """
+        クライアントが接続したライブストリームを起点に、視聴履歴とプールをバックグラウンドで更新する
+
+        Args:
+            live_stream (LiveStream): クライアントが接続したライブストリーム
+        """
+
+        # 視聴履歴を更新する
+        cls._viewing_history.pop(live_stream.display_channel_id, None)
+        cls._viewing_history[live_stream.display_channel_id] = None
+        while len(cls._viewing_history) > cls.MAX_VIEWING_HISTORY:
+            cls._viewing_history.popitem(last=False)
+
+        # ザッピングプールが無効な場合は何もしない
+        pool_size = Config().tv.zapping_pool_size
+        if pool_size == 0:
+            return
+
+        # 前回の更新がまだ終わっていなければ中断する (最後に接続されたライブストリームを起点にするため)
+        if cls._update_task is not None and not cls._update_task.done():
+            cls._update_task.cancel()
+
+        cls._update_task = asyncio.create_task(cls.__update(live_stream, pool_size))
+
+
+    @classmethod
+    async def __update(cls, anchor_live_stream: LiveStream, pool_size: int) -> None:
+        """
+        起点のライブストリームをもとにプールに入れるライブストリームを選び、Offline のものを事前に起動する
+
+        Args:
+            anchor_live_stream (LiveStream): 起点となる視聴中のライブストリーム
+            pool_size (int): プールに入れるライブストリームの数
+        """
+
+        try:
+            display_channel_ids = await cls.__selectCandidateChannelIDs(anchor_live_stream.display_channel_id, pool_size)
+
+            # 視聴中のライブストリームと同じ画質・エンコードオプションのライブストリームをプールに入れる
+            pooled_live_streams = [
+                LiveStream(display_channel_id, anchor_live_stream.quality, anchor_live_stream.encoding_options)
+                for display_channel_id in display_channel_ids
+            ]
+
+            # プールから外れたライブストリームは、通常の Idling のライブストリームと同様に max_alive_time 経過後に終了させる
+            ## 起点のライブストリーム自体は視聴中なので、プールに入っていた場合もプールから外す
+            for live_stream in cls._pooled_live_streams:
+                if live_stream not in pooled_live_streams:
+                    live_stream.zapping_anchor = None
+            anchor_live_stream.zapping_anchor = None
+            cls._pooled_live_streams = pooled_live_streams
+
+            # Offline のライブストリームを事前に起動する
+            ## 空きチューナーがない場合は LiveEncodingTask 側でチューナーの確保に失敗し、そのまま Offline に戻る
+            for live_stream in pooled_live_streams:
+                live_stream.zapping_anchor = anchor_live_stream
+                if await live_stream.standby() is True:
+                    logging.info(f'{live_stream.log_prefix} Started as a zapping standby for {anchor_live_stream.live_stream_id}.')
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            logging.warning(f'{anchor_live_stream.log_prefix} Failed to update the zapping pool:', exc_info=ex)
+
+
+    @classmethod
+    async def __selectCandidateChannelIDs(cls, display_channel_id: str, pool_size: int) -> list[str]:
+        """
+        次に選局されそうなチャンネルの ID を、可能性が高い順に最大 pool_size 個選ぶ
+        視聴中のチャンネルとチャンネル種別が同じチャンネルのうちリモコン番号順で次・前のチャンネルを優先し、続いて最近視聴したチャンネルを選ぶ
+
+        Args:
+            display_channel_id (str): 視聴中のチャンネルの ID
+            pool_size (int): 選ぶチャンネルの最大数
+
+        Returns:
+            list[str]: 選んだチャンネルの ID のリスト
+        """
+
+        channel = await Channel.filter(display_channel_id=display_channel_id).first()
+        if channel is None:
+            return []
+
+        # クライアントのチャンネル切り替えと同じく、チャンネル種別ごとにリモコン番号順で並べたチャンネルの前後を候補にする
+        ## Tortoise ORM では order_by() を複数回チェーンすると最後の order_by() だけが有効になるため、引数でまとめて指定する
+        channels = await Channel.filter(is_watchable=True, type=channel.type).order_by('remocon_id', 'channel_number')
+        channel_ids = [c.display_channel_id for c in channels]
+        candidate_channel_ids: list[str] = []
+        if display_channel_id in channel_ids and len(channel_ids) > 1:
+            index = channel_ids.index(display_channel_id)
+            candidate_channel_ids.append(channel_ids[(index + 1) % len(channel_ids)])
+            candidate_channel_ids.append(channel_ids[(index - 1) % len(channel_ids)])
+
+        # 最近視聴したチャンネルを新しい順に候補にする
+        candidate_channel_ids.extend(reversed(cls._viewing_history.keys()))
+
+        # 視聴中のチャンネルと重複を除いて、先頭から pool_size 個を選ぶ
+        result: list[str] = []
+        for candidate_channel_id in candidate_channel_ids:
+            if candidate_channel_id == display_channel_id or candidate_channel_id in result:
+                continue
+            result.append(candidate_channel_id)
+            if len(result) >= pool_size:
+                break
+        return result
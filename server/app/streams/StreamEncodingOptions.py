@@ -3,7 +3,7 @@ from __future__ import annotations
 from dataclasses import dataclass
 
 from app.config import Config
-from app.constants import QUALITY, QUALITY_TYPES
+from app.constants import QUALITY, QUALITY_TYPES, VIDEO_QUALITY_TYPES
 
 
 @dataclass(frozen=True)
@@ -104,6 +104,26 @@ class StreamQualityWithOptions:
     encoding_options: StreamEncodingOptions
 
 
+
+@dataclass(frozen=True)
+class VideoStreamQualityWithOptions:
+    """
+    録画視聴 API パスの品質指定を、ベース画質と追加エンコードオプションへ分解した結果を表す
+    ライブ視聴と異なり、映像をストリームコピーする original 品質も含む
+
+    Args:
+        quality (VIDEO_QUALITY_TYPES): ベース画質
+        encoding_options (StreamEncodingOptions): ベース画質に追加するエンコードオプション
+    """
+
+    # QUALITY に定義されているベース画質か original
+    quality: VIDEO_QUALITY_TYPES
+
+    # ベース画質に追加するエンコードオプション
+    ## original 品質では再エンコードしないため、常にオプションなしになる
+    encoding_options: StreamEncodingOptions
+
+
 def SplitQualityAndEncodingOptions(quality: str) -> StreamQualityWithOptions | None:
     """
     API パスの品質指定 (例: 720p-hevc-10bit-24fps) を、ベース画質 (720p-hevc) と追加オプション (-10bit / -24fps) に分解する
@@ -143,3 +163,31 @@ def SplitQualityAndEncodingOptions(quality: str) -> StreamQualityWithOptions | N
         quality = base_quality,
         encoding_options = encoding_options,
     )
+
+
+def SplitVideoQualityAndEncodingOptions(quality: str) -> VideoStreamQualityWithOptions | None:
+    """
+    録画視聴 API パスの品質指定を、ベース画質と追加オプションに分解する
+    original 以外の品質は SplitQualityAndEncodingOptions() と同じ規則で分解する
+
+    Args:
+        quality (str): API パスで指定された品質
+
+    Returns:
+        VideoStreamQualityWithOptions | None: 分解結果 (不正な品質指定の場合は None)
+    """
+
+    # original 品質は再エンコードしないため、-10bit / -24fps などの追加オプションは受け付けない
+    if quality == 'original':
+        return VideoStreamQualityWithOptions(
+            quality = 'original',
+            encoding_options = StreamEncodingOptions(),
+        )
+
+    stream_quality = SplitQualityAndEncodingOptions(quality)
+    if stream_quality is None:
+        return None
+    return VideoStreamQualityWithOptions(
+        quality = stream_quality.quality,
+        encoding_options = stream_quality.encoding_options,
+    )
@@ -45,17 +45,23 @@ class VideoEncodingTask:
     MAX_RETRY_COUNT: ClassVar[int] = 10  # 10回まで
 
 
-    def __init__(self, video_stream: VideoStream) -> None:
+    def __init__(self, video_stream: VideoStream, prefetch_segments: dict[int, VideoStreamSegment] | None = None) -> None:
         """
         エンコードタスクのインスタンスを初期化する
 
         Args:
             video_stream (VideoStream): エンコードタスクが紐づく録画視聴セッションのインスタンス
+            prefetch_segments (dict[int, VideoStreamSegment] | None): 先読みエンコード時に、エンコード結果を書き込むセグメント
+                (シーケンス番号をキーとした連続するセグメント / None の場合は録画視聴セッションのセグメントへ直接書き込む)
         """
 
         # このエンコードタスクが紐づく録画視聴セッションのインスタンス
         self.video_stream = video_stream
 
+        # 先読みエンコード時に、録画視聴セッションのセグメントの代わりにエンコード結果を書き込むセグメント
+        ## 先読みエンコードでは再生中のセグメントの状態を一切変更せず、指定された範囲だけをエンコードして終了する
+        self.prefetch_segments = prefetch_segments
+
         # psisimux と tsreadex とエンコーダーのプロセス
         # cancel() メソッドから参照されるため、インスタンス変数として保持する
         self._psisimux_process: asyncio.subprocess.Process | None = None
@@ -192,6 +198,63 @@ class VideoEncodingTask:
         return result
 
 
+    def buildFFmpegStreamCopyOptions(self, output_ts_offset: float) -> list[str]:
+        """
+        original 品質で FFmpeg に渡すオプションを組み立てる
+        映像は再エンコードせずにストリームコピーし、音声のみ他の品質と同じくステレオの AAC に変換する
+        入力 TS 上のキーフレーム (IDR) がそのまま出力にも現れるため、セグメントは元の録画のキーフレーム位置で分割される
+
+        Args:
+            output_ts_offset (float): 出力 TS のタイムスタンプオフセット (秒)
+
+        Returns:
+            list[str]: FFmpeg に渡すオプションが連なる配列
+        """
+
+        # オプションの入る配列
+        options: list[str] = []
+
+        # 入力ストリームの解析時間
+        ## original 品質は H.264 の録画でのみ使われるため、常に MPEG-2 以外のコーデック向けの長めの解析時間にする
+        analyzeduration = round(1500000 + (self._retry_count * 500000))  # リトライ回数に応じて少し増やす
+
+        # 入力
+        ## -analyzeduration をつけることで、ストリームの分析時間を短縮できる
+        options.append(f'-f mpegts -analyzeduration {analyzeduration} -i pipe:0')
+
+        # ストリームのマッピング
+        ## 音声切り替えのため、主音声・副音声両方を出力 TS に含む
+        options.append('-map 0:v:0 -map 0:a:0 -map 0:a:1 -map 0:d? -ignore_unknown')
+
+        # フラグ
+        ## max_interleave_delta の設定理由は buildFFmpegOptions() と同じ
+        max_interleave_delta = round(5000 + (self._retry_count * 1000))
+        options.append(f'-fflags nobuffer -flags low_delay -max_delay 0 -max_interleave_delta {max_interleave_delta}K -threads auto')
+
+        # 映像
+        ## 再エンコードせずにストリームコピーする
+        options.append('-vcodec copy')
+
+        # 音声
+        ## 音声が 5.1ch かどうかに関わらず、ステレオにダウンミックスする
+        ## 映像を再エンコードしない以上、音声も最高画質 (1080p) と同じビットレートで変換する
+        options.append(f'-acodec aac -aac_coder twoloop -ac 2 -ab {QUALITY["1080p"].audio_bitrate} -ar 48000 -af volume=2.0')
+
+        # 出力 TS のタイムスタンプオフセット
+        options.append(f'-output_ts_offset {output_ts_offset}')
+
+        # 出力
+        options.append('-y -f mpegts')  # MPEG-TS 出力ということを明示
+        options.append('pipe:1')  # 標準出力へ出力
+
+        # オプションをスペースで区切って配列にする
+        result: list[str] = []
+        for option in options:
+            result += option.split(' ')
+
+        return result
+
+
     def buildHWEncCOptions(self,
         quality: QUALITY_TYPES,
         encoder_type: Literal['QSVEncC', 'NVEncC', 'VCEEncC', 'rkmppenc'],
@@ -405,17 +468,20 @@ class VideoEncodingTask:
         """
 
         # エンコーダーの種類を取得
+        ## original 品質では映像をストリームコピーするだけなので、エンコーダーの設定に関わらず FFmpeg を使う
         CONFIG = Config()
-        ENCODER_TYPE = CONFIG.general.encoder
+        ENCODER_TYPE = 'FFmpeg' if self.video_stream.quality == 'original' else CONFIG.general.encoder
 
         # 新しいエンコードタスクを起動させた時点で既にエンコード済みのセグメントは使えなくなるので、すべてリセットする
-        for segment in self.video_stream.segments:
-            if segment.encode_status != 'Pending':
-                await segment.resetState()
+        ## 先読みエンコードでは再生中のセグメントとは別のセグメントに書き込むため、リセットしない
+        if self.prefetch_segments is None:
+            for segment in self.video_stream.segments:
+                if segment.encode_status != 'Pending':
+                    await segment.resetState()
 
         # 処理対象の VideoStreamSegment を取得し、エンコード中状態に設定
         current_sequence = start_sequence
-        current_segment: VideoStreamSegment = self.video_stream.segments[current_sequence]
+        current_segment: VideoStreamSegment = self.__getSegment(current_sequence)
         current_segment.encode_status = 'Encoding'
         logging.info(f'{self.video_stream.log_prefix}[Segment {current_sequence}] Starting the Encoder...')
 
@@ -553,7 +619,7 @@ class VideoEncodingTask:
 
                 # デバッグログ有効時は従来どおりエンコーダーの stderr を逐次出力する
                 if CONFIG.general.debug_encoder is True:
-                    logging.debug(f'{self.video_stream.log_prefix} [{ENCODER_TYPE}] {line}')
+                    logging.debug(lambda: f'{self.video_stream.log_prefix} [{ENCODER_TYPE}] {line}')
 
         def OnEncoderStderrObserverDone(done_task: asyncio.Task[None]) -> None:
             """
@@ -982,9 +1048,12 @@ class VideoEncodingTask:
                     os.close(tsreadex_write_pipe)
 
                 # FFmpeg
-                if ENCODER_TYPE == 'FFmpeg':
+                if ENCODER_TYPE == 'FFmpeg' or self.video_stream.quality == 'original':
                     # オプションを取得
-                    encoder_options = self.buildFFmpegOptions(self.video_stream.quality, output_ts_offset)
+                    if self.video_stream.quality == 'original':
+                        encoder_options = self.buildFFmpegStreamCopyOptions(output_ts_offset)
+                    else:
+                        encoder_options = self.buildFFmpegOptions(self.video_stream.quality, output_ts_offset)
                     logging.info(f'{self.video_stream.log_prefix} FFmpeg Commands:\nffmpeg {" ".join(encoder_options)}')
 
                     # エンコーダープロセスを作成・実行
@@ -1243,7 +1312,7 @@ class VideoEncodingTask:
                                     current_sequence += 1
 
                                     # 最終セグメントの場合はループを抜ける
-                                    if current_sequence >= len(self.video_stream.segments):
+                                    if current_sequence >= self.__getEndSequence():
                                         # 最終セグメント完了時は残りのキーフレーム情報をまとめて保存する
                                         await FlushCollectedSegmentMap()
                                         logging.info(f'{self.video_stream.log_prefix} Reached the final segment.')
@@ -1252,7 +1321,7 @@ class VideoEncodingTask:
                                     # 新しいセグメント用のデータと状態を初期化
                                     ## ここで encoded_segment は空の bytearray にリセットされる
                                     logging.info(f'{self.video_stream.log_prefix}[Segment {current_sequence}] Encoding...')
-                                    current_segment = self.video_stream.segments[current_sequence]
+                                    current_segment = self.__getSegment(current_sequence)
                                     current_segment.encode_status = 'Encoding'
                                     encoded_segment = bytearray()
                                     is_split_pending = False
@@ -1298,7 +1367,7 @@ class VideoEncodingTask:
                         await asyncio.sleep(0)
 
                     # 最終セグメントの場合はループを抜ける
-                    if current_sequence >= len(self.video_stream.segments):
+                    if current_sequence >= self.__getEndSequence():
                         break
 
                 # エンコーダープロセスを終了
@@ -1608,6 +1677,35 @@ class VideoEncodingTask:
                 logging.debug(f'{self.video_stream.log_prefix} cancel() completed in {cancel_elapsed_ms:.1f}ms.')
 
 
+    def __getSegment(self, sequence: int) -> VideoStreamSegment:
+        """
+        エンコード結果を書き込む HLS セグメントを取得する
+
+        Args:
+            sequence (int): HLS セグメントのシーケンス番号
+
+        Returns:
+            VideoStreamSegment: 先読みエンコード時は先読み用のセグメント、それ以外は録画視聴セッションのセグメント
+        """
+
+        if self.prefetch_segments is not None:
+            return self.prefetch_segments[sequence]
+        return self.video_stream.segments[sequence]
+
+
+    def __getEndSequence(self) -> int:
+        """
+        エンコードを終了するセグメントのシーケンス番号 (この番号のセグメントはエンコードしない) を取得する
+
+        Returns:
+            int: 先読みエンコード時は先読み範囲の末尾の次、それ以外は録画視聴セッションのセグメント数
+        """
+
+        if self.prefetch_segments is not None:
+            return max(self.prefetch_segments.keys()) + 1
+        return len(self.video_stream.segments)
+
+
     def __registerTSReadExInputPipe(self, pipe_fd: int) -> object:
         """
         tsreadex への入力パイプの書き込み側を現在の世代として登録する
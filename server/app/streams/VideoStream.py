@@ -9,18 +9,22 @@ import math
 import time
 import uuid
 import weakref
+from collections import OrderedDict
 from collections.abc import Callable
 from dataclasses import dataclass
 from pathlib import Path
 from typing import ClassVar, Literal
 
+import anyio
+import numpy as np
 from biim.mpeg2ts import ts
 from fastapi import HTTPException, status
+from numpy.typing import NDArray
 from tortoise import transactions
 
 from app import logging
 from app.config import Config
-from app.constants import QUALITY_TYPES
+from app.constants import VIDEO_QUALITY_TYPES
 from app.models.RecordedProgram import RecordedProgram
 from app.models.RecordedVideo import RecordedVideo
 from app.schemas import KeyFrame, SegmentMapEntry
@@ -28,7 +32,9 @@ from app.streams.StreamEncodingOptions import StreamEncodingOptions
 from app.streams.VideoEncodingTask import VideoEncodingTask
 from app.streams.VideoSegmentPlanner import VideoSegmentPlanner
 from app.utils import SetTimeout
+from app.utils.DriveIOLimiter import DriveIOLimiter
 from app.utils.MP4KeyFrameParser import MP4KeyFrameParser
+from app.utils.PrioritySemaphore import PrioritySemaphore
 from app.utils.TSKeyFrameSeeker import TSKeyFrameSeeker, TSStreamInfo
 
 
@@ -98,6 +104,27 @@ class VideoStream:
     ## DB 書き込みを HLS セグメントごとに発生させず、再生済み範囲をある程度まとめて保存する
     SEGMENT_MAP_SAVE_BATCH_SIZE: ClassVar[int] = 16
 
+    # 先読みエンコードで1回にエンコードするセグメント数
+    ## シーク直後に再生を再開でき、かつ後続のセグメントを要求されるまでにエンコーダーの起動が間に合う程度の長さにする
+    PREFETCH_SEGMENT_COUNT: ClassVar[int] = 3
+
+    # 録画視聴セッションごとに保持する先読みエンコード結果の最大数 (先読み範囲単位)
+    PREFETCH_MAX_CACHED_RANGES: ClassVar[int] = 4
+
+    # 先読みエンコードを開始するのに必要な、再生位置より先のエンコード済みセグメント数
+    ## 再生中のエンコードに余裕があるときだけ先読みエンコードを行い、再生中のエンコードの妨げにならないようにする
+    PREFETCH_MIN_BUFFERED_SEGMENTS: ClassVar[int] = 5
+
+    # 先読みの対象にする、再生位置から CM 区間の境界までの最大距離 (秒)
+    PREFETCH_LOOKAHEAD_SECONDS: ClassVar[int] = 10 * 60  # 10 分
+
+    # 先読みの対象にする、再生位置からのスキップ量 (秒)
+    ## クライアントのスキップ操作のうち、再生中のエンコードのバッファを超えやすいものを対象にする
+    PREFETCH_SKIP_SECONDS: ClassVar[tuple[int, ...]] = (30, 60)
+
+    # サーバー全体で同時に実行する先読みエンコードの最大数
+    PREFETCH_MAX_CONCURRENT_TASKS: ClassVar[int] = 1
+
     # 録画視聴セッションのインスタンスが入る、セッション ID をキーとした辞書
     # この辞書に録画視聴セッションに関する全てのデータが格納されている
     __instances: ClassVar[dict[str, VideoStream]] = {}
@@ -107,13 +134,17 @@ class VideoStream:
     ## ロックを使い終えた録画 ID は自動的に辞書から消し、長期稼働時に録画 ID 分だけ残り続ける状態を避ける
     __segment_map_save_locks: ClassVar[weakref.WeakValueDictionary[int, asyncio.Lock]] = weakref.WeakValueDictionary()
 
+    # 先読みエンコードを実行中の録画視聴セッションのセッション ID
+    ## 先読みエンコードはあくまで補助的な処理なので、サーバー全体で PREFETCH_MAX_CONCURRENT_TASKS 個までしか同時に実行しない
+    __prefetching_session_ids: ClassVar[set[str]] = set()
+
 
     # 必ずセッション ID ごとに1つのインスタンスになるように (Singleton)
     def __new__(
         cls,
         session_id: str,
         recorded_program: RecordedProgram,
-        quality: QUALITY_TYPES,
+        quality: VIDEO_QUALITY_TYPES,
         encoding_options: StreamEncodingOptions | None = None,
         is_new_session_allowed: bool = False,
     ) -> VideoStream:
@@ -168,7 +199,8 @@ class VideoStream:
             instance._ts_stream_info = None
             instance._ts_source_base_dts = None
             instance._mp4_keyframe_dts_list = None
-            instance._source_position_lock = asyncio.Lock()
+            ## 先読みエンコードのための解決は、再生中のエンコードのための解決より後回しにする (優先度 Low で待機する)
+            instance._source_position_lock = PrioritySemaphore()
 
             # 現在実行中の VideoEncodingTask のインスタンス
             ## 録画再生時は、シークによりエンコーダーの再起動が必要になる度に、新しい VideoEncodingTask を都度作り直す
@@ -184,9 +216,22 @@ class VideoStream:
             # イベントループ上の Task は弱参照で管理されるため、自然終了するまでここで強参照を保持する
             instance._detached_video_encoding_task_refs = set()
 
+            # 先読みエンコード用の VideoEncodingTask のインスタンスと、そのタスクへの参照
+            ## 先読みエンコードはシーク先として予測した位置の数セグメントだけを、再生中のセグメントとは別のセグメントにエンコードする
+            instance._prefetch_encoding_task = None
+            instance._prefetch_encoding_task_ref = None
+            # 先読みエンコードの開始セグメントのシーケンス番号をキーとした、先読みエンコード用のセグメントの LRU キャッシュ
+            ## シーク先のセグメントが先読み済みであれば、エンコーダーを起動せずにそのまま再生中のセグメントとして採用する
+            instance._prefetched_segment_ranges = OrderedDict()
+
             # destroy() の開始後に待機中のセグメント要求や生存期限更新がセッションを再始動しないよう、破棄済みかどうかを共有する
             instance._is_destroyed = False
 
+            # 録画ファイルのある HDD に、視聴セッションが破棄されるまでフォアグラウンドの読み込みとして登録する
+            ## FeedTSStream() による入力 TS の読み込みやシーク時のキーフレーム探索は再生を直接止めるため、
+            ## 登録中は同じ HDD 上のサムネイル生成やハッシュ計算などのバックグラウンド解析が AnalysisWorkerPool 側で間欠実行に絞られる
+            instance._foreground_drive_id = DriveIOLimiter.acquireForeground(anyio.Path(recorded_program.recorded_video.file_path))
+
             # キャンセルされない限り SESSION_TIMEOUT 秒後にインスタンスを破棄するタイマー
             # cancel_destroy_timer() を呼び出すことでタイマーをキャンセルできる
             instance._cancel_destroy_timer = SetTimeout(lambda: asyncio.create_task(instance.destroy()), cls.SESSION_TIMEOUT)
@@ -235,7 +280,7 @@ class VideoStream:
         self,
         session_id: str,
         recorded_program: RecordedProgram,
-        quality: QUALITY_TYPES,
+        quality: VIDEO_QUALITY_TYPES,
         encoding_options: StreamEncodingOptions | None = None,
         is_new_session_allowed: bool = False,
     ) -> None:
@@ -245,7 +290,7 @@ class VideoStream:
         Args:
             session_id (str): セッション ID
             recorded_program (RecordedProgram): 録画番組の情報
-            quality (QUALITY_TYPES): 映像の品質 (1080p-60fps ~ 240p)
+            quality (VIDEO_QUALITY_TYPES): 映像の品質 (1080p-60fps ~ 240p, original)
             encoding_options (StreamEncodingOptions | None): ベース画質に追加するエンコードオプション
             is_new_session_allowed (bool): セッションが存在しない場合に新規作成を許可するかどうか
         """
@@ -254,19 +299,24 @@ class VideoStream:
         # Singleton のためインスタンスの生成は __new__() で行うが、__init__() も定義しておかないと補完がうまく効かない
         self.session_id: str
         self.recorded_program: RecordedProgram
-        self.quality: QUALITY_TYPES
+        self.quality: VIDEO_QUALITY_TYPES
         self.encoding_options: StreamEncodingOptions
         self._segment_duration_seconds: float
         self._segments: list[VideoStreamSegment]
         self._segment_map_by_sequence: dict[int, SegmentMapEntry]
         self._ts_stream_info: TSStreamInfo | None
         self._ts_source_base_dts: int | None
-        self._mp4_keyframe_dts_list: list[int] | None
-        self._source_position_lock: asyncio.Lock
+        self._mp4_keyframe_dts_list: NDArray[np.int64] | None
+        self._source_position_lock: PrioritySemaphore
         self._video_encoding_task: VideoEncodingTask
         self._video_encoding_task_lock: asyncio.Lock
         self._video_encoding_task_ref: asyncio.Task[None] | None
         self._detached_video_encoding_task_refs: set[asyncio.Task[None]]
+        self._prefetch_encoding_task: VideoEncodingTask | None
+        self._prefetch_encoding_task_ref: asyncio.Task[None] | None
+        self._prefetched_segment_ranges: OrderedDict[int, dict[int, VideoStreamSegment]]
+        self._is_destroyed: bool
+        self._foreground_drive_id: str
         self._cancel_destroy_timer: Callable[[], None]
 
 
@@ -321,7 +371,7 @@ class VideoStream:
         if recorded_video.container_format != 'MPEG-TS':
             return
 
-        async with self._source_position_lock:
+        async with self._source_position_lock.hold('High'):
             file_path = Path(recorded_video.file_path)
 
             # segment_map キャッシュから再生を開始した場合、ソース位置は即時解決できても PID 情報が未取得のままになる
@@ -330,6 +380,7 @@ class VideoStream:
                 self._ts_stream_info = await asyncio.to_thread(
                     TSKeyFrameSeeker.findStreamInfo,
                     file_path,
+                    file_hash = recorded_video.file_hash,
                 )
 
             # segment_map をプレイリスト時刻へ対応させるには、録画先頭の DTS が基準として必要になる
@@ -339,6 +390,7 @@ class VideoStream:
                     TSKeyFrameSeeker.findBaseDTS,
                     file_path,
                     self._ts_stream_info,
+                    file_hash = recorded_video.file_hash,
                 )
 
 
@@ -477,12 +529,13 @@ class VideoStream:
         return virtual_playlist
 
 
-    async def resolveSegmentSourcePosition(self, segment_sequence: int) -> None:
+    async def resolveSegmentSourcePosition(self, segment_sequence: int, priority: Literal['High', 'Low'] = 'High') -> None:
         """
         指定セグメントをエンコード開始点として使えるよう、入力ソース側の位置と DTS を解決する
 
         Args:
             segment_sequence (int): 解決対象セグメントのシーケンス番号
+            priority (Literal['High', 'Low']): 他の解決の完了を待つ際の優先度 (先読みエンコードのための解決は Low)
         """
 
         resolve_start_time = time.perf_counter()
@@ -490,22 +543,22 @@ class VideoStream:
 
         # 既に解決済みなら、エンコードタスク側でそのまま利用できる
         if segment.source_start_dts is not None:
-            logging.debug(
+            logging.debug(lambda: (
                 f'{self.log_prefix}[Segment {segment_sequence}] '
                 f'Segment source position already resolved. '
                 f'[elapsed: {(time.perf_counter() - resolve_start_time) * 1000:.1f}ms]'
-            )
+            ))
             return
 
-        async with self._source_position_lock:
+        async with self._source_position_lock.hold(priority):
             # 多重リクエストでロック待ちの間に別リクエストが解決している可能性がある
             segment = self._segments[segment_sequence]
             if segment.source_start_dts is not None:
-                logging.debug(
+                logging.debug(lambda: (
                     f'{self.log_prefix}[Segment {segment_sequence}] '
                     f'Segment source position resolved while waiting for lock. '
                     f'[elapsed: {(time.perf_counter() - resolve_start_time) * 1000:.1f}ms]'
-                )
+                ))
                 return
 
             recorded_video = self.recorded_program.recorded_video
@@ -517,11 +570,11 @@ class VideoStream:
                 if segment_map_entry is not None:
                     segment.source_file_position = segment_map_entry['source_file_position']
                     segment.source_start_dts = segment_map_entry['source_start_dts']
-                    logging.debug(
+                    logging.debug(lambda: (
                         f'{self.log_prefix}[Segment {segment_sequence}] '
                         f'Segment source position resolved from segment_map. '
                         f'[elapsed: {(time.perf_counter() - resolve_start_time) * 1000:.1f}ms]'
-                    )
+                    ))
                     return
 
                 # PAT/PMT と先頭 DTS は同一視聴セッション内で変わらないため、最初の探索時だけ読む
@@ -529,12 +582,14 @@ class VideoStream:
                     self._ts_stream_info = await asyncio.to_thread(
                         TSKeyFrameSeeker.findStreamInfo,
                         file_path,
+                        file_hash = recorded_video.file_hash,
                     )
                 if self._ts_source_base_dts is None:
                     self._ts_source_base_dts = await asyncio.to_thread(
                         TSKeyFrameSeeker.findBaseDTS,
                         file_path,
                         self._ts_stream_info,
+                        file_hash = recorded_video.file_hash,
                     )
 
                 source_position = await asyncio.to_thread(
@@ -544,6 +599,8 @@ class VideoStream:
                     segment.playlist_start_seconds,
                     self._ts_source_base_dts,
                     round(self._segment_duration_seconds * ts.HZ),
+                    file_hash = recorded_video.file_hash,
+                    duration_seconds = recorded_video.duration,
                 )
                 segment.source_file_position = source_position.source_file_position
                 segment.source_start_dts = source_position.source_start_dts
@@ -565,10 +622,12 @@ class VideoStream:
                 return
 
             # MP4 は moov 内テーブルから同期サンプル DTS を短時間で復元できるため、DB キャッシュを作らない
+            ## 復元した DTS 一覧は録画ファイルのハッシュごとにプロセス全体でキャッシュされ、他のセッションや画質切り替えでも使い回される
             if self._mp4_keyframe_dts_list is None:
                 self._mp4_keyframe_dts_list = await asyncio.to_thread(
                     MP4KeyFrameParser.readVideoKeyFrameDTS,
                     file_path,
+                    file_hash = recorded_video.file_hash,
                 )
             source_start_dts = MP4KeyFrameParser.findKeyFrameDTSBefore(
                 self._mp4_keyframe_dts_list,
@@ -576,11 +635,11 @@ class VideoStream:
             )
             segment.source_file_position = None
             segment.source_start_dts = source_start_dts
-            logging.debug(
+            logging.debug(lambda: (
                 f'{self.log_prefix}[Segment {segment_sequence}] '
                 f'Segment source position resolved from MP4 keyframe table. '
                 f'[elapsed: {(time.perf_counter() - resolve_start_time) * 1000:.1f}ms]'
-            )
+            ))
 
 
     def createSegmentMapEntriesFromKeyFrames(self, key_frames: list[KeyFrame]) -> list[SegmentMapEntry]:
@@ -785,6 +844,19 @@ class VideoStream:
                     return None
 
                 # ロック待ちの間に他のリクエストがすでにエンコードを開始している可能性があるため再確認する
+                if segment.encode_status == 'Pending':
+                    # 再生中のエンコードのためにエンコーダーを再起動する場合、実行中の先読みエンコードは即座に中断する
+                    ## 完了済みの先読みセグメントは中断後も残るため、シーク先が先読み済みであれば下記で採用できる
+                    self.__cancelPrefetchEncodingTask()
+
+                    # シーク先のセグメントが先読み済みなら、エンコーダーを起動せずにそのまま採用する
+                    ## 先読み済みの範囲を超えたセグメントが要求された時点で、改めてそのセグメントからエンコードタスクを開始する
+                    if self.__adoptPrefetchedSegments(segment_sequence) is True:
+                        if self._video_encoding_task_ref is not None:
+                            await self.__cancelVideoEncodingTask(should_wait_for_runner = False)
+                            logging.info(f'{self.log_prefix}[Segment {segment_sequence}] Previous Encoding Task Canceled.')
+
+                # 先読み済みのセグメントを採用しなかった場合は、このセグメントから新しくエンコードタスクを開始する
                 if segment.encode_status == 'Pending':
                     # シークでは旧エンコーダーが同じ録画ファイルを読み続けていると、未キャッシュ区間の探索と I/O が競合する
                     ## そのため source position 解決より前に旧タスクへキャンセルを投げ、探索が録画ファイルを読みやすい状態へ寄せる
@@ -856,9 +928,242 @@ class VideoStream:
             await oldest_segment.resetState()
             logging.info(f'{self.log_prefix}[Segment {oldest_segment.sequence_index}] Reset segment data to free memory.')
 
+        # 再生中のエンコードに余裕があれば、次にシークされそうな位置の先読みエンコードを開始する
+        self.__startPrefetchEncodingTask(segment_sequence)
+
         return encoded_segment_ts
 
 
+    def __findPrefetchStartSequence(self, current_sequence: int) -> int | None:
+        """
+        次にシークされそうな位置のうち、まだエンコードされていない位置のセグメントのシーケンス番号を探す
+        シーク先の候補は、再生位置より後ろの CM 区間の境界 (プレイヤー上では「CM」「本編」マーカーとして表示される) を近い順に、
+        続いてクライアントのスキップ操作でのスキップ先とする
+
+        Args:
+            current_sequence (int): 再生中のセグメントのシーケンス番号
+
+        Returns:
+            int | None: 先読みエンコードを開始するセグメントのシーケンス番号 (先読みする位置がない場合は None)
+        """
+
+        current_seconds = self._segments[current_sequence].playlist_start_seconds
+
+        # シーク先の候補となる再生時刻 (秒) を優先度順に列挙する
+        candidate_seconds_list: list[float] = []
+        cm_sections = self.recorded_program.recorded_video.cm_sections or []
+        candidate_seconds_list.extend(sorted(
+            boundary_seconds
+            for cm_section in cm_sections
+            for boundary_seconds in (cm_section['start_time'], cm_section['end_time'])
+            if current_seconds < boundary_seconds <= current_seconds + self.PREFETCH_LOOKAHEAD_SECONDS
+        ))
+        candidate_seconds_list.extend(current_seconds + skip_seconds for skip_seconds in self.PREFETCH_SKIP_SECONDS)
+
+        for candidate_seconds in candidate_seconds_list:
+            # 仮想プレイリストのセグメントは等間隔なので、再生時刻から直接シーケンス番号を求められる
+            candidate_sequence = int(candidate_seconds // self._segment_duration_seconds)
+            if candidate_sequence <= current_sequence or candidate_sequence >= len(self._segments):
+                continue
+            # 再生中のエンコードで既にエンコードされている (されつつある) 位置は先読みしない
+            if self._segments[candidate_sequence].encode_status != 'Pending':
+                continue
+            # 既に先読み済み (先読み中) の位置は先読みしない
+            if any(candidate_sequence in prefetch_segments for prefetch_segments in self._prefetched_segment_ranges.values()):
+                continue
+            return candidate_sequence
+
+        return None
+
+
+    def __startPrefetchEncodingTask(self, current_sequence: int) -> None:
+        """
+        再生中のエンコードに余裕がある場合に、次にシークされそうな位置の先読みエンコードを低優先度で開始する
+        先読みエンコードは設定で有効化されている場合のみ行い、再生中のエンコードのためにエンコーダーを再起動する際には即座に中断される
+
+        Args:
+            current_sequence (int): 再生中のセグメントのシーケンス番号
+        """
+
+        # 先読みエンコードが無効な場合は何もしない
+        if Config().video.speculative_prefetch is False:
+            return
+
+        # 終了処理中のセッションや、既に先読みエンコードを実行中 (中断後の終了待ちを含む) のセッションでは開始しない
+        if self._is_destroyed is True or self._prefetch_encoding_task_ref is not None or \
+           self.session_id in self.__prefetching_session_ids:
+            return
+
+        # サーバー全体で同時に実行できる先読みエンコードの数に達している場合は開始しない
+        if len(self.__prefetching_session_ids) >= self.PREFETCH_MAX_CONCURRENT_TASKS:
+            return
+
+        # 再生位置より先のセグメントが十分にエンコード済みでない場合は、再生中のエンコードを優先するため開始しない
+        buffered_segments = self._segments[current_sequence + 1:current_sequence + 1 + self.PREFETCH_MIN_BUFFERED_SEGMENTS]
+        if len(buffered_segments) < self.PREFETCH_MIN_BUFFERED_SEGMENTS or \
+           any(s.encode_status != 'Completed' for s in buffered_segments):
+            return
+
+        # 再生位置より前の先読み範囲はもう使われないため破棄する
+        for start_sequence in [s for s in self._prefetched_segment_ranges if s <= current_sequence]:
+            self._prefetched_segment_ranges.pop(start_sequence)
+
+        # 先読みする位置を決める
+        start_sequence = self.__findPrefetchStartSequence(current_sequence)
+        if start_sequence is None:
+            return
+        end_sequence = min(start_sequence + self.PREFETCH_SEGMENT_COUNT, len(self._segments))
+
+        # 先読みエンコードタスクを開始する
+        self.__prefetching_session_ids.add(self.session_id)
+        self._prefetch_encoding_task_ref = asyncio.create_task(self.__runPrefetchEncodingTask(start_sequence, end_sequence))
+        self.__registerVideoEncodingTaskRef(self._prefetch_encoding_task_ref)
+        def OnPrefetchEncodingTaskDone(done_task: asyncio.Task[None]) -> None:
+            self.__prefetching_session_ids.discard(self.session_id)
+            if self._prefetch_encoding_task_ref == done_task:
+                self._prefetch_encoding_task_ref = None
+                self._prefetch_encoding_task = None
+        self._prefetch_encoding_task_ref.add_done_callback(OnPrefetchEncodingTaskDone)
+
+
+    async def __runPrefetchEncodingTask(self, start_sequence: int, end_sequence: int) -> None:
+        """
+        指定された範囲のセグメントを、再生中のセグメントとは別の先読み用のセグメントにエンコードする
+
+        Args:
+            start_sequence (int): 先読みエンコードを開始するセグメントのシーケンス番号
+            end_sequence (int): 先読みエンコードを終了するセグメントのシーケンス番号 (このセグメントはエンコードしない)
+        """
+
+        prefetch_segments: dict[int, VideoStreamSegment] = {}
+        try:
+            # 再生中のエンコードのためのソース位置の解決が実行中なら、その探索と録画ファイルの I/O を奪い合わないよう先読みしない
+            if self._source_position_lock.locked() is True:
+                return
+
+            # 先読みエンコードを開始する入力ソース上の位置を確定する
+            ## ここで解決したソース位置は segment_map としても保存されるため、先読みを使わないシークも速くなる
+            ## 再生中のエンコードのための解決より後回しになるよう優先度 Low で待機し、シーク時には解決中でも __cancelPrefetchEncodingTask() で中断される
+            await self.resolveSegmentSourcePosition(start_sequence, priority='Low')
+
+            # ソース位置の解決中に先読みエンコードが中断された場合や、再生中のエンコードが先に到達した場合は何もしない
+            if self._is_destroyed is True or self._prefetch_encoding_task_ref is not asyncio.current_task():
+                return
+            start_segment = self._segments[start_sequence]
+            if start_segment.encode_status != 'Pending':
+                return
+            assert start_segment.source_start_dts is not None
+
+            # QSVEncC では DTS ラップ直前から起動すると音ズレするため、getSegment() と同様に少し手前から起動する必要がある
+            ## 先読みでは手前から起動すると先読みの意味が薄れるため、該当する位置は先読みしない
+            if (
+                Config().general.encoder == 'QSVEncC' and
+                self.quality != 'original' and
+                self.recorded_program.recorded_video.container_format == 'MPEG-TS' and
+                self.recorded_program.recorded_video.has_video_stream_changes is False
+            ):
+                distance_to_wrap = ts.PCR_CYCLE - (start_segment.source_start_dts % ts.PCR_CYCLE)
+                if distance_to_wrap <= self.DTS_WRAP_AVOIDANCE_SECONDS * ts.HZ:
+                    return
+
+            # 再生中のセグメントの状態を変更しないよう、先読み用のセグメントを別に作成する
+            loop = asyncio.get_running_loop()
+            for sequence in range(start_sequence, end_sequence):
+                segment = self._segments[sequence]
+                prefetch_segments[sequence] = VideoStreamSegment(
+                    sequence_index = sequence,
+                    playlist_start_seconds = segment.playlist_start_seconds,
+                    source_file_position = segment.source_file_position,
+                    source_start_dts = segment.source_start_dts,
+                    duration_seconds = segment.duration_seconds,
+                    encode_status = 'Pending',
+                    encoded_segment_ts_future = loop.create_future(),
+                )
+
+            # 中断された場合でもエンコード済みのセグメントは採用できるよう、エンコード開始前にキャッシュへ登録しておく
+            self._prefetched_segment_ranges[start_sequence] = prefetch_segments
+            while len(self._prefetched_segment_ranges) > self.PREFETCH_MAX_CACHED_RANGES:
+                self._prefetched_segment_ranges.popitem(last=False)
+
+            # 先読みエンコードを実行する
+            self._prefetch_encoding_task = VideoEncodingTask(self, prefetch_segments)
+            logging.info(f'{self.log_prefix}[Segment {start_sequence}] Prefetch Encoding Task Started. [end_sequence: {end_sequence}]')
+            await self._prefetch_encoding_task.run(start_sequence)
+
+        except Exception as ex:
+            logging.warning(f'{self.log_prefix}[Segment {start_sequence}] Prefetch encoding task failed:', exc_info=ex)
+
+        finally:
+            # 1セグメントもエンコードできなかった先読み範囲は使えないため破棄する
+            if len(prefetch_segments) > 0 and \
+               all(s.encode_status != 'Completed' for s in prefetch_segments.values()) and \
+               self._prefetched_segment_ranges.get(start_sequence) is prefetch_segments:
+                self._prefetched_segment_ranges.pop(start_sequence)
+
+
+    def __cancelPrefetchEncodingTask(self) -> None:
+        """
+        実行中の先読みエンコードを中断する
+        外部プロセスは VideoEncodingTask.cancel() で即座に停止させ、タスク自体は自然終了に任せる
+        エンコーダーの起動前 (ソース位置の解決中) の場合はタスク自体をキャンセルし、再生中のエンコードのための解決をロック待ちさせない
+        """
+
+        if self._prefetch_encoding_task_ref is None:
+            return
+
+        if self._prefetch_encoding_task is not None:
+            self._prefetch_encoding_task.cancel()
+            logging.info(f'{self.log_prefix} Prefetch Encoding Task Canceled.')
+        else:
+            self._prefetch_encoding_task_ref.cancel()
+            logging.info(f'{self.log_prefix} Prefetch Encoding Task Canceled during source position resolution.')
+
+        # 終了待機はせず、強参照だけ detached set に移して自然終了に任せる
+        self.__detachVideoEncodingTaskRef(self._prefetch_encoding_task_ref)
+        self._prefetch_encoding_task_ref = None
+        self._prefetch_encoding_task = None
+
+
+    def __adoptPrefetchedSegments(self, segment_sequence: int) -> bool:
+        """
+        指定されたセグメントから始まる先読み済みのセグメントを、再生中のセグメントとして採用する
+
+        Args:
+            segment_sequence (int): シーク先のセグメントのシーケンス番号
+
+        Returns:
+            bool: 指定されたセグメントを先読み済みのセグメントから採用できたかどうか
+        """
+
+        for start_sequence, prefetch_segments in self._prefetched_segment_ranges.items():
+            if segment_sequence not in prefetch_segments:
+                continue
+
+            # シーク先から連続してエンコード済みの先読みセグメントだけを採用する
+            adopted_count = 0
+            for sequence in range(segment_sequence, max(prefetch_segments.keys()) + 1):
+                prefetch_segment = prefetch_segments[sequence]
+                segment = self._segments[sequence]
+                if prefetch_segment.encode_status != 'Completed' or segment.encode_status != 'Pending':
+                    break
+                if not segment.encoded_segment_ts_future.done():
+                    segment.encoded_segment_ts_future.set_result(prefetch_segment.encoded_segment_ts_future.result())
+                segment.encode_status = 'Completed'
+                adopted_count += 1
+
+            # 採用した (あるいは採用できなかった) 先読み範囲は、以降使わないので破棄する
+            self._prefetched_segment_ranges.pop(start_sequence)
+            if adopted_count > 0:
+                logging.info(
+                    f'{self.log_prefix}[Segment {segment_sequence}] '
+                    f'Adopted {adopted_count} prefetched segment(s) without restarting the encoder.'
+                )
+                return True
+            return False
+
+        return False
+
+
     async def __cancelVideoEncodingTask(
         self,
         should_wait_for_runner: bool = True,
@@ -924,6 +1229,9 @@ class VideoStream:
         self._is_destroyed = True
         self._cancel_destroy_timer()
 
+        # フォアグラウンドの読み込みの登録を解除し、同じ HDD 上のバックグラウンド解析を通常の速度に戻す
+        DriveIOLimiter.releaseForeground(self._foreground_drive_id)
+
         # 明示的な終了処理と生存期限タイマーが競合しても、新しく作られた同名セッションや登録解除済みセッションへ触れない
         async with self._video_encoding_task_lock:
             if self.__instances.get(self.session_id) is not self:
@@ -931,7 +1239,9 @@ class VideoStream:
 
             # 起動中のエンコードタスクがあればキャンセルする
             # この時点ですでにエンコードを完了して終了している場合もある
+            self.__cancelPrefetchEncodingTask()
             await self.__cancelVideoEncodingTask()
+            self._prefetched_segment_ranges.clear()
 
             # すべての HLS セグメントと、アクティブな間保持されていたインスタンスを削除する
             ## 今後同じセッション ID が指定された場合は新たに別のインスタンスが生成される
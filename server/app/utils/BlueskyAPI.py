@@ -32,6 +32,7 @@ from typing_extensions import TypedDict
 from app import logging, schemas
 from app.constants import JST
 from app.models.BlueskyAccount import BlueskyAccount
+from app.utils.UploadImageConverter import UploadImageConverter
 
 
 _RetriableResultT = TypeVar('_RetriableResultT')
@@ -533,47 +534,6 @@ class BlueskyAPI:
             models.AppBskyEmbedImages.Image: Bluesky の画像 embed 要素
         """
 
-        def ConvertLargeImageToWebP(image_bytes: bytes) -> bytes:
-            """
-            2MB を超える画像を WebP に変換し、必要に応じて長辺を縮小する
-
-            Args:
-                image_bytes (bytes): 変換前の画像データ
-
-            Returns:
-                bytes: Bluesky にアップロード可能な WebP 画像データ
-            """
-
-            with Image.open(io.BytesIO(image_bytes)) as image:
-                # アルファチャンネル付き画像も WebP に保存できるよう RGBA に寄せる
-                if image.mode not in ('RGB', 'RGBA'):
-                    image = image.convert('RGBA')
-
-                # 1 ループ目は元解像度のまま quality だけ 85 → 50 と段階的に下げて 2MB 以下を狙う
-                # それでも収まらない場合は長辺を 1920 → 1600 → 1280 → 1024 → 800 と段階的に縮めて再試行する
-                # 画質より解像度の維持を優先するための順序
-                original_image = image.copy()
-                original_long_edge = max(original_image.width, original_image.height)
-                for max_long_edge in [original_long_edge, 1920, 1600, 1280, 1024, 800]:
-                    working_image = original_image
-                    current_long_edge = max(working_image.width, working_image.height)
-                    # 現在の試行サイズより大きい画像だけを縮小し、小さい画像を拡大して画質を落とさない
-                    if current_long_edge > max_long_edge:
-                        resize_ratio = max_long_edge / current_long_edge
-                        resized_width = max(1, int(working_image.width * resize_ratio))
-                        resized_height = max(1, int(working_image.height * resize_ratio))
-                        working_image = working_image.resize((resized_width, resized_height), Image.Resampling.LANCZOS)
-
-                    for quality in [85, 80, 70, 60, 50]:
-                        output_buffer = io.BytesIO()
-                        working_image.save(output_buffer, format='WEBP', quality=quality, method=6)
-                        converted_bytes = output_buffer.getvalue()
-                        # 2MB 以下になった最初の組み合わせを採用し、必要以上の画質低下や縮小を避ける
-                        if len(converted_bytes) <= self.MAX_IMAGE_BYTES:
-                            return converted_bytes
-
-            raise ValueError('Image size exceeds the Bluesky limit after WebP conversion.')
-
         def GetImageSize(image_bytes: bytes) -> tuple[int, int]:
             """
             画像データから Bluesky の表示比率に使う幅と高さを取得する
@@ -591,8 +551,9 @@ class BlueskyAPI:
         # UploadFile は非同期に読み出し、サイズだけで分かる変換要否は Pillow を呼ぶ前に判定する
         image_bytes = await image.read()
         # Bluesky の blob 上限を超える場合だけ WebP 変換を試し、通常のキャプチャは元の JPEG をそのままアップロードする
+        ## 変換時は上限に収まる範囲でなるべく高い quality・解像度を維持した WebP に変換する
         if len(image_bytes) > self.MAX_IMAGE_BYTES:
-            image_bytes = await asyncio.to_thread(ConvertLargeImageToWebP, image_bytes)
+            image_bytes = await UploadImageConverter.convertToWebPWithinSize(image_bytes, self.MAX_IMAGE_BYTES)
 
         if len(image_bytes) > self.MAX_IMAGE_BYTES:
             raise ValueError('Image size exceeds the Bluesky limit.')
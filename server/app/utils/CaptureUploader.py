@@ -0,0 +1,247 @@
+
+from __future__ import annotations
+
+import asyncio
+import errno
+import os
+import shutil
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import IO, ClassVar
+
+
+class CaptureUploader:
+    """
+    クライアントからアップロードされたキャプチャ画像を、保存先フォルダに保存するクラス
+    ライブ視聴中に複数のクライアントから立て続けにキャプチャがアップロードされても互いに待たされないよう、
+    保存先フォルダの空き容量とファイル名の採番状況をメモリ上に保持し、ファイル I/O はまとめてワーカースレッドで行う
+    """
+
+    # 保存先フォルダの空き容量がこの値未満なら、最後のフォルダでない限り次の保存先フォルダを探す
+    MIN_FREE_SPACE_BYTES: ClassVar[int] = 10 * 1024 * 1024
+    # 保存先フォルダの空き容量 (と存在するかどうか) のキャッシュの有効期間 (秒)
+    ## 有効期間内は、前回取得した空き容量から保存したキャプチャのサイズを差し引いた値を空き容量の見積もりとして使う
+    FREE_SPACE_CACHE_TTL: ClassVar[float] = 30.0
+    # 一時ファイルへの書き込み単位 (バイト)
+    WRITE_CHUNK_SIZE: ClassVar[int] = 1024 * 1024
+    # 次に試す連番を保持するファイルパスの数の上限
+    ## キャプチャのファイル名は撮影日時を含みほとんどが重複しないため、上限を超えたら最も長く使われていないものから破棄する
+    MAX_SEQUENCE_NUMBER_ENTRIES: ClassVar[int] = 1000
+
+    # 保存先フォルダごとの (空き容量を取得した時刻, 空き容量の見積もり) のキャッシュ
+    ## フォルダが存在しない場合、空き容量は None になる
+    _free_space_cache: ClassVar[dict[Path, tuple[float, int | None]]] = {}
+
+    # 保存するファイルパスごとの、次に試す連番 (0 は連番を付けないファイル名を表す) の LRU キャッシュ
+    ## 同名のキャプチャが続けてアップロードされた場合に、既存のファイルを先頭の連番から1つずつ確認し直さずに済むようにする
+    ## 破棄されたファイルパスに同名のキャプチャがアップロードされた場合は、先頭の連番から確認し直すだけで済む
+    _next_sequence_numbers: ClassVar[OrderedDict[Path, int]] = OrderedDict()
+
+    # 保存中のキャプチャのために確保したファイルパス
+    ## 同名のキャプチャが同時にアップロードされた場合に、同じファイルパスを割り当てないようにする
+    _reserved_paths: ClassVar[set[Path]] = set()
+
+
+    @classmethod
+    async def selectUploadFolder(cls, upload_folders: list[Path]) -> Path | None:
+        """
+        先頭から順に、存在していて空き容量に余裕がある保存先フォルダを選ぶ
+        最後の保存先フォルダは、空き容量が MIN_FREE_SPACE_BYTES 未満でも存在していれば選ぶ
+
+        Args:
+            upload_folders (list[Path]): 保存先フォルダのリスト (優先度順)
+
+        Returns:
+            Path | None: 選ばれた保存先フォルダ (どのフォルダも存在しない場合は None)
+        """
+
+        for index, upload_folder in enumerate(upload_folders):
+            free_space = await cls.__getFreeSpace(upload_folder)
+            # 万が一保存先フォルダが存在しない場合は次の保存先フォルダを探す
+            if free_space is None:
+                continue
+            # 保存先フォルダの空き容量が足りないなら、最後のフォルダでなければ次の保存先フォルダを探す
+            if free_space < cls.MIN_FREE_SPACE_BYTES and index < len(upload_folders) - 1:
+                continue
+            return upload_folder
+
+        return None
+
+
+    @classmethod
+    async def save(cls, upload_folder: Path, filename: Path, file: IO[bytes]) -> Path:
+        """
+        キャプチャ画像を保存先フォルダに保存する
+        まず保存先フォルダ内の一時ファイルに書き込んでディスクへの書き込み完了 (fsync) を待ち、その後重複しないファイル名にアトミックに移動する
+        既存のファイルは上書きせず、同名のファイルがある場合は "{stem}-{連番}{suffix}" にリネームして保存する
+
+        Args:
+            upload_folder (Path): 保存先フォルダ
+            filename (Path): 保存するファイル名 (ディレクトリトラバーサルのチェック済みであること)
+            file (IO[bytes]): 保存するキャプチャ画像のファイルオブジェクト (先頭にシークされていること)
+
+        Returns:
+            Path: 保存したファイルのパス
+
+        Raises:
+            OSError: 書き込みに失敗した場合
+        """
+
+        temp_path = upload_folder / f'.{filename.stem}.{uuid.uuid4().hex}.tmp'
+        try:
+            # 一時ファイルへの書き込みと fsync はワーカースレッドでまとめて行う
+            written_bytes = await asyncio.to_thread(cls.__writeTempFile, file, temp_path)
+
+            # 重複しないファイルパスを割り当てて移動する
+            ## 採番後に他のプロセスなどから同名のファイルが作成されていた場合は、次の連番で再試行する
+            while True:
+                filepath = cls.__reservePath(upload_folder / filename)
+                try:
+                    await asyncio.to_thread(cls.__moveWithoutOverwrite, temp_path, filepath)
+                    break
+                except FileExistsError:
+                    continue
+                finally:
+                    cls._reserved_paths.discard(filepath)
+
+        except BaseException as ex:
+            # 書き込みや移動に失敗した場合は一時ファイルを削除する
+            await asyncio.to_thread(temp_path.unlink, missing_ok=True)
+            # 空き容量が足りずに失敗した場合は、空き容量の見積もりが実際より多くなっているため破棄する
+            ## 次回の selectUploadFolder() で空き容量を取得し直し、空き容量に余裕のある次の保存先フォルダを選べるようにする
+            if isinstance(ex, OSError) and (ex.errno == errno.ENOSPC or getattr(ex, 'winerror', None) == 112):
+                cls._free_space_cache.pop(upload_folder, None)
+            raise
+
+        # 空き容量の見積もりから保存したキャプチャのサイズを差し引く
+        cached = cls._free_space_cache.get(upload_folder)
+        if cached is not None and cached[1] is not None:
+            cls._free_space_cache[upload_folder] = (cached[0], cached[1] - written_bytes)
+
+        return filepath
+
+
+    @classmethod
+    async def __getFreeSpace(cls, upload_folder: Path) -> int | None:
+        """
+        保存先フォルダの空き容量を取得する
+        FREE_SPACE_CACHE_TTL 秒以内に取得済みの場合は、キャッシュされた見積もりを返す
+
+        Args:
+            upload_folder (Path): 保存先フォルダ
+
+        Returns:
+            int | None: 空き容量 (バイト) (フォルダが存在しない場合は None)
+        """
+
+        cached = cls._free_space_cache.get(upload_folder)
+        if cached is not None and time.monotonic() - cached[0] < cls.FREE_SPACE_CACHE_TTL:
+            return cached[1]
+
+        def GetFreeSpace() -> int | None:
+            if not upload_folder.is_dir():
+                return None
+            return shutil.disk_usage(upload_folder).free
+
+        free_space = await asyncio.to_thread(GetFreeSpace)
+        cls._free_space_cache[upload_folder] = (time.monotonic(), free_space)
+        return free_space
+
+
+    @classmethod
+    def __reservePath(cls, base_path: Path) -> Path:
+        """
+        保存するファイルパスを採番して確保する
+        前回採番した連番の続きから割り当てるため、既存のファイルの有無は確認しない (移動時に重複していれば呼び出し元で再試行する)
+
+        Args:
+            base_path (Path): 連番を付けないファイルパス
+
+        Returns:
+            Path: 確保したファイルパス
+        """
+
+        sequence_number = cls._next_sequence_numbers.get(base_path, 0)
+        while True:
+            if sequence_number == 0:
+                filepath = base_path
+            else:
+                filepath = base_path.with_name(f'{base_path.stem}-{sequence_number}{base_path.suffix}')
+            sequence_number += 1
+            if filepath not in cls._reserved_paths:
+                break
+
+        cls._next_sequence_numbers[base_path] = sequence_number
+        cls._next_sequence_numbers.move_to_end(base_path)
+        while len(cls._next_sequence_numbers) > cls.MAX_SEQUENCE_NUMBER_ENTRIES:
+            cls._next_sequence_numbers.popitem(last=False)
+        cls._reserved_paths.add(filepath)
+        return filepath
+
+
+    @classmethod
+    def __writeTempFile(cls, file: IO[bytes], temp_path: Path) -> int:
+        """
+        ファイルオブジェクトの内容を一時ファイルに書き込み、ディスクへの書き込みが完了するまで待つ (ワーカースレッドで実行される)
+
+        Args:
+            file (IO[bytes]): 書き込むファイルオブジェクト
+            temp_path (Path): 一時ファイルのパス
+
+        Returns:
+            int: 書き込んだバイト数
+        """
+
+        written_bytes = 0
+        with open(temp_path, mode='xb', buffering=0) as temp_file:
+            while chunk := file.read(cls.WRITE_CHUNK_SIZE):
+                temp_file.write(chunk)
+                written_bytes += len(chunk)
+            os.fsync(temp_file.fileno())
+        return written_bytes
+
+
+    @staticmethod
+    def __moveWithoutOverwrite(source_path: Path, destination_path: Path) -> None:
+        """
+        移動先に既にファイルが存在する場合は上書きせずに FileExistsError を送出する形で、ファイルをアトミックに移動する (ワーカースレッドで実行される)
+
+        Args:
+            source_path (Path): 移動元のパス
+            destination_path (Path): 移動先のパス
+
+        Raises:
+            FileExistsError: 移動先に既にファイルが存在する場合
+        """
+
+        # Windows の rename は移動先が存在する場合に FileExistsError を送出するため、そのままアトミックに移動できる
+        if sys.platform == 'win32':
+            os.rename(source_path, destination_path)
+            return
+
+        # POSIX の rename は移動先を上書きしてしまうため、移動先が存在する場合に失敗するハードリンクを作成してから移動元を削除する
+        try:
+            os.link(source_path, destination_path)
+        except FileExistsError:
+            raise
+        except OSError:
+            # ハードリンクに対応していないファイルシステムでは、存在を確認してから rename する
+            if destination_path.exists():
+                raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), str(destination_path)) from None
+            os.rename(source_path, destination_path)
+        else:
+            os.unlink(source_path)
+
+        # 移動後のファイル名がクラッシュ時に失われないよう、フォルダのエントリもディスクに書き込む
+        ## ネットワークドライブなどフォルダの fsync に対応していないファイルシステムもあるため、失敗しても無視する
+        try:
+            directory_fd = os.open(destination_path.parent, os.O_RDONLY)
+            try:
+                os.fsync(directory_fd)
+            finally:
+                os.close(directory_fd)
+        except OSError:
+            pass
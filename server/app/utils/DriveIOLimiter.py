@@ -1,69 +1,84 @@
 
 from __future__ import annotations
 
-import asyncio
+import os
+import select
 import sys
-from typing import ClassVar
+import threading
+import time
+from typing import IO, ClassVar
 
 import anyio
 import psutil
 
+from app.utils.PrioritySemaphore import PrioritySemaphore
+
 
 class DriveIOLimiter:
     """
     HDD ごとの同時実行を制限するクラス
     同一 HDD に対して同時に1つまでしかバックグラウンドタスクを実行できないようにする
+    また、録画視聴などのフォアグラウンドの読み込みが行われている HDD を管理し、
+    AnalysisWorkerPool がその HDD 上のバックグラウンド解析を間欠実行に絞れるようにする
     """
 
     # クラス変数として Semaphore の辞書を保持
-    # key: ドライブ識別子 (Windows) またはマウントポイント (Linux)
+    # key: ドライブ識別子 (Windows) またはデバイス識別子 (Linux)
     # value: その HDD 用の Semaphore
-    _drive_semaphores: ClassVar[dict[str, asyncio.Semaphore]] = {}
+    _drive_semaphores: ClassVar[dict[str, PrioritySemaphore]] = {}
 
+    # HDD ごとの、フォアグラウンドの読み込み (録画視聴セッションなど) の登録数
+    ## 録画視聴時の FeedTSStream() やシーク時の探索はワーカースレッドからも参照されるため、threading.Lock で保護する
+    _foreground_reader_counts: ClassVar[dict[str, int]] = {}
+    _foreground_lock: ClassVar[threading.Lock] = threading.Lock()
 
-    @staticmethod
-    def getDriveID(target_path: anyio.Path) -> str:
+    # ファイルシステムのデバイス番号 (st_dev) とデバイス識別子の対応表のキャッシュ
+    ## マウントテーブルが変化した (ディスクの着脱やマウント・アンマウントが行われた) 時点で破棄される
+    _device_id_cache: ClassVar[dict[int, str]] = {}
+
+    # マウントテーブルの変化を検知するための /proc/self/mounts のファイルオブジェクトと poll オブジェクト
+    ## /proc/self/mounts はマウントテーブルが変化すると POLLPRI / POLLERR で通知される
+    _mounts_file: ClassVar[IO[bytes] | None] = None
+    _mounts_poll: ClassVar[select.poll | None] = None
+
+    # マウントテーブルの変化を poll() で検知できない環境で、キャッシュを破棄する間隔 (秒)
+    DEVICE_ID_CACHE_TTL: ClassVar[float] = 60.0
+    _device_id_cache_created_at: ClassVar[float] = 0.0
+
+
+    @classmethod
+    def getDriveID(cls, target_path: anyio.Path) -> str:
         """
-        パスからドライブまたはマウントポイントを特定し、そのパスを ID として返す
-        Windows の場合はドライブレター、Linux の場合はマウントポイントを返す
+        パスからファイルが格納されている物理ドライブを特定し、その識別子を返す
+        Windows の場合はドライブレター、Linux の場合はファイルシステムのデバイス番号から辿った物理ディスクの識別子を返す
+        マウントポイントではなくデバイス番号で判定するため、同一ディスクのバインドマウントや、同一ディスク上の別パーティションも同じドライブとして扱われる
 
         Args:
             path (anyio.Path): 対象ファイルパス
 
         Returns:
-            str: ドライブ識別子 (Windows) またはマウントポイント (Linux)
+            str: ドライブ識別子 (Windows) またはデバイス識別子 (Linux)
         """
 
         try:
-            # パスを文字列に変換（psutilで使用するため）
+            # パスを文字列に変換
             target_path_str = str(target_path)
 
             if psutil.WINDOWS:
                 # Windows の場合はドライブレターを返す
                 return target_path_str[0].upper() + ':'
-            else:
-                # Linux の場合はマウントポイントを取得
-                partitions = psutil.disk_partitions(all=True)
-                mount_point = ''
-                target_parts = target_path.parts
-
-                # 最も適切なマウントポイントを探す
-                for partition in partitions:
-                    mount_path = anyio.Path(partition.mountpoint)
-                    mount_parts = mount_path.parts
 
-                    # マウントポイントがターゲットパスの先頭部分と完全に一致するか確認
-                    if (len(mount_parts) <= len(target_parts) and
-                        all(mp == tp for mp, tp in zip(mount_parts, target_parts)) and
-                        len(str(mount_path)) > len(mount_point)):
-                        mount_point = str(mount_path)
+            # マウントテーブルが変化していればキャッシュを破棄
+            cls.__invalidateCacheIfMountTableChanged()
 
-                if not mount_point:
-                    # マウントポイントが見つからない場合はパスをそのまま返す
-                    return target_path_str
-
-                # マウントポイントを返す
-                return mount_point
+            # ファイルシステムのデバイス番号を取得
+            ## バインドマウントやシンボリックリンク経由でも、同一のファイルシステム上のファイルであれば同じ値になる
+            device_number = os.stat(target_path_str).st_dev
+            device_id = cls._device_id_cache.get(device_number)
+            if device_id is None:
+                device_id = cls.__resolveDeviceID(device_number)
+                cls._device_id_cache[device_number] = device_id
+            return device_id
 
         except Exception:
             # エラー時はパスをそのまま返す
@@ -71,7 +86,7 @@ class DriveIOLimiter:
 
 
     @classmethod
-    def getSemaphore(cls, path: anyio.Path) -> asyncio.Semaphore:
+    def getSemaphore(cls, path: anyio.Path) -> PrioritySemaphore:
         """
         指定されたパスの HDD 用の Semaphore を取得する
         同一 HDD に対して同時に1つまでしかバックグラウンドタスクを実行できないようにする
@@ -80,7 +95,7 @@ class DriveIOLimiter:
             path (anyio.Path): 対象ファイルパス
 
         Returns:
-            asyncio.Semaphore: 対応する HDD 用の Semaphore
+            PrioritySemaphore: 対応する HDD 用の Semaphore (hold() で優先度を指定して獲得できる)
         """
 
         # ドライブの識別子を取得
@@ -89,10 +104,154 @@ class DriveIOLimiter:
         # HDD ごとのセマフォがなければ作成
         if drive_id not in cls._drive_semaphores:
             # 同時に1つのタスクしか実行できないようにする
-            cls._drive_semaphores[drive_id] = asyncio.Semaphore(1)
+            cls._drive_semaphores[drive_id] = PrioritySemaphore(1)
 
         return cls._drive_semaphores[drive_id]
 
 
+    @classmethod
+    def acquireForeground(cls, path: anyio.Path) -> str:
+        """
+        指定されたパスの HDD で、フォアグラウンドの読み込みが開始されたことを登録する
+        登録中の HDD 上で実行されているバックグラウンド解析は、AnalysisWorkerPool によって間欠実行に絞られる
+        読み込みが終わったら、戻り値のドライブ識別子を releaseForeground() に渡して必ず登録を解除すること
+
+        Args:
+            path (anyio.Path): 読み込むファイルのパス
+
+        Returns:
+            str: 登録したドライブ識別子
+        """
+
+        drive_id = cls.getDriveID(path)
+        with cls._foreground_lock:
+            cls._foreground_reader_counts[drive_id] = cls._foreground_reader_counts.get(drive_id, 0) + 1
+        return drive_id
+
+
+    @classmethod
+    def releaseForeground(cls, drive_id: str) -> None:
+        """
+        acquireForeground() で登録したフォアグラウンドの読み込みの登録を解除する
+
+        Args:
+            drive_id (str): acquireForeground() が返したドライブ識別子
+        """
+
+        with cls._foreground_lock:
+            count = cls._foreground_reader_counts.get(drive_id, 0) - 1
+            if count > 0:
+                cls._foreground_reader_counts[drive_id] = count
+            else:
+                cls._foreground_reader_counts.pop(drive_id, None)
+
+
+    @classmethod
+    def isForegroundActive(cls, drive_id: str) -> bool:
+        """
+        指定された HDD で、フォアグラウンドの読み込みが行われているかを返す
+
+        Args:
+            drive_id (str): ドライブ識別子
+
+        Returns:
+            bool: フォアグラウンドの読み込みが行われているかどうか
+        """
+
+        with cls._foreground_lock:
+            return drive_id in cls._foreground_reader_counts
+
+
+    @classmethod
+    def getForegroundReaderCounts(cls) -> dict[str, int]:
+        """
+        HDD ごとの、フォアグラウンドの読み込みの登録数を返す
+
+        Returns:
+            dict[str, int]: ドライブ識別子をキーとした登録数
+        """
+
+        with cls._foreground_lock:
+            return dict(cls._foreground_reader_counts)
+
+
+    @classmethod
+    def __invalidateCacheIfMountTableChanged(cls) -> None:
+        """
+        マウントテーブルが変化していれば、デバイス識別子のキャッシュを破棄する
+        Linux では /proc/self/mounts の poll() で変化を検知し、それ以外の環境では一定時間ごとに破棄する
+        """
+
+        # 初回呼び出し時に /proc/self/mounts を開いて poll オブジェクトに登録する
+        if cls._mounts_poll is None and sys.platform == 'linux' and hasattr(select, 'poll'):
+            try:
+                cls._mounts_file = open('/proc/self/mounts', 'rb')
+                cls._mounts_poll = select.poll()
+                cls._mounts_poll.register(cls._mounts_file.fileno(), select.POLLPRI | select.POLLERR)
+                cls._device_id_cache.clear()
+            except OSError:
+                cls._mounts_file = None
+                cls._mounts_poll = None
+
+        if cls._mounts_poll is not None and cls._mounts_file is not None:
+            # タイムアウト 0 で poll() し、イベントがあればマウントテーブルが変化している
+            if len(cls._mounts_poll.poll(0)) > 0:
+                cls._device_id_cache.clear()
+                # 変化の通知をリセットするため、ファイルを末尾まで読み直す
+                cls._mounts_file.seek(0)
+                cls._mounts_file.read()
+            return
+
+        # poll() が使えない環境では、一定時間ごとにキャッシュを破棄する
+        now = time.monotonic()
+        if now - cls._device_id_cache_created_at > cls.DEVICE_ID_CACHE_TTL:
+            cls._device_id_cache.clear()
+            cls._device_id_cache_created_at = now
+
+
+    @staticmethod
+    def __resolveDeviceID(device_number: int) -> str:
+        """
+        ファイルシステムのデバイス番号から、その下にある物理ディスクの識別子を解決する
+        パーティションは親ディスクに、単一のディスクで構成された LVM / dm-crypt などの論理デバイスは下層のディスクに辿る
+        NFS / SMB / overlayfs などのブロックデバイスを持たないファイルシステムは、デバイス番号そのものを識別子とする
+
+        Args:
+            device_number (int): ファイルシステムのデバイス番号 (st_dev)
+
+        Returns:
+            str: デバイス識別子
+        """
+
+        major = os.major(device_number)
+        minor = os.minor(device_number)
+        fallback_id = f'dev:{major}:{minor}'
+
+        # sysfs が存在しない環境 (macOS など) ではデバイス番号をそのまま識別子とする
+        sysfs_path = f'/sys/dev/block/{major}:{minor}'
+        if major == 0 or not os.path.exists(sysfs_path):
+            return fallback_id
+
+        try:
+            device_path = os.path.realpath(sysfs_path)
+            # 最大 8 段までデバイスの親子関係を辿る (循環参照対策)
+            for _ in range(8):
+                # パーティションの場合は、親ディレクトリが物理ディスクを表す
+                if os.path.exists(os.path.join(device_path, 'partition')):
+                    device_path = os.path.dirname(device_path)
+                    continue
+                # LVM / dm-crypt / mdraid などの論理デバイスは、下層のデバイスが1つだけの場合に限り辿る
+                ## 複数のディスクにまたがる場合は、論理デバイス自体を1つのドライブとして扱う
+                slaves_path = os.path.join(device_path, 'slaves')
+                slaves = os.listdir(slaves_path) if os.path.isdir(slaves_path) else []
+                if len(slaves) == 1:
+                    device_path = os.path.realpath(os.path.join(slaves_path, slaves[0]))
+                    continue
+                break
+            return f'/dev/{os.path.basename(device_path)}'
+        except OSError:
+            return fallback_id
+
+
 if __name__ == '__main__':
     print(DriveIOLimiter.getDriveID(anyio.Path(sys.argv[1])))
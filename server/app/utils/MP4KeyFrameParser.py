@@ -1,11 +1,14 @@
 from __future__ import annotations
 
-import bisect
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
 from pathlib import Path
-from typing import BinaryIO
+from typing import BinaryIO, ClassVar
 
+import numpy as np
 from biim.mpeg2ts import ts
+from numpy.typing import NDArray
 
 
 @dataclass(slots=True)
@@ -34,14 +37,16 @@ class _MP4TrackInfo:
     Args:
         handler_type (bytes | None): hdlr の handler_type
         timescale (int | None): mdhd の media timescale
-        stts_entries (list[tuple[int, int]]): decode time to sample table
-        stss_samples (list[int]): sync sample number 一覧
+        stts_sample_counts (NDArray[np.int64]): decode time to sample table の各エントリのサンプル数
+        stts_sample_deltas (NDArray[np.int64]): decode time to sample table の各エントリの時間差
+        stss_samples (NDArray[np.int64]): sync sample number 一覧
     """
 
     handler_type: bytes | None
     timescale: int | None
-    stts_entries: list[tuple[int, int]]
-    stss_samples: list[int]
+    stts_sample_counts: NDArray[np.int64]
+    stts_sample_deltas: NDArray[np.int64]
+    stss_samples: NDArray[np.int64]
 
 
 class MP4KeyFrameParser:
@@ -49,17 +54,84 @@ class MP4KeyFrameParser:
     MP4 コンテナの moov 内テーブルを読むためのユーティリティ
     """
 
+    # 録画ファイルのハッシュをキーとした、同期サンプル DTS 一覧の LRU キャッシュ
+    ## 数 GB の MP4 では stts / stss だけで数 MB になるため、新規セッション・画質切り替え・複数人視聴のたびに
+    ## moov を読み直さないよう、プロセス全体で使い回す (ワーカースレッドから参照されるため threading.Lock で保護する)
+    _keyframe_dts_cache: ClassVar[OrderedDict[str, NDArray[np.int64]]] = OrderedDict()
+    _keyframe_dts_cache_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    # キャッシュする録画ファイルの最大数
+    KEYFRAME_DTS_CACHE_MAX_ENTRIES: ClassVar[int] = 32
+
 
     @staticmethod
-    def readVideoKeyFrameDTS(path: Path) -> list[int]:
+    def readVideoKeyFrameDTS(path: Path, file_hash: str | None = None) -> NDArray[np.int64]:
         """
         MP4 の moov 内テーブルだけを読んで、映像同期サンプルの DTS を 90kHz 単位で返す
 
         Args:
             path (Path): MPEG-4 コンテナの録画ファイルパス
+            file_hash (str | None): 録画ファイルのハッシュ (指定時は読み取り結果をプロセス全体で使い回す)
+
+        Returns:
+            NDArray[np.int64]: 先頭同期サンプルを 0 とした 90kHz DTS 一覧 (昇順・読み取り専用)
+        """
+
+        # 同期サンプル DTS は録画ファイルごとに不変なため、キャッシュにあればファイルを読まずに返す
+        if file_hash is not None:
+            with MP4KeyFrameParser._keyframe_dts_cache_lock:
+                keyframe_dts_list = MP4KeyFrameParser._keyframe_dts_cache.get(file_hash)
+                if keyframe_dts_list is not None:
+                    MP4KeyFrameParser._keyframe_dts_cache.move_to_end(file_hash)
+                    return keyframe_dts_list
+
+        keyframe_dts_list = MP4KeyFrameParser.__readVideoKeyFrameDTS(path)
+        # 複数のセッションから共有されるため、誤って書き換えられないよう読み取り専用にしておく
+        keyframe_dts_list.setflags(write=False)
+        if file_hash is not None:
+            with MP4KeyFrameParser._keyframe_dts_cache_lock:
+                MP4KeyFrameParser._keyframe_dts_cache[file_hash] = keyframe_dts_list
+                MP4KeyFrameParser._keyframe_dts_cache.move_to_end(file_hash)
+                # 最も長く使われていない録画ファイルのキャッシュから破棄する
+                while len(MP4KeyFrameParser._keyframe_dts_cache) > MP4KeyFrameParser.KEYFRAME_DTS_CACHE_MAX_ENTRIES:
+                    MP4KeyFrameParser._keyframe_dts_cache.popitem(last=False)
+        return keyframe_dts_list
+
+
+    @staticmethod
+    def findKeyFrameDTSBefore(keyframe_dts_list: NDArray[np.int64], playlist_start_seconds: float) -> int:
+        """
+        MP4 の同期サンプル DTS 一覧から、プレイリスト時刻以前の最も近い開始 DTS を選ぶ
+
+        Args:
+            keyframe_dts_list (NDArray[np.int64]): 先頭同期サンプルを 0 とした 90kHz DTS 一覧
+            playlist_start_seconds (float): 録画内の相対再生時刻
 
         Returns:
-            list[int]: 先頭同期サンプルを 0 とした 90kHz DTS 一覧
+            int: psisimux に渡す開始 DTS (90kHz)
+        """
+
+        if len(keyframe_dts_list) == 0:
+            raise RuntimeError('MP4 keyframe DTS list is empty.')
+
+        # MP4 はファイル位置へシークせず、psisimux の -m へ渡す時刻だけを決める
+        target_dts = round(playlist_start_seconds * ts.HZ)
+        keyframe_index = int(np.searchsorted(keyframe_dts_list, target_dts, side='right')) - 1
+        if keyframe_index < 0:
+            keyframe_index = 0
+        return int(keyframe_dts_list[keyframe_index])
+
+
+    @staticmethod
+    def __readVideoKeyFrameDTS(path: Path) -> NDArray[np.int64]:
+        """
+        MP4 の moov 内テーブルを読み、映像同期サンプルの DTS を 90kHz 単位で計算する
+
+        Args:
+            path (Path): MPEG-4 コンテナの録画ファイルパス
+
+        Returns:
+            NDArray[np.int64]: 先頭同期サンプルを 0 とした 90kHz DTS 一覧
         """
 
         file_size = path.stat().st_size
@@ -85,68 +157,39 @@ class MP4KeyFrameParser:
                     continue
                 if track_info.timescale is None:
                     raise RuntimeError(f'video mdhd timescale was not found: {path}')
-                if len(track_info.stts_entries) == 0:
+                if len(track_info.stts_sample_counts) == 0:
                     raise RuntimeError(f'video stts was not found: {path}')
 
+                # stts は同じ時間差のサンプルをまとめて持つため、各まとまりの最終サンプル番号 (1 始まり) と先頭 DTS を計算する
+                entry_last_samples = np.cumsum(track_info.stts_sample_counts)
+                entry_durations = track_info.stts_sample_counts * track_info.stts_sample_deltas
+                entry_start_dts = np.cumsum(entry_durations) - entry_durations
+                total_sample_count = int(entry_last_samples[-1])
+
                 # stss がない映像トラックは、MP4 仕様上すべてのサンプルを同期サンプルとして扱う
-                sync_samples: list[int] | range
                 if len(track_info.stss_samples) > 0:
                     sync_samples = track_info.stss_samples
                 else:
-                    total_sample_count = sum(entry[0] for entry in track_info.stts_entries)
-                    sync_samples = range(1, total_sample_count + 1)
-
-                sync_sample_index = 0
-                sample_number = 1
-                sample_dts = 0
-                keyframe_dts_list: list[int] = []
-                for sample_count, sample_delta in track_info.stts_entries:
-                    # stts は同じ時間差のサンプルをまとめて持つため、現在のまとまりに含まれる最終サンプル番号を計算する
-                    entry_last_sample = sample_number + sample_count - 1
-                    while sync_sample_index < len(sync_samples) and sync_samples[sync_sample_index] <= entry_last_sample:
-                        # stss の同期サンプル番号を stts の累積 DTS に変換する
-                        ## サンプル番号は 1 始まりなので、現在のまとまりの先頭との差分だけ sample_delta を足す
-                        sync_sample_number = sync_samples[sync_sample_index]
-                        sync_sample_dts = sample_dts + (sync_sample_number - sample_number) * sample_delta
-                        keyframe_dts_list.append(sync_sample_dts * ts.HZ // track_info.timescale)
-                        sync_sample_index += 1
-                    # 次の stts のまとまりの先頭サンプル番号と DTS に進める
-                    sample_number += sample_count
-                    sample_dts += sample_count * sample_delta
+                    sync_samples = np.arange(1, total_sample_count + 1, dtype=np.int64)
+                # stts に存在しないサンプル番号を指す同期サンプルは DTS を決められないため無視する
+                ## stss は昇順なので、範囲外の同期サンプルは末尾にしか現れない
+                sync_samples = sync_samples[:int(np.searchsorted(sync_samples, total_sample_count, side='right'))]
+                if len(sync_samples) == 0:
+                    return np.zeros(0, dtype=np.int64)
+
+                # stss の同期サンプル番号を stts の累積 DTS に変換する
+                ## サンプル番号は 1 始まりなので、同期サンプルが属するまとまりの先頭との差分だけ sample_delta を足す
+                entry_indexes = np.searchsorted(entry_last_samples, sync_samples, side='left')
+                entry_first_samples = entry_last_samples[entry_indexes] - track_info.stts_sample_counts[entry_indexes] + 1
+                sync_sample_dts = entry_start_dts[entry_indexes] + (sync_samples - entry_first_samples) * track_info.stts_sample_deltas[entry_indexes]
+                keyframe_dts_list = sync_sample_dts * ts.HZ // track_info.timescale
 
                 # psisimux の -m はファイル先頭からの相対ミリ秒指定なので、先頭同期サンプルを 0 に正規化する
-                if len(keyframe_dts_list) == 0:
-                    return []
-                base_dts = keyframe_dts_list[0]
-                return [dts - base_dts for dts in keyframe_dts_list]
+                return keyframe_dts_list - keyframe_dts_list[0]
 
         raise RuntimeError(f'video trak was not found: {path}')
 
 
-    @staticmethod
-    def findKeyFrameDTSBefore(keyframe_dts_list: list[int], playlist_start_seconds: float) -> int:
-        """
-        MP4 の同期サンプル DTS 一覧から、プレイリスト時刻以前の最も近い開始 DTS を選ぶ
-
-        Args:
-            keyframe_dts_list (list[int]): 先頭同期サンプルを 0 とした 90kHz DTS 一覧
-            playlist_start_seconds (float): 録画内の相対再生時刻
-
-        Returns:
-            int: psisimux に渡す開始 DTS (90kHz)
-        """
-
-        if len(keyframe_dts_list) == 0:
-            raise RuntimeError('MP4 keyframe DTS list is empty.')
-
-        # MP4 はファイル位置へシークせず、psisimux の -m へ渡す時刻だけを決める
-        target_dts = round(playlist_start_seconds * ts.HZ)
-        keyframe_index = bisect.bisect_right(keyframe_dts_list, target_dts) - 1
-        if keyframe_index < 0:
-            keyframe_index = 0
-        return keyframe_dts_list[keyframe_index]
-
-
     @staticmethod
     def __readUInt32(data: bytes, offset: int) -> int:
         """
@@ -301,13 +344,14 @@ class MP4KeyFrameParser:
 
         handler_type: bytes | None = None
         timescale: int | None = None
-        stts_entries: list[tuple[int, int]] = []
-        stss_samples: list[int] = []
+        stts_sample_counts = np.zeros(0, dtype=np.int64)
+        stts_sample_deltas = np.zeros(0, dtype=np.int64)
+        stss_samples = np.zeros(0, dtype=np.int64)
 
         # trak の中身は mdia 配下にまとまっているため、mdia がないトラックは空情報として扱う
         mdia_box = MP4KeyFrameParser.__findMP4ChildBox(file, track_box, b'mdia')
         if mdia_box is None:
-            return _MP4TrackInfo(handler_type, timescale, stts_entries, stss_samples)
+            return _MP4TrackInfo(handler_type, timescale, stts_sample_counts, stts_sample_deltas, stss_samples)
 
         # hdlr の handler_type で映像トラックかどうかを後段で判定する
         hdlr_box = MP4KeyFrameParser.__findMP4ChildBox(file, mdia_box, b'hdlr')
@@ -329,32 +373,25 @@ class MP4KeyFrameParser:
         minf_box = MP4KeyFrameParser.__findMP4ChildBox(file, mdia_box, b'minf')
         stbl_box = MP4KeyFrameParser.__findMP4ChildBox(file, minf_box, b'stbl') if minf_box is not None else None
         if stbl_box is None:
-            return _MP4TrackInfo(handler_type, timescale, stts_entries, stss_samples)
+            return _MP4TrackInfo(handler_type, timescale, stts_sample_counts, stts_sample_deltas, stss_samples)
 
         # stts はサンプル数と時間差のランレングス表で、全サンプルの DTS を復元する元データになる
+        ## 数十万エントリになることもあるため、Python のリストにはせず big-endian の uint32 配列としてまとめて読む
         stts_box = MP4KeyFrameParser.__findMP4ChildBox(file, stbl_box, b'stts')
         if stts_box is not None:
             stts_payload = MP4KeyFrameParser.__readMP4Payload(file, stts_box)
             if len(stts_payload) >= 8:
-                entry_count = MP4KeyFrameParser.__readUInt32(stts_payload, 4)
-                for entry_index in range(entry_count):
-                    entry_offset = 8 + entry_index * 8
-                    if entry_offset + 8 > len(stts_payload):
-                        break
-                    sample_count = MP4KeyFrameParser.__readUInt32(stts_payload, entry_offset)
-                    sample_delta = MP4KeyFrameParser.__readUInt32(stts_payload, entry_offset + 4)
-                    stts_entries.append((sample_count, sample_delta))
+                entry_count = min(MP4KeyFrameParser.__readUInt32(stts_payload, 4), (len(stts_payload) - 8) // 8)
+                stts_table = np.frombuffer(stts_payload, dtype='>u4', count=entry_count * 2, offset=8).astype(np.int64)
+                stts_sample_counts = stts_table[0::2]
+                stts_sample_deltas = stts_table[1::2]
 
         # stss は同期サンプル番号の一覧で、存在しない場合は上位側で全サンプルを同期サンプルとして扱う
         stss_box = MP4KeyFrameParser.__findMP4ChildBox(file, stbl_box, b'stss')
         if stss_box is not None:
             stss_payload = MP4KeyFrameParser.__readMP4Payload(file, stss_box)
             if len(stss_payload) >= 8:
-                entry_count = MP4KeyFrameParser.__readUInt32(stss_payload, 4)
-                for entry_index in range(entry_count):
-                    sample_offset = 8 + entry_index * 4
-                    if sample_offset + 4 > len(stss_payload):
-                        break
-                    stss_samples.append(MP4KeyFrameParser.__readUInt32(stss_payload, sample_offset))
-
-        return _MP4TrackInfo(handler_type, timescale, stts_entries, stss_samples)
+                entry_count = min(MP4KeyFrameParser.__readUInt32(stss_payload, 4), (len(stss_payload) - 8) // 4)
+                stss_samples = np.frombuffer(stss_payload, dtype='>u4', count=entry_count, offset=8).astype(np.int64)
+
+        return _MP4TrackInfo(handler_type, timescale, stts_sample_counts, stts_sample_deltas, stss_samples)
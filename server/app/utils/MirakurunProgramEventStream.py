@@ -0,0 +1,241 @@
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Any, ClassVar
+
+import httpx
+
+from app import logging
+from app.constants import HTTPX_CLIENT
+from app.models.Program import Program
+from app.utils import GetMirakurunAPIEndpointURL
+from app.utils.TimeTableSnapshotCache import TimeTableSnapshotCache
+
+
+class MirakurunProgramEventStream:
+    """
+    Mirakurun のイベントストリーム (/api/events/stream) を購読し、番組情報の追加・更新・削除を随時 DB に反映するクラス
+    以前は program_update_interval ごとに /api/programs から全チャンネルの番組情報を取得し直して差分を取っていたが、
+    イベントストリームに接続できている間は変化した番組の情報だけを反映し、全件取得は取りこぼしを補うための整合性確保に留める
+    イベントストリームに対応していない mirakc などに接続している場合は、従来通り全件取得で番組情報を更新する
+    """
+
+    # イベントストリームに接続できている間に、全件取得による番組情報の更新を行う間隔 (秒)
+    RECONCILIATION_INTERVAL: ClassVar[float] = 60 * 60
+    # 最初のイベントを受け取ってから DB に反映するまでの待ち時間 (秒)
+    ## EPG の取得直後などは短時間に大量のイベントが届くため、まとめて1回のトランザクションで反映する
+    FLUSH_DELAY: ClassVar[float] = 3.0
+    # 再接続までの待ち時間の初期値と上限 (秒)
+    ## 接続に失敗するたびに倍に伸ばす
+    RECONNECT_MIN_DELAY: ClassVar[float] = 1.0
+    RECONNECT_MAX_DELAY: ClassVar[float] = 5 * 60
+    # 番組表のスナップショットを破棄する最短の間隔 (秒)
+    ## 破棄するたびに最大数十件のスナップショットの再生成がやり直しになるため、EPG の取得中などにイベントが続けて届いても、
+    ## 破棄はこの間隔に1回までにまとめる (番組表に反映されるまで、最大でこの秒数だけ遅れる)
+    SNAPSHOT_INVALIDATE_INTERVAL: ClassVar[float] = 60.0
+
+    # イベントストリームの購読タスクと、受け取ったイベントを DB に反映するタスク
+    _stream_task: ClassVar[asyncio.Task[None] | None] = None
+    _flush_task: ClassVar[asyncio.Task[None] | None] = None
+
+    # イベントストリームに接続できているかどうか
+    _is_connected: ClassVar[bool] = False
+
+    # イベントを取りこぼした可能性がある時刻 (time.monotonic() の値)
+    ## この時刻より後に全件取得による番組情報の更新が完了するまで、isFullUpdateRequired() は True を返す
+    _missed_events_at: ClassVar[float | None] = None
+
+    # まだ DB に反映していないイベントのリストと、イベントを受け取ったことを反映タスクに通知するイベント
+    _pending_events: ClassVar[list[dict[str, Any]]] = []
+    _pending_events_available: ClassVar[asyncio.Event] = asyncio.Event()
+
+
+    @classmethod
+    async def start(cls) -> None:
+        """
+        イベントストリームの購読を開始する
+        このメソッドはサーバー起動時に app.py から呼ばれ、サーバーの起動中は切断されても再接続し続ける
+        """
+
+        # 既に実行中の場合は何もしない
+        if cls._stream_task is not None:
+            return
+
+        cls._stream_task = asyncio.create_task(cls.__runStream())
+        cls._flush_task = asyncio.create_task(cls.__runFlush())
+
+
+    @classmethod
+    async def stop(cls) -> None:
+        """
+        イベントストリームの購読を停止する
+        このメソッドはサーバー終了時に app.py から呼ばれる
+        """
+
+        for task in (cls._stream_task, cls._flush_task):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        cls._stream_task = None
+        cls._flush_task = None
+        cls._is_connected = False
+
+
+    @classmethod
+    def isFullUpdateRequired(cls) -> bool:
+        """
+        全件取得による番組情報の更新 (Program.update()) が必要かどうかを返す
+        イベントストリームに接続できていない場合は常に True を返し、接続できている場合は以下のいずれかで True を返す
+        - 前回の全件更新から RECONCILIATION_INTERVAL 秒以上経過している
+        - 切断中や DB への反映の失敗でイベントを取りこぼした後に、まだ全件更新が行われていない
+
+        Returns:
+            bool: 全件取得による番組情報の更新が必要かどうか
+        """
+
+        if cls._is_connected is False:
+            return True
+        last_updated_at = Program.last_updated_at
+        if last_updated_at is None:
+            return True
+        if cls._missed_events_at is not None and last_updated_at < cls._missed_events_at:
+            return True
+        return time.monotonic() - last_updated_at >= cls.RECONCILIATION_INTERVAL
+
+
+    @classmethod
+    async def __runStream(cls) -> None:
+        """
+        イベントストリームに接続し、番組情報のイベントを受け取り続ける
+        切断された場合や接続に失敗した場合は、待ち時間を伸ばしながら再接続する
+        """
+
+        reconnect_delay = cls.RECONNECT_MIN_DELAY
+        is_unsupported_logged = False
+        while True:
+            try:
+                # resource=program を指定し、番組情報のイベントだけを受け取る
+                ## イベントがしばらく届かないこともあるため、読み取りのタイムアウトは設定しない
+                async with HTTPX_CLIENT() as client, client.stream(
+                    'GET',
+                    GetMirakurunAPIEndpointURL('/api/events/stream?resource=program'),
+                    timeout = httpx.Timeout(3.0, read=None),
+                ) as response:
+
+                    # mirakc や古い Mirakurun はイベントストリームに対応していないため、全件取得での更新を続ける
+                    ## 対応していないサーバーに頻繁にリクエストしないよう、再接続までの待ち時間を上限にする
+                    if response.status_code != 200:
+                        if is_unsupported_logged is False:
+                            logging.info(
+                                f'[MirakurunProgramEventStream] Event stream is not available (HTTP Error {response.status_code}). '
+                                'Programs will be updated periodically.'
+                            )
+                            is_unsupported_logged = True
+                        reconnect_delay = cls.RECONNECT_MAX_DELAY
+
+                    else:
+                        # 接続前 (再接続時は切断中) に届くはずだったイベントを、接続後の全件更新で補う
+                        ## 初回の接続時も、サーバー起動時の全件更新が接続より前に完了していたり、失敗していたりする可能性があるため同様に扱う
+                        cls._missed_events_at = time.monotonic()
+                        cls._is_connected = True
+                        reconnect_delay = cls.RECONNECT_MIN_DELAY
+                        logging.info('[MirakurunProgramEventStream] Connected to the event stream.')
+
+                        async for line in response.aiter_lines():
+                            event = cls.__parseEventLine(line)
+                            if event is not None and event.get('resource') == 'program':
+                                cls._pending_events.append(event)
+                                cls._pending_events_available.set()
+
+                        logging.warning('[MirakurunProgramEventStream] Event stream was closed by Mirakurun.')
+
+            except asyncio.CancelledError:
+                raise
+            except (httpx.NetworkError, httpx.TimeoutException, httpx.RemoteProtocolError) as ex:
+                if cls._is_connected is True:
+                    logging.warning(f'[MirakurunProgramEventStream] Disconnected from the event stream. ({ex.__class__.__name__})')
+            except Exception as ex:
+                logging.error('[MirakurunProgramEventStream] Unexpected error occurred while reading the event stream:', exc_info=ex)
+
+            finally:
+                cls._is_connected = False
+
+            await asyncio.sleep(reconnect_delay)
+            reconnect_delay = min(reconnect_delay * 2, cls.RECONNECT_MAX_DELAY)
+
+
+    @classmethod
+    async def __runFlush(cls) -> None:
+        """
+        受け取ったイベントを FLUSH_DELAY 秒ごとにまとめて DB に反映し、番組情報が変化していれば番組表のスナップショットを破棄する
+        スナップショットの破棄は、SNAPSHOT_INVALIDATE_INTERVAL 秒に1回までにまとめて行う
+        """
+
+        last_invalidated_at = float('-inf')
+        is_invalidation_pending = False
+        while True:
+
+            # スナップショットの破棄を保留している場合は、破棄できるようになるまでの間だけ次のイベントを待つ
+            if is_invalidation_pending is True:
+                wait_timeout = max(0.0, last_invalidated_at + cls.SNAPSHOT_INVALIDATE_INTERVAL - time.monotonic())
+                try:
+                    await asyncio.wait_for(cls._pending_events_available.wait(), timeout=wait_timeout)
+                except TimeoutError:
+                    pass
+            else:
+                await cls._pending_events_available.wait()
+
+            if cls._pending_events_available.is_set():
+                await asyncio.sleep(cls.FLUSH_DELAY)
+                events = cls._pending_events
+                cls._pending_events = []
+                cls._pending_events_available.clear()
+
+                try:
+                    is_changed = await Program.applyMirakurunProgramEvents(events)
+                    if is_changed is True:
+                        logging.debug(f'[MirakurunProgramEventStream] Applied {len(events)} program events.')
+                        is_invalidation_pending = True
+                except asyncio.CancelledError:
+                    raise
+                except Exception as ex:
+                    # 反映できなかったイベントは、次の全件更新で補う
+                    logging.error('[MirakurunProgramEventStream] Failed to apply program events:', exc_info=ex)
+                    cls._missed_events_at = time.monotonic()
+
+            # 前回の破棄から SNAPSHOT_INVALIDATE_INTERVAL 秒以上経過していれば、保留していたスナップショットの破棄を行う
+            if is_invalidation_pending is True and time.monotonic() - last_invalidated_at >= cls.SNAPSHOT_INVALIDATE_INTERVAL:
+                TimeTableSnapshotCache.invalidate()
+                last_invalidated_at = time.monotonic()
+                is_invalidation_pending = False
+
+
+    @staticmethod
+    def __parseEventLine(line: str) -> dict[str, Any] | None:
+        """
+        イベントストリームの1行をパースする
+        Mirakurun のイベントストリームは、"[" の行から始まり、イベントの JSON と "," の行が交互に続く終わりのない JSON 配列になっている
+
+        Args:
+            line (str): イベントストリームの1行
+
+        Returns:
+            dict[str, Any] | None: イベント (イベントを含まない行や、パースできない行の場合は None)
+        """
+
+        line = line.strip().lstrip('[,').rstrip(',]').strip()
+        if line == '':
+            return None
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            logging.debug(f'[MirakurunProgramEventStream] Failed to parse event: {line[:100]}')
+            return None
+        return event if isinstance(event, dict) else None
@@ -0,0 +1,108 @@
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import ClassVar, Literal
+
+
+class PrioritySemaphore:
+    """
+    待機中のタスクのうち、優先度の高いものから順に獲得させる Semaphore
+    asyncio.Semaphore と同じく async with で使える (この場合の優先度は Low)
+    録画完了直後のファイルの解析が、一括スキャン時のバックログの後ろに並ばずに済むようにするために使う
+    """
+
+    # 優先度ごとの順位 (小さいほど先に獲得できる)
+    PRIORITY_RANKS: ClassVar[dict[Literal['High', 'Low'], int]] = {'High': 0, 'Low': 1}
+
+
+    def __init__(self, value: int = 1) -> None:
+        """
+        PrioritySemaphore を初期化する
+
+        Args:
+            value (int): 同時に獲得できる数
+        """
+
+        self._value = value
+        # (優先度の順位, 待機を開始した順番, 獲得を通知する Future) のヒープ
+        ## 同じ優先度のタスクは、先に待機を開始したものから獲得できる
+        self._waiters: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._counter = itertools.count()
+
+
+    def locked(self) -> bool:
+        """
+        すぐに獲得できない状態かどうかを返す
+
+        Returns:
+            bool: すぐに獲得できない状態かどうか
+        """
+
+        return self._value == 0 or any(not future.done() for _, _, future in self._waiters)
+
+
+    async def acquire(self, priority: Literal['High', 'Low'] = 'Low') -> None:
+        """
+        Semaphore を獲得する
+        獲得できるまで待機し、待機中のタスクの中では優先度の高いものから順に獲得できる
+
+        Args:
+            priority (Literal['High', 'Low']): 獲得の優先度
+        """
+
+        if not self.locked():
+            self._value -= 1
+            return
+
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (self.PRIORITY_RANKS[priority], next(self._counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # release() で獲得済みになった直後にキャンセルされた場合は、獲得した分を次のタスクに譲る
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+
+    def release(self) -> None:
+        """
+        Semaphore を解放する
+        待機中のタスクがあれば、最も優先度の高いタスクに獲得させる
+        """
+
+        while len(self._waiters) > 0:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._value += 1
+
+
+    @asynccontextmanager
+    async def hold(self, priority: Literal['High', 'Low'] = 'Low') -> AsyncIterator[None]:
+        """
+        指定された優先度で Semaphore を獲得し、ブロックを抜けたら解放する
+
+        Args:
+            priority (Literal['High', 'Low']): 獲得の優先度
+        """
+
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+    async def __aenter__(self) -> None:
+        await self.acquire()
+
+
+    async def __aexit__(self, *args: object) -> None:
+        self.release()
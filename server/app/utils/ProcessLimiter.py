@@ -1,9 +1,10 @@
 
-import asyncio
 from typing import ClassVar
 
 import psutil
 
+from app.utils.PrioritySemaphore import PrioritySemaphore
+
 
 class ProcessLimiter:
     """
@@ -13,11 +14,11 @@ class ProcessLimiter:
     # クラス変数として Semaphore の辞書を保持
     # key: プロセスを識別するキー
     # value: そのプロセス用の Semaphore
-    _semaphores: ClassVar[dict[str, asyncio.Semaphore]] = {}
+    _semaphores: ClassVar[dict[str, PrioritySemaphore]] = {}
 
 
     @classmethod
-    def getSemaphore(cls, process_key: str) -> asyncio.Semaphore:
+    def getSemaphore(cls, process_key: str) -> PrioritySemaphore:
         """
         指定されたプロセス用の Semaphore を取得する
         初回呼び出し時に CPU 論理コア数の 50% の Semaphore を作成する
@@ -26,7 +27,7 @@ class ProcessLimiter:
             process_key (str): プロセスを識別するキー
 
         Returns:
-            asyncio.Semaphore: 指定されたプロセス用の Semaphore
+            PrioritySemaphore: 指定されたプロセス用の Semaphore (hold() で優先度を指定して獲得できる)
         """
 
         if process_key not in cls._semaphores:
@@ -35,5 +36,5 @@ class ProcessLimiter:
             if cpu_count is None:
                 cpu_count = 4  # 取得できない場合は4コアと仮定
             # 同時実行数を CPU コア数の 50% に制限
-            cls._semaphores[process_key] = asyncio.Semaphore(cpu_count // 2)
+            cls._semaphores[process_key] = PrioritySemaphore(max(1, cpu_count // 2))
         return cls._semaphores[process_key]
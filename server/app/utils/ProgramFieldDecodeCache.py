@@ -0,0 +1,153 @@
+
+from __future__ import annotations
+
+import json
+from typing import Any, ClassVar
+
+from app.schemas import Genre
+
+
+class ProgramFieldDecodeCache:
+    """
+    programs テーブルの JSON カラム (detail / genres) をデコードした結果を、JSON 文字列をキーとして保持するクラス
+    番組表 API や チャンネル情報 API は番組情報を取得するたびに全行の detail / genres を json.loads() していたが、
+    番組情報が変化するのは番組情報の更新時だけなので、同じ JSON 文字列は一度だけデコードし、以降はデコード済みの値を使い回す
+    特に genres は取り得る値の種類が少ないため、1週間分・全チャンネルの番組表でもほぼすべてキャッシュヒットする
+
+    キャッシュされた値は複数の番組情報で共有されるため、呼び出し元で変更してはならない (変更する場合は新しい値を代入すること)
+    """
+
+    # キャッシュするエントリの最大数
+    ## 番組表に載る番組の数 (1週間分・全チャンネルで数万件) を十分に上回る値にしている
+    ## 上限に達した場合は、次に prune() されるまで新しい JSON 文字列をキャッシュせずにデコードだけする
+    MAX_ENTRIES: ClassVar[int] = 100000
+
+    # JSON 文字列をキーとした (最後に使われた世代, デコード済みの値) のキャッシュ
+    _detail_cache: ClassVar[dict[str, tuple[int, dict[str, str]]]] = {}
+    _genres_cache: ClassVar[dict[str, tuple[int, list[Genre]]]] = {}
+
+    # 番組情報の更新ごとに進む世代
+    _generation: ClassVar[int] = 0
+
+
+    @classmethod
+    def encodeDetail(cls, detail: dict[str, str]) -> str:
+        """
+        番組詳細情報を JSON 文字列にエンコードする (Program.detail の JSONField の encoder として使われる)
+        番組情報の更新時に DB に書き込む値をそのままキャッシュしておき、後から読み込む際にデコードせずに済むようにする
+
+        Args:
+            detail (dict[str, str]): 番組詳細情報
+
+        Returns:
+            str: JSON 文字列
+        """
+
+        encoded = json.dumps(detail, ensure_ascii=False)
+        cls.__put(cls._detail_cache, encoded, detail)
+        return encoded
+
+
+    @classmethod
+    def encodeGenres(cls, genres: list[Genre]) -> str:
+        """
+        番組ジャンルを JSON 文字列にエンコードする (Program.genres の JSONField の encoder として使われる)
+
+        Args:
+            genres (list[Genre]): 番組ジャンル
+
+        Returns:
+            str: JSON 文字列
+        """
+
+        encoded = json.dumps(genres, ensure_ascii=False)
+        cls.__put(cls._genres_cache, encoded, genres)
+        return encoded
+
+
+    @classmethod
+    def decodeDetail(cls, encoded: str | bytes | None) -> dict[str, str]:
+        """
+        JSON 文字列の番組詳細情報をデコードする (Program.detail の JSONField の decoder としても使われる)
+
+        Args:
+            encoded (str | bytes | None): JSON 文字列 (空文字列や None の場合は空の辞書を返す)
+
+        Returns:
+            dict[str, str]: 番組詳細情報 (キャッシュと共有されるため変更しないこと)
+        """
+
+        if not encoded:
+            return {}
+        return cls.__get(cls._detail_cache, encoded if isinstance(encoded, str) else encoded.decode('utf-8'))
+
+
+    @classmethod
+    def decodeGenres(cls, encoded: str | bytes | None) -> list[Genre]:
+        """
+        JSON 文字列の番組ジャンルをデコードする (Program.genres の JSONField の decoder としても使われる)
+
+        Args:
+            encoded (str | bytes | None): JSON 文字列 (空文字列や None の場合は空のリストを返す)
+
+        Returns:
+            list[Genre]: 番組ジャンル (キャッシュと共有されるため変更しないこと)
+        """
+
+        if not encoded:
+            return []
+        return cls.__get(cls._genres_cache, encoded if isinstance(encoded, str) else encoded.decode('utf-8'))
+
+
+    @classmethod
+    def prune(cls) -> None:
+        """
+        前回の prune() 以降に一度も使われなかったエントリ (番組情報の更新で削除・変更された番組のものなど) を削除し、世代を進める
+        番組情報の更新が完了するたびに呼ばれる
+        """
+
+        for cache in (cls._detail_cache, cls._genres_cache):
+            stale_keys = [key for key, (generation, _) in cache.items() if generation < cls._generation]
+            for key in stale_keys:
+                del cache[key]
+        cls._generation += 1
+
+
+    @classmethod
+    def __get(cls, cache: dict[str, tuple[int, Any]], encoded: str) -> Any:
+        """
+        キャッシュからデコード済みの値を取得する (キャッシュにない場合はデコードしてキャッシュする)
+
+        Args:
+            cache (dict[str, tuple[int, Any]]): キャッシュ
+            encoded (str): JSON 文字列
+
+        Returns:
+            Any: デコード済みの値
+        """
+
+        entry = cache.get(encoded)
+        if entry is not None:
+            # 今の世代で使われたことを記録し、次の prune() で削除されないようにする
+            if entry[0] != cls._generation:
+                cache[encoded] = (cls._generation, entry[1])
+            return entry[1]
+
+        decoded = json.loads(encoded)
+        cls.__put(cache, encoded, decoded)
+        return decoded
+
+
+    @classmethod
+    def __put(cls, cache: dict[str, tuple[int, Any]], encoded: str, decoded: Any) -> None:
+        """
+        デコード済みの値をキャッシュに保存する
+
+        Args:
+            cache (dict[str, tuple[int, Any]]): キャッシュ
+            encoded (str): JSON 文字列
+            decoded (Any): デコード済みの値
+        """
+
+        if encoded in cache or len(cache) < cls.MAX_ENTRIES:
+            cache[encoded] = (cls._generation, decoded)
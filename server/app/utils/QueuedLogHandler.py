@@ -0,0 +1,155 @@
+
+import atexit
+import copy
+import importlib
+import logging
+import os
+import queue
+import threading
+from collections.abc import Mapping
+from typing import Any, ClassVar
+
+
+class QueuedLogHandler(logging.Handler):
+    """
+    ログレコードをキューに積むだけで即座に戻り、実際の書き込みはバックグラウンドのスレッドで行うログハンドラー
+    標準エラー出力やログファイルへの書き込みをイベントループのスレッドで同期的に行うと、ログファイルのあるドライブが一時的に詰まった際に
+    ライブストリームの配信などイベントループ上のすべての処理が止まってしまうため、書き込み先のハンドラーをこのハンドラーで包んで使う
+    ログのフォーマットは呼び出し元のスレッドで済ませてからキューに積むため、書き込み先のハンドラーにはフォーマッターを設定しない
+    すべての QueuedLogHandler で1つのキューと書き込みスレッドを共有し、ログの出力順を保つ
+    """
+
+    # 終了時にキューに残っているログの書き込みを待つ最大時間 (秒)
+    SHUTDOWN_TIMEOUT: ClassVar[float] = 5.0
+
+    # 書き込み先のハンドラーとログレコードの組、フラッシュ待ちのイベント、書き込みスレッドの終了を示す None のいずれかが入るキュー
+    _queue: ClassVar[queue.SimpleQueue[tuple[logging.Handler, logging.LogRecord] | threading.Event | None]] = queue.SimpleQueue()
+
+    # 書き込みスレッドと、そのスレッドを起動したプロセスの PID
+    ## マルチプロセス実行時に fork された子プロセスでは書き込みスレッドが引き継がれないため、PID が変わったら起動し直す
+    _thread: ClassVar[threading.Thread | None] = None
+    _thread_pid: ClassVar[int | None] = None
+    _thread_lock: ClassVar[threading.Lock] = threading.Lock()
+
+
+    def __init__(self, target: Mapping[str, Any]) -> None:
+        """
+        QueuedLogHandler を初期化する
+        logging.config.dictConfig() から、書き込み先のハンドラーの設定を target として受け取って初期化される
+
+        Args:
+            target (Mapping[str, Any]): 書き込み先のハンドラーの設定 (class キーにハンドラーのクラス名、それ以外のキーにコンストラクタの引数を指定する)
+        """
+
+        super().__init__()
+
+        # 書き込み先のハンドラーを初期化する
+        ## dictConfig() から渡される設定は ext:// などをアクセス時に変換する ConvertingDict なので、値はキーごとに取り出す
+        class_name = str(target['class'])
+        module_name, _, attribute_name = class_name.rpartition('.')
+        handler_class = getattr(importlib.import_module(module_name), attribute_name)
+        kwargs = {key: target[key] for key in target.keys() if key != 'class'}
+        self.target: logging.Handler = handler_class(**kwargs)
+
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """
+        ログレコードをフォーマットしてキューに積む
+
+        Args:
+            record (logging.LogRecord): ログレコード
+        """
+
+        try:
+            # logging.handlers.QueueHandler.prepare() と同様に、フォーマット済みのメッセージだけを持つレコードにする
+            ## 引数や例外情報はこの時点の内容でフォーマットしておかないと、書き込みスレッドで処理するまでの間に変化しうる
+            message = self.format(record)
+            record = copy.copy(record)
+            record.message = message
+            record.msg = message
+            record.args = None
+            record.exc_info = None
+            record.exc_text = None
+            record.stack_info = None
+            self.__ensureThread()
+            self._queue.put((self.target, record))
+        except Exception:
+            self.handleError(record)
+
+
+    def flush(self) -> None:
+        """
+        キューに積まれているログの書き込みが終わるまで待機する
+        """
+
+        # 書き込みスレッド自身から呼ばれた場合や、書き込みスレッドが起動していない場合は待機しない
+        thread = self._thread
+        if thread is None or thread.is_alive() is False or thread is threading.current_thread():
+            return
+        flushed_event = threading.Event()
+        self._queue.put(flushed_event)
+        flushed_event.wait(self.SHUTDOWN_TIMEOUT)
+
+
+    def close(self) -> None:
+        """
+        キューに積まれているログを書き込んでから、書き込み先のハンドラーを閉じる
+        dictConfig() の再実行時やプロセス終了時に呼ばれる
+        """
+
+        self.flush()
+        self.target.close()
+        super().close()
+
+
+    @classmethod
+    def __ensureThread(cls) -> None:
+        """
+        書き込みスレッドが起動していなければ起動する
+        """
+
+        if cls._thread is not None and cls._thread_pid == os.getpid():
+            return
+        with cls._thread_lock:
+            if cls._thread is not None and cls._thread_pid == os.getpid():
+                return
+            # fork 元のプロセスでキューに積まれていたログは親プロセス側で書き込まれるため、子プロセスでは新しいキューを使う
+            if cls._thread_pid is not None:
+                cls._queue = queue.SimpleQueue()
+            cls._thread = threading.Thread(target=cls.__run, name='QueuedLogHandler', daemon=True)
+            cls._thread_pid = os.getpid()
+            cls._thread.start()
+            atexit.register(cls.__shutdown)
+
+
+    @classmethod
+    def __run(cls) -> None:
+        """
+        キューからログレコードを取り出し、書き込み先のハンドラーで書き込む (書き込みスレッドで実行される)
+        """
+
+        while True:
+            item = cls._queue.get()
+            if item is None:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+            target, record = item
+            try:
+                target.handle(record)
+            except Exception:
+                target.handleError(record)
+
+
+    @classmethod
+    def __shutdown(cls) -> None:
+        """
+        プロセス終了時に、キューに残っているログを書き込んでから書き込みスレッドを終了する
+        """
+
+        thread = cls._thread
+        if thread is None or cls._thread_pid != os.getpid():
+            return
+        cls._queue.put(None)
+        thread.join(cls.SHUTDOWN_TIMEOUT)
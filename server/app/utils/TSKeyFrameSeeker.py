@@ -1,9 +1,13 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import bisect
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Literal, cast
+from typing import ClassVar, Literal, cast
 
+import numpy as np
 from biim.mpeg2ts import ts
 from biim.mpeg2ts.h264 import H264PES
 from biim.mpeg2ts.h265 import H265PES
@@ -12,6 +16,8 @@ from biim.mpeg2ts.pat import PATSection
 from biim.mpeg2ts.pes import PES
 from biim.mpeg2ts.pmt import PMTSection
 
+from app.utils.TSPacketReader import TSPacketReader
+
 
 @dataclass(slots=True)
 class TSKeyFramePosition:
@@ -89,20 +95,26 @@ class TSKeyFrameCollector:
         """
 
         keyframe_positions: list[TSKeyFramePosition] = []
-        offset = 0
-        # チャンク内の TS パケットを1つずつ走査し、映像 PID のキーフレームを検出する
-        while offset + self._stream_info.packet_size <= len(chunk):
-            current_file_offset = chunk_file_offset + offset
-            packet = TSKeyFrameSeeker.normalizePacket(
-                chunk[offset:offset + self._stream_info.packet_size],
-                self._stream_info.packet_size,
-            )
-            offset += self._stream_info.packet_size
-            if packet is None:
-                continue
-            # 映像 PID 以外のパケットはキーフレーム判定に不要なのでスキップする
-            if ts.pid(packet) != self._stream_info.video_pid:
-                continue
+        packet_size = self._stream_info.packet_size
+        packet_count = len(chunk) // packet_size
+        if packet_count == 0:
+            return keyframe_positions
+
+        # チャンクを (パケット数, パケットサイズ) の配列として扱い、sync_byte の検証と PID の抽出をまとめて行う
+        ## チャンクの大半を占める音声・PSI/SI・ヌルパケットを Python のループに乗せずに捨てられるため、
+        ## FeedTSStream() のワーカースレッドが GIL を握る時間を大きく減らせる
+        ## 192 バイトパケットの場合は先頭 4 バイトのタイムスタンプを飛ばした位置が TS ヘッダになる
+        header_offset = packet_size - ts.PACKET_SIZE
+        packets = np.frombuffer(chunk, dtype=np.uint8, count=packet_count * packet_size).reshape(packet_count, packet_size)
+        is_synced = packets[:, header_offset] == ts.SYNC_BYTE[0]
+        pids = ((packets[:, header_offset + 1].astype(np.uint16) & 0x1F) << 8) | packets[:, header_offset + 2]
+        video_packet_indexes = np.flatnonzero(is_synced & (pids == self._stream_info.video_pid))
+
+        # 映像 PID のパケットだけを1つずつ PES パーサーに通し、キーフレームを検出する
+        for packet_index in video_packet_indexes.tolist():
+            current_file_offset = chunk_file_offset + packet_index * packet_size
+            packet_offset = packet_index * packet_size + header_offset
+            packet = chunk[packet_offset:packet_offset + ts.PACKET_SIZE]
 
             # payload_unit_start_indicator が立っているパケットは新しい PES の先頭を示す
             is_payload_start = (packet[1] & 0x40) != 0
@@ -163,6 +175,24 @@ class _KeyFrameScanResult:
     has_confirmed_boundary: bool
 
 
+@dataclass(slots=True)
+class _TSFileIndex:
+    """
+    録画ファイルごとに、探索で得られた情報を視聴セッションをまたいで使い回すためのインデックス
+
+    Args:
+        stream_info (TSStreamInfo | None): ファイル先頭の PAT / PMT から取得したストリーム情報
+        base_dts (int | None): 録画先頭キーフレームの DTS (90kHz)
+        first_pcr (tuple[int, int] | None): ファイル先頭の PCR のファイル位置と PCR 90kHz 値
+        pcr_samples (list[tuple[int, int]]): 探索中に読んだ (先頭 PCR を基準に展開した PCR, ファイル位置) の疎なサンプル (PCR 昇順)
+    """
+
+    stream_info: TSStreamInfo | None = None
+    base_dts: int | None = None
+    first_pcr: tuple[int, int] | None = None
+    pcr_samples: list[tuple[int, int]] = field(default_factory=list)
+
+
 class TSKeyFrameSeeker:
     """
     TS 録画ファイルの再生開始位置を、プレイリスト上の相対時刻から解決する
@@ -171,6 +201,20 @@ class TSKeyFrameSeeker:
     PCR_SEARCH_WINDOW_BYTES = 2 * 1024 * 1024
     KEYFRAME_BACKTRACK_BYTES = 8 * 1024 * 1024
     MAX_KEYFRAME_SCAN_BYTES = 96 * 1024 * 1024
+    # PCR 探索で、目標時刻のこの範囲手前の PCR が見つかった時点で探索を打ち切る (90kHz)
+    ## 後段のキーフレーム探索は KEYFRAME_BACKTRACK_BYTES 手前から前方スキャンするため、1 秒程度手前であれば十分
+    PCR_SEARCH_TOLERANCE_TICKS = ts.HZ
+    # PCR 探索で読み込む位置の最大数 (補間探索が収束しない場合の保険)
+    PCR_SEARCH_MAX_PROBES = 32
+
+    # file_hash をキーとした、録画ファイルごとの探索結果のインデックス
+    ## 視聴セッションごとに作り直されると、同じ録画を開き直すたびに PAT / PMT・先頭 DTS・PCR 探索をやり直すことになるため、プロセス全体で共有する
+    ## シークは asyncio.to_thread() 経由でワーカースレッドから呼ばれるため、threading.Lock で保護する
+    _file_indexes: ClassVar[OrderedDict[str, _TSFileIndex]] = OrderedDict()
+    _file_indexes_lock: ClassVar[threading.Lock] = threading.Lock()
+    # インデックスを保持する録画ファイルの最大数と、1ファイルあたりの PCR サンプルの最大数
+    FILE_INDEX_MAX_ENTRIES: ClassVar[int] = 64
+    PCR_SAMPLE_MAX_COUNT: ClassVar[int] = 4096
 
 
     @staticmethod
@@ -179,10 +223,41 @@ class TSKeyFrameSeeker:
         *,
         start_offset: int = 0,
         max_scan_bytes: int | None = None,
+        file_hash: str | None = None,
     ) -> TSStreamInfo:
         """
         PAT/PMT から映像 PID と PCR PID を取得する
 
+        Args:
+            path (Path): TS コンテナの録画ファイルパス
+            start_offset (int): PAT / PMT の探索を開始する概算ファイル位置
+            max_scan_bytes (int | None): 最大スキャンバイト数 (None の場合は従来の上限を使用)
+            file_hash (str | None): 録画ファイルのハッシュ (指定時はファイル先頭から探索した結果をプロセス全体で使い回す)
+
+        Returns:
+            TSStreamInfo: オンデマンド探索に必要なストリーム情報
+        """
+
+        # ファイル先頭の PAT / PMT は録画ファイルごとに不変なため、インデックスにあればファイルを読まずに返す
+        file_index: _TSFileIndex | None = None
+        if file_hash is not None and start_offset == 0 and max_scan_bytes is None:
+            file_index = TSKeyFrameSeeker.__getFileIndex(file_hash)
+            with TSKeyFrameSeeker._file_indexes_lock:
+                if file_index.stream_info is not None:
+                    return file_index.stream_info
+
+        stream_info = TSKeyFrameSeeker.__readStreamInfo(path, start_offset, max_scan_bytes)
+        if file_index is not None:
+            with TSKeyFrameSeeker._file_indexes_lock:
+                file_index.stream_info = stream_info
+        return stream_info
+
+
+    @staticmethod
+    def __readStreamInfo(path: Path, start_offset: int, max_scan_bytes: int | None) -> TSStreamInfo:
+        """
+        指定位置から TS パケットを読み、PAT/PMT から映像 PID と PCR PID を取得する
+
         Args:
             path (Path): TS コンテナの録画ファイルパス
             start_offset (int): PAT / PMT の探索を開始する概算ファイル位置
@@ -198,45 +273,80 @@ class TSKeyFrameSeeker:
         pmt_pid: int | None = None
         aligned_start_offset = max(0, (start_offset // packet_size) * packet_size)
         max_packet_count = 300000 if max_scan_bytes is None else max(1, max_scan_bytes // packet_size)
+        scan_end_offset = aligned_start_offset + max_packet_count * packet_size
 
         with path.open('rb') as file:
-            file.seek(aligned_start_offset)
-            for _ in range(max_packet_count):
-                packet = TSKeyFrameSeeker.normalizePacket(file.read(packet_size), packet_size)
-                if packet is None:
-                    break
-
-                pid = ts.pid(packet)
-                if pid == 0x00:
-                    pat_parser.push(packet)
-                    for pat in pat_parser:
-                        if pat.CRC32() != 0:
-                            continue
-                        for program_number, program_map_pid in pat:
-                            if program_number != 0:
-                                pmt_pid = program_map_pid
-                                break
-                elif pmt_pid is not None and pid == pmt_pid:
-                    pmt_parser.push(packet)
-                    for pmt in pmt_parser:
-                        if pmt.CRC32() != 0:
-                            continue
-                        for stream_type, elementary_pid, _ in pmt:
-                            if stream_type == 0x02:
-                                return TSStreamInfo(elementary_pid, pmt.PCR_PID, 'MPEG-2', packet_size)
-                            if stream_type == 0x1B:
-                                return TSStreamInfo(elementary_pid, pmt.PCR_PID, 'H.264', packet_size)
-                            if stream_type == 0x24:
-                                return TSStreamInfo(elementary_pid, pmt.PCR_PID, 'H.265', packet_size)
+            scan_offset: int | None = aligned_start_offset
+            while scan_offset is not None:
+                # PAT と、PAT から判明した PMT のパケットだけを読む
+                ## PMT PID が判明・変化した時点で、そのパケットの直後から PID の絞り込みをやり直す
+                target_pids = (0x00,) if pmt_pid is None else (0x00, pmt_pid)
+                reader = TSPacketReader(file, packet_size, start_offset=scan_offset, end_offset=scan_end_offset)
+                scan_offset = None
+                for file_offset, packet in reader.iterPackets(target_pids):
+                    pid = ts.pid(packet)
+                    if pid == 0x00:
+                        previous_pmt_pid = pmt_pid
+                        pat_parser.push(packet)
+                        for pat in pat_parser:
+                            if pat.CRC32() != 0:
+                                continue
+                            for program_number, program_map_pid in pat:
+                                if program_number != 0:
+                                    pmt_pid = program_map_pid
+                                    break
+                        if pmt_pid != previous_pmt_pid:
+                            scan_offset = file_offset + packet_size
+                            break
+                    elif pmt_pid is not None and pid == pmt_pid:
+                        pmt_parser.push(packet)
+                        for pmt in pmt_parser:
+                            if pmt.CRC32() != 0:
+                                continue
+                            for stream_type, elementary_pid, _ in pmt:
+                                if stream_type == 0x02:
+                                    return TSStreamInfo(elementary_pid, pmt.PCR_PID, 'MPEG-2', packet_size)
+                                if stream_type == 0x1B:
+                                    return TSStreamInfo(elementary_pid, pmt.PCR_PID, 'H.264', packet_size)
+                                if stream_type == 0x24:
+                                    return TSStreamInfo(elementary_pid, pmt.PCR_PID, 'H.265', packet_size)
 
         raise RuntimeError(f'Video stream information was not found: {path}')
 
 
     @staticmethod
-    def findBaseDTS(path: Path, stream_info: TSStreamInfo) -> int:
+    def findBaseDTS(path: Path, stream_info: TSStreamInfo, file_hash: str | None = None) -> int:
         """
         TS コンテナ内の最初のキーフレーム DTS を取得する
 
+        Args:
+            path (Path): TS コンテナの録画ファイルパス
+            stream_info (TSStreamInfo): 対象映像 PID などのストリーム情報
+            file_hash (str | None): 録画ファイルのハッシュ (指定時は結果をプロセス全体で使い回す)
+
+        Returns:
+            int: 最初のキーフレーム DTS (90kHz)
+        """
+
+        file_index: _TSFileIndex | None = None
+        if file_hash is not None:
+            file_index = TSKeyFrameSeeker.__getFileIndex(file_hash)
+            with TSKeyFrameSeeker._file_indexes_lock:
+                if file_index.base_dts is not None:
+                    return file_index.base_dts
+
+        base_dts = TSKeyFrameSeeker.__readBaseDTS(path, stream_info)
+        if file_index is not None:
+            with TSKeyFrameSeeker._file_indexes_lock:
+                file_index.base_dts = base_dts
+        return base_dts
+
+
+    @staticmethod
+    def __readBaseDTS(path: Path, stream_info: TSStreamInfo) -> int:
+        """
+        ファイル先頭から映像 PES を読み、最初のキーフレーム DTS を取得する
+
         Args:
             path (Path): TS コンテナの録画ファイルパス
             stream_info (TSStreamInfo): 対象映像 PID などのストリーム情報
@@ -247,18 +357,10 @@ class TSKeyFrameSeeker:
 
         parser = TSKeyFrameSeeker.createPESParser(stream_info.codec)
         pending_pes_start: int | None = None
-        scanned_bytes = 0
 
         with path.open('rb') as file:
-            while scanned_bytes < TSKeyFrameSeeker.MAX_KEYFRAME_SCAN_BYTES:
-                current_file_offset = file.tell()
-                packet = TSKeyFrameSeeker.normalizePacket(file.read(stream_info.packet_size), stream_info.packet_size)
-                scanned_bytes += stream_info.packet_size
-                if packet is None:
-                    break
-                if ts.pid(packet) != stream_info.video_pid:
-                    continue
-
+            reader = TSPacketReader(file, stream_info.packet_size, max_scan_bytes=TSKeyFrameSeeker.MAX_KEYFRAME_SCAN_BYTES)
+            for current_file_offset, packet in reader.iterPackets((stream_info.video_pid,)):
                 is_payload_start = (packet[1] & 0x40) != 0
                 current_pes_start = current_file_offset if is_payload_start is True else None
                 # is_payload_start と current_pes_start は、いま読んだパケットが次の PES の開始位置かどうかを記録する
@@ -291,6 +393,8 @@ class TSKeyFrameSeeker:
         playlist_start_seconds: float,
         source_base_dts: int,
         max_keyframe_age_ticks: int,
+        file_hash: str | None = None,
+        duration_seconds: float | None = None,
     ) -> TSKeyFramePosition:
         """
         TS コンテナで、プレイリスト時刻以前の最も近いキーフレームを探索する
@@ -301,6 +405,8 @@ class TSKeyFrameSeeker:
             playlist_start_seconds (float): 録画内の相対再生時刻
             source_base_dts (int): 録画先頭キーフレームの DTS (90kHz)
             max_keyframe_age_ticks (int): 採用できるキーフレームの最大古さ (90kHz)
+            file_hash (str | None): 録画ファイルのハッシュ (指定時は PCR 探索で読んだサンプルをプロセス全体で使い回す)
+            duration_seconds (float | None): 録画ファイルの再生時間 (指定時は PCR 探索の最初の読み込み位置の推定に使う)
 
         Returns:
             TSKeyFramePosition: エンコード開始に使うファイル位置と DTS
@@ -308,11 +414,13 @@ class TSKeyFrameSeeker:
 
         file_size = path.stat().st_size
         target_dts = source_base_dts + round(playlist_start_seconds * ts.HZ)
-        pcr_offset = TSKeyFrameSeeker.__findOffsetByPCRBinarySearch(
+        pcr_offset = TSKeyFrameSeeker.__findOffsetByPCRSearch(
             path,
             stream_info,
             playlist_start_seconds,
             file_size,
+            file_hash = file_hash,
+            duration_seconds = duration_seconds,
         )
 
         keyframe = TSKeyFrameSeeker.__resolveKeyFrameNearOffset(
@@ -419,16 +527,10 @@ class TSKeyFrameSeeker:
         """
 
         aligned_offset = max(0, (start_offset // stream_info.packet_size) * stream_info.packet_size)
-        scanned_bytes = 0
         with path.open('rb') as file:
-            file.seek(aligned_offset)
-            while scanned_bytes < max_scan_bytes:
-                file_offset = file.tell()
-                packet = TSKeyFrameSeeker.normalizePacket(file.read(stream_info.packet_size), stream_info.packet_size)
-                scanned_bytes += stream_info.packet_size
-                if packet is None:
-                    continue
-                if ts.pid(packet) == stream_info.pcr_pid and ts.has_pcr(packet) is True:
+            reader = TSPacketReader(file, stream_info.packet_size, start_offset=aligned_offset, max_scan_bytes=max_scan_bytes)
+            for file_offset, packet in reader.iterPackets((stream_info.pcr_pid,), stop_on_sync_loss=False):
+                if ts.has_pcr(packet) is True:
                     return (file_offset, cast(int, ts.pcr(packet)))
         return None
 
@@ -537,16 +639,9 @@ class TSKeyFrameSeeker:
         scanned_bytes = 0
 
         with path.open('rb') as file:
-            file.seek(aligned_start_offset)
-            while scanned_bytes < max_scan_bytes:
-                current_file_offset = file.tell()
-                packet = TSKeyFrameSeeker.normalizePacket(file.read(stream_info.packet_size), stream_info.packet_size)
-                scanned_bytes += stream_info.packet_size
-                if packet is None:
-                    break
-                if ts.pid(packet) != stream_info.video_pid:
-                    continue
-
+            reader = TSPacketReader(file, stream_info.packet_size, start_offset=aligned_start_offset, max_scan_bytes=max_scan_bytes)
+            for current_file_offset, packet in reader.iterPackets((stream_info.video_pid,)):
+                scanned_bytes = current_file_offset + stream_info.packet_size - aligned_start_offset
                 is_payload_start = (packet[1] & 0x40) != 0
                 current_pes_start = current_file_offset if is_payload_start is True else None
                 # is_payload_start と current_pes_start は、いま読んだパケットが次の PES の開始位置かどうかを記録する
@@ -584,58 +679,178 @@ class TSKeyFrameSeeker:
 
 
     @staticmethod
-    def __findOffsetByPCRBinarySearch(
+    def __findOffsetByPCRSearch(
         path: Path,
         stream_info: TSStreamInfo,
         playlist_start_seconds: float,
         file_size: int,
+        *,
+        file_hash: str | None,
+        duration_seconds: float | None,
     ) -> int:
         """
-        PCR の単調増加を利用してプレイリスト時刻直前のファイル位置を二分探索する
+        PCR の単調増加を利用してプレイリスト時刻直前のファイル位置を探索する
+        放送 TS のビットレートはほぼ一定なため、二分探索ではなく、既知の (ファイル位置, PCR) の組から線形補間した位置を読む補間探索を行う
+        最初の読み込み位置はファイルサイズと再生時間から推定し、探索中に読んだ PCR は file_hash ごとのインデックスに蓄積して
+        以降のシークの探索範囲の絞り込みに使うため、ランダムなシークでも通常は 2〜3 回の読み込みで収束する
 
         Args:
             path (Path): TS コンテナの録画ファイルパス
             stream_info (TSStreamInfo): PCR PID を含むストリーム情報
             playlist_start_seconds (float): 録画内相対時刻
             file_size (int): ファイルサイズ
+            file_hash (str | None): 録画ファイルのハッシュ (None の場合はインデックスを使わない)
+            duration_seconds (float | None): 録画ファイルの再生時間 (None の場合は最初の読み込み位置を二分探索と同じく中央にする)
 
         Returns:
             int: 目標時刻直前と推定できるファイル位置
         """
 
-        first_pcr = TSKeyFrameSeeker.__readFirstPCRNear(
-            path,
-            stream_info,
-            0,
-            TSKeyFrameSeeker.PCR_SEARCH_WINDOW_BYTES,
-        )
+        file_index = TSKeyFrameSeeker.__getFileIndex(file_hash) if file_hash is not None else None
+
+        # ファイル先頭の PCR を取得する (インデックスにあれば再利用する)
+        first_pcr: tuple[int, int] | None = None
+        if file_index is not None:
+            with TSKeyFrameSeeker._file_indexes_lock:
+                first_pcr = file_index.first_pcr
         if first_pcr is None:
-            return 0
+            first_pcr = TSKeyFrameSeeker.__readFirstPCRNear(
+                path,
+                stream_info,
+                0,
+                TSKeyFrameSeeker.PCR_SEARCH_WINDOW_BYTES,
+            )
+            if first_pcr is None:
+                return 0
+            if file_index is not None:
+                with TSKeyFrameSeeker._file_indexes_lock:
+                    file_index.first_pcr = first_pcr
 
         first_offset, first_pcr_value = first_pcr
         target_pcr = first_pcr_value + round(playlist_start_seconds * ts.HZ)
-        lo = first_offset
-        hi = max(first_offset, file_size - stream_info.packet_size)
 
-        while hi - lo > TSKeyFrameSeeker.PCR_SEARCH_WINDOW_BYTES:
-            mid = ((lo + hi) // 2 // stream_info.packet_size) * stream_info.packet_size
-            mid_pcr = TSKeyFrameSeeker.__readFirstPCRNear(
+        def UnwrapPCR(pcr_value: int) -> int:
+            # 先頭 PCR を基準に展開し、録画途中での 33bit ラップアラウンドをまたいでも単調増加させる
+            return first_pcr_value + (pcr_value - first_pcr_value) % ts.PCR_CYCLE
+
+        # 探索範囲の下限 (PCR が目標以下の位置) と上限 (PCR が目標を超える位置)
+        ## インデックスに蓄積されたサンプルがあれば、目標を挟む最も近いサンプルから探索を始める
+        lower: tuple[int, int] = (first_offset, first_pcr_value)
+        upper: tuple[int, int] | None = None
+        if file_index is not None:
+            with TSKeyFrameSeeker._file_indexes_lock:
+                sample_index = bisect.bisect_right(file_index.pcr_samples, (target_pcr, file_size))
+                if sample_index > 0:
+                    sample_pcr, sample_offset = file_index.pcr_samples[sample_index - 1]
+                    if sample_offset > lower[0]:
+                        lower = (sample_offset, sample_pcr)
+                if sample_index < len(file_index.pcr_samples):
+                    sample_pcr, sample_offset = file_index.pcr_samples[sample_index]
+                    upper = (sample_offset, sample_pcr)
+        if target_pcr - lower[1] <= TSKeyFrameSeeker.PCR_SEARCH_TOLERANCE_TICKS:
+            return lower[0]
+
+        # 補間で探索範囲を半分以上に狭められなかった場合は、次の1回だけ二分探索に切り替える
+        ## ビットレートが大きく変動する区間で補間位置が端に偏り続け、収束が遅くなるのを防ぐ
+        use_bisection = False
+        for _ in range(TSKeyFrameSeeker.PCR_SEARCH_MAX_PROBES):
+            lower_offset = lower[0]
+            upper_offset = upper[0] if upper is not None else max(first_offset, file_size - stream_info.packet_size)
+            if upper_offset - lower_offset <= TSKeyFrameSeeker.PCR_SEARCH_WINDOW_BYTES:
+                break
+
+            # 目標よりわずかに手前の PCR を狙って読み込み位置を推定する
+            aim_pcr = target_pcr - TSKeyFrameSeeker.PCR_SEARCH_TOLERANCE_TICKS // 2
+            if upper is not None and upper[1] > lower[1] and use_bisection is False:
+                estimated_offset = lower_offset + round((upper_offset - lower_offset) * (aim_pcr - lower[1]) / (upper[1] - lower[1]))
+            elif upper is None and duration_seconds is not None and duration_seconds > 0 and use_bisection is False:
+                # 上限のサンプルがまだない場合は、ファイルサイズと再生時間から求めた平均ビットレートで外挿する
+                bytes_per_tick = (file_size - first_offset) / (duration_seconds * ts.HZ)
+                estimated_offset = lower_offset + round((aim_pcr - lower[1]) * bytes_per_tick)
+            else:
+                estimated_offset = (lower_offset + upper_offset) // 2
+            probe_offset = min(
+                max(estimated_offset, lower_offset + stream_info.packet_size),
+                upper_offset - stream_info.packet_size,
+            )
+            probe_offset = (probe_offset // stream_info.packet_size) * stream_info.packet_size
+
+            probe = TSKeyFrameSeeker.__readFirstPCRNear(
                 path,
                 stream_info,
-                mid,
+                probe_offset,
                 TSKeyFrameSeeker.PCR_SEARCH_WINDOW_BYTES,
             )
-            if mid_pcr is None:
-                lo = mid
+            if probe is None:
+                # PCR が読めない位置は、従来の二分探索と同じく目標より手前として扱う
+                lower = (probe_offset, lower[1])
+                use_bisection = True
                 continue
-            _, mid_pcr_value = mid_pcr
-            unwrapped_mid_pcr = TSKeyFrameSeeker.unwrapNear(mid_pcr_value, target_pcr)
-            if unwrapped_mid_pcr <= target_pcr:
-                lo = mid
+
+            pcr_offset, pcr_value = probe[0], UnwrapPCR(probe[1])
+            TSKeyFrameSeeker.__addPCRSample(file_index, pcr_offset, pcr_value)
+            previous_range = upper_offset - lower_offset
+            if pcr_value <= target_pcr:
+                if pcr_offset >= upper_offset:
+                    break
+                lower = (pcr_offset, pcr_value)
+                if target_pcr - pcr_value <= TSKeyFrameSeeker.PCR_SEARCH_TOLERANCE_TICKS:
+                    return pcr_offset
             else:
-                hi = mid
+                # probe_offset から pcr_offset までの間には PCR がないため、上限は読み込み位置そのものにできる
+                upper = (probe_offset, pcr_value)
+            current_upper_offset = upper[0] if upper is not None else upper_offset
+            use_bisection = (current_upper_offset - lower[0]) * 2 > previous_range
+
+        return lower[0]
+
+
+    @staticmethod
+    def __getFileIndex(file_hash: str) -> _TSFileIndex:
+        """
+        録画ファイルごとの探索結果のインデックスを取得する (存在しなければ作成する)
+
+        Args:
+            file_hash (str): 録画ファイルのハッシュ
+
+        Returns:
+            _TSFileIndex: インデックス
+        """
+
+        with TSKeyFrameSeeker._file_indexes_lock:
+            file_index = TSKeyFrameSeeker._file_indexes.get(file_hash)
+            if file_index is None:
+                file_index = _TSFileIndex()
+                TSKeyFrameSeeker._file_indexes[file_hash] = file_index
+                # 最も長く使われていない録画ファイルのインデックスから破棄する
+                while len(TSKeyFrameSeeker._file_indexes) > TSKeyFrameSeeker.FILE_INDEX_MAX_ENTRIES:
+                    TSKeyFrameSeeker._file_indexes.popitem(last=False)
+            else:
+                TSKeyFrameSeeker._file_indexes.move_to_end(file_hash)
+            return file_index
+
+
+    @staticmethod
+    def __addPCRSample(file_index: _TSFileIndex | None, pcr_offset: int, pcr_value: int) -> None:
+        """
+        PCR 探索で読んだ (ファイル位置, PCR) の組をインデックスに追加する
+
+        Args:
+            file_index (_TSFileIndex | None): インデックス (None の場合は何もしない)
+            pcr_offset (int): PCR を含む TS パケットのファイル位置
+            pcr_value (int): 先頭 PCR を基準に展開した PCR 90kHz 値
+        """
 
-        return lo
+        if file_index is None:
+            return
+        with TSKeyFrameSeeker._file_indexes_lock:
+            if len(file_index.pcr_samples) >= TSKeyFrameSeeker.PCR_SAMPLE_MAX_COUNT:
+                return
+            sample = (pcr_value, pcr_offset)
+            sample_index = bisect.bisect_left(file_index.pcr_samples, sample)
+            if sample_index < len(file_index.pcr_samples) and file_index.pcr_samples[sample_index] == sample:
+                return
+            file_index.pcr_samples.insert(sample_index, sample)
 
 
     @staticmethod
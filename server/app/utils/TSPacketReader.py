@@ -0,0 +1,124 @@
+
+from __future__ import annotations
+
+from collections.abc import Collection, Iterator
+from typing import BinaryIO, ClassVar
+
+import numpy as np
+from biim.mpeg2ts import ts
+
+
+class TSPacketReader:
+    """
+    TS ファイルを大きな窓単位でまとめて読み込み、TS パケットを memoryview で順に返すリーダー
+    TS パケットを1つずつ file.read() すると、数十 MB の探索で数十万回のシステムコールと bytes の生成が発生するため、
+    窓単位で読み込んだバッファの部分ビューをそのまま返し、PID の絞り込みも窓ごとに NumPy でまとめて行う
+    返すパケットは 192 バイトパケットの先頭 4 バイトを除いた 188 バイトのビューで、biim の各関数やパーサーにそのまま渡せる
+    """
+
+    # 最初に読み込む窓のサイズと、窓のサイズの上限
+    ## 探索の多くは読み込み開始位置の直後で終わるため、最初は小さく読み、探索が続くほど窓を倍々に広げる
+    INITIAL_WINDOW_SIZE: ClassVar[int] = 64 * 1024
+    MAX_WINDOW_SIZE: ClassVar[int] = 4 * 1024 * 1024
+
+
+    def __init__(
+        self,
+        file: BinaryIO,
+        packet_size: int = ts.PACKET_SIZE,
+        *,
+        start_offset: int = 0,
+        max_scan_bytes: int | None = None,
+        end_offset: int | None = None,
+    ) -> None:
+        """
+        TSPacketReader を初期化する
+
+        Args:
+            file (BinaryIO): 読み込む TS ファイルのファイルオブジェクト
+            packet_size (int): ファイル上の TS パケットサイズ (188 または 192)
+            start_offset (int): 読み込みを開始するファイル位置 (TS パケットの先頭位置を指定する)
+            max_scan_bytes (int | None): start_offset から読み込む最大バイト数 (None の場合は end_offset かファイル末尾まで)
+                (従来の1パケットずつ読む実装と同じく、上限をまたぐパケットまでは読む)
+            end_offset (int | None): 読み込みを終了するファイル位置 (None の場合はファイル末尾まで)
+        """
+
+        self.file = file
+        self.packet_size = packet_size
+        self.start_offset = max(0, start_offset)
+        self.end_offset = end_offset
+        if max_scan_bytes is not None:
+            scan_end_offset = self.start_offset + -(-max_scan_bytes // packet_size) * packet_size
+            self.end_offset = scan_end_offset if self.end_offset is None else min(self.end_offset, scan_end_offset)
+
+
+    def iterPackets(
+        self,
+        pids: Collection[int] | None = None,
+        *,
+        stop_on_sync_loss: bool = True,
+    ) -> Iterator[tuple[int, memoryview]]:
+        """
+        TS パケットをファイル位置と共に先頭から順に返す
+
+        Args:
+            pids (Collection[int] | None): 返すパケットの PID (None の場合はすべてのパケットを返す)
+            stop_on_sync_loss (bool): 同期バイトが一致しないパケットに到達した時点で読み込みを終了するか (False の場合は読み飛ばす)
+
+        Yields:
+            tuple[int, memoryview]: ファイル上のパケットの開始位置と、188 バイトの TS パケットのビュー
+        """
+
+        packet_size = self.packet_size
+        header_offset = packet_size - ts.PACKET_SIZE
+        target_pids: np.ndarray | None = None
+        if pids is not None:
+            target_pids = np.zeros(0x2000, dtype=np.bool_)
+            target_pids[list(pids)] = True
+
+        window_size = max(packet_size, (self.INITIAL_WINDOW_SIZE // packet_size) * packet_size)
+        max_window_size = max(packet_size, (self.MAX_WINDOW_SIZE // packet_size) * packet_size)
+        window_file_offset = self.start_offset
+        self.file.seek(window_file_offset)
+
+        while self.end_offset is None or window_file_offset < self.end_offset:
+            read_size = window_size
+            if self.end_offset is not None:
+                read_size = min(read_size, self.end_offset - window_file_offset)
+            # 窓ごとに新しい bytes として読み込むため、呼び出し側がビューを保持し続けても内容は書き換わらない
+            window = self.file.read(read_size)
+            packet_count = len(window) // packet_size
+            if packet_count == 0:
+                return
+
+            packets = np.frombuffer(window, dtype=np.uint8, count=packet_count * packet_size).reshape(packet_count, packet_size)
+            is_synced = packets[:, header_offset] == ts.SYNC_BYTE[0]
+
+            # 同期が外れたパケット以降は読まない
+            is_sync_lost = False
+            if stop_on_sync_loss is True:
+                unsynced_indexes = np.flatnonzero(~is_synced)
+                if len(unsynced_indexes) > 0:
+                    is_sync_lost = True
+                    is_synced = is_synced[:int(unsynced_indexes[0])]
+
+            if target_pids is not None:
+                packet_pids = ((packets[:len(is_synced), header_offset + 1].astype(np.uint16) & 0x1F) << 8) | packets[:len(is_synced), header_offset + 2]
+                packet_indexes = np.flatnonzero(is_synced & target_pids[packet_pids])
+            else:
+                packet_indexes = np.flatnonzero(is_synced)
+
+            window_view = memoryview(window)
+            for packet_index in packet_indexes.tolist():
+                packet_offset = packet_index * packet_size
+                yield (
+                    window_file_offset + packet_offset,
+                    window_view[packet_offset + header_offset:packet_offset + packet_size],
+                )
+
+            # 同期が外れたか、ファイル末尾に達した
+            if is_sync_lost is True or len(window) < read_size:
+                return
+
+            window_file_offset += packet_count * packet_size
+            window_size = min(window_size * 2, max_window_size)
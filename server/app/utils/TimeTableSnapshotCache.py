@@ -0,0 +1,182 @@
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import hashlib
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import datetime
+from typing import ClassVar
+
+from app import logging
+
+
+@dataclass(slots=True, frozen=True)
+class TimeTableSnapshotKey:
+    """
+    番組表スナップショットのキー (番組表 API のリクエストパラメーター)
+
+    Args:
+        channel_type (str | None): チャンネル種別 (None の場合は全種別)
+        pinned_channel_ids (tuple[str, ...] | None): ピン留めチャンネルの ID リスト (指定時は channel_type より優先される)
+        start_time (datetime): 取得開始日時
+        end_time (datetime | None): 取得終了日時 (None の場合は DB に存在する最終日時)
+    """
+
+    channel_type: str | None
+    pinned_channel_ids: tuple[str, ...] | None
+    start_time: datetime
+    end_time: datetime | None
+
+
+@dataclass(slots=True)
+class TimeTableSnapshot:
+    """
+    シリアライズ・gzip 圧縮済みの番組表スナップショット
+
+    Args:
+        revision (str): スナップショット生成時の番組表データのリビジョン (データバージョンと予約情報から生成される)
+        body_gzip (bytes): gzip 圧縮済みの JSON レスポンス
+        digest (str): 圧縮前の JSON レスポンスのハッシュ (ETag の生成に使う)
+    """
+
+    revision: str
+    body_gzip: bytes
+    digest: str
+
+    @property
+    def etag(self) -> str:
+        """ 圧縮前の JSON レスポンスの強い ETag """
+        return f'"{self.digest}"'
+
+    @property
+    def etag_gzip(self) -> str:
+        """ gzip 圧縮済みの JSON レスポンスの強い ETag (強い ETag は Content-Encoding ごとに異なる値にする必要がある) """
+        return f'"{self.digest}-gzip"'
+
+
+class TimeTableSnapshotCache:
+    """
+    番組表 API のレスポンスを、リクエストパラメーターごとにシリアライズ・圧縮済みのスナップショットとして保持するクラス
+    番組表のデータは番組情報・チャンネル情報の更新時にしか変化しないため、更新時に invalidate() でデータバージョンを進め、
+    保持しているスナップショットをバックグラウンドで再生成しておく
+    """
+
+    # 保持するスナップショットの最大数
+    ## 番組表の日付・チャンネル種別の組み合わせごとに1つずつ作られるため、よく開かれるものだけを残す
+    MAX_SNAPSHOTS: ClassVar[int] = 32
+
+    # 番組情報・チャンネル情報が更新されるたびに進むデータバージョン
+    _data_version: ClassVar[int] = 0
+
+    # スナップショットキーをキーとしたスナップショットの LRU キャッシュ
+    _snapshots: ClassVar[OrderedDict[TimeTableSnapshotKey, TimeTableSnapshot]] = OrderedDict()
+
+    # データ更新時に、保持しているスナップショットを再生成するコールバック (ProgramsRouter から登録される)
+    _regenerator: ClassVar[Callable[[list[TimeTableSnapshotKey]], Awaitable[None]] | None] = None
+    _regenerate_task: ClassVar[asyncio.Task[None] | None] = None
+
+
+    @classmethod
+    def getDataVersion(cls) -> int:
+        """
+        現在のデータバージョンを返す
+
+        Returns:
+            int: データバージョン
+        """
+
+        return cls._data_version
+
+
+    @classmethod
+    def get(cls, key: TimeTableSnapshotKey, revision: str) -> TimeTableSnapshot | None:
+        """
+        指定されたリビジョンのスナップショットを取得する
+
+        Args:
+            key (TimeTableSnapshotKey): スナップショットキー
+            revision (str): 現在の番組表データのリビジョン
+
+        Returns:
+            TimeTableSnapshot | None: スナップショット (存在しないか、リビジョンが古い場合は None)
+        """
+
+        snapshot = cls._snapshots.get(key)
+        if snapshot is None or snapshot.revision != revision:
+            return None
+        cls._snapshots.move_to_end(key)
+        return snapshot
+
+
+    @classmethod
+    async def put(cls, key: TimeTableSnapshotKey | None, revision: str, body: bytes) -> TimeTableSnapshot:
+        """
+        シリアライズ済みの JSON レスポンスを圧縮してスナップショットを作成し、キャッシュに保存する
+
+        Args:
+            key (TimeTableSnapshotKey | None): スナップショットキー (None の場合はキャッシュに保存しない)
+            revision (str): 番組表データのリビジョン
+            body (bytes): シリアライズ済みの JSON レスポンス
+
+        Returns:
+            TimeTableSnapshot: 作成したスナップショット
+        """
+
+        # 全チャンネル分の番組表は数 MB になるため、圧縮はスレッドで行いイベントループを止めないようにする
+        def CreateSnapshot() -> TimeTableSnapshot:
+            return TimeTableSnapshot(
+                revision = revision,
+                body_gzip = gzip.compress(body, compresslevel=6),
+                digest = hashlib.sha256(body).hexdigest()[:32],
+            )
+        snapshot = await asyncio.to_thread(CreateSnapshot)
+
+        if key is not None:
+            cls._snapshots[key] = snapshot
+            cls._snapshots.move_to_end(key)
+            while len(cls._snapshots) > cls.MAX_SNAPSHOTS:
+                cls._snapshots.popitem(last=False)
+        return snapshot
+
+
+    @classmethod
+    def setRegenerator(cls, regenerator: Callable[[list[TimeTableSnapshotKey]], Awaitable[None]]) -> None:
+        """
+        データ更新時に、保持しているスナップショットを再生成するコールバックを登録する
+
+        Args:
+            regenerator (Callable[[list[TimeTableSnapshotKey]], Awaitable[None]]): 再生成するスナップショットキーのリストを受け取るコールバック
+        """
+
+        cls._regenerator = regenerator
+
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """
+        番組情報・チャンネル情報の更新を通知し、データバージョンを進める
+        保持しているスナップショットは、次に番組表が開かれる前に終わるようバックグラウンドで再生成される
+        """
+
+        cls._data_version += 1
+        if cls._regenerator is None or len(cls._snapshots) == 0:
+            return
+
+        # 前回の再生成がまだ終わっていなければ中断する (どのみち古いデータバージョンのスナップショットになるため)
+        if cls._regenerate_task is not None and not cls._regenerate_task.done():
+            cls._regenerate_task.cancel()
+
+        # 最近使われたものから順に再生成する
+        keys = list(reversed(cls._snapshots.keys()))
+        regenerator = cls._regenerator
+        async def Regenerate() -> None:
+            try:
+                await regenerator(keys)
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                logging.warning('[TimeTableSnapshotCache] Failed to regenerate timetable snapshots:', exc_info=ex)
+        cls._regenerate_task = asyncio.create_task(Regenerate())
@@ -0,0 +1,863 @@
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import re
+import uuid
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Awaitable, Callable, Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, ClassVar
+
+import httpx
+from fastapi import HTTPException, status
+
+from app import logging
+from app.constants import API_REQUEST_HEADERS, TWITTER_MEDIA_CACHE_DIR
+
+
+@dataclass(slots=True)
+class TwitterMediaCacheEntry:
+    """
+    キャッシュされた Twitter の動画・画像1ファイル分の情報
+
+    Args:
+        key (str): URL のハッシュから生成したキャッシュキー (キャッシュファイル名に使う)
+        url (str): 動画・画像の URL
+        total_size (int): 動画・画像のファイルサイズ
+        content_type (str): Content-Type ヘッダーの値
+        etag (str | None): ETag ヘッダーの値
+        last_modified (str | None): Last-Modified ヘッダーの値
+        cache_control (str | None): Cache-Control ヘッダーの値
+        data_filename (str): キャッシュファイルのファイル名 (キャッシュを作り直すたびに異なる名前にする)
+        ranges (list[tuple[int, int]]): キャッシュファイルに書き込み済みのバイト範囲 ([開始位置, 終了位置) のリストで、開始位置順に並び重複しない)
+        reader_count (int): キャッシュファイルを読み書き中のレスポンスの数 (読み書き中のキャッシュは削除しない)
+    """
+
+    key: str
+    url: str
+    total_size: int
+    content_type: str
+    etag: str | None
+    last_modified: str | None
+    cache_control: str | None
+    data_filename: str
+    ranges: list[tuple[int, int]] = field(default_factory=list)
+    reader_count: int = 0
+
+    @property
+    def data_path(self) -> Path:
+        """ キャッシュファイルのパス """
+        return TWITTER_MEDIA_CACHE_DIR / self.data_filename
+
+    @property
+    def metadata_path(self) -> Path:
+        """ キャッシュのメタデータファイルのパス """
+        return TWITTER_MEDIA_CACHE_DIR / f'{self.key}.json'
+
+
+    def addRange(self, start: int, end: int) -> None:
+        """
+        書き込み済みのバイト範囲を追加し、隣接・重複する範囲と結合する
+
+        Args:
+            start (int): 開始位置
+            end (int): 終了位置 (この位置を含まない)
+        """
+
+        if start >= end:
+            return
+        merged_ranges: list[tuple[int, int]] = []
+        for range_start, range_end in self.ranges:
+            if range_end < start or end < range_start:
+                merged_ranges.append((range_start, range_end))
+            else:
+                start = min(start, range_start)
+                end = max(end, range_end)
+        merged_ranges.append((start, end))
+        merged_ranges.sort()
+        self.ranges = merged_ranges
+
+
+    def getCoveredEnd(self, position: int) -> int:
+        """
+        指定位置から連続して書き込み済みになっている範囲の終了位置を返す
+
+        Args:
+            position (int): 位置
+
+        Returns:
+            int: 書き込み済みの範囲の終了位置 (指定位置が書き込み済みでない場合は position をそのまま返す)
+        """
+
+        for range_start, range_end in self.ranges:
+            if range_start <= position < range_end:
+                return range_end
+        return position
+
+
+    def getUncoveredEnd(self, position: int) -> int:
+        """
+        指定位置から連続して書き込み済みになっていない範囲の終了位置 (次の書き込み済みの範囲の開始位置) を返す
+
+        Args:
+            position (int): 位置 (書き込み済みでない位置を指定する)
+
+        Returns:
+            int: 書き込み済みでない範囲の終了位置
+        """
+
+        for range_start, _ in self.ranges:
+            if range_start > position:
+                return range_start
+        return self.total_size
+
+
+    def toMetadata(self) -> dict[str, object]:
+        """
+        メタデータファイルに保存する辞書を返す
+
+        Returns:
+            dict[str, object]: メタデータ
+        """
+
+        return {
+            'url': self.url,
+            'total_size': self.total_size,
+            'content_type': self.content_type,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'cache_control': self.cache_control,
+            'data_filename': self.data_filename,
+            'ranges': self.ranges,
+        }
+
+
+@dataclass(slots=True)
+class TwitterMediaResponse:
+    """
+    TwitterMediaCache.open() が返す、クライアントに返すレスポンスの内容
+
+    Args:
+        status_code (int): HTTP ステータスコード
+        headers (dict[str, str]): レスポンスヘッダー
+        body (AsyncIterator[bytes]): レスポンスボディを返すイテレーター
+        cleanup (Callable[[], Awaitable[None]]): レスポンスの送信完了後に呼び出すクリーンアップ処理
+    """
+
+    status_code: int
+    headers: dict[str, str]
+    body: AsyncIterator[bytes]
+    cleanup: Callable[[], Awaitable[None]]
+
+
+class TwitterMediaCache:
+    """
+    Twitter の動画プロキシで取得した動画・画像を、取得したバイト範囲ごとにローカルディスクにキャッシュするクラス
+    video.twimg.com / pbs.twimg.com の URL が指す内容は変化しないため、URL のハッシュをキーとして、
+    ファイルサイズ分の疎なキャッシュファイルに取得済みの範囲だけを書き込んでいく
+    Range リクエストの範囲のうち取得済みの部分はキャッシュファイルから返し、未取得の部分だけを上流から取得するため、
+    同じ動画のシーク・リプレイや、複数のクライアントでの視聴で同じ範囲を何度もダウンロードしない
+    キャッシュの合計サイズが上限を超えた場合は、最も長く使われていないものから削除する
+    """
+
+    # キャッシュの合計サイズの上限 (バイト)
+    ## 疎なファイルに対応しないファイルシステムも考慮し、取得済みの範囲ではなくファイルサイズで計算する
+    MAX_CACHE_SIZE: ClassVar[int] = 1024 * 1024 * 1024  # 1GB
+
+    # キャッシュする1ファイルあたりのサイズの上限 (バイト)
+    ## これより大きいファイルはキャッシュせず、そのまま中継する
+    MAX_ENTRY_SIZE: ClassVar[int] = 256 * 1024 * 1024  # 256MB
+
+    # 上流からの取得とキャッシュファイルからの読み込みの単位 (バイト)
+    CHUNK_SIZE: ClassVar[int] = 256 * 1024  # 256KB
+
+    # 上流へのリクエストに転送するリクエストヘッダー (キャッシュを使わずにそのまま中継する場合)
+    PASSTHROUGH_REQUEST_HEADERS: ClassVar[tuple[str, ...]] = ('range', 'accept', 'accept-encoding', 'if-range', 'if-none-match', 'if-modified-since')
+
+    # クライアントに転送する上流のレスポンスヘッダー (キャッシュを使わずにそのまま中継する場合)
+    PASSTHROUGH_RESPONSE_HEADERS: ClassVar[tuple[str, ...]] = (
+        'content-type',
+        'content-length',
+        'content-range',
+        'accept-ranges',
+        'cache-control',
+        'etag',
+        'last-modified',
+    )
+
+    # キャッシュキーをキーとした、キャッシュの LRU インデックス
+    ## 初回のアクセス時に、キャッシュディレクトリにあるメタデータファイルから読み込む
+    _entries: ClassVar[OrderedDict[str, TwitterMediaCacheEntry] | None] = None
+    _entries_lock: ClassVar[asyncio.Lock | None] = None
+
+    # 上流へのリクエストに使う、接続をプールして使い回す httpx.AsyncClient
+    _client: ClassVar[httpx.AsyncClient | None] = None
+
+    # 実行中のメタデータの保存・キャッシュファイルの削除タスク
+    # ref: https://docs.astral.sh/ruff/rules/asyncio-dangling-task/
+    _background_tasks: ClassVar[set[asyncio.Task[None]]] = set()
+
+
+    @classmethod
+    def getClient(cls) -> httpx.AsyncClient:
+        """
+        上流へのリクエストに使う httpx.AsyncClient を取得する
+        リクエストごとに httpx.AsyncClient を作ると毎回 TLS 接続からやり直しになるため、すべてのリクエストで1つのクライアントを使い回す
+
+        Returns:
+            httpx.AsyncClient: 上流へのリクエストに使う httpx.AsyncClient
+        """
+
+        if cls._client is None:
+            cls._client = httpx.AsyncClient(
+                headers = {'User-Agent': API_REQUEST_HEADERS['User-Agent']},
+                follow_redirects = True,
+                timeout = 30.0,
+                limits = httpx.Limits(max_connections=32, max_keepalive_connections=8),
+            )
+        return cls._client
+
+
+    @classmethod
+    async def open(cls, url: str, request_headers: Mapping[str, str]) -> TwitterMediaResponse:
+        """
+        指定された URL の動画・画像を、キャッシュを使って取得する
+        Range ヘッダーが指定されている場合は、その範囲だけを返す
+
+        Args:
+            url (str): 動画・画像の URL (呼び出し元でドメインのバリデーションを済ませておくこと)
+            request_headers (Mapping[str, str]): クライアントからのリクエストヘッダー (キーは小文字)
+
+        Returns:
+            TwitterMediaResponse: クライアントに返すレスポンスの内容
+
+        Raises:
+            HTTPException: 上流へのリクエストに失敗したか、上流からエラーレスポンスが返された場合
+        """
+
+        # 単一の範囲の Range リクエスト以外や、条件付きリクエストはキャッシュを使わずにそのまま中継する
+        ## 複数の範囲の Range リクエストは動画・画像の再生では使われない
+        byte_range = cls.__parseRangeHeader(request_headers.get('range'))
+        if byte_range is None or 'if-none-match' in request_headers or 'if-modified-since' in request_headers:
+            return await cls.__openPassthrough(url, request_headers)
+
+        entries = await cls.__getEntries()
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        entry = entries.get(key)
+        if entry is None:
+            return await cls.__openUncached(url, key, request_headers, byte_range)
+
+        # If-Range がキャッシュした動画・画像と一致しない場合は、キャッシュを使わずにそのまま中継する
+        if_range = request_headers.get('if-range')
+        if if_range is not None and if_range not in (entry.etag, entry.last_modified):
+            return await cls.__openPassthrough(url, request_headers)
+
+        entries.move_to_end(key)
+
+        # 返す範囲を決める
+        start, end = cls.__resolveRange(byte_range, entry.total_size)
+        if start >= end:
+            return cls.__createRangeNotSatisfiableResponse(entry.total_size)
+
+        # 上流には問い合わせず、キャッシュした情報からレスポンスヘッダーを組み立てる
+        response_headers = cls.__createResponseHeaders(entry)
+        response_headers['content-length'] = str(end - start)
+        if 'range' in request_headers:
+            response_headers['content-range'] = f'bytes {start}-{end - 1}/{entry.total_size}'
+
+        file = await asyncio.to_thread(open, entry.data_path, 'r+b')
+        upstream_responses: list[httpx.Response] = []
+        return cls.__createCachedResponse(
+            entry = entry,
+            file = file,
+            status_code = status.HTTP_206_PARTIAL_CONTENT if 'range' in request_headers else status.HTTP_200_OK,
+            headers = response_headers,
+            body = cls.__iterCachedBody(entry, file, start, end, upstream_responses),
+            upstream_responses = upstream_responses,
+        )
+
+
+    @classmethod
+    async def __openPassthrough(cls, url: str, request_headers: Mapping[str, str]) -> TwitterMediaResponse:
+        """
+        キャッシュを使わずに、上流のレスポンスをそのまま中継する
+
+        Args:
+            url (str): 動画・画像の URL
+            request_headers (Mapping[str, str]): クライアントからのリクエストヘッダー (キーは小文字)
+
+        Returns:
+            TwitterMediaResponse: クライアントに返すレスポンスの内容
+        """
+
+        upstream_headers = {key: value for key, value in request_headers.items() if key in cls.PASSTHROUGH_REQUEST_HEADERS}
+        upstream_response = await cls.__sendUpstreamRequest(url, upstream_headers)
+        response_headers = {
+            key: value for key, value in upstream_response.headers.items()
+            if key.lower() in cls.PASSTHROUGH_RESPONSE_HEADERS
+        }
+        return TwitterMediaResponse(
+            status_code = upstream_response.status_code,
+            headers = response_headers,
+            body = upstream_response.aiter_bytes(chunk_size=cls.CHUNK_SIZE),
+            cleanup = upstream_response.aclose,
+        )
+
+
+    @classmethod
+    async def __openUncached(
+        cls,
+        url: str,
+        key: str,
+        request_headers: Mapping[str, str],
+        byte_range: tuple[int | None, int | None, int | None],
+    ) -> TwitterMediaResponse:
+        """
+        まだキャッシュにない動画・画像を上流から取得し、クライアントに中継しながらキャッシュファイルに書き込む
+
+        Args:
+            url (str): 動画・画像の URL
+            key (str): キャッシュキー
+            request_headers (Mapping[str, str]): クライアントからのリクエストヘッダー (キーは小文字)
+            byte_range (tuple[int | None, int | None, int | None]): クライアントが要求した範囲
+
+        Returns:
+            TwitterMediaResponse: クライアントに返すレスポンスの内容
+        """
+
+        # キャッシュファイルに書き込むバイト位置がずれないよう、圧縮せずに返すよう要求する
+        upstream_headers = {'Accept-Encoding': 'identity'}
+        if 'range' in request_headers:
+            upstream_headers['Range'] = request_headers['range']
+        upstream_response = await cls.__sendUpstreamRequest(url, upstream_headers)
+        response_headers = {
+            key: value for key, value in upstream_response.headers.items()
+            if key.lower() in cls.PASSTHROUGH_RESPONSE_HEADERS
+        }
+
+        # 上流のレスポンスから、返された範囲とファイルサイズを取得する
+        start: int | None = None
+        total_size: int | None = None
+        if upstream_response.status_code == status.HTTP_206_PARTIAL_CONTENT:
+            content_range = re.fullmatch(r'bytes (\d+)-(\d+)/(\d+)', upstream_response.headers.get('content-range', '').strip())
+            if content_range is not None:
+                start = int(content_range.group(1))
+                total_size = int(content_range.group(3))
+        elif upstream_response.status_code == status.HTTP_200_OK and upstream_response.headers.get('content-length', '').isdigit():
+            start = 0
+            total_size = int(upstream_response.headers['content-length'])
+
+        # ファイルサイズが分からないか、キャッシュするには大きすぎるか、圧縮されている場合はキャッシュせずにそのまま中継する
+        if (start is None or total_size is None or total_size == 0 or total_size > cls.MAX_ENTRY_SIZE or
+            upstream_response.headers.get('content-encoding', 'identity') != 'identity'):
+            return TwitterMediaResponse(
+                status_code = upstream_response.status_code,
+                headers = response_headers,
+                body = upstream_response.aiter_bytes(chunk_size=cls.CHUNK_SIZE),
+                cleanup = upstream_response.aclose,
+            )
+
+        # キャッシュを登録し、ファイルサイズ分の疎なキャッシュファイルを作成する
+        entries = await cls.__getEntries()
+        entry = entries.get(key)
+        if entry is not None and entry.total_size != total_size:
+            await cls.__discard(entry)
+            entry = None
+        if entry is None:
+            entry = TwitterMediaCacheEntry(
+                key = key,
+                url = url,
+                total_size = total_size,
+                content_type = upstream_response.headers.get('content-type', 'application/octet-stream'),
+                etag = upstream_response.headers.get('etag'),
+                last_modified = upstream_response.headers.get('last-modified'),
+                cache_control = upstream_response.headers.get('cache-control'),
+                # 同じ URL のキャッシュを作り直した場合でも、破棄した古いキャッシュファイルを読み込み中のレスポンスのデータを壊さないよう、
+                # キャッシュを作るたびに新しい名前のキャッシュファイルを作成する
+                data_filename = f'{key}.{uuid.uuid4().hex[:8]}.bin',
+            )
+            await cls.__evict(total_size)
+            def CreateDataFile() -> None:
+                TWITTER_MEDIA_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                with open(entry.data_path, 'xb') as data_file:
+                    data_file.truncate(total_size)
+            try:
+                await asyncio.to_thread(CreateDataFile)
+            except OSError as ex:
+                logging.warning(f'[TwitterMediaCache] Failed to create cache file for {url}:', exc_info=ex)
+                return TwitterMediaResponse(
+                    status_code = upstream_response.status_code,
+                    headers = response_headers,
+                    body = upstream_response.aiter_bytes(chunk_size=cls.CHUNK_SIZE),
+                    cleanup = upstream_response.aclose,
+                )
+            entries[key] = entry
+        entries.move_to_end(key)
+
+        # Range ヘッダーを指定せずにリクエストした場合 (= クライアントも Range ヘッダーを指定していない場合) は 200 のまま返す
+        file = await asyncio.to_thread(open, entry.data_path, 'r+b')
+        response_headers['accept-ranges'] = 'bytes'
+        return cls.__createCachedResponse(
+            entry = entry,
+            file = file,
+            status_code = upstream_response.status_code,
+            headers = response_headers,
+            body = cls.__iterUpstreamBody(entry, file, upstream_response, start),
+            upstream_responses = [upstream_response],
+        )
+
+
+    @classmethod
+    def __createCachedResponse(
+        cls,
+        entry: TwitterMediaCacheEntry,
+        file: BinaryIO,
+        status_code: int,
+        headers: dict[str, str],
+        body: AsyncIterator[bytes],
+        upstream_responses: list[httpx.Response],
+    ) -> TwitterMediaResponse:
+        """
+        キャッシュファイルを読み書きするレスポンスの内容を作成する
+        レスポンスの送信が完了するか、クライアントの切断などで中断された時点で、キャッシュファイルを閉じてメタデータを保存する
+
+        Args:
+            entry (TwitterMediaCacheEntry): キャッシュ
+            file (BinaryIO): 読み書きするキャッシュファイル
+            status_code (int): HTTP ステータスコード
+            headers (dict[str, str]): レスポンスヘッダー
+            body (AsyncIterator[bytes]): レスポンスボディを返すイテレーター
+            upstream_responses (list[httpx.Response]): レスポンスボディの取得中に開かれている上流のレスポンス (クリーンアップ時に閉じる)
+
+        Returns:
+            TwitterMediaResponse: クライアントに返すレスポンスの内容
+        """
+
+        entry.reader_count += 1
+        is_released = False
+
+        # レスポンスボディの送信が例外で中断された場合はクリーンアップ処理が呼ばれないため、どちらからでも1度だけ解放する
+        def Release() -> None:
+            nonlocal is_released
+            if is_released is False:
+                is_released = True
+                cls.__release(entry, file)
+
+        async def Body() -> AsyncIterator[bytes]:
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                Release()
+
+        async def Cleanup() -> None:
+            for upstream_response in upstream_responses:
+                await upstream_response.aclose()
+            Release()
+
+        return TwitterMediaResponse(
+            status_code = status_code,
+            headers = headers,
+            body = Body(),
+            cleanup = Cleanup,
+        )
+
+
+    @classmethod
+    async def __iterCachedBody(
+        cls,
+        entry: TwitterMediaCacheEntry,
+        file: BinaryIO,
+        start: int,
+        end: int,
+        upstream_responses: list[httpx.Response],
+    ) -> AsyncIterator[bytes]:
+        """
+        キャッシュ済みの動画・画像の指定範囲を返す
+        範囲のうち書き込み済みの部分はキャッシュファイルから読み込み、書き込み済みでない部分だけを上流から取得してキャッシュファイルに書き込む
+
+        Args:
+            entry (TwitterMediaCacheEntry): キャッシュ
+            file (BinaryIO): 読み書きするキャッシュファイル
+            start (int): 開始位置
+            end (int): 終了位置 (この位置を含まない)
+            upstream_responses (list[httpx.Response]): 取得中の上流のレスポンスを入れるリスト (クライアントの切断時に、クリーンアップ処理で閉じられるようにする)
+
+        Yields:
+            bytes: 動画・画像のデータ
+        """
+
+        position = start
+        while position < end:
+
+            # 書き込み済みの部分はキャッシュファイルから読み込む
+            covered_end = min(entry.getCoveredEnd(position), end)
+            if covered_end > position:
+                def Read(offset: int, size: int) -> bytes:
+                    file.seek(offset)
+                    return file.read(size)
+                chunk = await asyncio.to_thread(Read, position, min(cls.CHUNK_SIZE, covered_end - position))
+                if len(chunk) == 0:
+                    raise OSError(f'Unexpected end of cache file: {entry.data_path}')
+                position += len(chunk)
+                yield chunk
+                continue
+
+            # 書き込み済みでない部分は、次の書き込み済みの部分の直前までを上流から取得する
+            uncovered_end = min(entry.getUncoveredEnd(position), end)
+            upstream_response = await cls.__sendUpstreamRequest(entry.url, {
+                'Accept-Encoding': 'identity',
+                'Range': f'bytes={position}-{uncovered_end - 1}',
+            })
+            upstream_responses.append(upstream_response)
+            try:
+                # 上流の動画・画像が差し替えられていた場合、キャッシュ済みの部分と組み合わせると壊れたデータになるため、キャッシュを破棄して中断する
+                etag = upstream_response.headers.get('etag')
+                content_range = upstream_response.headers.get('content-range', '')
+                if ((entry.etag is not None and etag is not None and etag != entry.etag) or
+                    upstream_response.status_code != status.HTTP_206_PARTIAL_CONTENT or
+                    content_range.startswith(f'bytes {position}-') is False or
+                    content_range.endswith(f'/{entry.total_size}') is False):
+                    logging.warning(f'[TwitterMediaCache] Upstream content has changed. Discarding cache for {entry.url}.')
+                    await cls.__discard(entry)
+                    raise OSError(f'Upstream content has changed: {entry.url}')
+                async for chunk in cls.__iterUpstreamBody(entry, file, upstream_response, position, uncovered_end):
+                    position += len(chunk)
+                    yield chunk
+            finally:
+                upstream_responses.remove(upstream_response)
+                await upstream_response.aclose()
+            if position < uncovered_end:
+                raise OSError(f'Upstream response ended unexpectedly: {entry.url}')
+
+
+    @classmethod
+    async def __iterUpstreamBody(
+        cls,
+        entry: TwitterMediaCacheEntry,
+        file: BinaryIO,
+        upstream_response: httpx.Response,
+        start: int,
+        end: int | None = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        上流のレスポンスボディを返しながら、キャッシュファイルの対応する位置に書き込む
+
+        Args:
+            entry (TwitterMediaCacheEntry): キャッシュ
+            file (BinaryIO): 書き込むキャッシュファイル
+            upstream_response (httpx.Response): 上流のレスポンス
+            start (int): レスポンスボディの先頭が対応するファイル上の位置
+            end (int | None): 書き込む範囲の終了位置 (None の場合はファイル末尾まで)
+
+        Yields:
+            bytes: 動画・画像のデータ
+        """
+
+        end = entry.total_size if end is None else end
+        position = start
+
+        def Write(offset: int, data: bytes) -> None:
+            file.seek(offset)
+            file.write(data)
+            file.flush()
+
+        async for chunk in upstream_response.aiter_bytes(chunk_size=cls.CHUNK_SIZE):
+            chunk = chunk[:max(0, end - position)]
+            if len(chunk) == 0:
+                break
+            # 書き込みが終わってから書き込み済みの範囲に加えることで、他のレスポンスが書き込み途中のデータを読み込まないようにする
+            try:
+                await asyncio.to_thread(Write, position, chunk)
+                entry.addRange(position, position + len(chunk))
+            except OSError as ex:
+                logging.warning(f'[TwitterMediaCache] Failed to write cache file for {entry.url}:', exc_info=ex)
+            position += len(chunk)
+            yield chunk
+
+
+    @classmethod
+    async def __sendUpstreamRequest(cls, url: str, headers: Mapping[str, str]) -> httpx.Response:
+        """
+        上流にリクエストを送信し、レスポンスをストリーミングモードで受け取る
+
+        Args:
+            url (str): 動画・画像の URL
+            headers (Mapping[str, str]): リクエストヘッダー
+
+        Returns:
+            httpx.Response: 上流のレスポンス (呼び出し元で aclose() すること)
+
+        Raises:
+            HTTPException: 上流へのリクエストに失敗したか、上流からエラーレスポンスが返された場合
+        """
+
+        client = cls.getClient()
+        try:
+            upstream_request = client.build_request('GET', url, headers=headers)
+            upstream_response = await client.send(upstream_request, stream=True)
+        except Exception as ex:
+            logging.error('[TwitterMediaCache] Failed to request upstream:', exc_info=ex)
+            raise HTTPException(
+                status_code = status.HTTP_502_BAD_GATEWAY,
+                detail = f'Failed to request upstream: {ex}',
+            )
+
+        # 上流サーバーからエラーレスポンスが返された場合はクリーンアップしてエラーを返す
+        if upstream_response.status_code >= 400:
+            error_body = await upstream_response.aread()
+            await upstream_response.aclose()
+            error_text = error_body[:200].decode('utf-8', errors='replace')
+            logging.error(f'[TwitterMediaCache] Upstream returned HTTP {upstream_response.status_code}: {error_text}')
+            raise HTTPException(
+                status_code = upstream_response.status_code,
+                detail = f'Upstream returned HTTP {upstream_response.status_code}.',
+            )
+
+        return upstream_response
+
+
+    @staticmethod
+    def __parseRangeHeader(range_header: str | None) -> tuple[int | None, int | None, int | None] | None:
+        """
+        Range ヘッダーの値を解析する
+
+        Args:
+            range_header (str | None): Range ヘッダーの値
+
+        Returns:
+            tuple[int | None, int | None, int | None] | None: 開始位置・終了位置 (この位置を含む)・末尾からのバイト数の組
+                (Range ヘッダーがない場合は (0, None, None) 、キャッシュで扱えない形式の場合は None)
+        """
+
+        if range_header is None:
+            return (0, None, None)
+        match = re.fullmatch(r'\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*', range_header)
+        if match is None or (match.group(1) == '' and match.group(2) == ''):
+            return None
+        if match.group(1) == '':
+            return (None, None, int(match.group(2)))
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) != '' else None
+        if end is not None and end < start:
+            return None
+        return (start, end, None)
+
+
+    @staticmethod
+    def __resolveRange(byte_range: tuple[int | None, int | None, int | None], total_size: int) -> tuple[int, int]:
+        """
+        Range ヘッダーを解析した範囲を、ファイルサイズをもとに実際の範囲に変換する
+
+        Args:
+            byte_range (tuple[int | None, int | None, int | None]): Range ヘッダーを解析した範囲
+            total_size (int): ファイルサイズ
+
+        Returns:
+            tuple[int, int]: 開始位置と終了位置 (この位置を含まない) の組 (開始位置が終了位置以上の場合は範囲外)
+        """
+
+        start, end, suffix_length = byte_range
+        if suffix_length is not None:
+            return (max(0, total_size - suffix_length), total_size if suffix_length > 0 else 0)
+        assert start is not None
+        return (start, total_size if end is None else min(end + 1, total_size))
+
+
+    @staticmethod
+    def __createResponseHeaders(entry: TwitterMediaCacheEntry) -> dict[str, str]:
+        """
+        キャッシュした情報からレスポンスヘッダーを組み立てる
+
+        Args:
+            entry (TwitterMediaCacheEntry): キャッシュ
+
+        Returns:
+            dict[str, str]: レスポンスヘッダー
+        """
+
+        headers = {
+            'content-type': entry.content_type,
+            'accept-ranges': 'bytes',
+        }
+        if entry.cache_control is not None:
+            headers['cache-control'] = entry.cache_control
+        if entry.etag is not None:
+            headers['etag'] = entry.etag
+        if entry.last_modified is not None:
+            headers['last-modified'] = entry.last_modified
+        return headers
+
+
+    @staticmethod
+    def __createRangeNotSatisfiableResponse(total_size: int) -> TwitterMediaResponse:
+        """
+        要求された範囲がファイルサイズを超えている場合の 416 レスポンスを作成する
+
+        Args:
+            total_size (int): ファイルサイズ
+
+        Returns:
+            TwitterMediaResponse: クライアントに返すレスポンスの内容
+        """
+
+        async def EmptyBody() -> AsyncIterator[bytes]:
+            return
+            yield
+
+        async def Cleanup() -> None:
+            pass
+
+        return TwitterMediaResponse(
+            status_code = status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers = {'content-range': f'bytes */{total_size}', 'content-length': '0'},
+            body = EmptyBody(),
+            cleanup = Cleanup,
+        )
+
+
+    @classmethod
+    def __release(cls, entry: TwitterMediaCacheEntry, file: BinaryIO) -> None:
+        """
+        レスポンスの送信完了後に、キャッシュファイルを閉じてメタデータをバックグラウンドで保存する
+        読み書き中に破棄されたキャッシュの場合は、最後のレスポンスの完了時にキャッシュファイルをバックグラウンドで削除する
+        クライアントの切断でキャンセルされた後にも呼ばれるため、await せずに済む処理だけを行う
+
+        Args:
+            entry (TwitterMediaCacheEntry): キャッシュ
+            file (BinaryIO): 閉じるキャッシュファイル
+        """
+
+        file.close()
+        entry.reader_count -= 1
+
+        # 破棄されたキャッシュのメタデータは保存せず、読み書き中のレスポンスがなくなった時点でキャッシュファイルを削除する
+        if cls._entries is None or cls._entries.get(entry.key) is not entry:
+            if entry.reader_count > 0:
+                return
+            async def DeleteDataFile() -> None:
+                try:
+                    await asyncio.to_thread(entry.data_path.unlink, missing_ok=True)
+                except OSError as ex:
+                    logging.warning(f'[TwitterMediaCache] Failed to delete cache file for {entry.url}:', exc_info=ex)
+            task = asyncio.create_task(DeleteDataFile())
+        else:
+            metadata = json.dumps(entry.toMetadata(), ensure_ascii=False)
+            async def SaveMetadata() -> None:
+                try:
+                    await asyncio.to_thread(entry.metadata_path.write_text, metadata, encoding='utf-8')
+                except OSError as ex:
+                    logging.warning(f'[TwitterMediaCache] Failed to save cache metadata for {entry.url}:', exc_info=ex)
+            task = asyncio.create_task(SaveMetadata())
+        cls._background_tasks.add(task)
+        task.add_done_callback(cls._background_tasks.discard)
+
+
+    @classmethod
+    async def __discard(cls, entry: TwitterMediaCacheEntry) -> None:
+        """
+        キャッシュをインデックスから外し、キャッシュファイルとメタデータファイルを削除する
+        読み書き中のレスポンスがある場合、キャッシュファイルの削除は最後のレスポンスの完了時の __release() に任せる
+
+        Args:
+            entry (TwitterMediaCacheEntry): 破棄するキャッシュ
+        """
+
+        if cls._entries is not None and cls._entries.get(entry.key) is entry:
+            cls._entries.pop(entry.key)
+        def Delete() -> None:
+            entry.metadata_path.unlink(missing_ok=True)
+            # Windows では開かれているファイルを削除できないため、読み書き中のキャッシュファイルは残す
+            ## 同じ URL のキャッシュを作り直しても別の名前のキャッシュファイルになるため、読み込み中のデータが上書きされることはない
+            if entry.reader_count == 0:
+                entry.data_path.unlink(missing_ok=True)
+        try:
+            await asyncio.to_thread(Delete)
+        except OSError as ex:
+            logging.warning(f'[TwitterMediaCache] Failed to delete cache for {entry.url}:', exc_info=ex)
+
+
+    @classmethod
+    async def __evict(cls, required_size: int) -> None:
+        """
+        新たに required_size バイトのキャッシュを追加できるよう、最も長く使われていないキャッシュから削除する
+        読み書き中のキャッシュは削除しない
+
+        Args:
+            required_size (int): 新たに追加するキャッシュのサイズ
+        """
+
+        entries = await cls.__getEntries()
+        total_size = sum(entry.total_size for entry in entries.values())
+        for entry in list(entries.values()):
+            if total_size + required_size <= cls.MAX_CACHE_SIZE:
+                break
+            if entry.reader_count > 0:
+                continue
+            total_size -= entry.total_size
+            await cls.__discard(entry)
+
+
+    @classmethod
+    async def __getEntries(cls) -> OrderedDict[str, TwitterMediaCacheEntry]:
+        """
+        キャッシュのインデックスを取得する
+        初回の呼び出し時に、キャッシュディレクトリにあるメタデータファイルを更新日時順に読み込み、対応するファイルのないものは削除する
+
+        Returns:
+            OrderedDict[str, TwitterMediaCacheEntry]: キャッシュキーをキーとしたキャッシュの LRU インデックス
+        """
+
+        if cls._entries is not None:
+            return cls._entries
+        if cls._entries_lock is None:
+            cls._entries_lock = asyncio.Lock()
+        async with cls._entries_lock:
+            if cls._entries is not None:
+                return cls._entries
+
+            def LoadEntries() -> list[TwitterMediaCacheEntry]:
+                if TWITTER_MEDIA_CACHE_DIR.is_dir() is False:
+                    return []
+                loaded_entries: list[TwitterMediaCacheEntry] = []
+                metadata_paths = sorted(TWITTER_MEDIA_CACHE_DIR.glob('*.json'), key=lambda path: path.stat().st_mtime)
+                for metadata_path in metadata_paths:
+                    try:
+                        metadata = json.loads(metadata_path.read_text(encoding='utf-8'))
+                        entry = TwitterMediaCacheEntry(
+                            key = metadata_path.stem,
+                            url = str(metadata['url']),
+                            total_size = int(metadata['total_size']),
+                            content_type = str(metadata['content_type']),
+                            etag = metadata.get('etag'),
+                            last_modified = metadata.get('last_modified'),
+                            cache_control = metadata.get('cache_control'),
+                            # キャッシュファイル名を記録していない古いメタデータの場合は、以前のファイル名とみなす
+                            data_filename = str(metadata.get('data_filename', f'{metadata_path.stem}.bin')),
+                            ranges = [(int(range_start), int(range_end)) for range_start, range_end in metadata['ranges']],
+                        )
+                        if entry.data_path.is_file() is False or entry.data_path.stat().st_size != entry.total_size:
+                            raise ValueError('Cache file is missing or broken.')
+                        loaded_entries.append(entry)
+                    except Exception:
+                        metadata_path.unlink(missing_ok=True)
+                # メタデータファイルのないキャッシュファイルは、前回の終了時に削除できなかったか、メタデータの保存前に終了したものなので削除する
+                ## 壊れていたメタデータファイルに対応するキャッシュファイルも、ここで削除される
+                loaded_data_filenames = {entry.data_filename for entry in loaded_entries}
+                for data_path in TWITTER_MEDIA_CACHE_DIR.glob('*.bin'):
+                    if data_path.name not in loaded_data_filenames:
+                        data_path.unlink(missing_ok=True)
+                return loaded_entries
+
+            entries: OrderedDict[str, TwitterMediaCacheEntry] = OrderedDict()
+            try:
+                for entry in await asyncio.to_thread(LoadEntries):
+                    entries[entry.key] = entry
+            except OSError as ex:
+                logging.warning('[TwitterMediaCache] Failed to load cache index:', exc_info=ex)
+            cls._entries = entries
+            return entries
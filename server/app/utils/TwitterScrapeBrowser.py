@@ -25,6 +25,7 @@ from app.constants import (
     TWITTER_DEBUG_SCREENSHOTS_RETENTION_DAYS,
 )
 from app.models.TwitterAccount import TwitterAccount
+from app.utils.UploadImageConverter import UploadImageConverter
 
 
 class BrowserBinaryNotFoundError(RuntimeError):
@@ -87,6 +88,9 @@ class TwitterScrapeBrowser:
     ## 保存値がない場合だけこの既定値を使い、x.com へ `Accept-Language: en-US` を送信しないようにする
     _FALLBACK_ACCEPT_LANGUAGE: ClassVar[str] = 'ja,en;q=0.9'
     _FALLBACK_ACCEPT_LANGUAGES: ClassVar[tuple[str, ...]] = ('ja', 'en')
+    # Twitter Web App から添付できる画像の容量上限
+    ## これを超える画像は Twitter Web App 側でアップロードが拒否されるため、事前に上限に収まる WebP に変換する
+    MAX_IMAGE_BYTES: ClassVar[int] = 5 * 1024 * 1024
 
     def __init__(self, twitter_account: TwitterAccount) -> None:
         """
@@ -1374,6 +1378,11 @@ class TwitterScrapeBrowser:
                         image_bytes = await image.read()
                         mime_type = image.content_type or 'image/jpeg'
                         filename = image.filename or 'capture.jpg'
+                        # 容量上限を超える画像だけを WebP に変換し、通常のキャプチャは元の JPEG をそのまま添付する
+                        if len(image_bytes) > self.MAX_IMAGE_BYTES:
+                            image_bytes = await UploadImageConverter.convertToWebPWithinSize(image_bytes, self.MAX_IMAGE_BYTES)
+                            mime_type = 'image/webp'
+                            filename = f'{filename.rsplit(".", 1)[0]}.webp'
                         image_base64 = base64.b64encode(image_bytes).decode('ascii')
                         images_json_array.append({
                             'base64': image_base64,
@@ -0,0 +1,170 @@
+
+import asyncio
+import io
+import math
+from typing import ClassVar
+
+from PIL import Image
+
+
+class UploadImageConverter:
+    """
+    Bluesky や Twitter に投稿するキャプチャ画像を、投稿先の容量上限に収まる WebP 画像に変換するクラス
+    以前は長辺のサイズと quality の組み合わせを順に総当たりしていたため、大きなキャプチャ画像では投稿までに数十回の WebP エンコードが走っていた
+    1回目のエンコード結果のサイズから quality を見積もって二分探索し、縮小が必要な場合も容量の比率から縮小率を決めることで、エンコード回数を数回に抑える
+    """
+
+    # quality の探索範囲
+    ## 容量上限に収まる範囲でなるべく高い quality を選ぶ
+    ## MIN_QUALITY でも収まらない場合は、quality をこれ以上下げずに解像度を縮小する (画質より解像度の維持を優先するため)
+    MAX_QUALITY: ClassVar[int] = 85
+    MIN_QUALITY: ClassVar[int] = 50
+    # quality の二分探索をこの幅まで絞り込んだら打ち切る
+    QUALITY_SEARCH_PRECISION: ClassVar[int] = 3
+    # MIN_QUALITY でエンコードした際の、MAX_QUALITY でエンコードした際に対するおおよその容量の比率
+    ## MAX_QUALITY での容量にこの比率を掛けても上限を大きく超える場合は、MIN_QUALITY でのエンコードを省略してすぐに縮小する
+    ESTIMATED_MIN_QUALITY_SIZE_RATIO: ClassVar[float] = 0.45
+
+    # WebP の圧縮レベル (0-6)
+    ## 6 は 4 と比べて数 % 小さくなる程度なのに対しエンコード時間が数倍かかるため、投稿までの待ち時間を優先して 4 を使う
+    WEBP_METHOD: ClassVar[int] = 4
+
+    # 縮小率を容量の比率から求める際の安全係数
+    ## 容量はおおむね画素数に比例するが、縮小で細部が平滑化されるほど比例より小さくなるため、わずかに小さめの縮小率にして1回で収まるようにする
+    RESIZE_SAFETY_FACTOR: ClassVar[float] = 0.92
+    # 縮小の最大試行回数と、これ以上は縮小しない長辺の最小サイズ (px)
+    MAX_RESIZE_ATTEMPTS: ClassVar[int] = 4
+    MIN_LONG_EDGE: ClassVar[int] = 640
+
+
+    @classmethod
+    async def convertToWebPWithinSize(cls, image_bytes: bytes, max_bytes: int) -> bytes:
+        """
+        画像を max_bytes 以下の WebP 画像に変換する
+        エンコードは CPU-bound な処理のため、イベントループをブロックしないようワーカースレッドで実行する
+
+        Args:
+            image_bytes (bytes): 変換前の画像データ
+            max_bytes (int): 変換後の画像データの上限サイズ (バイト)
+
+        Returns:
+            bytes: max_bytes 以下の WebP 画像データ
+
+        Raises:
+            ValueError: 長辺を MIN_LONG_EDGE まで縮小しても max_bytes 以下に収まらない場合
+        """
+
+        return await asyncio.to_thread(cls.__convertToWebPWithinSize, image_bytes, max_bytes)
+
+
+    @classmethod
+    def __convertToWebPWithinSize(cls, image_bytes: bytes, max_bytes: int) -> bytes:
+        """
+        画像を max_bytes 以下の WebP 画像に変換する (ワーカースレッドで実行される)
+
+        Args:
+            image_bytes (bytes): 変換前の画像データ
+            max_bytes (int): 変換後の画像データの上限サイズ (バイト)
+
+        Returns:
+            bytes: max_bytes 以下の WebP 画像データ
+        """
+
+        with Image.open(io.BytesIO(image_bytes)) as opened_image:
+            # アルファチャンネル付き画像も WebP に保存できるよう RGBA に寄せる
+            original_image = opened_image if opened_image.mode in ('RGB', 'RGBA') else opened_image.convert('RGBA')
+            original_image.load()
+
+            working_image = original_image
+            for _ in range(cls.MAX_RESIZE_ATTEMPTS + 1):
+
+                # 現在の解像度で、容量上限に収まる最も高い quality を探す
+                converted_bytes, min_quality_size = cls.__searchQuality(working_image, max_bytes)
+                if converted_bytes is not None:
+                    return converted_bytes
+
+                # MIN_QUALITY でも収まらない場合は、容量の比率から縮小率を求めて縮小する
+                ## 縮小を繰り返すと画質が劣化するため、常に元画像から縮小する
+                resize_ratio = math.sqrt(max_bytes / min_quality_size) * cls.RESIZE_SAFETY_FACTOR
+                long_edge = max(working_image.width, working_image.height)
+                resized_long_edge = max(cls.MIN_LONG_EDGE, int(long_edge * resize_ratio))
+                if resized_long_edge >= long_edge:
+                    break
+                scale = resized_long_edge / max(original_image.width, original_image.height)
+                working_image = original_image.resize(
+                    (max(1, round(original_image.width * scale)), max(1, round(original_image.height * scale))),
+                    Image.Resampling.LANCZOS,
+                )
+
+        raise ValueError(f'Image size exceeds {max_bytes} bytes even after WebP conversion.')
+
+
+    @classmethod
+    def __searchQuality(cls, image: Image.Image, max_bytes: int) -> tuple[bytes | None, int]:
+        """
+        容量上限に収まる範囲で最も高い quality で画像を WebP にエンコードする
+        MAX_QUALITY で収まればそのまま返し、収まらなければ MIN_QUALITY との2点の容量から quality を見積もり、以降は二分探索で絞り込む
+
+        Args:
+            image (Image.Image): エンコードする画像
+            max_bytes (int): 上限サイズ (バイト)
+
+        Returns:
+            tuple[bytes | None, int]: 容量上限に収まった WebP 画像データ (MIN_QUALITY でも収まらない場合は None) と、MIN_QUALITY でエンコードした際の (見積もりの) サイズ
+        """
+
+        # 大半のキャプチャ画像は MAX_QUALITY で収まるため、まず1回だけエンコードする
+        high_bytes = cls.__encode(image, cls.MAX_QUALITY)
+        if len(high_bytes) <= max_bytes:
+            return high_bytes, len(high_bytes)
+
+        # MAX_QUALITY での容量から見積もって明らかに MIN_QUALITY でも収まらない場合は、エンコードせずに見積もった容量を返して縮小させる
+        estimated_min_quality_size = int(len(high_bytes) * cls.ESTIMATED_MIN_QUALITY_SIZE_RATIO)
+        if estimated_min_quality_size > max_bytes * 1.5:
+            return None, estimated_min_quality_size
+
+        # MIN_QUALITY でも収まらなければ、縮小が必要
+        low_bytes = cls.__encode(image, cls.MIN_QUALITY)
+        if len(low_bytes) > max_bytes:
+            return None, len(low_bytes)
+
+        # MIN_QUALITY (収まる) と MAX_QUALITY (収まらない) の間で、収まる最も高い quality を探す
+        ## 1回目は2点の容量から見積もった quality を試し、以降は二分探索する
+        ## WebP の容量は quality に対して指数関数的に増えるため、容量の対数で補間する
+        low_quality, high_quality = cls.MIN_QUALITY, cls.MAX_QUALITY
+        low_size, high_size = len(low_bytes), len(high_bytes)
+        best_bytes = low_bytes
+        is_first_attempt = True
+        while high_quality - low_quality > cls.QUALITY_SEARCH_PRECISION:
+            if is_first_attempt is True:
+                estimated_quality = low_quality + (high_quality - low_quality) * \
+                    math.log(max_bytes / low_size) / math.log(high_size / low_size)
+                quality = min(high_quality - 1, max(low_quality + 1, int(estimated_quality)))
+                is_first_attempt = False
+            else:
+                quality = (low_quality + high_quality) // 2
+            converted_bytes = cls.__encode(image, quality)
+            if len(converted_bytes) <= max_bytes:
+                low_quality, best_bytes = quality, converted_bytes
+            else:
+                high_quality = quality
+
+        return best_bytes, low_size
+
+
+    @classmethod
+    def __encode(cls, image: Image.Image, quality: int) -> bytes:
+        """
+        画像を指定された quality で WebP にエンコードする
+
+        Args:
+            image (Image.Image): エンコードする画像
+            quality (int): WebP の quality (0-100)
+
+        Returns:
+            bytes: WebP 画像データ
+        """
+
+        output_buffer = io.BytesIO()
+        image.save(output_buffer, format='WEBP', quality=quality, method=cls.WEBP_METHOD)
+        return output_buffer.getvalue()
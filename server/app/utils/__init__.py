@@ -1,6 +1,7 @@
 
 import asyncio
 import concurrent.futures
+import itertools
 import platform
 import sys
 from collections.abc import Callable
@@ -8,7 +9,10 @@ from datetime import datetime
 from pathlib import Path
 from typing import Any, Literal
 
-from app.constants import JST
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from app.constants import DATABASE_READ_CONNECTION_COUNT, JST
 
 
 def NormalizeToJSTDatetime(value: datetime) -> datetime:
@@ -81,6 +85,21 @@ def GetMirakurunAPIEndpointURL(endpoint: str) -> str:
     return str(Config().general.mirakurun_url).rstrip('/') + endpoint
 
 
+def GetDatabaseReadConnection() -> BaseDBAsyncClient:
+    """
+    生 SQL による読み取りに使う、読み取り専用のデータベースコネクションを取得する
+    WAL モードの SQLite では読み取りと書き込みが互いをブロックしないため、番組情報の更新などの書き込み中でも待たされずに読み取れる
+    各コネクションは同時に1つのクエリしか実行できないため、呼び出しごとにラウンドロビンで異なるコネクションを返す
+
+    Returns:
+        BaseDBAsyncClient: 読み取り専用のデータベースコネクション
+    """
+
+    return connections.get(f'read_{next(__database_read_connection_counter) % DATABASE_READ_CONNECTION_COUNT}')
+
+__database_read_connection_counter = itertools.count()
+
+
 def GetPlatformEnvironment() -> Literal['Windows', 'Linux', 'Linux-Docker', 'Linux-ARM'] | None:
     """
     サーバーが稼働している動作環境を取得する
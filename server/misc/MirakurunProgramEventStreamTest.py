@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+
+# Usage: poetry run python -m misc.MirakurunProgramEventStreamTest [--programs 200]
+
+"""
+Mirakurun のイベントストリームからの番組情報の差分反映 (MirakurunProgramEventStream) の検証スクリプト
+
+ローカルに /api/programs と /api/events/stream だけを実装した偽の Mirakurun サーバーを立て、
+インメモリの SQLite データベースに対して以下を順に検証する
+
+  1. full-update: Program.update() による全件取得で、偽サーバーの番組情報がすべて DB に保存される
+  2. connect: イベントストリームに接続すると、接続前のイベントを補う全件更新が必要になり、全件更新後は不要 (isFullUpdateRequired() が False) になる
+  3. create / update / remove: イベントで通知された番組の追加・更新・削除が DB に反映される
+  4. ignore: 登録されていないチャンネルの番組や、メインでない番組のイベントは無視される
+  5. coalesce invalidation: 続けて届いたイベントによる番組表のスナップショットの破棄が、SNAPSHOT_INVALIDATE_INTERVAL 秒に1回までにまとめられる
+  6. reconnect: 偽サーバーがイベントストリームを切断すると再接続し、取りこぼしを補う全件更新が必要になる
+  7. failed full update: 全件取得に失敗した場合は、全件更新が必要なままになる
+  8. reconcile: 全件更新後の DB が、偽サーバーの番組情報と一致する
+
+設計メモ:
+- 偽サーバーは uvicorn で同じイベントループ上に起動し、Config() の mirakurun_url を偽サーバーに向ける
+- config.yaml の内容は Mirakurun / mirakc の URL とバックエンド以外は使わないが、Config() のロードのために必要
+- 検証を短時間で終わらせるため、FLUSH_DELAY・再接続の待ち時間・スナップショットを破棄する間隔を短くしている
+"""
+
+import asyncio
+import copy
+import json
+import socket
+import time
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta
+from typing import Any
+
+import typer
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic_core import Url
+from tortoise import Tortoise
+
+from app.config import Config, LoadConfig
+from app.constants import DATABASE_CONFIG, JST
+from app.models.Channel import Channel
+from app.models.Program import Program
+from app.utils.MirakurunProgramEventStream import MirakurunProgramEventStream
+from app.utils.TimeTableSnapshotCache import TimeTableSnapshotCache
+
+
+# 偽サーバーが配信するチャンネルの (ネットワーク ID, サービス ID)
+SERVICES: list[tuple[int, int]] = [(32736, 1024), (32736, 1025), (4, 101)]
+# DB に登録しないチャンネル (このチャンネルの番組のイベントは無視されるべき)
+UNREGISTERED_SERVICE: tuple[int, int] = (32737, 1032)
+
+
+class FakeMirakurun:
+    """
+    /api/programs と /api/events/stream だけを実装した偽の Mirakurun サーバー
+    """
+
+    def __init__(self, program_count: int) -> None:
+        self.programs: dict[int, dict[str, Any]] = {}
+        self.event_queues: list[asyncio.Queue[dict[str, Any] | None]] = []
+        self.connection_count = 0
+        self.is_programs_api_failing = False
+        start_at = datetime.now(JST).replace(minute=0, second=0, microsecond=0)
+        for index in range(program_count):
+            network_id, service_id = SERVICES[index % len(SERVICES)]
+            slot = index // len(SERVICES)
+            self.putProgram(self.createProgram(network_id, service_id, 10000 + slot, start_at + timedelta(minutes=30 * slot)))
+
+        self.app = FastAPI()
+        self.app.get('/api/programs')(self.programsAPI)
+        self.app.get('/api/events/stream')(self.eventsStreamAPI)
+
+    @staticmethod
+    def getID(network_id: int, service_id: int, event_id: int) -> int:
+        return int(f'{network_id}{service_id:05d}{event_id:05d}')
+
+    def createProgram(self, network_id: int, service_id: int, event_id: int, start_at: datetime, name: str | None = None) -> dict[str, Any]:
+        return {
+            'id': self.getID(network_id, service_id, event_id),
+            'eventId': event_id,
+            'serviceId': service_id,
+            'networkId': network_id,
+            'startAt': int(start_at.timestamp() * 1000),
+            'duration': 30 * 60 * 1000,
+            'isFree': True,
+            'name': name if name is not None else f'番組 {service_id}-{event_id}',
+            'description': '番組概要',
+            'extended': {'番組内容': '番組詳細'},
+            'genres': [{'lv1': 0x5, 'lv2': 0x0, 'un1': 0xF, 'un2': 0xF}],
+            'video': {'type': 'mpeg2', 'resolution': '1080i', 'streamContent': 1, 'componentType': 0xB3},
+            'audios': [{'componentType': 3, 'componentTag': 16, 'isMain': True, 'samplingRate': 48000, 'langs': ['jpn']}],
+        }
+
+    def putProgram(self, program: dict[str, Any]) -> None:
+        self.programs[program['id']] = program
+
+    async def emit(self, event_type: str, data: dict[str, Any]) -> None:
+        for queue in self.event_queues:
+            await queue.put({'resource': 'program', 'type': event_type, 'data': data, 'time': int(time.time() * 1000)})
+
+    async def closeStreams(self) -> None:
+        for queue in self.event_queues:
+            await queue.put(None)
+
+    async def programsAPI(self) -> JSONResponse:
+        if self.is_programs_api_failing is True:
+            return JSONResponse({'message': 'Internal Server Error'}, status_code=500)
+        return JSONResponse(list(self.programs.values()))
+
+    async def eventsStreamAPI(self, resource: str | None = None) -> StreamingResponse:
+        queue: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue()
+        self.event_queues.append(queue)
+        self.connection_count += 1
+
+        # Mirakurun と同じく、"[" から始まりイベントの JSON と "," が交互に続く終わりのない JSON 配列を返す
+        async def Generate() -> AsyncIterator[bytes]:
+            try:
+                yield b'[\n'
+                while (event := await queue.get()) is not None:
+                    if resource is None or event['resource'] == resource:
+                        yield (json.dumps(event, ensure_ascii=False) + '\n,\n').encode('utf-8')
+            finally:
+                self.event_queues.remove(queue)
+
+        return StreamingResponse(Generate(), media_type='application/json')
+
+
+async def wait_until(condition: Any, timeout: float = 10.0) -> bool:
+    """
+    condition() が True を返すまで待つ (タイムアウトした場合は False を返す)
+    """
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if await condition() if asyncio.iscoroutinefunction(condition) else condition():
+            return True
+        await asyncio.sleep(0.1)
+    return False
+
+
+async def run_test(program_count: int) -> bool:
+
+    # 偽サーバーを空いているポートで起動する
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    fake = FakeMirakurun(program_count)
+    server = uvicorn.Server(uvicorn.Config(fake.app, host='127.0.0.1', port=port, log_level='warning'))
+    server_task = asyncio.create_task(server.serve())
+    await wait_until(lambda: server.started)
+
+    # サーバー設定を偽サーバーに向ける
+    Config().general.backend = 'Mirakurun'
+    Config().general.mirakurun_url = Url(f'http://127.0.0.1:{port}/')
+
+    # インメモリの SQLite データベースを初期化し、チャンネル情報を登録する
+    database_config = copy.deepcopy(DATABASE_CONFIG)
+    database_config['connections'] = {'default': 'sqlite://:memory:'}
+    await Tortoise.init(config=database_config)
+    await Tortoise.generate_schemas()
+    for index, (network_id, service_id) in enumerate(SERVICES):
+        await Channel.create(
+            id = f'NID{network_id}-SID{service_id:03d}',
+            display_channel_id = f'gr{index:03d}',
+            network_id = network_id,
+            service_id = service_id,
+            remocon_id = index + 1,
+            channel_number = f'{index + 1:03d}',
+            type = 'GR',
+            name = f'チャンネル {service_id}',
+            is_subchannel = False,
+            is_radiochannel = False,
+            is_watchable = True,
+        )
+
+    # 検証を短時間で終わらせるため、待ち時間を短くする
+    MirakurunProgramEventStream.FLUSH_DELAY = 0.3
+    MirakurunProgramEventStream.RECONNECT_MIN_DELAY = 0.2
+    MirakurunProgramEventStream.SNAPSHOT_INVALIDATE_INTERVAL = 2.0
+
+    results: list[tuple[str, bool]] = []
+    def Check(name: str, is_passed: bool, detail: Any = None) -> None:
+        results.append((name, is_passed))
+        typer.echo(f'{"PASS" if is_passed else "FAIL"}  {name}' + (f'  ({detail})' if is_passed is False and detail is not None else ''))
+
+    def GetProgramID(program: dict[str, Any]) -> str:
+        return Program.getMirakurunProgramID(program)
+
+    try:
+        # 1. 全件取得
+        await Program.update()
+        Check('full-update', await Program.all().count() == len(fake.programs))
+
+        # 2. イベントストリームへの接続
+        ## 接続前に届くはずだったイベントは全件更新で補う必要がある
+        await MirakurunProgramEventStream.start()
+        is_connected = await wait_until(lambda: MirakurunProgramEventStream._is_connected is True)
+        Check('connect requires full update', is_connected and MirakurunProgramEventStream.isFullUpdateRequired() is True)
+        await Program.update()
+        Check('connect', MirakurunProgramEventStream.isFullUpdateRequired() is False)
+
+        # 3. 番組の追加・更新・削除
+        network_id, service_id = SERVICES[0]
+        new_program = fake.createProgram(network_id, service_id, 60000, datetime.now(JST) + timedelta(days=1))
+        updated_program = dict(next(iter(fake.programs.values())), name='更新後の番組名')
+        removed_program = list(fake.programs.values())[1]
+        fake.putProgram(new_program)
+        fake.putProgram(updated_program)
+        del fake.programs[removed_program['id']]
+        await fake.emit('create', new_program)
+        await fake.emit('update', updated_program)
+        await fake.emit('remove', {'id': removed_program['id']})
+
+        async def IsApplied() -> bool:
+            updated = await Program.get_or_none(id=GetProgramID(updated_program))
+            return (
+                await Program.exists(id=GetProgramID(new_program)) and
+                updated is not None and updated.title == '更新後の番組名' and
+                not await Program.exists(id=GetProgramID(removed_program))
+            )
+        Check('create / update / remove', await wait_until(IsApplied))
+
+        # 4. 保存対象でない番組のイベント
+        unregistered_program = fake.createProgram(*UNREGISTERED_SERVICE, 60001, datetime.now(JST))
+        shared_program = fake.createProgram(network_id, service_id, 60002, datetime.now(JST))
+        shared_program['relatedItems'] = [{'type': 'shared', 'networkId': network_id, 'serviceId': SERVICES[1][1], 'eventId': 60002}]
+        await fake.emit('create', unregistered_program)
+        await fake.emit('create', shared_program)
+        await asyncio.sleep(MirakurunProgramEventStream.FLUSH_DELAY * 3)
+        Check('ignore', not await Program.exists(id=GetProgramID(unregistered_program)) and not await Program.exists(id=GetProgramID(shared_program)))
+
+        # 5. スナップショットの破棄のまとめ
+        ## 前回の破棄から SNAPSHOT_INVALIDATE_INTERVAL 秒以上空けてから、FLUSH_DELAY 秒より長い間隔で3回イベントを送る
+        ## 最初のイベントですぐに破棄され、残りの2回分は間隔が空くまで保留されて1回にまとめられるはず
+        await asyncio.sleep(MirakurunProgramEventStream.SNAPSHOT_INVALIDATE_INTERVAL)
+        data_version = TimeTableSnapshotCache._data_version
+        for index in range(3):
+            await fake.emit('update', dict(next(iter(fake.programs.values())), name=f'更新後の番組名 {index}'))
+            await asyncio.sleep(MirakurunProgramEventStream.FLUSH_DELAY * 2)
+        invalidate_count_before_interval = TimeTableSnapshotCache._data_version - data_version
+        await asyncio.sleep(MirakurunProgramEventStream.SNAPSHOT_INVALIDATE_INTERVAL)
+        invalidate_count = TimeTableSnapshotCache._data_version - data_version
+        Check('coalesce invalidation', invalidate_count_before_interval == 1 and invalidate_count == 2, (invalidate_count_before_interval, invalidate_count))
+
+        # 6. 切断と再接続
+        connection_count = fake.connection_count
+        await fake.closeStreams()
+        Check('reconnect', await wait_until(lambda: fake.connection_count > connection_count and len(fake.event_queues) > 0))
+        Check('reconnect requires full update', MirakurunProgramEventStream.isFullUpdateRequired() is True)
+
+        # 7. 全件取得に失敗した場合
+        fake.is_programs_api_failing = True
+        await Program.update()
+        fake.is_programs_api_failing = False
+        Check('failed full update keeps full update required', MirakurunProgramEventStream.isFullUpdateRequired() is True)
+
+        # 8. 切断中の変更を全件更新で補う
+        fake.putProgram(fake.createProgram(network_id, service_id, 60003, datetime.now(JST) + timedelta(days=2)))
+        await Program.update()
+        db_program_ids = {program.id for program in await Program.all()}
+        Check('reconcile', db_program_ids == {GetProgramID(program) for program in fake.programs.values()})
+        Check('reconcile clears full update', MirakurunProgramEventStream.isFullUpdateRequired() is False)
+
+    finally:
+        await MirakurunProgramEventStream.stop()
+        await Tortoise.close_connections()
+        server.should_exit = True
+        await server_task
+
+    return all(is_passed for _, is_passed in results)
+
+
+app = typer.Typer(add_completion=False)
+
+
+@app.command()
+def main(
+    programs: int = typer.Option(200, '--programs', min=3, help='Number of programs served by the fake Mirakurun server.'),
+):
+    LoadConfig(bypass_validation=True)
+    if asyncio.run(run_test(programs)) is False:
+        raise typer.Exit(code=1)
+
+
+if __name__ == '__main__':
+    app()
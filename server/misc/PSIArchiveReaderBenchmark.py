@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+# Usage: poetry run python -m misc.PSIArchiveReaderBenchmark [--output-dir /path/to/corpus] [--iterations 5]
+
+"""
+PSI/SI 書庫 (psisiarc の .psc) リーダーのベンチマークスクリプト
+
+psisiarc の書庫フォーマットに沿った合成書庫 (ベンチマーク用コーパス) を生成し、
+TSInfoAnalyzer.readPSIData() で読み込んだときの所要時間と、取り出したセクションの正しさを検証する
+あわせて、MPEG-4 形式の録画ファイルの横に置いた書庫から TSInfoAnalyzer の初期化時に仮想 TS ファイルが作られることも検証する
+
+コーパス:
+  - short: 30 分番組相当 (TOT 5 秒間隔 / EIT を数秒おきに送出)
+  - long: 6 時間番組相当 (EDCB で長時間録画したときの .psc に近いサイズ)
+  - eit-heavy: 2 時間番組相当で、EIT のバージョン更新が多く辞書の入れ替えが頻繁に起こるもの
+
+読み込みパターン:
+  - all: TSInfoAnalyzer の初期化時と同じく PAT / NIT / SDT / TOT / EIT を取り出す
+  - tot-only: 過去ログコメントのタイミング調整時と同じく TOT だけを取り出す
+
+設計メモ:
+- 書庫の生成は psisiarc の出力と同じく、ブロックごとに「今回のブロックで使うセクションの辞書」と
+  「時刻リスト」「コードリスト」を書き出し、前回の辞書で未参照のエントリはウィンドウ内で引き継ぐ
+- 乱数のシードを固定しているため、同じ引数であれば常に同じコーパスが生成される
+- --output-dir を指定した場合はコーパスをそのディレクトリに書き出して残す (未指定時は一時ディレクトリに生成して破棄する)
+"""
+
+import random
+import struct
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import typer
+
+from app import schemas
+from app.metadata.TSInfoAnalyzer import (
+    PSI_ARCHIVE_HEADER_STRUCT,
+    PSI_ARCHIVE_MAGIC,
+    TSInfoAnalyzer,
+)
+
+
+# 書庫の時刻の単位 (Hz)
+PSI_ARCHIVE_CLOCK = 11250
+
+# 辞書ウィンドウの最大長
+## psisiarc の既定値に合わせる
+MAX_DICTIONARY_WINDOW_LEN = 1024
+
+# TSInfoAnalyzer の初期化時に取り出す PID
+ALL_TARGET_PIDS = [0x00, 0x10, 0x11, 0x14, 0x12, 0x26, 0x27]
+
+
+@dataclass
+class CorpusPreset:
+    """
+    合成書庫の生成条件
+    """
+
+    name: str
+    # 番組の長さ (秒)
+    duration_sec: int
+    # 1ブロックあたりの時間 (秒)
+    block_sec: int
+    # 1秒あたりに送出する EIT セクションの数
+    eit_sections_per_sec: int
+    # EIT セクションのバージョンを更新する確率 (送出ごと)
+    eit_version_update_ratio: float
+
+
+CORPUS_PRESETS: list[CorpusPreset] = [
+    CorpusPreset(name='short', duration_sec=30 * 60, block_sec=10, eit_sections_per_sec=8, eit_version_update_ratio=0.01),
+    CorpusPreset(name='long', duration_sec=6 * 60 * 60, block_sec=10, eit_sections_per_sec=8, eit_version_update_ratio=0.01),
+    CorpusPreset(name='eit-heavy', duration_sec=2 * 60 * 60, block_sec=10, eit_sections_per_sec=24, eit_version_update_ratio=0.2),
+]
+
+
+@dataclass
+class SyntheticArchive:
+    """
+    生成した合成書庫と、その書庫から取り出されるべきセクションの一覧
+    """
+
+    path: Path
+    # (時刻 (秒), PID, セクションデータ) のリスト (書庫内の出現順)
+    sections: list[tuple[float, int, bytes]] = field(default_factory=list)
+
+
+def build_section(table_id: int, length: int, rng: random.Random) -> bytes:
+    """
+    セクションらしい形 (table_id と section_length を持つ) の合成セクションを生成する
+    """
+
+    body = rng.randbytes(length - 3)
+    return bytes((table_id, 0xb0 | (length - 3) >> 8, (length - 3) & 0xff)) + body
+
+
+def write_block(
+    output: bytearray,
+    block_time: int,
+    events: list[tuple[int, list[tuple[int, bytes]]]],
+    last_dictionary: list[tuple[int, bytes]],
+) -> list[tuple[int, bytes]]:
+    """
+    1ブロック分の書庫データを書き出し、次のブロックで参照する辞書を返す
+
+    Args:
+        output (bytearray): 書き出し先
+        block_time (int): ブロック先頭の絶対時刻 (11250Hz)
+        events (list[tuple[int, list[tuple[int, bytes]]]]): (直前からの時刻の増分, その時刻に出現した (PID, セクション) のリスト) のリスト
+        last_dictionary (list[tuple[int, bytes]]): 前回のブロックの辞書
+
+    Returns:
+        list[tuple[int, bytes]]: 今回のブロックの辞書
+    """
+
+    # 今回のブロックで使うセクションを出現順に辞書へ登録する
+    entries: list[tuple[int, bytes]] = []
+    entry_indexes: dict[tuple[int, bytes], int] = {}
+    for _, items in events:
+        for item in items:
+            if item not in entry_indexes:
+                entry_indexes[item] = len(entries)
+                entries.append(item)
+
+    # 前回の辞書にあるセクションは参照として、ないセクションは新規として辞書に書き出す
+    last_indexes = {item: index for index, item in enumerate(last_dictionary)}
+    dictionary_codes: list[int] = []
+    new_entries: list[tuple[int, bytes]] = []
+    referenced_last_indexes: set[int] = set()
+    for item in entries:
+        last_index = last_indexes.get(item)
+        if last_index is not None:
+            dictionary_codes.append(last_index + 4096)
+            referenced_last_indexes.add(last_index)
+        else:
+            dictionary_codes.append(len(item[1]) - 1)
+            new_entries.append(item)
+
+    # 前回の辞書のうち未参照のものは、ウィンドウに収まる範囲で引き継ぐ
+    carry_over_len = min(len(last_dictionary), max(0, MAX_DICTIONARY_WINDOW_LEN - len(entries)))
+    dictionary_window_len = len(entries) + carry_over_len
+    next_dictionary = entries + [
+        last_dictionary[index] for index in range(carry_over_len) if index not in referenced_last_indexes
+    ]
+
+    dictionary_data = b''.join(struct.pack('<H', pid) for pid, _ in new_entries) + b''.join(section for _, section in new_entries)
+    time_list = [0x80000000 | (block_time % 0x40000000)]
+    code_list: list[int] = []
+    for time_delta, items in events:
+        time_list.append(time_delta | (len(items) - 1) << 16)
+        code_list.extend(entry_indexes[item] + 4096 for item in items)
+
+    output += PSI_ARCHIVE_MAGIC + b'\x00\x00'
+    output += PSI_ARCHIVE_HEADER_STRUCT.pack(
+        len(time_list), len(entries), dictionary_window_len, len(dictionary_data), len(dictionary_data), len(code_list),
+    )
+    output += b'\x00' * 4
+    output += struct.pack(f'<{len(time_list)}I', *time_list)
+    output += struct.pack(f'<{len(dictionary_codes)}H', *dictionary_codes)
+    output += dictionary_data + b'\x00' * (len(dictionary_data) % 2)
+    output += struct.pack(f'<{len(code_list)}H', *code_list)
+    output += b'\x00' * (4 - (len(dictionary_codes) * 2 + (len(dictionary_data) + 1) // 2 * 2 + len(code_list) * 2) % 4)
+    return next_dictionary
+
+
+def generate_archive(preset: CorpusPreset, output_dir: Path, seed: int) -> SyntheticArchive:
+    """
+    生成条件に従って合成書庫を生成する
+    """
+
+    rng = random.Random(f'{preset.name}:{seed}')
+    archive = SyntheticArchive(path=output_dir / f'{preset.name}.psc')
+
+    # 周期的に送出される PSI/SI セクション
+    pat = (0x00, build_section(0x00, 24, rng))
+    nit = (0x10, build_section(0x40, 512, rng))
+    sdt = (0x11, build_section(0x42, 256, rng))
+    # EIT は送出スロットごとにセクションを持ち、一定確率でバージョンが更新される
+    eit_slots: list[tuple[int, bytes]] = [
+        (rng.choice([0x12, 0x26, 0x27]), build_section(0x4e, rng.randint(200, 4000), rng))
+        for _ in range(preset.eit_sections_per_sec * 8)
+    ]
+
+    output = bytearray()
+    last_dictionary: list[tuple[int, bytes]] = []
+    start_time = rng.randint(0, 0x3fffffff)
+    for block_start_sec in range(0, preset.duration_sec, preset.block_sec):
+        events: list[tuple[int, list[tuple[int, bytes]]]] = []
+        for sec in range(block_start_sec, min(block_start_sec + preset.block_sec, preset.duration_sec)):
+            items: list[tuple[int, bytes]] = [pat]
+            if sec % 10 == 0:
+                items += [nit, sdt]
+            if sec % 5 == 0:
+                # TOT は毎回異なる時刻を持つため、常に新規のセクションになる
+                items.append((0x14, bytes((0x73, 0x70, 0x1a)) + struct.pack('>IH', sec, 0) + rng.randbytes(19)))
+            for _ in range(preset.eit_sections_per_sec):
+                slot_index = rng.randrange(len(eit_slots))
+                if rng.random() < preset.eit_version_update_ratio:
+                    eit_slots[slot_index] = (eit_slots[slot_index][0], build_section(0x4e, rng.randint(200, 4000), rng))
+                items.append(eit_slots[slot_index])
+            # ブロック先頭のイベントは絶対時刻の直後なので増分は 0 とする
+            events.append((0 if sec == block_start_sec else PSI_ARCHIVE_CLOCK, items))
+            time_sec = (sec * PSI_ARCHIVE_CLOCK) / PSI_ARCHIVE_CLOCK
+            archive.sections.extend((time_sec, pid, section) for pid, section in items)
+        last_dictionary = write_block(output, start_time + block_start_sec * PSI_ARCHIVE_CLOCK, events, last_dictionary)
+
+    archive.path.write_bytes(output)
+    return archive
+
+
+def run_benchmark(archive: SyntheticArchive, target_pids: list[int], iterations: int) -> tuple[float, int]:
+    """
+    合成書庫を TSInfoAnalyzer.readPSIData() で読み込み、所要時間の中央値と取り出したセクション数を返す
+    取り出したセクションが生成時のものと一致しない場合は AssertionError を送出する
+    """
+
+    expected = [(time_sec, pid, section) for time_sec, pid, section in archive.sections if pid in target_pids]
+    elapsed_times: list[float] = []
+    for _ in range(iterations):
+        actual: list[tuple[float, int, bytes]] = []
+
+        def callback(time_sec: float, pid: int, section: memoryview) -> bool:
+            actual.append((time_sec, pid, bytes(section)))
+            return True
+
+        with open(archive.path, 'rb') as f:
+            start = time.perf_counter()
+            result = TSInfoAnalyzer.readPSIData(f, target_pids, callback)
+            elapsed_times.append(time.perf_counter() - start)
+
+        assert result is True, f'{archive.path.name}: readPSIData() returned False.'
+        assert len(actual) == len(expected), f'{archive.path.name}: Section count mismatch. ({len(actual)} != {len(expected)})'
+        for (actual_time, actual_pid, actual_section), (expected_time, expected_pid, expected_section) in zip(actual, expected):
+            assert abs(actual_time - expected_time) < 0.001 and actual_pid == expected_pid and actual_section == expected_section, \
+                f'{archive.path.name}: Section mismatch at {expected_time:.3f}s (PID: {expected_pid:#06x}).'
+
+    elapsed_times.sort()
+    return elapsed_times[len(elapsed_times) // 2], len(expected)
+
+
+def check_analyzer_init(archive: SyntheticArchive, duration_sec: int) -> int:
+    """
+    合成書庫を MPEG-4 形式の録画ファイルの PSI/SI 書庫として TSInfoAnalyzer を初期化し、作成された仮想 TS ファイルのサイズを返す
+    仮想 TS ファイルが空か、TS パケット単位になっていない場合は AssertionError を送出する
+    """
+
+    # TSInfoAnalyzer は録画ファイルと同じ名前の .psc を読み込むため、録画ファイル自体は存在しなくてよい
+    recorded_video = schemas.RecordedVideo.model_construct(
+        file_path = str(archive.path.with_suffix('.mp4')),
+        file_size = 0,
+        duration = float(duration_sec),
+        container_format = 'MPEG-4',
+    )
+    analyzer = TSInfoAnalyzer(recorded_video)
+    assert analyzer.end_ts_offset > 0, f'{archive.path.name}: No packets were created from the archive.'
+    assert analyzer.end_ts_offset % 188 == 0, f'{archive.path.name}: Packets are not aligned to 188 bytes. ({analyzer.end_ts_offset})'
+    return analyzer.end_ts_offset
+
+
+app = typer.Typer(add_completion=False)
+
+
+@app.command()
+def main(
+    output_dir: Path | None = typer.Option(None, '--output-dir', file_okay=False, dir_okay=True, writable=True, resolve_path=True, help='Directory to keep the generated corpus. Defaults to a temporary directory.'),
+    iterations: int = typer.Option(5, '--iterations', '-n', min=1, help='Number of iterations per archive and pattern.'),
+    seed: int = typer.Option(0, '--seed', help='Random seed for corpus generation.'),
+):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus_dir = output_dir if output_dir is not None else Path(temp_dir)
+        corpus_dir.mkdir(parents=True, exist_ok=True)
+
+        typer.echo(f'{"Archive":<12} {"Size":>10} {"Pattern":<10} {"Sections":>10} {"Median":>10} {"Throughput":>12}')
+        for preset in CORPUS_PRESETS:
+            archive = generate_archive(preset, corpus_dir, seed)
+            archive_size = archive.path.stat().st_size
+            for pattern_name, target_pids in [('all', ALL_TARGET_PIDS), ('tot-only', [0x14])]:
+                median_sec, section_count = run_benchmark(archive, target_pids, iterations)
+                typer.echo(
+                    f'{preset.name:<12} {archive_size / 1024 / 1024:>8.2f}MB {pattern_name:<10} {section_count:>10} '
+                    f'{median_sec * 1000:>8.1f}ms {archive_size / 1024 / 1024 / median_sec:>8.1f}MB/s'
+                )
+            packets_size = check_analyzer_init(archive, preset.duration_sec)
+            typer.echo(f'{preset.name:<12} {"":>10} {"init":<10} {packets_size // 188:>10} {"":>10} {"(packets)":>12}')
+
+
+if __name__ == '__main__':
+    app()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+# Usage: poetry run python -m misc.TSPacketReaderBenchmark [--output /path/to/synthetic.ts] [--size-gb 2] [--iterations 5]
+
+"""
+TSPacketReader のベンチマークスクリプト
+
+放送 TS に近い PID 構成とビットレートを持つ合成 TS (既定で 2GB) を生成し、
+従来の TS パケットを1つずつ file.read() する読み込みと、TSPacketReader による窓単位の読み込みの所要時間を比較する
+あわせて、両者が返すパケットのファイル位置と内容が一致することを検証する
+
+読み込みパターン:
+  - first-pcr: ランダムな位置から最初の PCR を探す (TSKeyFrameSeeker の PCR 探索と同じ)
+  - video-96mb: ランダムな位置から 96MB 分の映像 PID のパケットを読む (TSKeyFrameSeeker のキーフレーム探索の上限と同じ)
+  - full-scan: ファイル全体から映像 PID のパケットを読む
+
+設計メモ:
+- 合成 TS は 16Mbps 相当で、映像 (0x111)・音声 (0x112)・PCR (0x1FF)・PAT・PMT のパケットを含む
+- PCR はパケット位置から求めた値で単調増加するため、TSKeyFrameSeeker の PCR 探索にもそのまま使える
+- 生成直後のファイルはページキャッシュに載っているため、ディスクの読み込み速度ではなく、システムコールとパケット処理のオーバーヘッドを測定する
+- --output を指定した場合は合成 TS をそのパスに書き出して残す (未指定時は一時ディレクトリに生成して破棄する)
+"""
+
+import random
+import tempfile
+import time
+from collections.abc import Callable, Iterator
+from pathlib import Path
+
+import numpy as np
+import typer
+from biim.mpeg2ts import ts
+
+from app.utils.TSKeyFrameSeeker import TSKeyFrameSeeker
+from app.utils.TSPacketReader import TSPacketReader
+
+
+# 合成 TS の PID
+PMT_PID = 0x1F0
+VIDEO_PID = 0x111
+AUDIO_PID = 0x112
+PCR_PID = 0x1FF
+
+# 合成 TS のビットレート (bps) と、PCR / PAT・PMT を送出する間隔 (パケット数)
+BITRATE = 16_000_000
+PCR_INTERVAL_PACKETS = 400
+PSI_INTERVAL_PACKETS = 4000
+AUDIO_INTERVAL_PACKETS = 20
+
+# 1回に生成するパケット数
+GENERATE_CHUNK_PACKETS = 65536
+
+
+def crc32_mpeg2(data: bytes) -> int:
+    """
+    PSI セクションの CRC-32 (MPEG-2) を計算する
+    """
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc ^= byte << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else (crc << 1)
+            crc &= 0xFFFFFFFF
+    return crc
+
+
+def build_psi_packet(pid: int, section: bytes) -> bytes:
+    """
+    CRC を付与したセクションを1つの TS パケットに格納する
+    """
+    section += crc32_mpeg2(section).to_bytes(4, 'big')
+    packet = bytes((0x47, 0x40 | (pid >> 8), pid & 0xFF, 0x10, 0x00)) + section
+    return packet + b'\xff' * (ts.PACKET_SIZE - len(packet))
+
+
+def build_template_packets() -> tuple[bytes, bytes]:
+    """
+    PAT / PMT の TS パケットを生成する
+    """
+    pat_body = bytes((0x00, 0x01, 0xC1, 0x00, 0x00)) + bytes((0x04, 0x00, 0xE0 | (PMT_PID >> 8), PMT_PID & 0xFF))
+    pat = bytes((0x00, 0xB0, len(pat_body) + 4)) + pat_body
+    pmt_body = (
+        bytes((0x04, 0x00, 0xC1, 0x00, 0x00, 0xE0 | (PCR_PID >> 8), PCR_PID & 0xFF, 0xF0, 0x00)) +
+        bytes((0x1B, 0xE0 | (VIDEO_PID >> 8), VIDEO_PID & 0xFF, 0xF0, 0x00)) +
+        bytes((0x0F, 0xE0 | (AUDIO_PID >> 8), AUDIO_PID & 0xFF, 0xF0, 0x00))
+    )
+    pmt = bytes((0x02, 0xB0, len(pmt_body) + 4)) + pmt_body
+    return build_psi_packet(0x00, pat), build_psi_packet(PMT_PID, pmt)
+
+
+def generate_ts(path: Path, size_bytes: int) -> None:
+    """
+    指定サイズの合成 TS を生成する
+    """
+    pat_packet, pmt_packet = build_template_packets()
+    packets_per_second = BITRATE / (ts.PACKET_SIZE * 8)
+    total_packets = size_bytes // ts.PACKET_SIZE
+    rng = np.random.default_rng(0)
+    payload = rng.integers(0, 256, size=ts.PACKET_SIZE - 4, dtype=np.uint8)
+
+    with path.open('wb') as file:
+        for chunk_start in range(0, total_packets, GENERATE_CHUNK_PACKETS):
+            packet_count = min(GENERATE_CHUNK_PACKETS, total_packets - chunk_start)
+            indexes = np.arange(chunk_start, chunk_start + packet_count, dtype=np.int64)
+            packets = np.empty((packet_count, ts.PACKET_SIZE), dtype=np.uint8)
+
+            # 既定は映像 PID のパケットとする
+            packets[:, 0] = 0x47
+            packets[:, 1] = VIDEO_PID >> 8
+            packets[:, 2] = VIDEO_PID & 0xFF
+            packets[:, 3] = 0x10 | (indexes & 0x0F)
+            packets[:, 4:] = payload
+            packets[indexes % AUDIO_INTERVAL_PACKETS == 1, 2] = AUDIO_PID & 0xFF
+
+            # PCR のみを持つアダプテーションフィールドだけのパケット
+            pcr_rows = np.flatnonzero(indexes % PCR_INTERVAL_PACKETS == 2)
+            pcr_values = ((indexes[pcr_rows] * ts.HZ / packets_per_second).astype(np.int64) + 0x1_2345_6789) % ts.PCR_CYCLE
+            packets[pcr_rows, 1] = PCR_PID >> 8
+            packets[pcr_rows, 2] = PCR_PID & 0xFF
+            packets[pcr_rows, 3] = 0x20
+            packets[pcr_rows, 4] = 183
+            packets[pcr_rows, 5] = 0x10
+            packets[pcr_rows, 6] = (pcr_values >> 25) & 0xFF
+            packets[pcr_rows, 7] = (pcr_values >> 17) & 0xFF
+            packets[pcr_rows, 8] = (pcr_values >> 9) & 0xFF
+            packets[pcr_rows, 9] = (pcr_values >> 1) & 0xFF
+            packets[pcr_rows, 10] = ((pcr_values & 0x01) << 7) | 0x7E
+            packets[pcr_rows, 11] = 0x00
+            packets[pcr_rows, 12:] = 0xFF
+
+            # PAT / PMT
+            packets[indexes % PSI_INTERVAL_PACKETS == 0] = np.frombuffer(pat_packet, dtype=np.uint8)
+            packets[indexes % PSI_INTERVAL_PACKETS == 3] = np.frombuffer(pmt_packet, dtype=np.uint8)
+
+            file.write(packets.tobytes())
+
+
+def iter_packets_legacy(path: Path, start_offset: int, max_scan_bytes: int, pid: int) -> Iterator[tuple[int, bytes]]:
+    """
+    従来の実装と同じく、TS パケットを1つずつ file.read() して指定 PID のパケットを返す
+    """
+    with path.open('rb') as file:
+        file.seek(start_offset)
+        scanned_bytes = 0
+        while scanned_bytes < max_scan_bytes:
+            file_offset = file.tell()
+            packet = TSKeyFrameSeeker.normalizePacket(file.read(ts.PACKET_SIZE), ts.PACKET_SIZE)
+            scanned_bytes += ts.PACKET_SIZE
+            if packet is None:
+                break
+            if ts.pid(packet) == pid:
+                yield (file_offset, packet)
+
+
+def iter_packets_reader(path: Path, start_offset: int, max_scan_bytes: int, pid: int) -> Iterator[tuple[int, bytes | memoryview]]:
+    """
+    TSPacketReader で指定 PID のパケットを返す
+    """
+    with path.open('rb') as file:
+        reader = TSPacketReader(file, ts.PACKET_SIZE, start_offset=start_offset, max_scan_bytes=max_scan_bytes)
+        yield from reader.iterPackets((pid,))
+
+
+def run_pattern(
+    iter_packets: Callable[[Path, int, int, int], Iterator[tuple[int, bytes | memoryview]]],
+    path: Path,
+    offsets: list[int],
+    max_scan_bytes: int,
+    pid: int,
+    first_only: bool,
+) -> tuple[float, list[tuple[int, int, int]]]:
+    """
+    各開始位置から指定 PID のパケットを読み、合計の所要時間と、検証用の (パケット数, 最初の位置, 最後の位置) のリストを返す
+    """
+    results: list[tuple[int, int, int]] = []
+    start = time.perf_counter()
+    for offset in offsets:
+        count = 0
+        first_offset = last_offset = -1
+        for file_offset, packet in iter_packets(path, offset, max_scan_bytes, pid):
+            if pid == PCR_PID and ts.has_pcr(packet) is False:
+                continue
+            if count == 0:
+                first_offset = file_offset
+            last_offset = file_offset
+            count += 1
+            if first_only is True:
+                break
+        results.append((count, first_offset, last_offset))
+    return time.perf_counter() - start, results
+
+
+app = typer.Typer(add_completion=False)
+
+@app.command()
+def main(
+    output: Path | None = typer.Option(None, '--output', dir_okay=False, writable=True, resolve_path=True, help='Path to keep the generated TS. Defaults to a temporary file.'),
+    size_gb: float = typer.Option(2.0, '--size-gb', min=0.1, help='Size of the generated TS in GB.'),
+    iterations: int = typer.Option(5, '--iterations', '-n', min=1, help='Number of random start offsets per pattern.'),
+    seed: int = typer.Option(0, '--seed', help='Random seed for start offsets.'),
+):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        ts_path = output if output is not None else Path(temp_dir) / 'synthetic.ts'
+        size_bytes = int(size_gb * 1024 * 1024 * 1024)
+        if not ts_path.exists() or ts_path.stat().st_size != (size_bytes // ts.PACKET_SIZE) * ts.PACKET_SIZE:
+            typer.echo(f'Generating {size_gb:.1f}GB synthetic TS: {ts_path}')
+            start = time.perf_counter()
+            generate_ts(ts_path, size_bytes)
+            typer.echo(f'Generated in {time.perf_counter() - start:.1f}s')
+        file_size = ts_path.stat().st_size
+
+        rng = random.Random(seed)
+        def RandomOffsets(max_scan_bytes: int) -> list[int]:
+            return [
+                (rng.randrange(0, max(file_size - max_scan_bytes, 1)) // ts.PACKET_SIZE) * ts.PACKET_SIZE
+                for _ in range(iterations)
+            ]
+
+        patterns = [
+            ('first-pcr', RandomOffsets(TSKeyFrameSeeker.PCR_SEARCH_WINDOW_BYTES), TSKeyFrameSeeker.PCR_SEARCH_WINDOW_BYTES, PCR_PID, True),
+            ('video-96mb', RandomOffsets(TSKeyFrameSeeker.MAX_KEYFRAME_SCAN_BYTES), TSKeyFrameSeeker.MAX_KEYFRAME_SCAN_BYTES, VIDEO_PID, False),
+            ('full-scan', [0], file_size, VIDEO_PID, False),
+        ]
+
+        typer.echo(f'{"Pattern":<12} {"Reads":>6} {"Legacy":>12} {"Reader":>12} {"Speedup":>9} {"Reader throughput":>18}')
+        for pattern_name, offsets, max_scan_bytes, pid, first_only in patterns:
+            legacy_sec, legacy_results = run_pattern(iter_packets_legacy, ts_path, offsets, max_scan_bytes, pid, first_only)
+            reader_sec, reader_results = run_pattern(iter_packets_reader, ts_path, offsets, max_scan_bytes, pid, first_only)
+            assert legacy_results == reader_results, f'{pattern_name}: Packet mismatch between legacy reader and TSPacketReader.'
+            scanned_bytes = sum(min(max_scan_bytes, file_size - offset) for offset in offsets) if first_only is False else 0
+            throughput = f'{scanned_bytes / 1024 / 1024 / reader_sec:>14.1f}MB/s' if scanned_bytes > 0 else f'{"-":>18}'
+            typer.echo(
+                f'{pattern_name:<12} {len(offsets):>6} {legacy_sec * 1000:>10.1f}ms {reader_sec * 1000:>10.1f}ms '
+                f'{legacy_sec / reader_sec:>8.1f}x {throughput}'
+            )
+
+
+if __name__ == '__main__':
+    app()
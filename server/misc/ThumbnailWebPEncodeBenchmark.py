@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+# Usage: poetry run python -m misc.ThumbnailWebPEncodeBenchmark [--iterations 3] [--output-dir /path/to/output]
+
+"""
+シークバー用サムネイルタイル画像の WebP エンコードのベンチマークスクリプト
+
+ThumbnailGenerator と同じレイアウトの合成タイル画像を生成し、以下のエンコード方式で WebP に変換したときの
+所要時間・ピークメモリ使用量・出力サイズを比較する
+
+エンコード方式:
+  - pillow: ThumbnailGenerator.encodeImageToWebP() (Pillow (libwebp) で BGR 配列から直接エンコードする現行の方式)
+  - ffmpeg: 以前の方式 (PNG にエンコードしてから FFmpeg のサブプロセスに渡して WebP に変換する)
+
+タイル画像:
+  - sheet: 遅延読み込み用のタイルシート 1 枚 (10x10)
+  - 30min: 30 分番組の1枚のタイル画像
+  - 6h: 6 時間番組の1枚のタイル画像
+
+設計メモ:
+- ピークメモリ使用量は ru_maxrss で計測するため、エンコード方式とタイル画像の組み合わせごとに spawn した別プロセスで計測する
+  (ru_maxrss はプロセス生存中の最大値しか取れず、同じプロセスで続けて計測すると前の計測結果に引きずられる)
+- Peak RSS はタイル画像の生成後からの増分、FFmpeg RSS は FFmpeg サブプロセスのピークメモリ使用量 (ffmpeg 方式のみ)
+- 合成フレームはグラデーション・図形・ノイズを組み合わせて実際の映像に近い圧縮率になるようにしており、乱数のシードを固定している
+- FFmpeg が thirdparty/ に存在しない場合、ffmpeg 方式はスキップする
+"""
+
+import math
+import multiprocessing
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+import typer
+from numpy.typing import NDArray
+
+from app.constants import LIBRARY_PATH
+from app.metadata.ThumbnailGenerator import ThumbnailGenerator
+
+
+# 1枚のタイル画像の列数
+## ThumbnailGenerator.__calculateTileLayout() と同じく、WebP の最大サイズ制限に収まる最大の列数で並べる
+TILE_COLS = ThumbnailGenerator.WEBP_MAX_SIZE // ThumbnailGenerator.TILE_SCALE[0]
+
+# タイル画像の種類ごとの (列数, 行数)
+## 30 分番組は 5 秒間隔で 360 枚、6 時間番組は最大間隔の 30 秒間隔で 720 枚のフレームを並べる
+TILE_LAYOUTS: dict[str, tuple[int, int]] = {
+    'sheet': (ThumbnailGenerator.TILE_SHEET_COLS, ThumbnailGenerator.TILE_SHEET_ROWS),
+    '30min': (TILE_COLS, math.ceil(360 / TILE_COLS)),
+    '6h': (TILE_COLS, math.ceil(720 / TILE_COLS)),
+}
+
+
+def generate_tile_image(column_count: int, row_count: int, seed: int) -> NDArray[np.uint8]:
+    """
+    グラデーション・図形・ノイズを組み合わせた合成フレームを並べたタイル画像 (BGR) を生成する
+    """
+
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    tile_width, tile_height = ThumbnailGenerator.TILE_SCALE
+    tile_image = np.zeros((tile_height * row_count, tile_width * column_count, 3), dtype=np.uint8)
+    gradient_x = np.linspace(0, 1, tile_width, dtype=np.float32)[np.newaxis, :, np.newaxis]
+    gradient_y = np.linspace(0, 1, tile_height, dtype=np.float32)[:, np.newaxis, np.newaxis]
+    for row in range(row_count):
+        for col in range(column_count):
+            # シーンごとに異なる2色のグラデーションを背景にする
+            color_a = np.array([rng.randint(0, 255) for _ in range(3)], dtype=np.float32)
+            color_b = np.array([rng.randint(0, 255) for _ in range(3)], dtype=np.float32)
+            frame = (color_a * (1 - gradient_x) * (1 - gradient_y) + color_b * (gradient_x + gradient_y) / 2).clip(0, 255).astype(np.uint8)
+            # 被写体に見立てた図形と、映像のノイズに見立てた乱数を加える
+            for _ in range(rng.randint(2, 6)):
+                center = (rng.randint(0, tile_width), rng.randint(0, tile_height))
+                cv2.circle(frame, center, rng.randint(10, 60), tuple(rng.randint(0, 255) for _ in range(3)), -1)
+            noise = np_rng.integers(-12, 12, size=frame.shape, dtype=np.int16)
+            frame = (frame.astype(np.int16) + noise).clip(0, 255).astype(np.uint8)
+            tile_image[row * tile_height:(row + 1) * tile_height, col * tile_width:(col + 1) * tile_width] = frame
+    return tile_image
+
+
+def encode_with_ffmpeg(tile_image: NDArray[np.uint8], output_path: Path, preset: str) -> None:
+    """
+    以前の ThumbnailGenerator と同じく、PNG にエンコードしてから FFmpeg のサブプロセスに渡して WebP に変換する
+    """
+
+    _, tile_png_data = cv2.imencode('.png', tile_image)
+    subprocess.run(
+        [
+            LIBRARY_PATH['FFmpeg'],
+            '-y',
+            '-nostdin',
+            '-f', 'image2pipe',
+            '-codec:v', 'png',
+            '-i', 'pipe:0',
+            '-codec:v', 'webp',
+            '-quality', str(ThumbnailGenerator.WEBP_QUALITY_TILE),
+            '-compression_level', str(ThumbnailGenerator.WEBP_COMPRESSION),
+            '-preset', preset,
+            '-threads', 'auto',
+            '-f', 'webp',
+            str(output_path),
+        ],
+        input = tile_png_data.tobytes(),
+        stdout = subprocess.DEVNULL,
+        stderr = subprocess.DEVNULL,
+        check = True,
+    )
+
+
+def get_max_rss_bytes(who: int) -> int:
+    """
+    ru_maxrss をバイト単位で取得する (Linux では KB 単位、macOS ではバイト単位で返される)
+    """
+
+    max_rss = resource.getrusage(who).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def run_benchmark(encoder: str, layout_name: str, iterations: int, seed: int, output_dir: Path) -> tuple[float, int, int, int]:
+    """
+    spawn した別プロセス内で実行され、所要時間の中央値・ピークメモリ使用量の増分・FFmpeg のピークメモリ使用量・出力サイズを返す
+    """
+
+    column_count, row_count = TILE_LAYOUTS[layout_name]
+    tile_image = generate_tile_image(column_count, row_count, seed)
+    output_path = output_dir / f'{layout_name}_{encoder}.webp'
+    baseline_rss = get_max_rss_bytes(resource.RUSAGE_SELF)
+
+    elapsed_times: list[float] = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        if encoder == 'pillow':
+            assert ThumbnailGenerator.encodeImageToWebP(tile_image, output_path, ThumbnailGenerator.WEBP_QUALITY_TILE, layout_name) is True
+        else:
+            encode_with_ffmpeg(tile_image, output_path, 'picture')
+        elapsed_times.append(time.perf_counter() - start)
+
+    # 出力された WebP が元のタイル画像と同じ大きさでデコードできることを確認する
+    decoded_image = cv2.imread(str(output_path), cv2.IMREAD_COLOR)
+    assert decoded_image is not None and decoded_image.shape == tile_image.shape, f'{output_path.name}: Decoded image shape mismatch.'
+
+    elapsed_times.sort()
+    return (
+        elapsed_times[len(elapsed_times) // 2],
+        max(0, get_max_rss_bytes(resource.RUSAGE_SELF) - baseline_rss),
+        get_max_rss_bytes(resource.RUSAGE_CHILDREN) if encoder == 'ffmpeg' else 0,
+        output_path.stat().st_size,
+    )
+
+
+app = typer.Typer(add_completion=False)
+
+
+@app.command()
+def main(
+    output_dir: Path | None = typer.Option(None, '--output-dir', file_okay=False, dir_okay=True, writable=True, resolve_path=True, help='Directory to keep the encoded images. Defaults to a temporary directory.'),
+    iterations: int = typer.Option(3, '--iterations', '-n', min=1, help='Number of iterations per encoder and tile image.'),
+    seed: int = typer.Option(0, '--seed', help='Random seed for tile image generation.'),
+):
+    encoders = ['pillow']
+    if Path(LIBRARY_PATH['FFmpeg']).is_file():
+        encoders.append('ffmpeg')
+    else:
+        typer.echo(f'FFmpeg not found: {LIBRARY_PATH["FFmpeg"]} (skipping ffmpeg encoder)')
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        encoded_dir = output_dir if output_dir is not None else Path(temp_dir)
+        encoded_dir.mkdir(parents=True, exist_ok=True)
+
+        typer.echo(f'{"Tile":<8} {"Image":>12} {"Encoder":<8} {"Median":>10} {"Peak RSS":>10} {"FFmpeg RSS":>11} {"Output":>10}')
+        for layout_name, (column_count, row_count) in TILE_LAYOUTS.items():
+            image_size = f'{ThumbnailGenerator.TILE_SCALE[0] * column_count}x{ThumbnailGenerator.TILE_SCALE[1] * row_count}'
+            for encoder in encoders:
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                    median_sec, peak_rss, ffmpeg_rss, output_size = executor.submit(
+                        run_benchmark, encoder, layout_name, iterations, seed, encoded_dir,
+                    ).result()
+                typer.echo(
+                    f'{layout_name:<8} {image_size:>12} {encoder:<8} {median_sec * 1000:>8.0f}ms '
+                    f'{peak_rss / 1024 / 1024:>8.1f}MB {ffmpeg_rss / 1024 / 1024:>9.1f}MB {output_size / 1024:>8.0f}KB'
+                )
+
+
+if __name__ == '__main__':
+    app()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+# Usage: poetry run python -m misc.TwitterMediaCacheTest [--size 65536]
+
+"""
+Twitter の動画・画像のキャッシュ (TwitterMediaCache) の検証スクリプト
+
+ローカルに Range リクエストに対応した偽の上流サーバー (video.twimg.com の代わり) を立て、
+一時ディレクトリをキャッシュディレクトリとして以下を順に検証する
+
+  1. miss: キャッシュにない範囲は上流から取得され、正しいデータが返される
+  2. hit: 取得済みの範囲は上流に問い合わせずにキャッシュファイルから返される
+  3. partial: 一部だけ取得済みの範囲は、取得済みでない部分だけが上流から取得される
+  4. reload: 再起動相当 (インデックスの破棄) の後も、メタデータファイルからキャッシュが読み込まれる
+  5. discard while reading: 読み込み中のキャッシュが破棄され、同じ URL のキャッシュが作り直されても、読み込み中のレスポンスのデータは壊れない
+  6. cleanup: 破棄されたキャッシュのキャッシュファイルは、読み込み中のレスポンスの完了後に削除される
+
+設計メモ:
+- 偽サーバーは uvicorn で同じイベントループ上に起動する
+- キャッシュディレクトリは TwitterMediaCache モジュールの TWITTER_MEDIA_CACHE_DIR を一時ディレクトリに向けて使う
+- 読み込み中のレスポンスを途中で止めて検証するため、CHUNK_SIZE を小さくしている
+"""
+
+import asyncio
+import hashlib
+import re
+import socket
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+import typer
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+import app.utils.TwitterMediaCache as TwitterMediaCacheModule
+from app.utils.TwitterMediaCache import TwitterMediaCache, TwitterMediaResponse
+
+
+class FakeUpstream:
+    """
+    Range リクエストに対応した、1つの動画ファイルだけを返す偽の上流サーバー
+    """
+
+    def __init__(self, size: int) -> None:
+        self.setContent(bytes(index % 251 for index in range(size)))
+        self.requested_ranges: list[str | None] = []
+
+        self.app = FastAPI()
+        self.app.get('/video.mp4')(self.videoAPI)
+
+    def setContent(self, content: bytes) -> None:
+        self.content = content
+        self.etag = f'"{hashlib.md5(content).hexdigest()}"'
+
+    async def videoAPI(self, request: Request) -> Response:
+        range_header = request.headers.get('range')
+        self.requested_ranges.append(range_header)
+        headers = {'etag': self.etag, 'accept-ranges': 'bytes', 'content-type': 'video/mp4'}
+        if range_header is None:
+            return Response(self.content, headers=headers)
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', range_header)
+        assert match is not None
+        start = int(match.group(1))
+        end = min(int(match.group(2)) + 1, len(self.content)) if match.group(2) != '' else len(self.content)
+        headers['content-range'] = f'bytes {start}-{end - 1}/{len(self.content)}'
+        return Response(self.content[start:end], status_code=206, headers=headers)
+
+
+async def read_body(response: TwitterMediaResponse) -> bytes:
+    """
+    レスポンスボディをすべて読み込み、クリーンアップ処理を呼び出す
+    """
+
+    try:
+        return b''.join([chunk async for chunk in response.body])
+    finally:
+        await response.cleanup()
+
+
+async def wait_background_tasks() -> None:
+    """
+    メタデータの保存・キャッシュファイルの削除タスクの完了を待つ
+    """
+
+    while len(TwitterMediaCache._background_tasks) > 0:
+        await asyncio.gather(*TwitterMediaCache._background_tasks, return_exceptions=True)
+
+
+async def run_test(size: int) -> bool:
+
+    # 偽サーバーを空いているポートで起動する
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    fake = FakeUpstream(size)
+    server = uvicorn.Server(uvicorn.Config(fake.app, host='127.0.0.1', port=port, log_level='warning'))
+    server_task = asyncio.create_task(server.serve())
+    deadline = time.monotonic() + 10
+    while server.started is False and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    url = f'http://127.0.0.1:{port}/video.mp4'
+
+    # キャッシュディレクトリを一時ディレクトリに向け、読み込み単位を小さくする
+    temp_dir = tempfile.TemporaryDirectory()
+    cache_dir = Path(temp_dir.name)
+    TwitterMediaCacheModule.TWITTER_MEDIA_CACHE_DIR = cache_dir
+    TwitterMediaCache._entries = None
+    TwitterMediaCache.CHUNK_SIZE = 1024
+
+    results: list[tuple[str, bool]] = []
+    def Check(name: str, is_passed: bool, detail: Any = None) -> None:
+        results.append((name, is_passed))
+        typer.echo(f'{"PASS" if is_passed else "FAIL"}  {name}' + (f'  ({detail})' if is_passed is False and detail is not None else ''))
+
+    async def Fetch(range_header: str) -> bytes:
+        return await read_body(await TwitterMediaCache.open(url, {'range': range_header}))
+
+    half = size // 2
+    try:
+        # 1. キャッシュにない範囲
+        fake.requested_ranges.clear()
+        data = await Fetch('bytes=0-99')
+        Check('miss', data == fake.content[0:100] and fake.requested_ranges == ['bytes=0-99'], fake.requested_ranges)
+
+        # 2. 取得済みの範囲
+        fake.requested_ranges.clear()
+        data = await Fetch('bytes=10-49')
+        Check('hit', data == fake.content[10:50] and fake.requested_ranges == [], fake.requested_ranges)
+
+        # 3. 一部だけ取得済みの範囲
+        fake.requested_ranges.clear()
+        data = await Fetch(f'bytes=50-{half - 1}')
+        Check('partial', data == fake.content[50:half] and fake.requested_ranges == [f'bytes=100-{half - 1}'], fake.requested_ranges)
+
+        # 4. インデックスを破棄して、メタデータファイルから読み込み直す
+        await wait_background_tasks()
+        TwitterMediaCache._entries = None
+        fake.requested_ranges.clear()
+        data = await Fetch(f'bytes=0-{half - 1}')
+        Check('reload', data == fake.content[0:half] and fake.requested_ranges == [], fake.requested_ranges)
+
+        # 5. 読み込み中のキャッシュの破棄と作り直し
+        ## 取得済みの範囲を読み込むレスポンスを、最初のチャンクだけ読んで止めておく
+        old_content = fake.content
+        reading_response = await TwitterMediaCache.open(url, {'range': f'bytes=0-{half - 1}'})
+        reading_chunks = [await anext(reading_response.body)]
+        old_data_files = set(cache_dir.glob('*.bin'))
+
+        ## 上流の動画を差し替え、取得済みでない範囲を要求してキャッシュを破棄させる
+        fake.setContent(bytes((index * 7 + 3) % 253 for index in range(size)))
+        try:
+            await Fetch(f'bytes={half}-')
+        except OSError:
+            pass
+
+        ## 同じ URL のキャッシュを作り直す
+        data = await Fetch('bytes=0-99')
+        is_recreated = data == fake.content[0:100]
+
+        ## 止めておいたレスポンスの残りを読み込む
+        try:
+            async for chunk in reading_response.body:
+                reading_chunks.append(chunk)
+        finally:
+            await reading_response.cleanup()
+        Check('discard while reading', is_recreated and b''.join(reading_chunks) == old_content[0:half])
+
+        # 6. 破棄されたキャッシュファイルの削除
+        await wait_background_tasks()
+        data_files = set(cache_dir.glob('*.bin'))
+        Check('cleanup', len(data_files) == 1 and data_files.isdisjoint(old_data_files), sorted(path.name for path in data_files))
+
+    finally:
+        await wait_background_tasks()
+        if TwitterMediaCache._client is not None:
+            await TwitterMediaCache._client.aclose()
+            TwitterMediaCache._client = None
+        server.should_exit = True
+        await server_task
+        temp_dir.cleanup()
+
+    return all(is_passed for _, is_passed in results)
+
+
+app = typer.Typer(add_completion=False)
+
+
+@app.command()
+def main(
+    size: int = typer.Option(64 * 1024, '--size', min=8192, help='Size of the video served by the fake upstream server.'),
+):
+    if asyncio.run(run_test(size)) is False:
+        raise typer.Exit(code=1)
+
+
+if __name__ == '__main__':
+    app()